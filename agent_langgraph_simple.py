@@ -3,26 +3,38 @@ Agente de IA para Atendimento de Supermercado usando LangGraph
 Versão simplificada e estável com arquitetura de grafos
 """
 
-from typing import Dict, Any, TypedDict, Sequence, List
-from langchain_openai import ChatOpenAI
-from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage
-from langchain_core.tools import tool
+from typing import Dict, Any, Callable, List, Optional
+from datetime import datetime
+from zoneinfo import ZoneInfo
+from langchain_core.messages import BaseMessage, SystemMessage, HumanMessage, AIMessage, ToolMessage
+from langchain_core.tools import BaseTool, tool
 from langchain_core.runnables import RunnableConfig
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode, tools_condition, create_react_agent
+from langgraph.prebuilt import create_react_agent
 from langgraph.checkpoint.memory import MemorySaver
+from langgraph.errors import GraphRecursionError
 from pathlib import Path
 import json
 import os
+import threading
+import time
+import uuid
 
 from config.settings import settings
-from config.logger import setup_logger
+from config.logger import setup_logger, payload_preview
+from config.metrics import record_cache, timed_stage
 from tools.http_tools import estoque, pedidos, alterar, ean_lookup, estoque_preco
 # Redis tools removidos - apenas buffer de mensagens mantido
 from tools.time_tool import get_current_time
+from tools.fast_path import answer_fast_path
+from tools import cart, cassette, deadline, prefetch
+from tools.tool_node import InstrumentedToolNode
+from tools.plan_execute import PLAN_INSTRUCTION, RESPOND_INSTRUCTION, create_plan_execute_agent
+from tools.model_router import (
+    FAST, QUALITY, ROUTE_LATENCY, ROUTE_TURNS, choose_route, new_turn_messages, side_effect_calls, validate_turn,
+)
 from memory.limited_postgres_memory import LimitedPostgresChatMessageHistory
 from memory.response_filter import prepare_client_response
+from memory.llm_usage import usage_callback
 
 logger = setup_logger(__name__)
 
@@ -43,21 +55,41 @@ def estoque_tool(url: str) -> str:
     return estoque(url)
 
 
+def _turn_id(config: Optional[RunnableConfig]) -> Optional[str]:
+    """Identificador do turno da conversa (definido em run_agent_langgraph)."""
+    return ((config or {}).get("configurable") or {}).get("turn_id")
+
+
 @tool
-def pedidos_tool(json_body: str) -> str:
+def pedidos_tool(json_body: str, config: RunnableConfig) -> str:
     """
     Enviar o pedido finalizado para o painel dos funcionários (dashboard).
     
     O corpo da requisição deve ser um JSON (em formato string) com os detalhes do pedido.
     Exemplo: '{"cliente": "João Silva", "telefone": "5511999998888", "itens": [{"produto": "Arroz Integral 1kg", "quantidade": 2, "preco": 8.50}], "total": 17.00}'
+    Com itens no carrinho, omita "itens" e "total": o pedido é montado a partir do carrinho.
+    Exemplo: '{"cliente": "João Silva", "entrega": "retirada"}'
     
     Use esta ferramenta SOMENTE quando o cliente confirmar que deseja finalizar o pedido.
     """
-    return pedidos(json_body)
+    telefone = cart.phone_from(config)
+    turn_id = _turn_id(config)
+    if not settings.cart_enabled or not telefone:
+        return pedidos(json_body, turn_id)
+    try:
+        data = json.loads(json_body)
+    except (TypeError, ValueError):
+        return pedidos(json_body, turn_id)
+    if not isinstance(data, dict) or not cart.fill_order(telefone, data):
+        return pedidos(json_body, turn_id)
+    result = pedidos(json.dumps(data, ensure_ascii=False), turn_id)
+    if result.startswith("✅"):
+        cart.clear(telefone)
+    return result
 
 
 @tool
-def alterar_tool(telefone: str, json_body: str) -> str:
+def alterar_tool(telefone: str, json_body: str, config: RunnableConfig) -> str:
     """
     Atualizar o pedido no painel dos funcionários (dashboard).
     
@@ -68,11 +100,39 @@ def alterar_tool(telefone: str, json_body: str) -> str:
     
     Use esta ferramenta quando o cliente quiser modificar ou cancelar um pedido existente.
     """
-    return alterar(telefone, json_body)
+    return alterar(telefone, json_body, _turn_id(config))
+
+
+
+
+
+@tool
+def cart_add(ean: str, config: RunnableConfig, quantidade: float = 1) -> str:
+    """
+    Adicionar um produto ao carrinho do cliente (ou aumentar a quantidade).
+    Informe o EAN (apenas dígitos) e a quantidade; nome e preço vêm do sistema.
+    Retorna o carrinho atualizado com subtotais e total já calculados.
+    """
+    return cart.add(cart.phone_from(config), ean, quantidade)
 
 
+@tool
+def cart_remove(ean: str, config: RunnableConfig, quantidade: Optional[float] = None) -> str:
+    """
+    Remover um produto do carrinho pelo EAN. Sem quantidade, remove o item inteiro;
+    com quantidade, diminui só essa quantidade. Retorna o carrinho atualizado.
+    """
+    return cart.remove(cart.phone_from(config), ean, quantidade)
 
 
+@tool
+def cart_view(config: RunnableConfig) -> str:
+    """
+    Ver o carrinho atual do cliente: itens, quantidades, preços, subtotais e total.
+    Use os totais daqui em vez de somar os preços.
+    """
+    return cart.summary(cart.phone_from(config))
+
 
 @tool
 def time_tool() -> str:
@@ -95,7 +155,7 @@ def ean_tool(query: str) -> str:
     q = (query or "").strip()
     if q.startswith("{") and q.endswith("}"):
         q = ("" or q)  # Usar query direta
-    return ean_lookup(q)
+    return prefetch.cached_ean_lookup(q) or ean_lookup(q)
 
 @tool("ean")
 def ean_tool_alias(query: str) -> str:
@@ -107,7 +167,7 @@ def ean_tool_alias(query: str) -> str:
     q = (query or "").strip()
     if q.startswith("{") and q.endswith("}"):
         q = ("" or q)  # Usar query direta
-    return ean_lookup(q)
+    return prefetch.cached_ean_lookup(q) or ean_lookup(q)
 
 
 @tool
@@ -123,7 +183,7 @@ def estoque_preco_tool(ean: str) -> str:
     Use esta ferramenta para montar opções (nome + variação + preço)
     e perguntar tamanho/gramagem quando o pedido for genérico.
     """
-    return estoque_preco(ean)
+    return prefetch.cached_estoque_preco(ean) or estoque_preco(ean)
 
 @tool("estoque")
 def estoque_preco_alias(ean: str) -> str:
@@ -132,7 +192,7 @@ def estoque_preco_alias(ean: str) -> str:
     Consulta preço e disponibilidade pelo EAN (apenas dígitos).
     Filtra apenas itens com estoque e normaliza o preço em `preco`.
     """
-    return estoque_preco(ean)
+    return prefetch.cached_estoque_preco(ean) or estoque_preco(ean)
 
 
 # Lista de ferramentas principais
@@ -155,6 +215,35 @@ ACTIVE_TOOLS = [
     time_tool,
     pedidos_tool,  # <--- ADICIONADO AQUI (Correção Crítica)
 ]
+CART_TOOLS = [cart_add, cart_remove, cart_view]
+
+
+def bound_tools() -> List[BaseTool]:
+    """Ferramentas ligadas ao agente, em ordem fixa (prefixo estável para o cache)."""
+    return sorted(ACTIVE_TOOLS + (CART_TOOLS if settings.cart_enabled else []), key=lambda t: t.name)
+
+
+# Trechos do prompt que dependem das ferramentas do carrinho estarem ligadas;
+# linha vazia remove o marcador do prompt.
+_CART_PROMPT = {
+    "order_tools": (
+        '4. **cart_add** - Colocar um produto no carrinho pelo EAN (`cart_add(ean="codigo_ean", quantidade=2)`)\n'
+        "5. **cart_remove** - Tirar um produto (ou parte da quantidade) do carrinho\n"
+        "6. **cart_view** - Ver o carrinho com subtotais e total já calculados\n"
+        "7. **pedidos_tool** - Enviar o pedido confirmado; os itens e o total saem do carrinho"
+    ),
+    "cart_confirm_rule": "- Subtotais e total vêm **copiados** do último retorno de `cart_add`/`cart_remove`/`cart_view` — **nunca some os preços você mesma**",
+    "cart_step": "8. **Mantenha o pedido no carrinho**: quando o cliente escolher um produto, use `cart_add`; quando desistir, `cart_remove`",
+    "cart_totals_rule": "- **Totais só do carrinho**: ao falar subtotal ou total, copie os valores retornados por `cart_add`/`cart_remove`/`cart_view`",
+    "cart_example": "[cart_add do arroz → carrinho com Total: R$[total]]",
+}
+_NO_CART_PROMPT = {
+    "order_tools": "4. **pedidos_tool** - Enviar o pedido confirmado com itens, quantidades, preços e total",
+    "cart_confirm_rule": "",
+    "cart_step": "8. **Mantenha contexto** do pedido sendo montado",
+    "cart_totals_rule": "",
+    "cart_example": "",
+}
 
 
 # ============================================
@@ -172,6 +261,10 @@ def load_system_prompt() -> str:
         text = Path(prompt_path).read_text(encoding="utf-8")
         text = text.replace("{base_url}", settings.supermercado_base_url)
         text = text.replace("{ean_base}", settings.estoque_ean_base_url)
+        names = {t.name for t in bound_tools()}
+        sections = _CART_PROMPT if {t.name for t in CART_TOOLS} <= names else _NO_CART_PROMPT
+        for key, value in sections.items():
+            text = text.replace("{%s}\n" % key, f"{value}\n" if value else "")
         logger.info(f"Carregado prompt do sistema de: {prompt_path}")
         return text
     except Exception as e:
@@ -179,11 +272,87 @@ def load_system_prompt() -> str:
         raise
 
 
-def _build_llm():
+# ============================================
+# Prompt com prefixo estável (cache de prefixo)
+# ============================================
+
+# Provedores do "rabo" dinâmico do prompt: (state, config) -> texto ou None
+PromptTailProvider = Callable[[Dict[str, Any], RunnableConfig], Optional[str]]
+_prompt_tail_providers: List[PromptTailProvider] = []
+
+
+def register_prompt_tail(provider: PromptTailProvider) -> PromptTailProvider:
+    """Registra um bloco de contexto variável, enviado depois da conversa (fora do prefixo em cache)."""
+    _prompt_tail_providers.append(provider)
+    return provider
+
+
+@register_prompt_tail
+def _datetime_tail(state: Dict[str, Any], config: RunnableConfig) -> Optional[str]:
+    if not settings.prompt_tail_datetime:
+        return None
+    now = datetime.now(ZoneInfo("America/Sao_Paulo"))
+    return f"Data/hora atual: {now.strftime('%d/%m/%Y às %H:%M:%S')} (America/Sao_Paulo)"
+
+
+@register_prompt_tail
+def _cart_tail(state: Dict[str, Any], config: RunnableConfig) -> Optional[str]:
+    telefone = cart.phone_from(config)
+    if not settings.cart_enabled or not telefone:
+        return None
+    cart_items = cart.items(telefone)
+    return cart.render(cart_items) if cart_items else None
+
+
+def _uses_anthropic_format() -> bool:
+    return getattr(settings, "llm_provider", "openai").lower() == "moonshot"
+
+
+def make_cached_prompt(system_prompt: str, instruction: Optional[str] = None) -> Callable[[Dict[str, Any], RunnableConfig], List[BaseMessage]]:
+    """
+    Monta as mensagens de cada chamada como [prefixo fixo] + conversa + [contexto variável].
+
+    O SystemMessage do prefixo é criado uma única vez (bytes idênticos em todas as
+    chamadas); no formato Anthropic leva cache_control para marcar o fim do trecho
+    cacheável. O contexto variável vai por último para não invalidar o prefixo
+    nem o histórico já enviado. `instruction` (etapa do modo plan_execute) entra
+    no fim do contexto variável. Sem tempo para a chamada dentro do prazo da
+    conversa, levanta DeadlineExceeded em vez de chamar o LLM.
+    """
+    if _uses_anthropic_format():
+        prefix = SystemMessage(content=[{"type": "text", "text": system_prompt, "cache_control": {"type": "ephemeral"}}])
+    else:
+        prefix = SystemMessage(content=system_prompt)
+
+    def prompt(state: Dict[str, Any], config: RunnableConfig) -> List[BaseMessage]:
+        deadline.require("llm", float(settings.deadline_min_llm_seconds))
+        messages = [prefix, *state["messages"]]
+        tail = []
+        for provider in _prompt_tail_providers:
+            try:
+                text = provider(state, config)
+            except Exception as e:
+                logger.warning(f"Falha ao montar contexto do prompt ({getattr(provider, '__name__', provider)}): {e}")
+                continue
+            if text:
+                tail.append(text)
+        if instruction:
+            tail.append(instruction)
+        if tail:
+            content = "[Contexto atual - uso interno]\n" + "\n".join(tail)
+            # Anthropic não aceita SystemMessage fora do início da conversa
+            messages.append(HumanMessage(content=content) if _uses_anthropic_format() else SystemMessage(content=content))
+        return messages
+
+    return prompt
+
+
+def _build_llm(model_override: Optional[str] = None):
+    """LLM do agente; model_override (rota rápida da cascata) substitui llm_model/llm_profile."""
     provider = getattr(settings, "llm_provider", "openai").lower()
-    model = getattr(settings, "llm_model", "gpt-4o-mini")
+    model = model_override or getattr(settings, "llm_model", "gpt-4o-mini")
     temp = float(getattr(settings, "llm_temperature", 0.0))
-    profile = getattr(settings, "llm_profile", None)
+    profile = None if model_override else getattr(settings, "llm_profile", None)
     
     print(f"[LLM] Configurando LLM: provider={provider}, model={model}, temp={temp}")
     
@@ -215,9 +384,15 @@ def _build_llm():
             if ("moonshot.ai" in _u or "moonshot.cn" in _u) and "/anthropic" not in _u:
                 _u = _u.rstrip("/") + "/anthropic"
             _os.environ["ANTHROPIC_BASE_URL"] = _u
-        from langchain_anthropic import ChatAnthropic
+        try:
+            from langchain_anthropic import ChatAnthropic
+        except ImportError as e:
+            raise ImportError("Provedor 'moonshot' requer langchain-anthropic: pip install -r requirements-optional.txt") from e
         return ChatAnthropic(model=model, temperature=temp, max_tokens=max_tokens)
     
+    # Importado aqui: langchain_openai + openai respondem pela maior parte do import a frio
+    from langchain_openai import ChatOpenAI
+
     print(f"[LLM] Criando ChatOpenAI com modelo {model}")
     
     # GPT-5-mini não suporta temperatura - apenas usar para outros modelos
@@ -226,7 +401,8 @@ def _build_llm():
         print(f"[LLM] Criando ChatOpenAI com modelo {model} (sem temperatura)")
         
         # Criar modelo sem temperatura
-        base_model = ChatOpenAI(model=model, openai_api_key=settings.openai_api_key)
+        base_model = ChatOpenAI(model=model, openai_api_key=settings.openai_api_key, base_url=settings.openai_base_url,
+                                http_client=deadline.llm_http_client())
         
         # Criar wrapper que ignora qualquer tentativa de adicionar temperatura
         class GPT5MiniWrapper:
@@ -254,37 +430,54 @@ def _build_llm():
         return GPT5MiniWrapper(base_model)
     else:
         print(f"[LLM] Criando ChatOpenAI com modelo {model} e temperatura {temp}")
-        return ChatOpenAI(model=model, openai_api_key=settings.openai_api_key, temperature=temp)
+        # http_client: timeout de cada chamada limitado ao prazo da conversa
+        return ChatOpenAI(model=model, openai_api_key=settings.openai_api_key, base_url=settings.openai_base_url, temperature=temp,
+                          http_client=deadline.llm_http_client())
 
-def create_agent_with_history():
-    """Cria o agente LangGraph com histórico usando create_react_agent"""
+def create_agent_with_history(model: Optional[str] = None, checkpointer: Optional[MemorySaver] = None):
+    """
+    Cria o agente LangGraph com histórico usando create_react_agent.
+    model/checkpointer permitem montar a rota rápida da cascata sobre o mesmo histórico.
+    """
     logger.info("Criando agente LangGraph com create_react_agent...")
     
     # Carregar prompt do sistema
     system_prompt = load_system_prompt()
     
-    llm = _build_llm()
+    llm = _build_llm(model)
+    # Gravação/reprodução de cassetes (settings.cassette_mode); sem efeito quando "off"
+    llm = cassette.wrap_llm(llm)
+    if model is None:
+        global _agent_llm
+        _agent_llm = llm
     
     # Criar memória com checkpoint
-    memory = MemorySaver()
+    memory = checkpointer or MemorySaver()
     
-    # Criar agente REACT usando a função prebuilt
-    # Para GPT-5-mini, precisamos garantir que não haja configuração de temperatura
-    if settings.llm_model == "gpt-5-mini":
-        # Criar agente sem configurações adicionais que possam adicionar temperatura
-        agent = create_react_agent(
+    # Prefixo estável (prompt + ferramentas em ordem fixa) primeiro e dados variáveis no fim,
+    # para aproveitar o cache de prefixo dos provedores (GPT-5-mini usa o mesmo caminho).
+    tools = bound_tools()
+    if settings.agent_mode == "plan_execute":
+        agent = create_plan_execute_agent(
             llm,
-            ACTIVE_TOOLS,
-            prompt=system_prompt,
-            checkpointer=memory
-        )
-    else:
-        agent = create_react_agent(
-            llm,
-            ACTIVE_TOOLS,
-            prompt=system_prompt,
-            checkpointer=memory
+            tools,
+            plan_prompt=make_cached_prompt(system_prompt, PLAN_INSTRUCTION),
+            respond_prompt=make_cached_prompt(system_prompt, RESPOND_INSTRUCTION),
+            checkpointer=memory,
         )
+        logger.info("✅ Agente LangGraph plan_execute criado com sucesso")
+        return agent
+
+    # Criar agente REACT usando a função prebuilt.
+    # version="v1": todas as chamadas de ferramenta de um passo vão juntas ao
+    # InstrumentedToolNode, que as executa em paralelo com tempo limite por ferramenta.
+    agent = create_react_agent(
+        llm,
+        InstrumentedToolNode(tools),
+        prompt=make_cached_prompt(system_prompt),
+        checkpointer=memory,
+        version="v1",
+    )
     
     logger.info("✅ Agente LangGraph REACT criado com sucesso")
     return agent
@@ -295,17 +488,209 @@ def create_agent_with_history():
 # ============================================
 
 _agent_graph = None
+_agent_llm = None
+_fast_agent_graph = None
+_agent_graph_lock = threading.Lock()
 
 def get_agent_graph():
-    """Retorna o grafo do agente (singleton)"""
+    """Retorna o grafo do agente (singleton; construído uma única vez mesmo com o aquecimento em paralelo)"""
     global _agent_graph
     
     if _agent_graph is None:
-        _agent_graph = create_agent_with_history()
+        with _agent_graph_lock:
+            if _agent_graph is None:
+                _agent_graph = create_agent_with_history()
         
     return _agent_graph
 
 
+def get_fast_agent_graph():
+    """Grafo da rota rápida da cascata: mesmo prompt/ferramentas e mesmo checkpointer do grafo principal"""
+    global _fast_agent_graph
+    
+    if _fast_agent_graph is None:
+        checkpointer = get_agent_graph().checkpointer
+        with _agent_graph_lock:
+            if _fast_agent_graph is None:
+                _fast_agent_graph = create_agent_with_history(settings.llm_cascade_fast_model, checkpointer)
+    
+    return _fast_agent_graph
+
+
+def _turn_start_config(agent: Any, config: Dict[str, Any], before: Any) -> Dict[str, Any]:
+    """
+    Checkpoint de onde o turno é refeito: o último antes do turno ou, no primeiro
+    turno da conversa, o checkpoint de entrada (step -1) criado pela tentativa,
+    que ainda não tem mensagens. Nada do histórico é apagado.
+    """
+    if before.config.get("configurable", {}).get("checkpoint_id"):
+        return before.config
+    start = None
+    for snapshot in agent.get_state_history(config):
+        if (snapshot.metadata or {}).get("source") == "input":
+            start = snapshot  # o histórico vem do mais novo para o mais antigo
+    return start.config if start is not None else config
+
+
+def _invoke_agent(telefone: str, mensagem: str, initial_state: Dict[str, Any], config: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Executa o turno no grafo principal ou, com a cascata ligada, tenta primeiro o
+    modelo rápido. Se a resposta dele for reprovada, o turno é refeito no modelo de
+    qualidade a partir do checkpoint anterior ao turno (a tentativa descartada fica
+    num ramo morto do histórico), exceto quando a tentativa já chamou uma
+    ferramenta com efeito colateral (pedido, carrinho).
+    """
+    agent = get_agent_graph()
+    if not settings.llm_cascade_enabled:
+        return agent.invoke(initial_state, config)
+
+    route, reason = choose_route(mensagem)
+    start = time.perf_counter()
+    if route == QUALITY:
+        result = agent.invoke(initial_state, config)
+        ROUTE_TURNS.inc(route=QUALITY, outcome="ok", reason=reason)
+        ROUTE_LATENCY.observe(time.perf_counter() - start, route=QUALITY)
+        return result
+
+    before = agent.get_state(config)
+    before_messages = list((before.values or {}).get("messages", []))
+    result, error = None, None
+    try:
+        result = get_fast_agent_graph().invoke(initial_state, config)
+    except Exception as e:
+        if deadline.expired() or isinstance(e, deadline.DeadlineExceeded):
+            raise  # sem tempo para refazer o turno no modelo de qualidade
+        logger.warning(f"[CASCATA] Modelo rápido falhou para {telefone}: {e}")
+        error = e
+    # Após uma exceção, o checkpoint guarda o que o turno chegou a executar
+    after = result["messages"] if result is not None else (agent.get_state(config).values or {}).get("messages", [])
+    turn_messages = new_turn_messages(before_messages, after)
+    failure = "excecao" if error is not None else validate_turn(turn_messages)
+
+    if failure is None:
+        ROUTE_TURNS.inc(route=FAST, outcome="ok", reason=reason)
+        ROUTE_LATENCY.observe(time.perf_counter() - start, route=FAST)
+        return result
+
+    applied = side_effect_calls(turn_messages)
+    if applied:
+        # Refazer repetiria pedido/carrinho: fica com a tentativa do modelo rápido
+        logger.warning(f"[CASCATA] {telefone}: resposta reprovada ({failure}) após {applied}; sem escalar")
+        ROUTE_TURNS.inc(route=FAST, outcome="not_escalated", reason=failure)
+        ROUTE_LATENCY.observe(time.perf_counter() - start, route=FAST)
+        if error is not None:
+            raise error
+        return result
+
+    logger.info(f"[CASCATA] Escalando {telefone} para o modelo de qualidade (motivo: {failure})")
+    start_config = _turn_start_config(agent, config, before)
+    fork_config = {**config, "configurable": {**config["configurable"], **start_config["configurable"]}}
+    result = agent.invoke(initial_state, fork_config)
+    ROUTE_TURNS.inc(route=FAST, outcome="escalated", reason=failure)
+    ROUTE_LATENCY.observe(time.perf_counter() - start, route="escalated")
+    return result
+
+
+def warmup_llm() -> str:
+    """
+    Faz uma chamada mínima ao mesmo cliente LLM usado pelo grafo, para abrir a
+    conexão HTTP/TLS com o provedor antes do primeiro cliente.
+    """
+    get_agent_graph()
+    response = _agent_llm.invoke([HumanMessage(content="ok")])
+    return getattr(response, "content", "") or ""
+
+
+def record_exchange(telefone: str, mensagem: str, resposta: str) -> None:
+    """
+    Registra no checkpoint do agente uma troca respondida fora do grafo,
+    para que o histórico da conversa continue completo no próximo turno.
+    """
+    agent = get_agent_graph()
+    config = {"configurable": {"thread_id": telefone}}
+    agent.update_state(
+        config,
+        {"messages": [HumanMessage(content=mensagem), AIMessage(content=resposta)]},
+        as_node=_reply_node(agent),
+    )
+
+
+def _last_reply(telefone: str) -> Optional[str]:
+    """Última resposta do agente na conversa (None se a conversa está vazia)."""
+    try:
+        state = get_agent_graph().get_state({"configurable": {"thread_id": telefone}})
+    except Exception as e:
+        logger.warning(f"Falha ao ler o histórico para o atalho: {e}")
+        return None
+    for m in reversed((state.values or {}).get("messages") or []):
+        if isinstance(m, AIMessage) and m.content and not m.tool_calls:
+            return m.content if isinstance(m.content, str) else str(m.content)
+    return None
+
+
+def _reply_node(agent) -> str:
+    """Nó que produz a resposta final no grafo ativo (react: agent; plan_execute: respond)."""
+    return "agent" if "agent" in agent.nodes else "respond"
+
+
+_PARTIAL_NAME_KEYS = ("produto", "descricao", "nome", "name")
+# Resposta fixa do create_react_agent quando os passos (recursion_limit) acabam
+_STEP_LIMIT_REPLY = "Sorry, need more steps to process this request."
+
+
+def _step_limit_reached(result: Dict[str, Any]) -> bool:
+    messages = result.get("messages") if isinstance(result, dict) else None
+    return bool(messages) and isinstance(messages[-1], AIMessage) and messages[-1].content == _STEP_LIMIT_REPLY
+
+
+def _partial_reply(turn_messages: List[BaseMessage]) -> str:
+    """Resposta de prazo esgotado com os preços já consultados no turno."""
+    found = []
+    for m in turn_messages:
+        if not isinstance(m, ToolMessage) or m.name not in ("estoque", "estoque_preco_tool"):
+            continue
+        try:
+            items = json.loads(m.content)
+        except (TypeError, ValueError):
+            continue
+        for item in items if isinstance(items, list) else []:
+            nome = next((item[k] for k in _PARTIAL_NAME_KEYS if isinstance(item, dict) and item.get(k)), None)
+            preco = item.get("preco") if isinstance(item, dict) else None
+            if nome and isinstance(preco, (int, float)):
+                linha = f"- {nome}: R$ " + f"{preco:.2f}".replace(".", ",")
+                if linha not in found:
+                    found.append(linha)
+    if found:
+        return ("Desculpe a demora! Ainda estou conferindo alguns itens, mas já encontrei:\n"
+                + "\n".join(found) + "\nJá te confirmo o restante.")
+    return ("Desculpe a demora! O sistema está lento para consultar os produtos agora. "
+            "Pode me mandar o pedido de novo em instantes?")
+
+
+def _finish_partial(agent, config: Dict[str, Any], reason: str) -> Dict[str, Any]:
+    """
+    Encerra o turno interrompido pelo prazo (ou limite de passos): responde com o
+    que já foi apurado e deixa o checkpoint consistente para o próximo turno
+    (chamadas de ferramenta pendentes recebem um ToolMessage de erro).
+    """
+    messages = list((agent.get_state(config).values or {}).get("messages", []))
+    reply_id = None
+    if messages and isinstance(messages[-1], AIMessage) and messages[-1].content == _STEP_LIMIT_REPLY:
+        # Substitui (mesmo id) a mensagem padrão do create_react_agent
+        reply_id = messages.pop().id
+    start = max((i for i, m in enumerate(messages) if isinstance(m, HumanMessage)), default=-1) + 1
+    turn = messages[start:]
+    answered = {m.tool_call_id for m in turn if isinstance(m, ToolMessage)}
+    pending = [
+        ToolMessage(content=f"Erro: consulta cancelada ({reason}).", name=c["name"], tool_call_id=c["id"], status="error")
+        for m in turn if isinstance(m, AIMessage) for c in m.tool_calls if c["id"] not in answered
+    ]
+    reply = AIMessage(content=_partial_reply(turn), id=reply_id)
+    agent.update_state(config, {"messages": [*pending, reply]}, as_node=_reply_node(agent))
+    return {"messages": [*messages, *pending, reply]}
+
+
+@timed_stage("agent")
 def run_agent_langgraph(telefone: str, mensagem: str) -> Dict[str, Any]:
     """
     Executa o agente LangGraph com uma mensagem e ID de sessão (telefone).
@@ -317,59 +702,92 @@ def run_agent_langgraph(telefone: str, mensagem: str) -> Dict[str, Any]:
     Returns:
         Dict com 'output' (resposta do agente) e 'error' (se houver)
     """
-    print(f"[AGENT] Iniciando processamento para telefone: {telefone}")
-    print(f"[AGENT] Mensagem: {mensagem}")
+    logger.info("[AGENT] Iniciando processamento para telefone: %s", telefone)
+    logger.debug("[AGENT] Mensagem: %s", payload_preview(mensagem))
+    
+    # Atalho determinístico: intenções triviais não precisam do LLM
+    fast_reply = answer_fast_path(mensagem, _last_reply(telefone))
+    record_cache("fast_path", bool(fast_reply))
+    if fast_reply:
+        try:
+            record_exchange(telefone, mensagem, fast_reply)
+        except Exception as e:
+            logger.warning(f"Falha ao registrar resposta do atalho no histórico: {e}")
+        return {"output": fast_reply, "error": None}
     
     try:
         agent = get_agent_graph()
-        print(f"[AGENT] Agente carregado com {len(ACTIVE_TOOLS)} ferramentas ativas")
+        logger.debug("[AGENT] Agente carregado com %d ferramentas ativas", len(ACTIVE_TOOLS))
         
         # Preparar estado inicial
         initial_state = {
             "messages": [HumanMessage(content=mensagem)],
         }
         
-        logger.info(f"Estado inicial preparado: {initial_state}")
+        logger.debug("Estado inicial preparado: %s", payload_preview(mensagem))
         
-        # Configuração com session_id para checkpoint
-        config = {"configurable": {"thread_id": telefone}}
+        # Configuração com session_id para checkpoint; recursion_limit limita as voltas LLM ↔ ferramentas
+        config = {
+            # turn_id: o mesmo pedido repetido pelo LLM no turno não duplica (fila de pedidos)
+            "configurable": {"thread_id": telefone, "turn_id": uuid.uuid4().hex},
+            "callbacks": [usage_callback],
+            "recursion_limit": int(settings.agent_recursion_limit),
+        }
         
         # Executar grafo
         logger.info("Executando agente...")
-        result = agent.invoke(initial_state, config)
+        # Prazo da resposta (o buffer_loop já abre um ao liberar as mensagens; o mais curto vale)
+        with deadline.budget(float(settings.reply_deadline_seconds)):
+            try:
+                # Pré-busca dos produtos citados enquanto o LLM decide as chamadas de ferramenta
+                with prefetch.scope(mensagem):
+                    result = _invoke_agent(telefone, mensagem, initial_state, config)
+                if _step_limit_reached(result):
+                    raise GraphRecursionError("create_react_agent sem passos restantes")
+            except GraphRecursionError:
+                logger.warning(f"[AGENT] Limite de {settings.agent_recursion_limit} passos atingido para {telefone}")
+                deadline.DEADLINE_EXCEEDED.inc(stage="recursion_limit")
+                result = _finish_partial(agent, config, "limite de passos")
+            except Exception as e:
+                if not (isinstance(e, deadline.DeadlineExceeded) or deadline.expired()):
+                    raise
+                logger.warning(f"[AGENT] Prazo de resposta esgotado para {telefone}: {e}")
+                result = _finish_partial(agent, config, "prazo esgotado")
+            finally:
+                left = deadline.remaining()
+                if left is not None:
+                    deadline.DEADLINE_REMAINING.observe(left)
         
         # Debug: verificar estrutura do resultado
-        print(f"[DEBUG] Resultado do agente: {result}")
-        print(f"[DEBUG] Tipo do resultado: {type(result)}")
+        logger.debug("[DEBUG] Resultado do agente: %s", payload_preview(result))
         
         # Extrair última mensagem (resposta do agente)
         if isinstance(result, dict) and "messages" in result:
             messages = result["messages"]
-            print(f"[DEBUG] Total de mensagens: {len(messages)}")
+            logger.debug("[DEBUG] Total de mensagens: %d", len(messages))
             if messages:
                 last_message = messages[-1]
-                print(f"[DEBUG] Última mensagem: {last_message}")
-                print(f"[DEBUG] Tipo da última mensagem: {type(last_message)}")
+                logger.debug("[DEBUG] Última mensagem (%s): %s", type(last_message).__name__, payload_preview(last_message))
                 
                 if isinstance(last_message, AIMessage):
                     output = last_message.content
                 else:
                     output = str(last_message.content)
                 
-                print(f"[DEBUG] Conteúdo extraído: {output}")
+                logger.debug("[DEBUG] Conteúdo extraído: %s", payload_preview(output))
             else:
-                print("[ERROR] Nenhuma mensagem retornada pelo agente")
+                logger.error("[ERROR] Nenhuma mensagem retornada pelo agente")
                 output = "Desculpe, não consegui processar sua mensagem."
         else:
-            print(f"[ERROR] Resultado inesperado do agente: {result}")
+            logger.error("[ERROR] Resultado inesperado do agente: %s", payload_preview(result))
             output = "Desculpe, não consegui processar sua mensagem."
         
         logger.info("✅ Agente LangGraph REACT executado com sucesso")
-        logger.debug(f"Resposta: {output}")
+        logger.debug("Resposta: %s", payload_preview(output))
         
         # Filter internal metadata before returning to client
         filtered_output = prepare_client_response(output)
-        logger.debug(f"Resposta filtrada: {filtered_output}")
+        logger.debug("Resposta filtrada: %s", payload_preview(filtered_output))
         
         # Redis removido - apenas buffer de mensagens mantido
         
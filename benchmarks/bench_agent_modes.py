@@ -0,0 +1,114 @@
+"""
+Comparação dos modos do agente (react × plan_execute) em conversas com vários itens
+
+Roda as conversas de benchmarks/conversations/multi_itens.jsonl contra os
+serviços simulados, com o LLM simulado pedindo uma consulta por item
+(MULTI_ITEM_SCRIPT), uma vez em cada modo, e compara por turno:
+chamadas ao LLM, tokens de prompt enviados e duração.
+
+Uso:
+  python benchmarks/bench_agent_modes.py
+  python benchmarks/bench_agent_modes.py --llm-latency lognormal:1.2 --upstream-latency fixed:0.2
+  python benchmarks/bench_agent_modes.py --conversations benchmarks/conversations/basico.jsonl --json
+"""
+import argparse
+import json
+import logging
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config.settings import settings  # noqa: E402
+from mocks import MULTI_ITEM_SCRIPT, MockServices, ServiceProfile  # noqa: E402
+
+DEFAULT_CONVERSATIONS = ROOT / "benchmarks" / "conversations" / "multi_itens.jsonl"
+MODES = ("react", "plan_execute")
+
+
+def load_conversations(path: Path) -> List[Dict]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_mode(mode: str, conversations: List[Dict], mocks: MockServices) -> Dict[str, float]:
+    import agent_langgraph_simple as agente
+    from memory.llm_usage import LLM_TOKENS
+
+    settings.agent_mode = mode
+    agente._agent_graph = agente._fast_agent_graph = None
+    agente.get_agent_graph()
+
+    durations, llm_calls, prompt_tokens = [], [], []
+    for conv in conversations:
+        telefone = f"bench-{mode}-{conv['id']}"
+        for turn in conv["turns"]:
+            calls_before = mocks.requests["llm"]
+            tokens_before = LLM_TOKENS.value(model=settings.llm_model, kind="prompt")
+            start = time.perf_counter()
+            result = agente.run_agent_langgraph(telefone, turn)
+            durations.append(time.perf_counter() - start)
+            if result.get("error"):
+                raise RuntimeError(f"{mode}/{conv['id']}: {result['error']}")
+            llm_calls.append(mocks.requests["llm"] - calls_before)
+            prompt_tokens.append(LLM_TOKENS.value(model=settings.llm_model, kind="prompt") - tokens_before)
+
+    return {
+        "turns": len(durations),
+        "llm_calls": sum(llm_calls),
+        "llm_calls_per_turn": statistics.mean(llm_calls),
+        "prompt_tokens": sum(prompt_tokens),
+        "turn_p50_ms": statistics.median(durations) * 1000,
+        "turn_max_ms": max(durations) * 1000,
+        "total_s": sum(durations),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=Path, default=DEFAULT_CONVERSATIONS)
+    parser.add_argument("--llm-latency", default="lognormal:0.8", help="distribuição de latência do LLM simulado")
+    parser.add_argument("--upstream-latency", default="lognormal:0.15", help="latência do ERP/smart-responder")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="imprime o resultado em JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.WARNING)
+    conversations = load_conversations(args.conversations)
+    # Sem pré-busca: compara só a estrutura do grafo
+    settings.prefetch_enabled = False
+    results: Dict[str, Dict[str, float]] = {}
+    for mode in MODES:
+        # Mesma semente em cada modo: as duas execuções sorteiam a mesma sequência de latências
+        profiles = {
+            "llm": ServiceProfile.parse(args.llm_latency, seed=args.seed),
+            "erp": ServiceProfile.parse(args.upstream_latency, seed=args.seed),
+            "smart_responder": ServiceProfile.parse(args.upstream_latency, seed=args.seed),
+        }
+        with MockServices(profiles=profiles, llm_script=MULTI_ITEM_SCRIPT) as mocks:
+            mocks.apply_to_settings(settings)
+            results[mode] = run_mode(mode, conversations, mocks)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"\n{len(conversations)} conversas, LLM {args.llm_latency}, serviços {args.upstream_latency}\n")
+    print(f"{'modo':<14}{'turnos':>7}{'LLM/turno':>11}{'tokens prompt':>15}{'p50 turno':>12}{'max turno':>12}{'total':>9}")
+    for mode, r in results.items():
+        print(f"{mode:<14}{r['turns']:>7}{r['llm_calls_per_turn']:>11.2f}{r['prompt_tokens']:>15.0f}"
+              f"{r['turn_p50_ms']:>10.0f}ms{r['turn_max_ms']:>10.0f}ms{r['total_s']:>8.1f}s")
+    react, plan = results["react"], results["plan_execute"]
+    if react["total_s"] > 0 and react["prompt_tokens"] > 0:
+        print(f"\nplan_execute em relação ao react: tempo {plan['total_s'] / react['total_s'] - 1:+.0%}, "
+              f"tokens de prompt {plan['prompt_tokens'] / react['prompt_tokens'] - 1:+.0%}, "
+              f"chamadas ao LLM {plan['llm_calls'] / react['llm_calls'] - 1:+.0%}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
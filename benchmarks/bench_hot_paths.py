@@ -0,0 +1,155 @@
+"""
+Micro-benchmarks dos caminhos quentes em Python, com baseline gravado
+
+Casos (sobre os payloads gravados em benchmarks/payloads e benchmarks/upstream):
+  extract_incoming.*       server._extract_incoming por layout de webhook
+  sanitize_number          server._sanitize_number (JID, LID, formatado)
+  split_message            divisão em partes de send_whatsapp_message (resposta longa)
+  strip_internal_metadata  memory.response_filter.strip_internal_metadata
+  prepare_client_response  memory.response_filter.prepare_client_response
+  ean_pairs                extração de pares (EAN, nome) do smart-responder
+  ean_rank                 _score/_rank_pairs dos pares extraídos
+  estoque_normalize        normalização de disponibilidade/preço do ERP
+
+Os tempos são divididos pelo de uma carga de calibração em Python puro (medida
+intercalada com cada caso), para que o baseline gravado em uma máquina seja comparável em outra. Sai com código 1
+se algum caso ficar mais lento que o baseline além da tolerância.
+
+Uso:
+  python benchmarks/bench_hot_paths.py                 # compara com o baseline
+  python benchmarks/bench_hot_paths.py --save          # grava novo baseline
+  python benchmarks/bench_hot_paths.py --only ean --tolerance 0.5
+"""
+import argparse
+import json
+import logging
+import platform
+import sys
+import timeit
+from pathlib import Path
+from typing import Callable, Dict, Tuple
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+HERE = Path(__file__).resolve().parent
+BASELINE = HERE / "baselines" / "hot_paths.json"
+
+
+def _calibration() -> int:
+    """Carga fixa de Python puro (dicts, strings, laço) usada como unidade de tempo."""
+    total = 0
+    d = {}
+    for i in range(200):
+        key = f"k{i % 17}"
+        d[key] = d.get(key, 0) + i
+        total += len(key.upper())
+    return total + len(d)
+
+
+def build_cases() -> Dict[str, Callable[[], object]]:
+    logging.disable(logging.WARNING)
+    import server
+    from memory.response_filter import prepare_client_response, strip_internal_metadata
+    from tools import http_tools
+
+    cases: Dict[str, Callable[[], object]] = {}
+
+    for path in sorted((HERE / "payloads").glob("*.json")):
+        payload = json.loads(path.read_text(encoding="utf-8"))
+        cases[f"extract_incoming.{path.stem}"] = lambda p=payload: server._extract_incoming(p)
+
+    numbers = ["558598752006@s.whatsapp.net", "558597520000:558598752006", "+55 85 9875-2006", "558598752006"]
+    cases["sanitize_number"] = lambda: [server._sanitize_number(n) for n in numbers]
+
+    catalog = json.loads((HERE / "upstream" / "erp_estoque_preco.json").read_text(encoding="utf-8"))
+    linhas = [f"• {it['produto']} — R$ {it['vl_produto']} ({it['ds_unidade']})" for it in catalog]
+    longa = "\n\n".join(f"Opção {i}:\n" + "\n".join(linhas) for i in range(60))
+    cases["split_message"] = lambda: server._split_message(longa)
+
+    resposta = (
+        'Temos sim! {"produto": "ARROZ CAMIL 5KG", "_timestamp": "2026-10-18T21:14:03", "preco": 27.9} '
+        "Atualizado em 2026-10-18T21:14:03.123Z, _timestamp=2026-10-18 . Posso separar para você?"
+    ) * 4
+    cases["strip_internal_metadata"] = lambda: strip_internal_metadata(resposta)
+    cases["prepare_client_response"] = lambda: prepare_client_response(resposta)
+
+    smart = json.loads((HERE / "upstream" / "smart_responder.json").read_text(encoding="utf-8"))
+    cases["ean_pairs"] = lambda: http_tools._extract_pairs(smart)
+    pairs = http_tools._extract_pairs(smart)
+    cases["ean_rank"] = lambda: http_tools._rank_pairs("arroz camil 5kg", pairs)
+
+    cases["estoque_normalize"] = lambda: http_tools._normalize_estoque_items(catalog)
+    return cases
+
+
+def measure(fn: Callable[[], object], number: int, repeat: int) -> Tuple[float, float]:
+    """
+    Melhor tempo por chamada (µs) do caso e da calibração, medidos de forma
+    intercalada para que oscilações da máquina afetem os dois igualmente.
+    """
+    best_case = best_cal = float("inf")
+    for _ in range(repeat):
+        best_cal = min(best_cal, timeit.timeit(_calibration, number=number))
+        best_case = min(best_case, timeit.timeit(fn, number=number))
+    return best_case / number * 1e6, best_cal / number * 1e6
+
+
+def run(number: int, repeat: int, only: str = "") -> Dict[str, object]:
+    cases = {name: fn for name, fn in build_cases().items() if only in name}
+    results = {}
+    for name, fn in cases.items():
+        us, cal = measure(fn, number, repeat)
+        results[name] = {"us": us, "relative": us / cal}
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "cases": results,
+    }
+
+
+def compare(current: Dict[str, object], baseline: Dict[str, object], tolerance: float) -> int:
+    """Imprime a comparação e retorna o número de regressões."""
+    regressions = 0
+    print(f"{'caso':<36} {'µs':>10} {'baseline':>10} {'variação':>9}")
+    for name, cur in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if base is None:
+            print(f"{name:<36} {cur['us']:>10.2f} {'—':>10} {'novo':>9}")
+            continue
+        change = cur["relative"] / base["relative"] - 1
+        flag = ""
+        if change > tolerance:
+            regressions += 1
+            flag = "  ❌ regressão"
+        print(f"{name:<36} {cur['us']:>10.2f} {base['us']:>10.2f} {change:>+8.0%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=15)
+    parser.add_argument("--only", default="", help="filtra casos pelo nome")
+    parser.add_argument("--tolerance", type=float, default=0.30, help="piora relativa aceita (0.30 = 30%%)")
+    parser.add_argument("--save", action="store_true", help="grava o resultado como novo baseline")
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    args = parser.parse_args()
+
+    current = run(args.number, args.repeat, args.only)
+    if args.save:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(current, indent=2) + "\n", encoding="utf-8")
+        print(f"💾 Baseline gravado em {args.baseline} ({len(current['cases'])} casos)")
+        return 0
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+    if not baseline:
+        print(f"⚠️  Sem baseline em {args.baseline}; rode com --save")
+    regressions = compare(current, baseline, args.tolerance)
+    print("✅ Sem regressões" if not regressions else f"❌ {regressions} caso(s) acima da tolerância de {args.tolerance:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
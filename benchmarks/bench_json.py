@@ -0,0 +1,95 @@
+"""
+Benchmark do caminho de JSON por requisição: stdlib vs config.fast_json
+
+Simula o trabalho de JSON de um atendimento típico: decodificar o webhook,
+decodificar as respostas do smart-responder e do ERP, serializar as saídas
+das ferramentas (indent=2) e formatar os registros do log JSON.
+
+Uso:
+  python benchmarks/bench_json.py [--requests 2000]
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from pythonjsonlogger import jsonlogger  # noqa: E402
+
+from config import fast_json  # noqa: E402
+
+HERE = Path(__file__).resolve().parent
+LOG_RECORDS_PER_REQUEST = 12
+
+
+def _fixtures():
+    webhook = (HERE / "payloads" / "uaz_message_text.json").read_bytes()
+    smart = (HERE / "upstream" / "smart_responder.json").read_bytes()
+    erp = (HERE / "upstream" / "erp_estoque_preco.json").read_bytes()
+    return webhook, smart, erp
+
+
+def _formatter(serializer) -> logging.Formatter:
+    kwargs = {"json_ensure_ascii": False}
+    if serializer is not None:
+        kwargs["json_serializer"] = serializer
+    return jsonlogger.JsonFormatter("%(asctime)s %(name)s %(levelname)s %(message)s", **kwargs)
+
+
+def _record(i: int) -> logging.LogRecord:
+    return logging.LogRecord("bench", logging.INFO, __file__, i, "Consultando estoque_preco por EAN: %s", ("7896100100000",), None)
+
+
+def _run_stdlib(n: int, webhook: bytes, smart: bytes, erp: bytes) -> float:
+    fmt = _formatter(None)
+    records = [_record(i) for i in range(LOG_RECORDS_PER_REQUEST)]
+    start = time.process_time()
+    for _ in range(n):
+        json.loads(webhook)
+        data = json.loads(smart)
+        json.dumps(data, indent=2, ensure_ascii=False)
+        items = json.loads(erp)
+        json.dumps(items, indent=2, ensure_ascii=False)
+        for rec in records:
+            fmt.format(rec)
+    return time.process_time() - start
+
+
+def _run_fast(n: int, webhook: bytes, smart: bytes, erp: bytes) -> float:
+    fmt = _formatter(fast_json.log_serializer)
+    records = [_record(i) for i in range(LOG_RECORDS_PER_REQUEST)]
+    start = time.process_time()
+    for _ in range(n):
+        fast_json.loads(webhook)
+        data = fast_json.loads(smart)
+        fast_json.dumps(data, indent=True)
+        items = fast_json.loads(erp)
+        fast_json.dumps(items, indent=True)
+        for rec in records:
+            fmt.format(rec)
+    return time.process_time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    webhook, smart, erp = _fixtures()
+    n = args.requests
+    base = _run_stdlib(n, webhook, smart, erp)
+    fast = _run_fast(n, webhook, smart, erp)
+
+    print(f"backend rápido: {fast_json.BACKEND}")
+    print(f"stdlib json : {base / n * 1e6:8.1f} µs CPU/requisição")
+    print(f"fast_json   : {fast / n * 1e6:8.1f} µs CPU/requisição")
+    if fast > 0:
+        print(f"ganho       : {base / fast:8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Micro-benchmark do normalizador de webhooks sobre payloads gravados (UAZ e Cloud API)
+
+Uso:
+  python benchmarks/bench_webhook_normalizer.py [--number 20000] [--repeat 5]
+"""
+import argparse
+import json
+import sys
+import timeit
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from tools.webhook_normalizer import normalize_incoming, sanitize_number  # noqa: E402
+
+PAYLOAD_DIR = Path(__file__).resolve().parent / "payloads"
+
+
+def load_payloads() -> dict:
+    """Carrega todos os payloads gravados em benchmarks/payloads/*.json."""
+    return {p.stem: json.loads(p.read_text(encoding="utf-8")) for p in sorted(PAYLOAD_DIR.glob("*.json"))}
+
+
+def _best_us(fn, number: int, repeat: int) -> float:
+    return min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    payloads = load_payloads()
+    print(f"{'payload':<28} {'normalize_incoming':>20}")
+    for name, payload in payloads.items():
+        us = _best_us(lambda: normalize_incoming(payload), args.number, args.repeat)
+        print(f"{name:<28} {us:>17.2f} µs")
+
+    samples = ["558598752006@s.whatsapp.net", "558597520000:558598752006", "+55 85 9875-2006", "558598752006"]
+    print()
+    print(f"{'sanitize_number':<28} {'tempo':>20}")
+    for raw in samples:
+        us = _best_us(lambda: sanitize_number(raw), args.number, args.repeat)
+        print(f"{raw:<28} {us:>17.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
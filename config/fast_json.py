@@ -0,0 +1,88 @@
+"""
+Camada de JSON rápida (orjson / msgspec) com fallback para a biblioteca padrão
+Usada no webhook, nas respostas dos upstreams, na saída das ferramentas e no log JSON
+"""
+import json
+from typing import Any, Callable, Optional, Union
+
+try:
+    import orjson as _orjson
+except ImportError:  # pragma: no cover - depende do ambiente
+    _orjson = None
+
+try:
+    import msgspec as _msgspec
+except ImportError:  # pragma: no cover - depende do ambiente
+    _msgspec = None
+
+if _orjson is not None:
+    BACKEND = "orjson"
+elif _msgspec is not None:
+    BACKEND = "msgspec"
+else:
+    BACKEND = "json"
+
+# Erro de decodificação comum a todos os backends (orjson/msgspec são normalizados)
+JSONDecodeError = json.JSONDecodeError
+
+if _orjson is not None:
+    _OPTS = _orjson.OPT_NON_STR_KEYS
+    _OPTS_INDENT = _OPTS | _orjson.OPT_INDENT_2
+if _msgspec is not None:
+    _msgspec_encoder = _msgspec.json.Encoder()
+    _msgspec_decoder = _msgspec.json.Decoder()
+
+
+def loads(data: Union[bytes, bytearray, memoryview, str]) -> Any:
+    """Decodifica JSON de bytes ou str. Levanta json.JSONDecodeError em caso de erro."""
+    if _orjson is not None:
+        # orjson.JSONDecodeError já é subclasse de json.JSONDecodeError
+        return _orjson.loads(data)
+    if _msgspec is not None:
+        try:
+            return _msgspec_decoder.decode(data.encode("utf-8") if isinstance(data, str) else data)
+        except _msgspec.DecodeError as e:
+            raise JSONDecodeError(str(e), "", 0) from e
+    if isinstance(data, (bytes, bytearray, memoryview)):
+        data = bytes(data).decode("utf-8")
+    return json.loads(data)
+
+
+def dumps(obj: Any, *, indent: bool = False, default: Optional[Callable[[Any], Any]] = None) -> str:
+    """
+    Serializa para str sem escapar acentos (equivalente a ensure_ascii=False).
+
+    indent=True produz a mesma indentação de 2 espaços de json.dumps(indent=2).
+    Tipos não suportados pelo backend rápido caem para json.dumps.
+    """
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj, default=default, option=_OPTS_INDENT if indent else _OPTS).decode("utf-8")
+        except TypeError:
+            pass
+    elif _msgspec is not None and not indent and default is None:
+        try:
+            return _msgspec_encoder.encode(obj).decode("utf-8")
+        except (TypeError, _msgspec.EncodeError):
+            pass
+    return json.dumps(obj, indent=2 if indent else None, ensure_ascii=False, default=default)
+
+
+def dumps_bytes(obj: Any) -> bytes:
+    """Serializa para bytes UTF-8 compactos (corpo de requisições/respostas HTTP)."""
+    if _orjson is not None:
+        try:
+            return _orjson.dumps(obj, option=_OPTS)
+        except TypeError:
+            pass
+    return dumps(obj).encode("utf-8")
+
+
+def log_serializer(obj: Any, default=None, cls=None, indent=None, ensure_ascii=True, **_: Any) -> str:
+    """
+    Serializador compatível com `json.dumps` para o python-json-logger.
+    Reaproveita o `default` do encoder do formatter (datetime, exceções etc.).
+    """
+    if default is None and cls is not None:
+        default = cls().default
+    return dumps(obj, indent=bool(indent), default=default)
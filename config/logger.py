@@ -1,50 +1,80 @@
 """
 Sistema de Logging para o Agente de Supermercado
+
+Todos os loggers publicam em uma fila (QueueHandler); uma única thread
+(QueueListener) grava nos handlers compartilhados: arquivo JSON, arquivo de
+texto e console. Os arquivos giram por tamanho e os antigos são comprimidos.
 """
+import atexit
+import gzip
 import logging
+import os
+import queue
+import random
+import shutil
 import sys
+import threading
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
 from pythonjsonlogger import jsonlogger
 
+from .fast_json import dumps, log_serializer
+from .settings import settings
+from .tracing import current_span
 
-def setup_logger(name: str, log_file: str = "logs/agente.log", level: str = "INFO") -> logging.Logger:
-    """
-    Configura e retorna um logger com formatação JSON e saída para arquivo e console
-    
-    Args:
-        name: Nome do logger
-        log_file: Caminho do arquivo de log
-        level: Nível de logging (DEBUG, INFO, WARNING, ERROR, CRITICAL)
-    
-    Returns:
-        Logger configurado
-    """
-    # Criar diretório de logs se não existir
-    log_path = Path(log_file)
-    log_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # Criar logger
-    logger = logging.getLogger(name)
-    logger.setLevel(getattr(logging, level.upper()))
-    
-    # Evitar duplicação de handlers
-    if logger.handlers:
-        return logger
-    
+# Pipelines por arquivo de log: (fila, listener, handler de fila)
+_pipelines: Dict[str, Tuple[queue.SimpleQueue, QueueListener, QueueHandler]] = {}
+_pipelines_lock = threading.Lock()
+
+
+def _gzip_namer(name: str) -> str:
+    return name + ".gz"
+
+
+def _gzip_rotator(source: str, dest: str) -> None:
+    """Comprime o arquivo rotacionado e remove o original."""
+    with open(source, "rb") as f_in, gzip.open(dest, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def _rotating_handler(path: Path, max_bytes: Optional[int] = None,
+                      backup_count: Optional[int] = None) -> RotatingFileHandler:
+    handler = RotatingFileHandler(
+        str(path),
+        maxBytes=int(max_bytes if max_bytes is not None else getattr(settings, "log_max_bytes", 10 * 1024 * 1024)),
+        backupCount=int(backup_count if backup_count is not None else getattr(settings, "log_backup_count", 5)),
+        encoding="utf-8",
+        delay=True,
+    )
+    if getattr(settings, "log_compress", True):
+        handler.namer = _gzip_namer
+        handler.rotator = _gzip_rotator
+    return handler
+
+
+def _build_handlers(log_file: str) -> Tuple[logging.Handler, ...]:
     # Formato JSON para arquivo
     json_formatter = jsonlogger.JsonFormatter(
         '%(asctime)s %(name)s %(levelname)s %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
+        datefmt='%Y-%m-%d %H:%M:%S',
+        json_serializer=log_serializer,
+        json_ensure_ascii=False,
     )
-    
+
     # Formato legível para console
     console_formatter = logging.Formatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
         datefmt='%Y-%m-%d %H:%M:%S'
     )
-    
+
+    log_path = Path(log_file)
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+
     # Handler para arquivo (JSON)
-    file_handler = logging.FileHandler(log_file, encoding='utf-8')
+    file_handler = _rotating_handler(log_path)
     file_handler.setLevel(logging.DEBUG)
     file_handler.setFormatter(json_formatter)
 
@@ -54,18 +84,131 @@ def setup_logger(name: str, log_file: str = "logs/agente.log", level: str = "INF
     console_handler.setFormatter(console_formatter)
 
     # Handler adicional para arquivo em texto legível
-    plain_file = Path(log_file).with_name("agente_plain.log")
-    plain_file_handler = logging.FileHandler(str(plain_file), encoding='utf-8')
+    plain_file_handler = _rotating_handler(log_path.with_name("agente_plain.log"))
     plain_file_handler.setLevel(logging.DEBUG)
     plain_file_handler.setFormatter(console_formatter)
-    
-    # Adicionar handlers
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    logger.addHandler(plain_file_handler)
-    
+
+    return file_handler, console_handler, plain_file_handler
+
+
+class _TraceContextFilter(logging.Filter):
+    """Anexa trace_id/span_id do span ativo ao registro (aparecem no log JSON)."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_span()
+        if span is not None:
+            record.trace_id = span.trace_id
+            record.span_id = span.span_id
+        return True
+
+
+def _get_queue_handler(log_file: str) -> QueueHandler:
+    """Retorna o QueueHandler do arquivo, iniciando o listener na primeira chamada."""
+    key = str(Path(log_file).resolve())
+    with _pipelines_lock:
+        pipeline = _pipelines.get(key)
+        if pipeline is None:
+            log_queue: queue.SimpleQueue = queue.SimpleQueue()
+            listener = QueueListener(log_queue, *_build_handlers(log_file), respect_handler_level=True)
+            listener.start()
+            queue_handler = QueueHandler(log_queue)
+            # O filtro roda na thread que loga, onde o contexto do span está ativo
+            queue_handler.addFilter(_TraceContextFilter())
+            pipeline = (log_queue, listener, queue_handler)
+            _pipelines[key] = pipeline
+        return pipeline[2]
+
+
+def log_queue_size() -> int:
+    """Registros aguardando gravação em todas as filas de log."""
+    return sum(p[0].qsize() for p in list(_pipelines.values()))
+
+
+@atexit.register
+def shutdown_logging() -> None:
+    """Esvazia as filas e fecha os handlers (chamado no encerramento do processo)."""
+    with _pipelines_lock:
+        pipelines = list(_pipelines.values())
+        _pipelines.clear()
+    for _, listener, _ in pipelines:
+        try:
+            listener.stop()
+        except Exception:
+            pass
+        for handler in listener.handlers:
+            try:
+                handler.close()
+            except Exception:
+                pass
+
+
+def setup_logger(name: str, log_file: str = "logs/agente.log", level: str = "INFO") -> logging.Logger:
+    """
+    Configura e retorna um logger que publica na fila de log compartilhada
+
+    Args:
+        name: Nome do logger
+        log_file: Caminho do arquivo de log
+        level: Nível de logging (DEBUG, INFO, WARNING, ERROR, CRITICAL)
+
+    Returns:
+        Logger configurado
+    """
+    # Criar logger
+    logger = logging.getLogger(name)
+    logger.setLevel(getattr(logging, level.upper()))
+
+    # Evitar duplicação de handlers
+    if logger.handlers:
+        return logger
+
+    logger.addHandler(_get_queue_handler(log_file))
     return logger
 
 
+# ============================================
+# Amostragem e truncamento de payloads grandes
+# ============================================
+
+class PayloadPreview:
+    """
+    Representação preguiçosa de um payload para log: só é serializada e
+    truncada se o registro for de fato emitido.
+    """
+    __slots__ = ("value", "limit")
+
+    def __init__(self, value: Any, limit: Optional[int] = None):
+        self.value = value
+        self.limit = limit if limit is not None else int(getattr(settings, "log_payload_max_chars", 1000))
+
+    def __str__(self) -> str:
+        value = self.value
+        if isinstance(value, bytes):
+            text = value.decode("utf-8", errors="replace")
+        elif isinstance(value, str):
+            text = value
+        else:
+            try:
+                text = dumps(value)
+            except Exception:
+                text = str(value)
+        if self.limit > 0 and len(text) > self.limit:
+            return f"{text[:self.limit]}... (+{len(text) - self.limit} chars)"
+        return text
+
+    __repr__ = __str__
+
+
+def payload_preview(value: Any, limit: Optional[int] = None) -> PayloadPreview:
+    """Atalho para PayloadPreview; use como argumento de logger.info('%s', ...)."""
+    return PayloadPreview(value, limit)
+
+
+def sample_payload() -> bool:
+    """Decide se o payload completo (truncado) desta requisição deve ser logado."""
+    rate = float(getattr(settings, "log_payload_sample_rate", 0.1))
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
 # Logger principal da aplicação
 app_logger = setup_logger("agente_supermercado")
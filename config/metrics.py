@@ -0,0 +1,340 @@
+"""
+Registro de métricas no formato de exposição do Prometheus (texto 0.0.4)
+
+Implementação mínima e sem dependências: contadores, gauges (inclusive
+calculados no momento da coleta) e histogramas com labels. Cada operação
+custa um lock e uma busca em dict, para não pesar no caminho quente.
+"""
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from . import tracing
+
+# Buckets padrão de latência (segundos), do webhook (ms) até o agente (dezenas de s)
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0,
+)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _label_str(names: Sequence[str], values: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(f'{extra[0]}="{_escape(extra[1])}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames: Tuple[str, ...] = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        if len(labels) != len(self.labelnames):
+            raise ValueError(f"{self.name}: labels esperados {self.labelnames}, recebidos {tuple(labels)}")
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Contador monotônico."""
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    """Valor instantâneo; pode ser calculado na coleta via set_function."""
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._functions: Dict[Tuple[str, ...], Callable[[], float]] = {}
+
+    def set(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], float], **labels: str) -> None:
+        """Registra uma função avaliada a cada coleta (ex.: len(dict) de sessões)."""
+        key = self._key(labels)
+        with self._lock:
+            self._functions[key] = fn
+
+    def value(self, **labels: str) -> float:
+        key = self._key(labels)
+        fn = self._functions.get(key)
+        return float(fn()) if fn else self._values.get(key, 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = dict(self._values)
+            functions = list(self._functions.items())
+        for key, fn in functions:
+            try:
+                items[key] = float(fn())
+            except Exception:
+                continue
+        return [f"{self.name}{_label_str(self.labelnames, k)} {_format_value(v)}" for k, v in items.items()]
+
+
+class Histogram(_Metric):
+    """Histograma cumulativo com buckets fixos."""
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets))
+        # por label: [contagem por bucket..., +Inf], soma
+        self._counts: Dict[Tuple[str, ...], List[int]] = {}
+        self._sums: Dict[Tuple[str, ...], float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        idx = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[idx] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str):
+        """Context manager que observa a duração do bloco em segundos."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels: str) -> int:
+        return sum(self._counts.get(self._key(labels), ()))
+
+    def sum(self, **labels: str) -> float:
+        return self._sums.get(self._key(labels), 0.0)
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(c), self._sums[k]) for k, c in self._counts.items()]
+        lines: List[str] = []
+        for key, counts, total in items:
+            cumulative = 0
+            for bound, c in zip(self.buckets + (math.inf,), counts):
+                cumulative += c
+                lines.append(
+                    f"{self.name}_bucket{_label_str(self.labelnames, key, ('le', _format_value(bound)))} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{_label_str(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_label_str(self.labelnames, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    """Coleção de métricas renderizada no endpoint /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self.register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self.register(Gauge(name, documentation, labelnames))
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: Iterable[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(m.render() for m in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+# Conteúdo do endpoint /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ============================================
+# Métricas da aplicação
+# ============================================
+
+STAGE_LATENCY = REGISTRY.histogram(
+    "agente_stage_duration_seconds",
+    "Duração de cada etapa do atendimento (webhook, buffer_wait, process_message, agent, send_whatsapp)",
+    ["stage"],
+)
+TOOL_LATENCY = REGISTRY.histogram(
+    "agente_tool_duration_seconds",
+    "Duração de cada ferramenta do agente",
+    ["tool", "status"],
+)
+UPSTREAM_LATENCY = REGISTRY.histogram(
+    "agente_upstream_request_duration_seconds",
+    "Duração das requisições HTTP para serviços externos",
+    ["host", "method", "status"],
+)
+LLM_LATENCY = REGISTRY.histogram(
+    "agente_llm_call_duration_seconds",
+    "Duração de cada chamada ao LLM",
+    ["model"],
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "agente_cache_requests_total",
+    "Consultas a caches/atalhos por resultado (hit/miss)",
+    ["cache", "result"],
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "agente_queue_depth",
+    "Itens aguardando em filas internas",
+    ["queue"],
+)
+ACTIVE_SESSIONS = REGISTRY.gauge(
+    "agente_active_sessions",
+    "Sessões ativas por tipo (presence, buffer)",
+    ["kind"],
+)
+STARTUP_PHASE = REGISTRY.gauge(
+    "agente_startup_phase_seconds",
+    "Duração de cada fase do aquecimento na inicialização",
+    ["phase"],
+)
+ACTIVE_THREADS = REGISTRY.gauge("agente_threads", "Threads ativas no processo")
+ACTIVE_THREADS.set_function(threading.active_count)
+SPANS_DROPPED = REGISTRY.gauge("agente_trace_spans_dropped", "Spans descartados pelo exportador de traces")
+SPANS_DROPPED.set_function(tracing.dropped_spans)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Registra uma consulta a cache (a razão de acerto sai de hit / (hit + miss))."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def track_tool(name: str):
+    """
+    Decorator que mede a duração de uma ferramenta (métrica + span "tool.<nome>").
+    Saídas iniciadas por "Erro" (padrão das ferramentas HTTP) contam como status=error.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                with tracing.span(f"tool.{name}") as sp:
+                    result = fn(*args, **kwargs)
+                    if isinstance(result, str) and result.startswith(("Erro", "❌")):
+                        status = "error"
+                    if sp is not None:
+                        sp.set_attribute("status", status)
+                return result
+            except Exception:
+                status = "exception"
+                raise
+            finally:
+                TOOL_LATENCY.observe(time.perf_counter() - start, tool=name, status=status)
+        return wrapper
+    return decorator
+
+
+def timed_stage(stage: str):
+    """Decorator (sync ou async) que observa a duração em STAGE_LATENCY e abre um span da etapa."""
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    with tracing.span(stage):
+                        return await fn(*args, **kwargs)
+                finally:
+                    STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                with tracing.span(stage):
+                    return fn(*args, **kwargs)
+            finally:
+                STAGE_LATENCY.observe(time.perf_counter() - start, stage=stage)
+        return wrapper
+    return decorator
@@ -17,6 +17,7 @@ class Settings(BaseSettings):
     
     # OpenAI
     openai_api_key: str
+    openai_base_url: Optional[str] = None  # endpoint compatível (ex.: python -m mocks)
     llm_model: str = "gpt-5-mini"
     llm_temperature: float = 0.0
     llm_provider: str = "openai"
@@ -57,6 +58,10 @@ class Settings(BaseSettings):
     # Pré-resolvedor: desativado por padrão (fluxo removido)
     pre_resolver_enabled: bool = False
     
+    # Agregação de mensagens (buffer_loop): janela de espera e janelas ociosas antes de responder
+    buffer_window_seconds: float = 5.0
+    buffer_idle_checks: int = 3
+
     # WhatsApp API
     whatsapp_api_url: str
     whatsapp_token: str
@@ -72,9 +77,142 @@ class Settings(BaseSettings):
     # Logging
     log_level: str = "INFO"
     log_file: str = "logs/agente.log"
+    log_max_bytes: int = 10 * 1024 * 1024  # rotação por tamanho
+    log_backup_count: int = 5
+    log_compress: bool = True  # comprime arquivos rotacionados (.gz)
+    log_payload_max_chars: int = 1000  # truncamento de payloads/corpos nos logs
+    log_payload_sample_rate: float = 0.1  # fração de webhooks com payload completo no log
+
+    # Tracing (spans OTLP/JSON em arquivo ou coletor OTLP/HTTP)
+    tracing_enabled: bool = False
+    trace_export_file: str = "logs/traces.jsonl"
+    trace_max_bytes: int = 50 * 1024 * 1024  # rotação do arquivo de spans (mesma compressão dos logs)
+    trace_backup_count: int = 3
+    trace_otlp_endpoint: str | None = None  # ex.: http://otel-collector:4318/v1/traces
+    trace_batch_size: int = 256
+    trace_flush_interval: float = 2.0  # segundos
+
+    # Uso do LLM/ferramentas por conversa (callbacks → tabela llm_usage no Postgres)
+    llm_usage_persist: bool = True
+    llm_usage_table: str = "llm_usage"
+    llm_usage_batch_size: int = 50
+    llm_usage_flush_interval: float = 10.0  # segundos
+    llm_usage_max_pending: int = 5000  # limite em memória se o Postgres estiver fora
+    llm_usage_max_threads: int = 10000  # conversas com totais em memória (LRU)
+
+    # Cassetes de gravação/reprodução (LLM + HTTP): off | record | replay | auto
+    cassette_mode: str = "off"
+    cassette_dir: str = "cassettes"
+    cassette_name: str = "default"
+
+    # Aquecimento na inicialização (/ready só responde 200 ao final)
+    warmup_enabled: bool = True
+    warmup_http: bool = True  # abre conexões com UAZ/ERP/smart-responder (HEAD na raiz)
+    warmup_http_timeout: float = 3.0
+    warmup_llm: bool = False  # chamada mínima ao LLM (tem custo de tokens)
 
     # Prompt do agente (caminho opcional para arquivo externo)
     agent_prompt_path: str | None = None
+    # Data/hora no contexto variável ao fim do prompt (fora do prefixo em cache)
+    prompt_tail_datetime: bool = True
+
+    # Cascata de modelos: turnos simples no modelo rápido, escala para llm_model se reprovado
+    llm_cascade_enabled: bool = False
+    llm_cascade_fast_model: str = "gpt-4o-mini"
+    llm_cascade_max_items: int = 2  # acima disso vai direto para o modelo de qualidade
+    llm_cascade_max_chars: int = 300
+
+    # Pré-busca especulativa de ean_lookup/estoque_preco dos produtos citados na mensagem
+    prefetch_enabled: bool = True
+    prefetch_max_items: int = 6  # produtos por turno
+    prefetch_vocabulary_file: str | None = None  # palavras de produto extras (uma por linha), além da lista embutida
+    prefetch_eans_per_item: int = 2  # estoque_preco dos primeiros EANs de cada busca
+    prefetch_workers: int = 8
+    prefetch_wait_seconds: float = 10.0  # espera máxima por uma consulta já em andamento
+
+    # Modo do agente: react (create_react_agent) | plan_execute (plano → consultas em paralelo → resposta)
+    agent_mode: str = "react"
+    plan_eans_per_item: int = 2  # plan_execute: estoque dos primeiros EANs de cada busca
+
+    # Prazo de ponta a ponta da resposta (a partir da liberação do buffer)
+    reply_deadline_seconds: float = 45.0
+    deadline_min_tool_seconds: float = 8.0  # não inicia passo de ferramenta com menos que isso (ferramenta + resposta)
+    deadline_min_llm_seconds: float = 3.0  # não inicia chamada ao LLM com menos que isso
+    agent_recursion_limit: int = 16  # passos do grafo por turno (cada volta LLM → ferramentas usa 2)
+
+    # Chamadas de ferramenta de um mesmo passo do agente executadas em paralelo
+    tool_pool_workers: int = 0  # pool compartilhado entre conversas (0 = conversas esperadas × chamadas por passo)
+    tool_expected_conversations: int = 64  # conversas simultâneas esperadas no pico
+    tool_calls_per_conversation: int = 4  # chamadas de ferramenta por passo, com folga para as abandonadas
+    tool_timeout_seconds: float = 30.0
+    tool_timeouts: dict[str, float] = {"ean": 20.0, "ean_tool": 20.0, "estoque": 15.0, "estoque_preco_tool": 15.0}
+
+    # Circuit breaker por serviço externo (estado compartilhado via Redis) e último resultado bom
+    breaker_enabled: bool = True
+    breaker_window_seconds: float = 30.0  # janela fixa de contagem de erros/lentidão
+    breaker_min_calls: int = 5  # chamadas mínimas na janela antes de avaliar as taxas
+    breaker_error_rate: float = 0.5  # fração de erros (5xx/429, timeout, conexão) que abre o circuito
+    breaker_slow_call_seconds: float = 5.0
+    breaker_slow_rate: float = 0.5  # fração de chamadas lentas que abre o circuito
+    breaker_open_seconds: float = 30.0  # tempo aberto antes da chamada de teste (half_open)
+    breaker_probe_timeout_seconds: float = 15.0  # libera outra chamada de teste se a anterior não voltar
+    breaker_fallback_ttl_seconds: float = 6 * 3600.0  # validade do último resultado bom
+    breaker_price_fallback_max_age_seconds: float = 600.0  # preço/estoque (estoque, estoque_preco): idade máxima servida
+    breaker_fallback_max_entries: int = 2000  # sem Redis: respostas guardadas em memória
+
+    # Hedge do ean_lookup: cópia da requisição quando a original passa do percentil recente
+    hedge_enabled: bool = False
+    hedge_percentile: float = 0.95  # limiar adaptativo (latências recentes do host, tools/adaptive.py)
+    hedge_min_samples: int = 20  # sem hedge até ter amostras suficientes
+    hedge_min_delay_seconds: float = 0.05
+    hedge_budget_ratio: float = 0.05  # cópias no máximo ~5% das chamadas
+    hedge_budget_burst: float = 5.0
+    hedge_workers: int = 16
+
+    # Timeouts adaptativos (múltiplo do p99 recente por host) e orçamento de retentativas
+    adaptive_timeout_enabled: bool = True
+    adaptive_timeout_multiplier: float = 3.0
+    adaptive_timeout_min_seconds: float = 2.0
+    adaptive_timeout_max_seconds: float = 30.0
+    adaptive_min_samples: int = 50  # antes disso vale o timeout fixo do chamador
+    adaptive_window_seconds: float = 300.0  # duas janelas se revezam: só a latência recente conta
+    adaptive_sketch_accuracy: float = 0.02  # erro relativo dos percentis
+    upstream_max_retries: int = 1  # consultas idempotentes (ean, estoque)
+    retry_budget_ratio: float = 0.1  # retentativas no máximo ~10% das requisições por host
+    retry_budget_burst: float = 10.0
+
+    # Fila local (SQLite) de pedidos/alterações entregue ao painel em segundo plano
+    order_outbox_enabled: bool = True
+    order_outbox_path: str = "data/order_outbox.sqlite3"
+    order_outbox_batch_size: int = 20
+    order_outbox_workers: int = 4
+    order_outbox_max_attempts: int = 8
+    order_outbox_retry_base_seconds: float = 2.0  # backoff exponencial entre tentativas
+    order_outbox_retry_max_seconds: float = 300.0
+    order_outbox_lease_seconds: float = 120.0  # reserva de uma operação em envio (vários workers)
+    order_outbox_poll_seconds: float = 5.0
+
+    # Carrinho por cliente (hash no Redis) mantido pelas ferramentas cart_add/cart_remove/cart_view
+    cart_enabled: bool = True
+    cart_ttl_seconds: int = 24 * 3600
+
+    # Snapshot local (SQLite) de preço/estoque do ERP por EAN, sincronizado em segundo plano
+    erp_snapshot_enabled: bool = False
+    erp_snapshot_path: str = "data/erp_snapshot.sqlite3"
+    erp_snapshot_max_age_seconds: float = 600.0  # estoque_preco usa a entrada conferida há menos que isso
+    erp_snapshot_refresh_seconds: float = 120.0  # reconfere (GET condicional) entradas mais antigas que isso
+    erp_snapshot_interval_seconds: float = 30.0  # intervalo entre ciclos de sincronização
+    erp_snapshot_batch_size: int = 200  # EANs conferidos por ciclo
+    erp_snapshot_active_seconds: float = 1800.0  # só reconfere EANs pedidos nesse intervalo
+    erp_snapshot_evict_seconds: float = 86400.0  # remove EANs fora do catálogo não pedidos nesse intervalo
+    erp_snapshot_workers: int = 8
+    erp_snapshot_catalog_url: str | None = None  # lista completa do catálogo para o diff periódico
+    erp_snapshot_full_sync_seconds: float = 540.0  # limitado a max_age - interval (ver erp_snapshot.full_sync_interval)
+
+    # Atalho para intenções triviais (saudação, horário, endereço, setores) sem LLM
+    fast_path_enabled: bool = True
+    fast_path_min_confidence: float = 0.85
+    fast_path_training_file: str | None = None  # JSONL {"text", "intent"} extraído dos logs
     
     # Config V1 legacy removida; usando model_config (Pydantic v2)
 
@@ -0,0 +1,273 @@
+"""
+Tracing ponta a ponta (webhook → buffer → agente → ferramentas → envio WhatsApp)
+
+Os IDs de trace/span seguem o formato do W3C/OpenTelemetry e são propagados
+por contextvars; para atravessar threads use `bind_context`. Os spans
+finalizados vão para uma fila e uma thread exportadora grava em lote no
+formato OTLP/JSON, em arquivo (JSONL) ou via HTTP para um coletor OTLP.
+"""
+import contextvars
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from . import fast_json
+from .settings import settings
+
+SERVICE_NAME = "agente-supermercado"
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    """Intervalo de tempo nomeado dentro de um trace."""
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, attributes: Optional[Dict[str, Any]] = None):
+        self.trace_id = parent.trace_id if parent else _new_id(16)
+        self.span_id = _new_id(8)
+        self.parent_id = parent.span_id if parent else None
+        self.name = name
+        self.start_ns = time.time_ns()
+        self.end_ns: Optional[int] = None
+        self.attributes: Dict[str, Any] = dict(attributes) if attributes else {}
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def record_error(self, error: BaseException) -> None:
+        self.error = f"{type(error).__name__}: {error}"
+
+    def end(self) -> None:
+        """Finaliza o span (idempotente) e o envia para exportação."""
+        if self.end_ns is not None:
+            return
+        self.end_ns = time.time_ns()
+        _exporter.submit(self)
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end_ns if self.end_ns is not None else time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_otlp(self) -> Dict[str, Any]:
+        data: Dict[str, Any] = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns or self.start_ns),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            data["parentSpanId"] = self.parent_id
+        return data
+
+
+def _otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+# ============================================
+# Exportação em lote
+# ============================================
+
+class _BatchExporter:
+    """Fila + thread daemon que grava os spans finalizados em lotes."""
+
+    def __init__(self):
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=10000)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._export_lock = threading.Lock()
+        self._handler: Optional[logging.Handler] = None
+        self._handler_path: Optional[Path] = None
+        self.dropped = 0
+        self.exported = 0
+
+    def submit(self, span: Span) -> None:
+        if not settings.tracing_enabled:
+            return
+        self._ensure_started()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+                self._thread.start()
+
+    def _drain(self, limit: int) -> List[Span]:
+        batch: List[Span] = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self) -> None:
+        batch_size = max(1, int(settings.trace_batch_size))
+        interval = max(0.05, float(settings.trace_flush_interval))
+        while True:
+            try:
+                first = self._queue.get(timeout=interval)
+            except queue.Empty:
+                continue
+            batch = [first] + self._drain(batch_size - 1)
+            self._export_batch(batch)
+
+    def _export_batch(self, batch: List[Span]) -> None:
+        try:
+            self.export(batch)
+        finally:
+            for _ in batch:
+                self._queue.task_done()
+
+    def flush(self) -> None:
+        """Exporta imediatamente o que estiver na fila (usado em testes e no shutdown)."""
+        while True:
+            batch = self._drain(max(1, int(settings.trace_batch_size)))
+            if not batch:
+                break
+            self._export_batch(batch)
+        # Espera o lote que a thread exportadora já tirou da fila
+        self._queue.join()
+
+    def _file_handler(self) -> logging.Handler:
+        """Arquivo de spans com a mesma rotação/compressão dos logs (config/logger.py)."""
+        from .logger import _rotating_handler
+
+        path = Path(settings.trace_export_file)
+        if self._handler is None or self._handler_path != path:
+            if self._handler is not None:
+                self._handler.close()
+            path.parent.mkdir(parents=True, exist_ok=True)
+            handler = _rotating_handler(path, max_bytes=settings.trace_max_bytes,
+                                        backup_count=settings.trace_backup_count)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._handler, self._handler_path = handler, path
+        return self._handler
+
+    def export(self, spans: List[Span]) -> None:
+        payload = {
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{
+                    "scope": {"name": "agente.tracing"},
+                    "spans": [s.to_otlp() for s in spans],
+                }],
+            }]
+        }
+        try:
+            endpoint = (settings.trace_otlp_endpoint or "").strip()
+            if endpoint:
+                import requests
+                requests.post(
+                    endpoint,
+                    data=fast_json.dumps_bytes(payload),
+                    headers={"Content-Type": "application/json"},
+                    timeout=5,
+                )
+            else:
+                with self._export_lock:
+                    handler = self._file_handler()
+                    handler.emit(logging.makeLogRecord({"msg": fast_json.dumps(payload)}))
+            self.exported += len(spans)
+        except Exception:
+            self.dropped += len(spans)
+
+
+_exporter = _BatchExporter()
+
+
+def flush() -> None:
+    _exporter.flush()
+
+
+def dropped_spans() -> int:
+    return _exporter.dropped
+
+
+# ============================================
+# API de instrumentação
+# ============================================
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def current_trace_id() -> Optional[str]:
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+def set_attributes(**attributes: Any) -> None:
+    """Adiciona atributos ao span ativo (se houver)."""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes.update(attributes)
+
+
+def start_span(name: str, **attributes: Any) -> Span:
+    """
+    Cria um span filho do span atual sem ativá-lo no contexto.
+    Útil em callbacks com início/fim separados; chame `span.end()` ao final.
+    """
+    return Span(name, _current_span.get(), attributes)
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """Abre um span filho do atual (ou um novo trace) durante o bloco."""
+    if not settings.tracing_enabled:
+        yield None
+        return
+    current = Span(name, _current_span.get(), attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.record_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        current.end()
+
+
+def bind_context(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """
+    Captura o contexto atual (incluindo o span ativo) para executar `fn` em
+    outra thread: threading.Thread(target=bind_context(fn), args=...).
+    """
+    ctx = contextvars.copy_context()
+
+    def runner(*args, **kwargs):
+        return ctx.run(fn, *args, **kwargs)
+
+    return runner
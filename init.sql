@@ -21,6 +21,27 @@ COMMENT ON COLUMN memoria IS 'Identificador da sessão (telefone do cliente)';
 COMMENT ON COLUMN memoria IS 'Mensagem em formato JSON';
 COMMENT ON COLUMN memoria IS 'Data e hora de criação da mensagem';
 
+-- Uso do LLM e das ferramentas por conversa (memory/llm_usage.py)
+CREATE TABLE IF NOT EXISTS llm_usage (
+    id BIGSERIAL PRIMARY KEY,
+    thread_id TEXT NOT NULL,
+    kind TEXT NOT NULL,              -- 'llm' ou 'tool'
+    name TEXT NOT NULL,              -- modelo ou nome da ferramenta
+    latency_ms REAL NOT NULL,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cached_tokens INTEGER NOT NULL DEFAULT 0,
+    args_chars INTEGER NOT NULL DEFAULT 0,
+    result_chars INTEGER NOT NULL DEFAULT 0,
+    error BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_llm_usage_thread ON llm_usage(thread_id, created_at);
+CREATE INDEX IF NOT EXISTS idx_llm_usage_created_at ON llm_usage(created_at);
+
+COMMENT ON TABLE llm_usage IS 'Chamadas ao LLM e às ferramentas por conversa (custo e latência)';
+
 -- Inserir mensagem de teste (opcional)
 -- INSERT INTO basemercadaokLkGG (session_id, message) 
 -- VALUES ('5511999998888', '{"type": "system", "content": "Histórico iniciado"}');
@@ -1,5 +1,4 @@
 from typing import List, Optional
-from langchain_community.chat_message_histories import PostgresChatMessageHistory
 from langchain_core.messages import BaseMessage
 from langchain_core.chat_history import BaseChatMessageHistory
 try:
@@ -37,7 +36,10 @@ class LimitedPostgresChatMessageHistory(BaseChatMessageHistory):
         self.table_name = table_name
         self.max_messages = max_messages
         
-        # Initialize the base PostgreSQL history (stores all messages)
+        # Initialize the base PostgreSQL history (stores all messages).
+        # Imported lazily: langchain_community is only needed once a history is created.
+        from langchain_community.chat_message_histories import PostgresChatMessageHistory
+
         self._postgres_history = PostgresChatMessageHistory(
             session_id=session_id,
             connection_string=connection_string,
@@ -0,0 +1,299 @@
+"""
+Instrumentação do loop ReAct via callbacks do LangChain
+
+Registra cada chamada ao LLM (modelo, tokens de prompt/resposta/cache,
+latência) e cada chamada de ferramenta (nome, tamanho dos argumentos e do
+resultado, latência) por thread_id (telefone). Os totais ficam em memória (só
+as settings.llm_usage_max_threads conversas mais recentes) e os registros são
+gravados em lote no Postgres por uma thread de fundo.
+"""
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field, replace
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+try:
+    import psycopg2
+    import psycopg2.extras
+except ImportError:
+    psycopg2 = None
+
+from config import tracing
+from config.logger import setup_logger
+from config.metrics import LLM_LATENCY, QUEUE_DEPTH, REGISTRY
+from config.settings import settings
+
+logger = setup_logger(__name__)
+
+LLM_TOKENS = REGISTRY.counter(
+    "agente_llm_tokens_total",
+    "Tokens consumidos por modelo e tipo (prompt, completion, cached)",
+    ["model", "kind"],
+)
+LLM_CACHE_RATIO = REGISTRY.histogram(
+    "agente_llm_cached_prompt_ratio",
+    "Fração dos tokens de prompt servida do cache de prefixo do provedor, por chamada",
+    ["model"],
+    buckets=(0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0),
+)
+
+
+@dataclass(slots=True)
+class UsageRecord:
+    thread_id: str
+    kind: str  # "llm" | "tool"
+    name: str  # modelo ou nome da ferramenta
+    latency_ms: float
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    args_chars: int = 0
+    result_chars: int = 0
+    error: bool = False
+    created_at: datetime = field(default_factory=datetime.utcnow)
+
+
+@dataclass(slots=True)
+class ThreadUsage:
+    """Totais acumulados de uma conversa."""
+    llm_calls: int = 0
+    tool_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cached_tokens: int = 0
+    llm_ms: float = 0.0
+    tool_ms: float = 0.0
+    errors: int = 0
+
+    @property
+    def cached_ratio(self) -> float:
+        """Fração dos tokens de prompt da conversa servida do cache do provedor."""
+        return self.cached_tokens / self.prompt_tokens if self.prompt_tokens else 0.0
+
+
+def _extract_tokens(response: Any) -> tuple:
+    """(prompt, completion, cached) a partir do LLMResult (usage_metadata ou llm_output)."""
+    try:
+        message = response.generations[0][0].message
+        usage = getattr(message, "usage_metadata", None)
+        if usage:
+            details = usage.get("input_token_details") or {}
+            return (
+                int(usage.get("input_tokens") or 0),
+                int(usage.get("output_tokens") or 0),
+                int(details.get("cache_read") or 0),
+            )
+    except (AttributeError, IndexError, TypeError):
+        pass
+    token_usage = (getattr(response, "llm_output", None) or {}).get("token_usage") or {}
+    cached = (token_usage.get("prompt_tokens_details") or {}).get("cached_tokens") or 0
+    return (
+        int(token_usage.get("prompt_tokens") or 0),
+        int(token_usage.get("completion_tokens") or 0),
+        int(cached),
+    )
+
+
+class UsageStore:
+    """Agregação em memória por thread_id e fila de registros para o Postgres."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # LRU por conversa: as menos recentes saem ao passar de llm_usage_max_threads
+        self._totals: "OrderedDict[str, ThreadUsage]" = OrderedDict()
+        self._pending: List[UsageRecord] = []
+        self._wakeup = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def add(self, record: UsageRecord) -> None:
+        with self._lock:
+            totals = self._totals.get(record.thread_id)
+            if totals is None:
+                totals = self._totals[record.thread_id] = ThreadUsage()
+                while len(self._totals) > int(settings.llm_usage_max_threads):
+                    self._totals.popitem(last=False)
+            else:
+                self._totals.move_to_end(record.thread_id)
+            if record.kind == "llm":
+                totals.llm_calls += 1
+                totals.prompt_tokens += record.prompt_tokens
+                totals.completion_tokens += record.completion_tokens
+                totals.cached_tokens += record.cached_tokens
+                totals.llm_ms += record.latency_ms
+            else:
+                totals.tool_calls += 1
+                totals.tool_ms += record.latency_ms
+            if record.error:
+                totals.errors += 1
+
+            if not settings.llm_usage_persist:
+                return
+            self._pending.append(record)
+            overflow = len(self._pending) - int(settings.llm_usage_max_pending)
+            if overflow > 0:
+                # Postgres indisponível por muito tempo: descarta os mais antigos
+                del self._pending[:overflow]
+            full = len(self._pending) >= int(settings.llm_usage_batch_size)
+        self._ensure_flusher()
+        if full:
+            self._wakeup.set()
+
+    def summary(self, thread_id: str) -> Optional[ThreadUsage]:
+        with self._lock:
+            totals = self._totals.get(thread_id)
+            return replace(totals) if totals else None
+
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def _ensure_flusher(self) -> None:
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="llm-usage-flusher", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wakeup.wait(timeout=float(settings.llm_usage_flush_interval))
+            self._wakeup.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """Grava os registros pendentes em um único INSERT. Retorna quantos foram gravados."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if not batch:
+            return 0
+        try:
+            _insert_batch(batch)
+            return len(batch)
+        except Exception as e:
+            logger.warning("Falha ao gravar %d registro(s) de uso do LLM: %s", len(batch), e)
+            with self._lock:
+                self._pending[:0] = batch
+            return 0
+
+
+def _insert_batch(batch: List[UsageRecord]) -> None:
+    if psycopg2 is None:
+        raise RuntimeError("psycopg2 não instalado")
+    rows = [
+        (
+            r.thread_id, r.kind, r.name, round(r.latency_ms, 2), r.prompt_tokens, r.completion_tokens,
+            r.cached_tokens, r.args_chars, r.result_chars, r.error, r.created_at,
+        )
+        for r in batch
+    ]
+    with psycopg2.connect(settings.postgres_connection_string) as conn:
+        with conn.cursor() as cursor:
+            psycopg2.extras.execute_values(
+                cursor,
+                f"""
+                INSERT INTO {settings.llm_usage_table}
+                    (thread_id, kind, name, latency_ms, prompt_tokens, completion_tokens,
+                     cached_tokens, args_chars, result_chars, error, created_at)
+                VALUES %s
+                """,
+                rows,
+            )
+
+
+usage_store = UsageStore()
+atexit.register(usage_store.flush)
+QUEUE_DEPTH.set_function(usage_store.pending, queue="llm_usage")
+
+
+class UsageCallbackHandler(BaseCallbackHandler):
+    """
+    Callback compartilhado pelo grafo: mede LLM e ferramentas por thread_id.
+    Também alimenta LLM_LATENCY/LLM_TOKENS no /metrics e abre spans "llm".
+    """
+
+    def __init__(self, store: UsageStore = usage_store):
+        self.store = store
+        self._runs: Dict[Any, tuple] = {}
+
+    @staticmethod
+    def _thread_id(metadata: Optional[Dict[str, Any]]) -> str:
+        return str((metadata or {}).get("thread_id") or "desconhecido")
+
+    # ---------------- LLM ----------------
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, metadata=None, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        model = str((metadata or {}).get("ls_model_name") or params.get("model_name") or params.get("model") or "desconhecido")
+        self._runs[run_id] = (time.perf_counter(), self._thread_id(metadata), model, tracing.start_span("llm", model=model))
+
+    def _finish_llm(self, run_id, response: Any = None, error: Optional[BaseException] = None) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, thread_id, model, span = run
+        elapsed = time.perf_counter() - start
+        prompt, completion, cached = _extract_tokens(response) if response is not None else (0, 0, 0)
+
+        LLM_LATENCY.observe(elapsed, model=model)
+        if prompt:
+            LLM_TOKENS.inc(prompt, model=model, kind="prompt")
+        if completion:
+            LLM_TOKENS.inc(completion, model=model, kind="completion")
+        if cached:
+            LLM_TOKENS.inc(cached, model=model, kind="cached")
+        if prompt:
+            ratio = cached / prompt
+            LLM_CACHE_RATIO.observe(ratio, model=model)
+            logger.debug("LLM %s: %d tokens de prompt, %d em cache (%.0f%%)", model, prompt, cached, ratio * 100)
+
+        span.set_attribute("prompt_tokens", prompt)
+        span.set_attribute("completion_tokens", completion)
+        span.set_attribute("cached_tokens", cached)
+        if error is not None:
+            span.record_error(error)
+        span.end()
+
+        self.store.add(UsageRecord(
+            thread_id=thread_id, kind="llm", name=model, latency_ms=elapsed * 1000,
+            prompt_tokens=prompt, completion_tokens=completion, cached_tokens=cached,
+            error=error is not None,
+        ))
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        self._finish_llm(run_id, response=response)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish_llm(run_id, error=error)
+
+    # ---------------- Ferramentas ----------------
+
+    def on_tool_start(self, serialized, input_str, *, run_id, metadata=None, **kwargs):
+        name = str((serialized or {}).get("name") or kwargs.get("name") or "desconhecida")
+        self._runs[run_id] = (time.perf_counter(), self._thread_id(metadata), name, len(input_str or ""))
+
+    def _finish_tool(self, run_id, output: Any = None, error: bool = False) -> None:
+        run = self._runs.pop(run_id, None)
+        if run is None:
+            return
+        start, thread_id, name, args_chars = run
+        content = getattr(output, "content", output)
+        self.store.add(UsageRecord(
+            thread_id=thread_id, kind="tool", name=name,
+            latency_ms=(time.perf_counter() - start) * 1000,
+            args_chars=args_chars, result_chars=len(str(content)) if content is not None else 0,
+            error=error,
+        ))
+
+    def on_tool_end(self, output, *, run_id, **kwargs):
+        self._finish_tool(run_id, output=output)
+
+    def on_tool_error(self, error, *, run_id, **kwargs):
+        self._finish_tool(run_id, error=True)
+
+
+usage_callback = UsageCallbackHandler()
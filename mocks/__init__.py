@@ -0,0 +1,18 @@
+"""
+Serviços simulados (UAZ, ERP, smart-responder e LLM compatível com OpenAI)
+para medir desempenho e rodar o agente offline.
+"""
+from .latency import LatencyModel, ServiceProfile
+from .llm import DEFAULT_SCRIPT, MULTI_ITEM_SCRIPT, PrefixCache, chat_completion
+from .services import MockServices, Deliveries
+
+__all__ = [
+    'LatencyModel',
+    'ServiceProfile',
+    'DEFAULT_SCRIPT',
+    'MULTI_ITEM_SCRIPT',
+    'chat_completion',
+    'PrefixCache',
+    'MockServices',
+    'Deliveries',
+]
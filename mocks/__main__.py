@@ -0,0 +1,51 @@
+"""
+Sobe os serviços simulados em primeiro plano.
+
+Uso:
+  python -m mocks --port 9000 --llm-latency lognormal:0.8 --erp-latency uniform:0.02-0.1 --erp-error-rate 0.05
+
+Depois exporte as variáveis impressas e inicie o servidor normalmente.
+"""
+import argparse
+import time
+
+from .latency import ServiceProfile
+from .llm import load_script
+from .services import ERP, LLM, SMART, UAZ, MockServices
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--seed", type=int, default=None, help="semente para latências/erros reprodutíveis")
+    parser.add_argument("--llm-script", default=None, help="JSON com a lista de passos do LLM simulado")
+    for service in (UAZ, ERP, SMART, LLM):
+        flag = service.replace("_", "-")
+        parser.add_argument(f"--{flag}-latency", default="0", help=f"latência de {service} (ex.: lognormal:0.8)")
+        parser.add_argument(f"--{flag}-error-rate", type=float, default=0.0)
+        parser.add_argument(f"--{flag}-hang-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    profiles = {}
+    for service in (UAZ, ERP, SMART, LLM):
+        profiles[service] = ServiceProfile.parse(
+            getattr(args, f"{service}_latency"),
+            error_rate=getattr(args, f"{service}_error_rate"),
+            hang_rate=getattr(args, f"{service}_hang_rate"),
+            seed=args.seed,
+        )
+
+    mocks = MockServices(args.host, args.port, profiles=profiles, llm_script=load_script(args.llm_script)).start()
+    print(f"Serviços simulados em {mocks.base_url}")
+    for key, value in mocks.env().items():
+        print(f"export {key}={value}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mocks.stop()
+
+
+if __name__ == "__main__":
+    main()
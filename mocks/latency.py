@@ -0,0 +1,85 @@
+"""
+Distribuições de latência e injeção de erros para os serviços simulados
+
+Especificação de latência em texto (segundos):
+  "0"                      sem atraso
+  "fixed:0.05"             atraso fixo
+  "uniform:0.02-0.2"       uniforme entre os limites
+  "lognormal:0.8"          lognormal com média 0.8 (sigma 0.5)
+  "lognormal:0.8,1.0"      lognormal com média 0.8 e sigma 1.0 (cauda mais longa)
+"""
+import math
+import random
+import threading
+from dataclasses import dataclass, field
+from typing import Optional
+
+
+class LatencyModel:
+    """Sorteia atrasos segundo uma distribuição; aceita semente para reprodutibilidade."""
+
+    def __init__(self, spec: str = "0", seed: Optional[int] = None):
+        self.spec = spec.strip() or "0"
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        kind, _, params = self.spec.partition(":")
+        if not params:
+            kind, params = "fixed", kind
+        self.kind = kind.lower()
+        if self.kind == "fixed":
+            self._args = (float(params),)
+        elif self.kind == "uniform":
+            low, _, high = params.partition("-")
+            self._args = (float(low), float(high or low))
+        elif self.kind == "lognormal":
+            mean, _, sigma = params.partition(",")
+            self._args = (float(mean), float(sigma or 0.5))
+        else:
+            raise ValueError(f"Distribuição de latência desconhecida: {spec}")
+
+    def sample(self) -> float:
+        with self._lock:
+            if self.kind == "fixed":
+                return self._args[0]
+            if self.kind == "uniform":
+                return self._rng.uniform(*self._args)
+            mean, sigma = self._args
+            if mean <= 0:
+                return 0.0
+            # média da lognormal = exp(mu + sigma²/2)
+            mu = math.log(mean) - sigma * sigma / 2
+            return self._rng.lognormvariate(mu, sigma)
+
+    def __repr__(self) -> str:
+        return f"LatencyModel({self.spec!r})"
+
+
+@dataclass
+class ServiceProfile:
+    """Comportamento de um serviço simulado: latência, erros e travamentos."""
+    latency: LatencyModel = field(default_factory=LatencyModel)
+    error_rate: float = 0.0  # fração de respostas com `error_status`
+    error_status: int = 503
+    hang_rate: float = 0.0  # fração de requisições que ficam presas por `hang_seconds`
+    hang_seconds: float = 30.0
+    seed: Optional[int] = None
+
+    def __post_init__(self):
+        self._rng = random.Random(self.seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, latency: str = "0", error_rate: float = 0.0, hang_rate: float = 0.0, seed: Optional[int] = None,
+              **kwargs) -> "ServiceProfile":
+        return cls(latency=LatencyModel(latency, seed), error_rate=error_rate, hang_rate=hang_rate, seed=seed, **kwargs)
+
+    def decide(self) -> tuple:
+        """Retorna (atraso em segundos, status de erro ou None) para uma requisição."""
+        delay = self.latency.sample()
+        with self._lock:
+            roll = self._rng.random()
+        if roll < self.hang_rate:
+            return self.hang_seconds, None
+        if roll < self.hang_rate + self.error_rate:
+            return delay, self.error_status
+        return delay, None
@@ -0,0 +1,161 @@
+"""
+Endpoint simulado compatível com POST /v1/chat/completions (OpenAI)
+
+O roteiro é uma lista de passos executados a cada turno do cliente: o passo
+é escolhido pelo número de respostas do assistente desde a última mensagem
+do usuário. Cada passo chama uma ferramenta ou devolve texto final.
+Marcadores nos argumentos/texto:
+  {last_user}  última mensagem do usuário (até 80 caracteres)
+  {last_ean}   primeiro código de 8 a 14 dígitos da última saída de ferramenta
+Um passo com "each" emite várias chamadas na mesma resposta:
+  "each": "item"  uma por item da última mensagem do usuário ({item})
+  "each": "ean"   uma por saída de ferramenta do passo anterior ({last_ean} de cada)
+
+PrefixCache imita o cache automático de prefixo da OpenAI (blocos de 128
+tokens a partir de 1024) para que usage.prompt_tokens_details.cached_tokens
+reflita o quanto o prompt enviado é estável entre chamadas.
+"""
+import json
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+DEFAULT_SCRIPT: List[Dict[str, Any]] = [
+    {"tool": "ean", "args": {"query": "{last_user}"}},
+    {"tool": "estoque", "args": {"ean": "{last_ean}"}},
+    {"content": "Temos sim! Arroz Camil 5kg por R$ 27,90. Posso separar para você?"},
+]
+
+# Itens pedidos numa mesma mensagem (MULTI_ITEM_SCRIPT)
+MULTI_ITEM_SCRIPT: List[Dict[str, Any]] = [
+    {"tool": "ean", "each": "item", "args": {"query": "{item}"}},
+    {"tool": "estoque", "each": "ean", "args": {"ean": "{last_ean}"}},
+    {"content": "Separei tudo! Confira os itens e valores acima. Posso fechar o pedido?"},
+]
+
+_EAN_RE = re.compile(r"\b(\d{8,14})\b")
+_ITEM_SPLIT_RE = re.compile(r"\s*(?:,|;|\n|\be\b)\s*")
+
+
+def load_script(path: Optional[str]) -> List[Dict[str, Any]]:
+    if not path:
+        return DEFAULT_SCRIPT
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _text(content: Any) -> str:
+    if isinstance(content, list):
+        return " ".join(str(part.get("text", "")) for part in content if isinstance(part, dict))
+    return str(content or "")
+
+
+def _fill(value: Any, ctx: Dict[str, str]) -> Any:
+    if isinstance(value, str):
+        for key, repl in ctx.items():
+            value = value.replace("{" + key + "}", repl)
+        return value
+    if isinstance(value, dict):
+        return {k: _fill(v, ctx) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_fill(v, ctx) for v in value]
+    return value
+
+
+def _estimate_tokens(messages: List[Dict[str, Any]]) -> int:
+    return max(1, sum(len(_text(m.get("content"))) for m in messages) // 4)
+
+
+class PrefixCache:
+    """Prefixos (tools + mensagens serializados) das requisições recentes."""
+
+    MIN_TOKENS = 1024
+    BLOCK_TOKENS = 128
+
+    def __init__(self, size: int = 256):
+        self._recent = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def cached_tokens(self, request: Dict[str, Any]) -> int:
+        text = json.dumps([request.get("tools") or [], request.get("messages") or []], ensure_ascii=False, sort_keys=True)
+        with self._lock:
+            best = max((_common_prefix(text, prev) for prev in self._recent), default=0)
+            self._recent.append(text)
+        tokens = best // 4
+        if tokens < self.MIN_TOKENS:
+            return 0
+        return tokens - tokens % self.BLOCK_TOKENS
+
+
+def _common_prefix(a: str, b: str) -> int:
+    n = min(len(a), len(b))
+    i = 0
+    while i < n and a[i] == b[i]:
+        i += 1
+    return i
+
+
+def chat_completion(request: Dict[str, Any], script: List[Dict[str, Any]],
+                    cache: Optional[PrefixCache] = None) -> Dict[str, Any]:
+    """Monta a resposta do próximo passo do roteiro para a conversa recebida."""
+    messages: List[Dict[str, Any]] = request.get("messages") or []
+    tool_names = {t.get("function", {}).get("name") for t in request.get("tools") or []}
+
+    last_user = ""
+    steps_since_user = 0
+    last_tool_output = ""
+    step_outputs: List[str] = []
+    for m in messages:
+        role = m.get("role")
+        if role == "user":
+            last_user = _text(m.get("content"))
+            steps_since_user = 0
+        elif role == "assistant":
+            steps_since_user += 1
+            step_outputs = []
+        elif role == "tool":
+            last_tool_output = _text(m.get("content"))
+            step_outputs.append(last_tool_output)
+
+    match = _EAN_RE.search(last_tool_output)
+    ctx = {"last_user": last_user[:80], "last_ean": match.group(1) if match else ""}
+
+    step = script[min(steps_since_user, len(script) - 1)] if script else {"content": "ok"}
+    message: Dict[str, Any] = {"role": "assistant", "content": None}
+    finish_reason = "stop"
+    if "tool" in step and (not tool_names or step["tool"] in tool_names):
+        if step.get("each") == "item":
+            contexts = [{**ctx, "item": item} for item in _ITEM_SPLIT_RE.split(last_user) if item.strip()]
+        elif step.get("each") == "ean":
+            found = (_EAN_RE.search(out) for out in step_outputs)
+            contexts = [{**ctx, "last_ean": m.group(1)} for m in found if m]
+        else:
+            contexts = [ctx]
+        message["tool_calls"] = [{
+            "id": f"call_{uuid.uuid4().hex[:16]}",
+            "type": "function",
+            "function": {"name": step["tool"], "arguments": json.dumps(_fill(step.get("args", {}), c), ensure_ascii=False)},
+        } for c in contexts or [ctx]]
+        finish_reason = "tool_calls"
+    else:
+        message["content"] = _fill(step.get("content", "ok"), ctx)
+
+    prompt_tokens = _estimate_tokens(messages)
+    cached_tokens = min(cache.cached_tokens(request), prompt_tokens) if cache is not None else 0
+    completion_tokens = max(1, len(json.dumps(message)) // 4)
+    return {
+        "id": f"chatcmpl-{uuid.uuid4().hex[:24]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": request.get("model") or "mock",
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    }
@@ -0,0 +1,251 @@
+"""
+Servidor HTTP único com os serviços simulados
+
+Rotas:
+  POST|GET /message/send, /send/text              UAZ: envio de mensagem (registra entregas)
+  POST|GET /message/presence, /presence/send ...  UAZ: presença
+  GET      /erp/ean/<ean>                         ERP (estoque_ean_base_url = <base>/erp/ean; ETag/If-None-Match)
+  GET      /erp/api/produtos/consulta             ERP (estoque por nome)
+  POST     /erp/pedidos/, PUT /erp/pedidos/...    ERP (pedidos/alterar; supermercado_base_url = <base>/erp)
+  POST     /smart-responder                       Supabase smart-responder
+  POST     /v1/chat/completions                   LLM compatível com OpenAI (roteiro de ferramentas)
+
+Controle (não contam como requisição a nenhum serviço; usados quando os mocks
+rodam em outro processo, como no scripts/load_test.py):
+  GET      /_mocks/requests                       contagem de requisições por serviço
+  GET      /_mocks/deliveries/<numero>?timeout=s  espera a primeira entrega; {"delivered_at": epoch ou null}
+"""
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs
+from typing import Any, Dict, List, Optional, Tuple
+
+from .latency import ServiceProfile
+from .llm import DEFAULT_SCRIPT, PrefixCache, chat_completion
+
+FIXTURES = Path(__file__).resolve().parent.parent / "benchmarks" / "upstream"
+
+UAZ, ERP, SMART, LLM = "uaz", "erp", "smart_responder", "llm"
+
+
+class Deliveries:
+    """Mensagens entregues na UAZ simulada, por número (apenas dígitos)."""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._by_number: Dict[str, List[Tuple[float, str]]] = {}
+
+    def record(self, number: str, text: str) -> None:
+        with self._cond:
+            self._by_number.setdefault(number, []).append((time.perf_counter(), text))
+            self._cond.notify_all()
+
+    def get(self, number: str) -> List[Tuple[float, str]]:
+        with self._cond:
+            return list(self._by_number.get(number, []))
+
+    def wait(self, number: str, timeout: float, count: int = 1) -> Optional[float]:
+        """Espera `count` entregas para o número; retorna o perf_counter da primeira ou None."""
+        deadline = time.perf_counter() + timeout
+        with self._cond:
+            while len(self._by_number.get(number, [])) < count:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return None
+                self._cond.wait(remaining)
+            return self._by_number[number][0][0]
+
+    def total(self) -> int:
+        with self._cond:
+            return sum(len(v) for v in self._by_number.values())
+
+
+def _erp_catalog() -> Dict[str, List[Dict[str, Any]]]:
+    items = json.loads((FIXTURES / "erp_estoque_preco.json").read_text(encoding="utf-8"))
+    catalog: Dict[str, List[Dict[str, Any]]] = {}
+    for item in items:
+        catalog.setdefault(str(item.get("codigo_ean")), []).append(item)
+    return catalog
+
+
+class MockServices:
+    """
+    Sobe os serviços simulados em uma porta local.
+
+    Exemplo:
+        mocks = MockServices(profiles={"llm": ServiceProfile.parse("lognormal:0.8")}).start()
+        mocks.apply_to_settings(settings)
+        ...
+        mocks.stop()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0,
+                 profiles: Optional[Dict[str, ServiceProfile]] = None,
+                 llm_script: Optional[List[Dict[str, Any]]] = None):
+        self.host = host
+        self.port = port
+        self.profiles: Dict[str, ServiceProfile] = {name: ServiceProfile() for name in (UAZ, ERP, SMART, LLM)}
+        self.profiles.update(profiles or {})
+        self.llm_script = llm_script or DEFAULT_SCRIPT
+        self.llm_cache = PrefixCache()
+        self.deliveries = Deliveries()
+        self.requests: Dict[str, int] = {name: 0 for name in self.profiles}
+        self._catalog = _erp_catalog()
+        self._smart_body = (FIXTURES / "smart_responder.json").read_bytes()
+        self._httpd: Optional[ThreadingHTTPServer] = None
+        self._counter_lock = threading.Lock()
+
+    # ---------------- ciclo de vida ----------------
+
+    def start(self) -> "MockServices":
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]
+        threading.Thread(target=self._httpd.serve_forever, name="mock-services", daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self._httpd is not None:
+            self._httpd.shutdown()
+            self._httpd.server_close()
+            self._httpd = None
+
+    def __enter__(self) -> "MockServices":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    def env(self) -> Dict[str, str]:
+        """Variáveis de ambiente para apontar o agente para os serviços simulados."""
+        base = self.base_url
+        return {
+            "WHATSAPP_API_URL": base,
+            "WHATSAPP_TOKEN": "mock-token",
+            "SUPERMERCADO_BASE_URL": f"{base}/erp",
+            "SUPERMERCADO_AUTH_TOKEN": "mock-token",
+            "ESTOQUE_EAN_BASE_URL": f"{base}/erp/ean",
+            "SMART_RESPONDER_URL": f"{base}/smart-responder",
+            "SMART_RESPONDER_AUTH": "Bearer mock-token",
+            "OPENAI_BASE_URL": f"{base}/v1",
+            "OPENAI_API_KEY": "sk-mock",
+        }
+
+    def apply_to_settings(self, settings) -> None:
+        """Aplica env() diretamente no objeto settings já carregado."""
+        for key, value in self.env().items():
+            setattr(settings, key.lower(), value)
+
+    # ---------------- roteamento ----------------
+
+    def _count(self, service: str) -> None:
+        with self._counter_lock:
+            self.requests[service] = self.requests.get(service, 0) + 1
+
+    def route(self, method: str, path: str, body: Dict[str, Any]) -> Tuple[str, int, bytes]:
+        """Retorna (serviço, status, corpo) para a requisição."""
+        if path in ("/message/send", "/send/text"):
+            number = re.sub(r"\D", "", str(body.get("number") or body.get("phone") or ""))
+            self.deliveries.record(number, str(body.get("text") or body.get("message") or ""))
+            return UAZ, 200, b'{"status":"sent"}'
+        if path in ("/message/presence", "/presence/send", "/send/presence", "/presence"):
+            return UAZ, 200, b'{"status":"ok"}'
+        if path.startswith("/erp/ean/"):
+            ean = re.sub(r"\D", "", path.rsplit("/", 1)[-1])
+            return ERP, 200, json.dumps(self._catalog.get(ean, []), ensure_ascii=False).encode("utf-8")
+        if path == "/erp/api/produtos/consulta":
+            items = [i for group in self._catalog.values() for i in group]
+            return ERP, 200, json.dumps(items[:5], ensure_ascii=False).encode("utf-8")
+        if path.startswith("/erp/pedidos"):
+            return ERP, 200, json.dumps({"status": "ok", "id": int(time.time() * 1000) % 100000}).encode("utf-8")
+        if path == "/smart-responder":
+            return SMART, 200, self._smart_body
+        if path.rstrip("/") in ("/v1/chat/completions", "/chat/completions"):
+            return LLM, 200, json.dumps(chat_completion(body, self.llm_script, self.llm_cache), ensure_ascii=False).encode("utf-8")
+        return "", 404, b'{"error":"not found"}'
+
+    def control(self, path: str, query: str) -> Tuple[int, bytes]:
+        """Rotas /_mocks/: estado dos serviços simulados para quem roda em outro processo."""
+        if path == "/_mocks/requests":
+            with self._counter_lock:
+                return 200, json.dumps(self.requests).encode("utf-8")
+        if path.startswith("/_mocks/deliveries/"):
+            number = re.sub(r"\D", "", path.rsplit("/", 1)[-1])
+            timeout = float((parse_qs(query).get("timeout") or ["0"])[0])
+            first = self.deliveries.wait(number, timeout)
+            # perf_counter não é comparável entre processos: converte para epoch
+            delivered_at = None if first is None else time.time() - (time.perf_counter() - first)
+            return 200, json.dumps({"delivered_at": delivered_at}).encode("utf-8")
+        return 404, b'{"error":"not found"}'
+
+    def _service_for(self, path: str) -> str:
+        if path.startswith("/erp"):
+            return ERP
+        if path == "/smart-responder":
+            return SMART
+        if "chat/completions" in path:
+            return LLM
+        return UAZ
+
+    def _handler_class(self):
+        services = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status: int, body: bytes, headers: Optional[Dict[str, str]] = None) -> None:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _handle(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                raw = self.rfile.read(length) if length else b""
+                try:
+                    body = json.loads(raw) if raw else {}
+                except ValueError:
+                    body = {}
+                path, _, query = self.path.partition("?")
+                if path.startswith("/_mocks/"):
+                    return self._reply(*services.control(path, query))
+                service = services._service_for(path)
+                services._count(service)
+
+                delay, error_status = services.profiles[service].decide()
+                if delay > 0:
+                    time.sleep(delay)
+                if error_status is not None:
+                    return self._reply(error_status, b'{"error":"injected"}')
+                try:
+                    _, status, payload = services.route(self.command, path, body if isinstance(body, dict) else {})
+                except Exception as e:  # roteiro/fixture inválidos não devem derrubar o servidor
+                    status, payload = 500, json.dumps({"error": str(e)}).encode("utf-8")
+                if self.command == "GET" and service == ERP and status == 200:
+                    # Consultas do ERP respondem com ETag e aceitam GET condicional
+                    etag = '"' + hashlib.sha1(payload).hexdigest()[:16] + '"'
+                    if self.headers.get("If-None-Match") == etag:
+                        return self._reply(304, b"", {"ETag": etag})
+                    return self._reply(status, payload, {"ETag": etag})
+                self._reply(status, payload)
+
+            do_GET = _handle
+            do_POST = _handle
+            do_PUT = _handle
+
+        return Handler
@@ -0,0 +1,141 @@
+"""
+Suíte de conversas gravadas (cassetes) para o agente
+
+Cada linha do arquivo de conversas é {"id": ..., "turns": ["msg 1", "msg 2", ...]}.
+
+  record  executa as conversas contra os serviços configurados (ou os simulados
+          com --mocks), grava LLM + HTTP no cassete e salva as respostas de
+          referência (e o provedor/modelo usados) em <cassette_dir>/<nome>.golden.json
+  replay  reproduz do cassete, sem rede, com o mesmo provedor/modelo da gravação,
+          e compara com as respostas de referência (código de saída 1 se houver
+          divergência ou requisição não gravada)
+
+Uso:
+  python scripts/cassette_suite.py record --mocks
+  python scripts/cassette_suite.py replay
+  python scripts/cassette_suite.py replay --conversations benchmarks/conversations/basico.jsonl --name basico
+"""
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config.settings import settings  # noqa: E402
+
+DEFAULT_CONVERSATIONS = ROOT / "benchmarks" / "conversations" / "basico.jsonl"
+
+# Entram no hash das requisições (modelo e URLs); o replay usa os mesmos valores da gravação
+RECORDED_SETTINGS = (
+    "llm_provider", "llm_model", "llm_temperature",
+    "supermercado_base_url", "estoque_ean_base_url", "smart_responder_url", "whatsapp_api_url",
+)
+# Credenciais não entram no hash nem no arquivo; no replay basta que não estejam vazias
+REPLAY_CREDENTIALS = ("openai_api_key", "supermercado_auth_token", "smart_responder_auth", "whatsapp_token")
+
+
+def load_conversations(path: Path) -> List[Dict]:
+    with path.open("r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def run_suite(conversations: List[Dict]) -> Dict[str, List[str]]:
+    from agent_langgraph_simple import run_agent_langgraph
+
+    outputs: Dict[str, List[str]] = {}
+    for idx, conv in enumerate(conversations):
+        telefone = f"cassete-{conv.get('id', idx)}"
+        replies = []
+        for turn in conv["turns"]:
+            result = run_agent_langgraph(telefone, turn)
+            replies.append(result.get("error") and f"[erro] {result['error']}" or result.get("output", ""))
+        outputs[str(conv.get("id", idx))] = replies
+    return outputs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("mode", choices=("record", "replay"))
+    parser.add_argument("--conversations", type=Path, default=DEFAULT_CONVERSATIONS)
+    parser.add_argument("--name", default=None, help="nome do cassete (padrão: nome do arquivo de conversas)")
+    parser.add_argument("--dir", default=None, help="diretório dos cassetes (padrão: settings.cassette_dir)")
+    parser.add_argument("--mocks", action="store_true", help="grava contra os serviços simulados de mocks/")
+    parser.add_argument("--verbose", action="store_true")
+    args = parser.parse_args()
+
+    settings.cassette_mode = args.mode
+    settings.cassette_name = args.name or args.conversations.stem
+    if args.dir:
+        settings.cassette_dir = args.dir
+    settings.llm_usage_persist = False
+    golden_path = Path(settings.cassette_dir) / f"{settings.cassette_name}.golden.json"
+    cassette_path = Path(settings.cassette_dir) / f"{settings.cassette_name}.jsonl"
+
+    mocks = None
+    if args.mode == "record":
+        # Regravação completa: descarta o cassete anterior
+        cassette_path.unlink(missing_ok=True)
+        if args.mocks:
+            from mocks import MockServices
+            mocks = MockServices().start()
+            mocks.apply_to_settings(settings)
+            settings.llm_provider = "openai"
+            settings.llm_model = "gpt-4o-mini"
+    else:
+        if not cassette_path.exists():
+            print(f"❌ Cassete não encontrado: {cassette_path}")
+            return 1
+        golden = json.loads(golden_path.read_text(encoding="utf-8")) if golden_path.exists() else {}
+        for key, value in golden.get("settings", {}).items():
+            setattr(settings, key, value)
+        for key in REPLAY_CREDENTIALS:
+            if not getattr(settings, key, None):
+                setattr(settings, key, "replay")
+
+    if not args.verbose:
+        logging.disable(logging.WARNING)
+
+    conversations = load_conversations(args.conversations)
+    start = time.perf_counter()
+    try:
+        outputs = run_suite(conversations)
+    finally:
+        if mocks is not None:
+            mocks.stop()
+    elapsed = time.perf_counter() - start
+    turns = sum(len(c["turns"]) for c in conversations)
+    print(f"⏱️  {len(conversations)} conversas / {turns} turnos em {elapsed:.2f}s ({args.mode})")
+
+    if args.mode == "record":
+        golden_path.parent.mkdir(parents=True, exist_ok=True)
+        recorded = {
+            "settings": {key: getattr(settings, key) for key in RECORDED_SETTINGS},
+            "outputs": outputs,
+        }
+        golden_path.write_text(json.dumps(recorded, ensure_ascii=False, indent=2), encoding="utf-8")
+        print(f"💾 Cassete: {cassette_path}  referência: {golden_path}")
+        return 0
+
+    failures = 0
+    for conv_id, replies in outputs.items():
+        expected = golden.get("outputs", {}).get(conv_id)
+        if expected is not None and expected != replies:
+            failures += 1
+            print(f"❌ {conv_id}: divergiu da referência")
+            for got, want in zip(replies, expected):
+                if got != want:
+                    print(f"   esperado: {want[:120]!r}\n   obtido:   {got[:120]!r}")
+        elif any(r.startswith("[erro]") for r in replies):
+            failures += 1
+            print(f"❌ {conv_id}: {next(r for r in replies if r.startswith('[erro]'))[:200]}")
+    print("✅ Todas as conversas conferem" if not failures else f"❌ {failures} conversa(s) divergente(s)")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
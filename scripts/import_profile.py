@@ -0,0 +1,91 @@
+"""
+Perfil do tempo de import a frio (resumo de `python -X importtime`)
+
+Roda o import em um processo novo e mostra o total, os imports diretos mais
+caros e o tempo próprio agregado por pacote de topo.
+
+Uso:
+  python scripts/import_profile.py                 # perfil de `import server`
+  python scripts/import_profile.py agent_langgraph_simple --top 15
+"""
+import argparse
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+ROOT = Path(__file__).resolve().parent.parent
+
+_LINE_RE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+class ImportRow(NamedTuple):
+    self_us: int
+    cumulative_us: int
+    depth: int
+    module: str
+
+
+def profile(module: str) -> List[ImportRow]:
+    """Executa `import <module>` com -X importtime em um interpretador novo."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} falhou:\n{proc.stderr[-2000:]}")
+    rows = []
+    for line in proc.stderr.splitlines():
+        m = _LINE_RE.match(line)
+        if m:
+            rows.append(ImportRow(int(m.group(1)), int(m.group(2)), len(m.group(3)) // 2, m.group(4)))
+    return rows
+
+
+def total_seconds(rows: List[ImportRow], module: str) -> float:
+    return next(r.cumulative_us for r in rows if r.module == module) / 1e6
+
+
+def direct_imports(rows: List[ImportRow], module: str) -> List[ImportRow]:
+    """Filhos diretos do módulo (importtime lista os filhos antes do pai)."""
+    idx = next(i for i, r in enumerate(rows) if r.module == module)
+    depth = rows[idx].depth
+    children = []
+    for r in reversed(rows[:idx]):
+        if r.depth <= depth:
+            break
+        if r.depth == depth + 1:
+            children.append(r)
+    return children
+
+
+def by_package(rows: List[ImportRow]) -> Dict[str, int]:
+    agg: Dict[str, int] = {}
+    for r in rows:
+        top = r.module.split(".")[0]
+        agg[top] = agg.get(top, 0) + r.self_us
+    return agg
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("module", nargs="?", default="server")
+    parser.add_argument("--top", type=int, default=12)
+    args = parser.parse_args()
+
+    rows = profile(args.module)
+    print(f"⏱️  import {args.module}: {total_seconds(rows, args.module) * 1000:.0f}ms ({len(rows)} módulos)\n")
+
+    direct = direct_imports(rows, args.module)
+    print(f"{'imports diretos (acumulado)':<44} {'ms':>8}")
+    for r in sorted(direct, key=lambda r: -r.cumulative_us)[:args.top]:
+        print(f"{r.module:<44} {r.cumulative_us / 1000:>8.1f}")
+
+    print(f"\n{'pacote (tempo próprio somado)':<44} {'ms':>8}")
+    for name, us in sorted(by_package(rows).items(), key=lambda kv: -kv[1])[:args.top]:
+        print(f"{name:<44} {us / 1000:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+"""
+Teste de carga: clientes simultâneos de WhatsApp contra /webhook/whatsapp
+
+Sobe os serviços simulados de `mocks/` (UAZ, ERP, smart-responder e LLM
+compatível com OpenAI com roteiro ean → estoque → resposta) e o servidor
+(uvicorn) em processos separados do gerador de carga, para que threads, RSS e
+disputa pelo GIL medidos sejam só os do servidor. Os clientes chegam como um
+processo de Poisson e mandam rajadas de mensagens (com duplicatas e eco fromMe
+após a resposta).
+
+Mede a latência ponta a ponta (primeira mensagem → entrega na UAZ), a
+latência de ack do webhook, a vazão e, ao longo do tempo, threads (do
+/metrics) e RSS do processo do servidor.
+
+Uso:
+  python scripts/load_test.py --customers 50 --rate 5 --window 0.5 --idle-checks 2
+  python scripts/load_test.py --llm-latency lognormal:1.5,1.0 --erp-error-rate 0.05
+"""
+import argparse
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import requests  # noqa: E402
+
+from mocks import MockServices  # noqa: E402
+
+PAYLOADS = ROOT / "benchmarks" / "payloads"
+
+MESSAGES = [
+    "oi, boa tarde",
+    "quero arroz 5kg",
+    "tem feijão carioca?",
+    "e 2 coca 2l",
+    "quanto tá o óleo de soja?",
+    "manda também 1 pacote de café",
+    "tem leite integral?",
+]
+
+
+# ============================================
+# Processos (mocks e servidor) e clientes
+# ============================================
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_http(url: str, proc: subprocess.Popen, timeout: float, name: str) -> None:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc.poll() is not None:
+            raise SystemExit(f"{name} terminou ao iniciar (código {proc.returncode})")
+        try:
+            if requests.get(url, timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"{name} não respondeu em {url} após {timeout:.0f}s")
+
+
+def start_mocks(args, port: int) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "mocks", "--port", str(port),
+           "--uaz-latency", args.upstream_latency,
+           "--erp-latency", args.upstream_latency, "--erp-error-rate", str(args.erp_error_rate),
+           "--smart-responder-latency", args.upstream_latency,
+           "--llm-latency", args.llm_latency, "--llm-error-rate", str(args.llm_error_rate)]
+    if args.seed is not None:
+        cmd += ["--seed", str(args.seed)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL)
+    _wait_http(f"http://127.0.0.1:{port}/_mocks/requests", proc, 30, "mocks")
+    return proc
+
+
+def start_server(args, env: Dict[str, str]) -> subprocess.Popen:
+    cmd = [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(args.port),
+           "--log-level", "warning", "--no-access-log"]
+    # Sem --verbose, os logs do servidor ficam só em logs/agente.log
+    output = None if args.verbose else subprocess.DEVNULL
+    proc = subprocess.Popen(cmd, cwd=ROOT, env={**os.environ, **env}, stdout=output, stderr=output)
+    _wait_http(f"http://127.0.0.1:{args.port}/ready", proc, args.startup_timeout, "servidor")
+    return proc
+
+
+def _stop(proc: Optional[subprocess.Popen]) -> None:
+    if proc is None or proc.poll() is not None:
+        return
+    proc.terminate()
+    try:
+        proc.wait(10)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def _payload(template: Dict[str, Any], numero: str, text: str, message_id: str, from_me: bool = False) -> Dict[str, Any]:
+    data = json.loads(json.dumps(template))
+    chatid = f"{numero}@s.whatsapp.net"
+    data["chat"]["wa_chatid"] = chatid
+    data["chat"]["phone"] = f"+{numero}"
+    msg = data["message"]
+    msg.update({"chatid": chatid, "content": text, "text": text, "messageid": message_id, "fromMe": from_me})
+    if not from_me:
+        msg["sender"] = chatid
+        msg["sender_pn"] = chatid
+    return data
+
+
+class Stats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.e2e: List[float] = []
+        self.acks: List[float] = []
+        self.timeouts = 0
+        self.http_errors = 0
+        self.in_flight = 0
+        self.samples: List[tuple] = []
+
+
+def wait_delivery(mocks_url: str, numero: str, timeout: float) -> Optional[float]:
+    """Epoch da primeira entrega na UAZ simulada para o número, ou None."""
+    try:
+        resp = requests.get(f"{mocks_url}/_mocks/deliveries/{numero}", params={"timeout": timeout}, timeout=timeout + 5)
+        return resp.json().get("delivered_at")
+    except (requests.RequestException, ValueError):
+        return None
+
+
+def run_customer(idx: int, args, url: str, mocks_url: str, stats: Stats, templates) -> None:
+    text_tpl, echo_tpl = templates
+    numero = f"5585{9000000 + idx:08d}"
+    session = requests.Session()
+    with stats.lock:
+        stats.in_flight += 1
+
+    def post(payload):
+        t0 = time.perf_counter()
+        try:
+            resp = session.post(url, json=payload, timeout=30)
+            ok = resp.status_code < 400
+        except requests.RequestException:
+            ok = False
+        with stats.lock:
+            stats.acks.append(time.perf_counter() - t0)
+            if not ok:
+                stats.http_errors += 1
+
+    try:
+        first = time.time()
+        burst = random.randint(1, args.burst_max)
+        for k in range(burst):
+            payload = _payload(text_tpl, numero, random.choice(MESSAGES), uuid.uuid4().hex[:20].upper())
+            post(payload)
+            if random.random() < args.duplicate_rate:
+                post(payload)  # reentrega do provedor com o mesmo messageid
+            if k < burst - 1:
+                time.sleep(random.uniform(0.1, args.burst_gap))
+
+        delivered = wait_delivery(mocks_url, numero, args.timeout)
+        with stats.lock:
+            if delivered is None:
+                stats.timeouts += 1
+            else:
+                stats.e2e.append(delivered - first)
+
+        if delivered is not None and random.random() < args.echo_rate:
+            post(_payload(echo_tpl, numero, "Temos sim! Arroz Camil 5kg por R$ 27,90.", uuid.uuid4().hex[:20].upper(), from_me=True))
+    finally:
+        with stats.lock:
+            stats.in_flight -= 1
+
+
+def rss_mb(pid: int) -> float:
+    try:
+        with open(f"/proc/{pid}/status", "r") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return float("nan")
+
+
+def server_threads(metrics_url: str) -> float:
+    """Gauge agente_threads do /metrics do servidor."""
+    try:
+        for line in requests.get(metrics_url, timeout=2).text.splitlines():
+            if line.startswith("agente_threads "):
+                return float(line.split()[1])
+    except (requests.RequestException, ValueError):
+        pass
+    return float("nan")
+
+
+def sampler(stats: Stats, start: float, interval: float, stop: threading.Event, pid: int, metrics_url: str) -> None:
+    while not stop.is_set():
+        threads, rss = server_threads(metrics_url), rss_mb(pid)
+        with stats.lock:
+            stats.samples.append((time.perf_counter() - start, threads, rss, stats.in_flight, len(stats.e2e)))
+        stop.wait(interval)
+
+
+def _pct(values: List[float], p: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, int(round(p / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[idx]
+
+
+def report(stats: Stats, elapsed: float, args) -> None:
+    print("\n================ RESULTADO ================")
+    print(f"clientes: {args.customers}  chegada: {args.rate}/s  rajada<= {args.burst_max}  "
+          f"janela: {args.window}s x {args.idle_checks}")
+    done = len(stats.e2e)
+    print(f"conversas concluídas: {done}  timeouts: {stats.timeouts}  erros HTTP: {stats.http_errors}")
+    print(f"vazão: {done / elapsed:.2f} conversas/s ({elapsed:.1f}s)")
+    for label, values in (("ponta a ponta", stats.e2e), ("ack do webhook", stats.acks)):
+        if values:
+            print(f"{label:<15} p50={_pct(values, 50) * 1000:8.1f}ms  p95={_pct(values, 95) * 1000:8.1f}ms  "
+                  f"p99={_pct(values, 99) * 1000:8.1f}ms  max={max(values) * 1000:8.1f}ms  "
+                  f"média={statistics.mean(values) * 1000:8.1f}ms")
+    print("\n   t(s)  threads   RSS(MB)  em_andamento  concluídas   (threads/RSS do processo do servidor)")
+    for t, threads, rss, in_flight, completed in stats.samples:
+        print(f"{t:7.1f}  {threads:7.0f}  {rss:8.1f}  {in_flight:12d}  {completed:10d}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=30, help="total de clientes simulados")
+    parser.add_argument("--rate", type=float, default=3.0, help="chegadas por segundo (Poisson)")
+    parser.add_argument("--burst-max", type=int, default=3, help="máximo de mensagens por rajada")
+    parser.add_argument("--burst-gap", type=float, default=1.0, help="intervalo máximo entre mensagens da rajada (s)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.1, help="fração de mensagens reenviadas")
+    parser.add_argument("--echo-rate", type=float, default=0.8, help="fração de conversas com eco fromMe")
+    parser.add_argument("--llm-latency", default="lognormal:0.8", help="distribuição de latência do LLM (ver mocks/latency.py)")
+    parser.add_argument("--upstream-latency", default="lognormal:0.05", help="latência de UAZ/ERP/smart-responder")
+    parser.add_argument("--erp-error-rate", type=float, default=0.0, help="fração de erros 503 injetados no ERP")
+    parser.add_argument("--llm-error-rate", type=float, default=0.0, help="fração de erros 503 injetados no LLM")
+    parser.add_argument("--seed", type=int, default=None, help="semente para latências/erros reprodutíveis")
+    parser.add_argument("--window", type=float, default=0.5, help="buffer_window_seconds")
+    parser.add_argument("--idle-checks", type=int, default=2, help="buffer_idle_checks")
+    parser.add_argument("--timeout", type=float, default=120.0, help="espera máxima pela resposta (s)")
+    parser.add_argument("--sample-interval", type=float, default=1.0)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--mocks-port", type=int, default=0, help="porta dos serviços simulados (0 = livre)")
+    parser.add_argument("--startup-timeout", type=float, default=60.0, help="espera máxima pelo /ready do servidor (s)")
+    parser.add_argument("--verbose", action="store_true", help="mostra os logs do servidor no terminal")
+    args = parser.parse_args()
+
+    if args.seed is not None:
+        random.seed(args.seed)
+    mocks_port = args.mocks_port or _free_port()
+    mocks_url = f"http://127.0.0.1:{mocks_port}"
+    env = {
+        **MockServices(port=mocks_port).env(),
+        "WHATSAPP_METHOD": "POST",
+        "LLM_PROVIDER": "openai",
+        "LLM_MODEL": "gpt-4o-mini",
+        "BUFFER_WINDOW_SECONDS": str(args.window),
+        "BUFFER_IDLE_CHECKS": str(args.idle_checks),
+        "LLM_USAGE_PERSIST": "false",
+        "LOG_PAYLOAD_SAMPLE_RATE": "0",
+    }
+
+    mocks_proc = server_proc = None
+    try:
+        mocks_proc = start_mocks(args, mocks_port)
+        server_proc = start_server(args, env)
+
+        templates = (
+            json.loads((PAYLOADS / "uaz_message_text.json").read_text(encoding="utf-8")),
+            json.loads((PAYLOADS / "uaz_message_from_me.json").read_text(encoding="utf-8")),
+        )
+        url = f"http://127.0.0.1:{args.port}/webhook/whatsapp"
+        stats = Stats()
+        stop = threading.Event()
+        start = time.perf_counter()
+        threading.Thread(
+            target=sampler,
+            args=(stats, start, args.sample_interval, stop, server_proc.pid, f"http://127.0.0.1:{args.port}/metrics"),
+            daemon=True,
+        ).start()
+
+        customers = []
+        for idx in range(args.customers):
+            t = threading.Thread(target=run_customer, args=(idx, args, url, mocks_url, stats, templates), daemon=True)
+            t.start()
+            customers.append(t)
+            time.sleep(random.expovariate(args.rate) if args.rate > 0 else 0)
+        for t in customers:
+            t.join()
+
+        elapsed = time.perf_counter() - start
+        stop.set()
+        report(stats, elapsed, args)
+        print(f"\nrequisições aos serviços simulados: {requests.get(f'{mocks_url}/_mocks/requests', timeout=5).json()}")
+    finally:
+        _stop(server_proc)
+        _stop(mocks_proc)
+
+if __name__ == "__main__":
+    main()
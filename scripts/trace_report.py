@@ -0,0 +1,101 @@
+"""
+Relatório dos traces exportados (OTLP/JSON em JSONL, ver config/tracing.py).
+
+Agrupa os spans por trace, ordena pelas conversas mais lentas e imprime a
+árvore de spans com o caminho crítico (filho mais demorado de cada nível)
+marcado com '*'.
+
+Uso:
+  python scripts/trace_report.py [logs/traces.jsonl] [--top 10] [--telefone 5511...]
+"""
+import argparse
+import json
+import sys
+from collections import defaultdict
+from typing import Any, Dict, List
+
+
+def _attributes(span: Dict[str, Any]) -> Dict[str, Any]:
+    out = {}
+    for attr in span.get("attributes", []):
+        value = attr.get("value", {})
+        out[attr["key"]] = next(iter(value.values()), None) if value else None
+    return out
+
+
+def load_spans(path: str) -> List[Dict[str, Any]]:
+    spans: List[Dict[str, Any]] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            for rs in json.loads(line).get("resourceSpans", []):
+                for ss in rs.get("scopeSpans", []):
+                    for span in ss.get("spans", []):
+                        span["start"] = int(span["startTimeUnixNano"])
+                        span["end"] = int(span["endTimeUnixNano"])
+                        span["attrs"] = _attributes(span)
+                        spans.append(span)
+    return spans
+
+
+def _print_tree(span: Dict[str, Any], children: Dict[str, List[Dict[str, Any]]], t0: int, depth: int, critical: bool):
+    dur_ms = (span["end"] - span["start"]) / 1e6
+    offset_ms = (span["start"] - t0) / 1e6
+    mark = "*" if critical else " "
+    status = " ERRO" if span.get("status", {}).get("code") == 2 else ""
+    extras = " ".join(f"{k}={v}" for k, v in span["attrs"].items() if k != "telefone")
+    print(f"  {mark} {'  ' * depth}{span['name']:<24} +{offset_ms:9.1f}ms {dur_ms:9.1f}ms{status} {extras}")
+    kids = sorted(children.get(span["spanId"], []), key=lambda s: s["start"])
+    slowest = max(kids, key=lambda s: s["end"] - s["start"], default=None)
+    for kid in kids:
+        _print_tree(kid, children, t0, depth + 1, critical and kid is slowest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("path", nargs="?", default="logs/traces.jsonl")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--telefone", default=None)
+    args = parser.parse_args()
+
+    try:
+        spans = load_spans(args.path)
+    except FileNotFoundError:
+        print(f"Arquivo não encontrado: {args.path}")
+        sys.exit(1)
+
+    traces: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+    for span in spans:
+        traces[span["traceId"]].append(span)
+
+    summaries = []
+    for trace_id, items in traces.items():
+        telefone = next((s["attrs"]["telefone"] for s in items if "telefone" in s["attrs"]), "")
+        if args.telefone and telefone != args.telefone:
+            continue
+        start = min(s["start"] for s in items)
+        end = max(s["end"] for s in items)
+        summaries.append((end - start, trace_id, telefone, items))
+
+    summaries.sort(reverse=True)
+    print(f"{len(summaries)} trace(s) em {args.path}")
+    for total, trace_id, telefone, items in summaries[: args.top]:
+        print(f"\ntrace {trace_id} telefone={telefone or '?'} total={total / 1e6:.1f}ms spans={len(items)}")
+        ids = {s["spanId"] for s in items}
+        children: Dict[str, List[Dict[str, Any]]] = defaultdict(list)
+        roots = []
+        for s in items:
+            parent = s.get("parentSpanId")
+            if parent and parent in ids:
+                children[parent].append(s)
+            else:
+                roots.append(s)
+        t0 = min(s["start"] for s in items)
+        for root in sorted(roots, key=lambda s: s["start"]):
+            _print_tree(root, children, t0, 0, True)
+
+
+if __name__ == "__main__":
+    main()
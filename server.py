@@ -3,24 +3,32 @@ Servidor FastAPI para receber mensagens do WhatsApp e processar com o agente
 # touch: reload marker
 """
 from fastapi import FastAPI, Request, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 from pydantic import BaseModel, Field
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 import requests
 from datetime import datetime
+import logging
 import time
 import threading
+import asyncio
+from urllib.parse import urlparse
 
 from config.settings import settings
-from config.logger import setup_logger
-from agent_langgraph_simple import run_agent_langgraph as run_agent, get_session_history
+from config.logger import setup_logger, payload_preview, sample_payload, log_queue_size
+from config.metrics import REGISTRY, CONTENT_TYPE, STAGE_LATENCY, ACTIVE_SESSIONS, QUEUE_DEPTH, STARTUP_PHASE, timed_stage
+from config import fast_json, tracing
+from agent_langgraph_simple import run_agent_langgraph as run_agent, get_session_history, get_agent_graph, get_fast_agent_graph, warmup_llm
 from tools.redis_tools import (
+    get_redis_client,
     push_message_to_buffer,
     get_buffer_length,
     pop_all_messages,
     set_agent_cooldown,
     is_agent_in_cooldown,
 )
+from tools.webhook_normalizer import normalize_incoming, sanitize_number
+from tools import deadline, erp_snapshot, order_outbox, upstream
 
 logger = setup_logger(__name__)
 
@@ -68,224 +76,31 @@ class PresenceRequest(BaseModel):
 # Funções Auxiliares
 # ============================================
 
-def _extract_incoming(payload: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Normaliza payloads de diferentes provedores (UAZ/Cloud API) para um formato comum.
-    Retorna dict com: telefone, mensagem_texto, message_type, message_id, from_me (bool).
-    """
-    # 0) Estrutura UAZ Webhook (lista 'messages' com 'content')
-    try:
-        messages_list = payload.get("messages")
-        if isinstance(messages_list, list) and messages_list:
-            m0 = messages_list[0] or {}
-            content = m0.get("content", {})
-
-            # telefone pode vir em 'sender' ou 'chatid' (ex.: "5585987520060@s.whatsapp.net")
-            telefone = m0.get("sender") or m0.get("chatid") or m0.get("from")
-            if isinstance(telefone, str):
-                # extrair apenas dígitos; remover sufixos como "@s.whatsapp.net"
-                import re
-                telefone = re.sub(r"\D", "", telefone.split("@")[0])
-
-            message_type = content.get("type") or m0.get("type") or "text"
-            mensagem_texto = content.get("text") or m0.get("text")
-            message_id = m0.get("messageid") or m0.get("id")
-            from_me = bool(m0.get("fromMe") or m0.get("wasSentByApi") or False)
-
-            if telefone:
-                return {
-                    "telefone": telefone,
-                    "mensagem_texto": mensagem_texto,
-                    "message_type": message_type,
-                    "message_id": message_id,
-                    "from_me": from_me,
-                }
-    except Exception:
-        pass
-    # 1) Estrutura UAZ presumida (body.message/chat/data)
-    try:
-        body = payload.get("body", {})
-        message = body.get("message", {})
-        chat = body.get("chat", {})
-        data = body.get("data", {})
-
-        telefone = chat.get("wa_id") or message.get("from")
-        message_type = data.get("messageType") or message.get("type") or "textMessage"
-        from_me = bool(message.get("fromMe") or message.get("wasSentByApi") or False)
-
-        mensagem_texto = None
-        # Tentativas de extração de texto
-        if message_type in ("textMessage", "text", "txt"):
-            mensagem_texto = (message.get("text") or {}).get("body") or message.get("body")
-        elif message_type in ("imageMessage", "image"):
-            mensagem_texto = message.get("image", {}).get("caption", "[Imagem recebida]")
-        elif message_type in ("audioMessage", "audio"):
-            mensagem_texto = "[Mensagem de áudio recebida - transcrição não implementada]"
-
-        message_id = message.get("messageid") or message.get("id")
-
-        if telefone:
-            return {
-                "telefone": telefone,
-                "mensagem_texto": mensagem_texto,
-                "message_type": message_type,
-                "message_id": message_id,
-                "from_me": from_me,
-            }
-    except Exception:
-        pass
+# Normalização do webhook (detecção de layout + struct com slots)
+_extract_incoming = normalize_incoming
 
-    # 2) Estrutura WhatsApp Cloud API oficial (entry -> changes -> value)
-    try:
-        entry = payload.get("entry", [])
-        if entry:
-            changes = entry[0].get("changes", [])
-            value = changes[0].get("value", {}) if changes else {}
-            messages = value.get("messages", [])
-            contacts = value.get("contacts", [])
-            msg = messages[0] if messages else {}
-
-            telefone = (contacts[0].get("wa_id") if contacts else None) or msg.get("from")
-            message_type = msg.get("type") or "text"
-            mensagem_texto = None
-
-            if message_type == "text":
-                mensagem_texto = (msg.get("text") or {}).get("body")
-            elif message_type == "image":
-                mensagem_texto = (msg.get("image") or {}).get("caption", "[Imagem recebida]")
-            elif message_type == "audio":
-                mensagem_texto = "[Mensagem de áudio recebida - transcrição não implementada]"
-
-            return {
-                "telefone": telefone,
-                "mensagem_texto": mensagem_texto,
-                "message_type": message_type,
-                "message_id": msg.get("id"),
-                "from_me": False,
-            }
-    except Exception:
-        pass
-
-    # 3) Fallback robusto para formato UAZ com campos de topo (message/chat)
-    import re
-
-    def _sanitize_phone(raw: Any) -> Optional[str]:
-        if raw is None:
-            return None
-        s = str(raw)
-        # remover sufixo do domínio do WhatsApp
-        if "@" in s:
-            s = s.split("@")[0]
-        # em wa_fastid, o formato é "owner:phone" -> pegar a parte de phone
-        if ":" in s:
-            parts = s.split(":")
-            s = parts[-1]
-        digits = re.sub(r"\D", "", s)
-        return digits or None
-
-    chat = payload.get("chat") or {}
-    message_any = payload.get("message")
-    from_me = False
-
-    # message/text/type/id defaults
-    mensagem_texto = payload.get("text")
-    message_type = payload.get("messageType") or "text"
-    message_id = payload.get("id") or payload.get("messageid")
-
-    # Extração do texto e tipo a partir de message_any
-    if isinstance(message_any, dict):
-        message_type = message_any.get("type") or message_type
-
-        # content pode ser string ou dict
-        content = message_any.get("content")
-        if isinstance(content, str) and not mensagem_texto:
-            mensagem_texto = content
-        elif isinstance(content, dict):
-            mensagem_texto = content.get("text") or mensagem_texto
-            message_type = content.get("type") or message_type
-
-        # Campo text pode ser string ou dict { body: "..." }
-        txt = message_any.get("text")
-        if mensagem_texto is None:
-            if isinstance(txt, dict):
-                mensagem_texto = txt.get("body")
-            else:
-                mensagem_texto = txt or message_any.get("body")
-
-        # ID da mensagem
-        message_id = message_any.get("messageid") or message_any.get("id") or message_id
-        # Flag de self-message
-        from_me = bool(message_any.get("fromMe") or message_any.get("wasSentByApi") or False)
-
-    # Extração do telefone a partir de múltiplas fontes
-    # Se for uma mensagem enviada pelo agente (from_me=True), priorizamos o número do CLIENTE (chat.wa_id)
-    # para que a memória de conversação use sempre o mesmo session_id do cliente.
-    if from_me:
-        telefone_candidates = [
-            chat.get("wa_id"),
-            chat.get("phone"),
-            chat.get("wa_chatid"),
-            chat.get("wa_fastid"),
-            payload.get("wa_id"),
-            payload.get("sender"),
-            payload.get("chatid"),
-            payload.get("from"),  # último: número do agente
-        ]
-        if isinstance(message_any, dict):
-            telefone_candidates.extend([
-                message_any.get("sender"),
-                message_any.get("sender_pn"),
-                message_any.get("chatid"),
-                message_any.get("from"),
-            ])
-    else:
-        telefone_candidates = [
-            payload.get("from"),
-            payload.get("wa_id"),
-            payload.get("sender"),
-            payload.get("chatid"),
-            chat.get("phone"),
-            chat.get("wa_chatid"),
-            chat.get("wa_fastid"),
-        ]
-        if isinstance(message_any, dict):
-            telefone_candidates.extend([
-                message_any.get("sender"),
-                message_any.get("sender_pn"),
-                message_any.get("chatid"),
-                message_any.get("from"),
-            ])
-
-    telefone: Optional[str] = None
-    for cand in telefone_candidates:
-        cand_digits = _sanitize_phone(cand)
-        if cand_digits:
-            telefone = cand_digits
-            break
 
-    # Tipo de mídia padrão para texto
-    if message_type in (None, "", "textMessage"):
-        message_type = "text"
+def _split_message(mensagem: str, max_length: int = 4000) -> List[str]:
+    """Divide mensagens longas por parágrafos (limite do WhatsApp: ~4096 caracteres)"""
+    if len(mensagem) <= max_length:
+        return [mensagem]
 
-    # Ajuste de mensagens de mídia
-    if isinstance(message_any, dict):
-        if message_type in ("imageMessage", "image") and not mensagem_texto:
-            img = message_any.get("image")
-            if isinstance(img, dict):
-                mensagem_texto = img.get("caption") or "[Imagem recebida]"
-            else:
-                mensagem_texto = "[Imagem recebida]"
-        elif message_type in ("audioMessage", "audio") and not mensagem_texto:
-            mensagem_texto = "[Mensagem de áudio recebida - transcrição não implementada]"
+    mensagens = []
+    mensagem_atual = ""
+    for paragrafo in mensagem.split('\n\n'):
+        if len(mensagem_atual) + len(paragrafo) + 2 <= max_length:
+            mensagem_atual += paragrafo + "\n\n"
+        else:
+            if mensagem_atual:
+                mensagens.append(mensagem_atual.strip())
+            mensagem_atual = paragrafo + "\n\n"
+
+    if mensagem_atual:
+        mensagens.append(mensagem_atual.strip())
+    return mensagens
 
-    return {
-        "telefone": telefone,
-        "mensagem_texto": mensagem_texto,
-        "message_type": message_type,
-        "message_id": message_id,
-        "from_me": from_me,
-    }
 
+@timed_stage("send_whatsapp")
 def send_whatsapp_message(telefone: str, mensagem: str) -> bool:
     """
     Envia mensagem de resposta para o WhatsApp via API UAZ
@@ -302,7 +117,6 @@ def send_whatsapp_message(telefone: str, mensagem: str) -> bool:
     # Caso contrário, usa o padrão `/message/send`.
     base = (settings.whatsapp_api_url or "").rstrip("/")
     try:
-        from urllib.parse import urlparse
         parsed = urlparse(base)
         # Se não há caminho definido ("" ou "/"), acrescenta o caminho padrão
         if not parsed.path or parsed.path == "/":
@@ -322,109 +136,72 @@ def send_whatsapp_message(telefone: str, mensagem: str) -> bool:
         "token": (settings.whatsapp_token or "").strip(),
     }
     
-    # Dividir mensagem em partes se for muito longa (limite do WhatsApp: ~4096 caracteres)
-    max_length = 4000
-    mensagens = []
-    
-    if len(mensagem) > max_length:
-        # Dividir por parágrafos
-        paragrafos = mensagem.split('\n\n')
-        mensagem_atual = ""
-        
-        for paragrafo in paragrafos:
-            if len(mensagem_atual) + len(paragrafo) + 2 <= max_length:
-                mensagem_atual += paragrafo + "\n\n"
-            else:
-                if mensagem_atual:
-                    mensagens.append(mensagem_atual.strip())
-                mensagem_atual = paragrafo + "\n\n"
-        
-        if mensagem_atual:
-            mensagens.append(mensagem_atual.strip())
-    else:
-        mensagens = [mensagem]
+    mensagens = _split_message(mensagem)
     
+    # Determinar formato de payload com base no endpoint (igual para todas as partes)
+    use_number_text = urlparse(url).path.endswith("/send/text")
+    numero_sanitizado = _sanitize_number(telefone) or ""
+    method = getattr(settings, "whatsapp_method", "POST").upper()
+    # Log suave do token para depuração (parcialmente mascarado), uma vez por envio
+    if logger.isEnabledFor(logging.DEBUG):
+        tok = (settings.whatsapp_token or "").strip()
+        masked = (tok[:8] + "..." + tok[-4:]) if tok else "<vazio>"
+        logger.debug("Auth UAZ token (masked): %s len=%d", masked, len(tok))
+
     # Enviar cada parte
     try:
         for i, msg in enumerate(mensagens):
-            # Determinar formato de payload com base no endpoint
-            from urllib.parse import urlparse
-            import re
-            parsed_url = urlparse(url)
-            use_number_text = parsed_url.path.endswith("/send/text")
-            numero_sanitizado = re.sub(r"\D", "", telefone or "")
-
             payload_main = {"number": numero_sanitizado, "text": msg} if use_number_text else {"phone": telefone, "message": msg}
             payload_alt = {"phone": telefone, "message": msg} if use_number_text else {"number": numero_sanitizado, "text": msg}
-            
-            method = getattr(settings, "whatsapp_method", "POST").upper()
-            # Log suave do token para depuração (parcialmente mascarado)
-            try:
-                tok = (settings.whatsapp_token or "").strip()
-                masked = (tok[:8] + "..." + tok[-4:]) if tok else "<vazio>"
-                logger.info(f"Auth UAZ token (masked): {masked} len={len(tok)}")
-            except Exception:
-                pass
 
             if method == "GET":
-                logger.info(f"Enviando para UAZ API (GET): url={url} params={payload_main}")
-                response = requests.get(url, headers=headers, params=payload_main, timeout=10)
-                preview_body = (response.text or "")[:800]
-                logger.info(f"UAZ API retorno (GET): status={response.status_code} body={preview_body}")
+                logger.info("Enviando para UAZ API (GET): url=%s params=%s", url, payload_preview(payload_main, 200))
+                response = upstream.get(url, headers=headers, params=payload_main, timeout=10)
+                logger.info("UAZ API retorno (GET): status=%s body=%s", response.status_code, payload_preview(response.text))
             else:
-                logger.info(f"Enviando para UAZ API (POST): url={url} payload={payload_main}")
-                response = requests.post(url, headers=headers, json=payload_main, timeout=10)
-                preview_body = (response.text or "")[:800]
-                logger.info(f"UAZ API retorno (POST): status={response.status_code} body={preview_body}")
+                logger.info("Enviando para UAZ API (POST): url=%s payload=%s", url, payload_preview(payload_main, 200))
+                response = upstream.post(url, headers=headers, json=payload_main, timeout=10)
+                logger.info("UAZ API retorno (POST): status=%s body=%s", response.status_code, payload_preview(response.text))
 
             # Fallback em payload dentro do mesmo método
             if response.status_code >= 400:
                 if method == "GET":
-                    logger.warning(f"GET falhou com status {response.status_code}. Tentando GET com payload alternativo.")
-                    response = requests.get(url, headers=headers, params=payload_alt, timeout=10)
-                    preview_body = (response.text or "")[:800]
-                    logger.info(f"UAZ API retorno (GET alt): status={response.status_code} body={preview_body}")
+                    logger.warning("GET falhou com status %s. Tentando GET com payload alternativo.", response.status_code)
+                    response = upstream.get(url, headers=headers, params=payload_alt, timeout=10)
+                    logger.info("UAZ API retorno (GET alt): status=%s body=%s", response.status_code, payload_preview(response.text))
                 else:
-                    logger.warning(f"POST falhou com status {response.status_code}. Tentando POST com payload alternativo.")
-                    response = requests.post(url, headers=headers, json=payload_alt, timeout=10)
-                    preview_body = (response.text or "")[:800]
-                    logger.info(f"UAZ API retorno (POST alt): status={response.status_code} body={preview_body}")
+                    logger.warning("POST falhou com status %s. Tentando POST com payload alternativo.", response.status_code)
+                    response = upstream.post(url, headers=headers, json=payload_alt, timeout=10)
+                    logger.info("UAZ API retorno (POST alt): status=%s body=%s", response.status_code, payload_preview(response.text))
 
             # Fallback automático de método (trocar POST/GET) usando payload principal
             if response.status_code >= 400:
                 if method == "POST":
-                    logger.warning(f"POST ainda falhou com status {response.status_code}. Tentando GET com payload principal.")
-                    response = requests.get(url, headers=headers, params=payload_main, timeout=10)
-                    preview_body = (response.text or "")[:800]
-                    logger.info(f"UAZ API retorno (GET): status={response.status_code} body={preview_body}")
+                    logger.warning("POST ainda falhou com status %s. Tentando GET com payload principal.", response.status_code)
+                    response = upstream.get(url, headers=headers, params=payload_main, timeout=10)
+                    logger.info("UAZ API retorno (GET): status=%s body=%s", response.status_code, payload_preview(response.text))
                 else:
-                    logger.warning(f"GET ainda falhou com status {response.status_code}. Tentando POST com payload principal.")
-                    response = requests.post(url, headers=headers, json=payload_main, timeout=10)
-                    preview_body = (response.text or "")[:800]
-                    logger.info(f"UAZ API retorno (POST): status={response.status_code} body={preview_body}")
+                    logger.warning("GET ainda falhou com status %s. Tentando POST com payload principal.", response.status_code)
+                    response = upstream.post(url, headers=headers, json=payload_main, timeout=10)
+                    logger.info("UAZ API retorno (POST): status=%s body=%s", response.status_code, payload_preview(response.text))
 
             # Último fallback: método alternativo com payload alternativo
             if response.status_code >= 400:
                 if method == "POST":
-                    logger.warning(f"GET com payload principal falhou. Tentando GET com payload alternativo.")
-                    response = requests.get(url, headers=headers, params=payload_alt, timeout=10)
-                    preview_body = (response.text or "")[:800]
-                    logger.info(f"UAZ API retorno (GET alt): status={response.status_code} body={preview_body}")
+                    logger.warning("GET com payload principal falhou. Tentando GET com payload alternativo.")
+                    response = upstream.get(url, headers=headers, params=payload_alt, timeout=10)
+                    logger.info("UAZ API retorno (GET alt): status=%s body=%s", response.status_code, payload_preview(response.text))
                 else:
-                    logger.warning(f"POST com payload principal falhou. Tentando POST com payload alternativo.")
-                    response = requests.post(url, headers=headers, json=payload_alt, timeout=10)
-                    preview_body = (response.text or "")[:800]
-                    logger.info(f"UAZ API retorno (POST alt): status={response.status_code} body={preview_body}")
+                    logger.warning("POST com payload principal falhou. Tentando POST com payload alternativo.")
+                    response = upstream.post(url, headers=headers, json=payload_alt, timeout=10)
+                    logger.info("UAZ API retorno (POST alt): status=%s body=%s", response.status_code, payload_preview(response.text))
                 params = {"phone": telefone, "message": msg}
                 # Alguns provedores esperam token no query; manter no header por segurança
-                response_get = requests.get(url, headers=headers, params=params, timeout=10)
-                preview_body_get = (response_get.text or "")[:800]
-                logger.info(
-                    f"UAZ API retorno (GET): status={response_get.status_code} body={preview_body_get}"
-                )
+                response_get = upstream.get(url, headers=headers, params=params, timeout=10)
+                logger.info("UAZ API retorno (GET): status=%s body=%s", response_get.status_code, payload_preview(response_get.text))
                 response_get.raise_for_status()
             
-            logger.info(f"Mensagem {i+1}/{len(mensagens)} enviada para {telefone}")
+            logger.info("Mensagem %d/%d enviada para %s", i + 1, len(mensagens), telefone)
         
         return True
     
@@ -442,18 +219,13 @@ presence_sessions: Dict[str, Dict[str, Any]] = {}
 # Buffer de mensagens por telefone (evita múltiplos agregadores simultâneos)
 buffer_sessions: Dict[str, Dict[str, Any]] = {}
 
+# Tamanhos calculados no momento da coleta do /metrics
+ACTIVE_SESSIONS.set_function(lambda: len(presence_sessions), kind="presence")
+ACTIVE_SESSIONS.set_function(lambda: len(buffer_sessions), kind="buffer")
+QUEUE_DEPTH.set_function(log_queue_size, queue="log")
+
 
-def _sanitize_number(num: Optional[str]) -> Optional[str]:
-    if not num:
-        return None
-    import re
-    s = str(num)
-    if "@" in s:
-        s = s.split("@")[0]
-    if ":" in s:
-        s = s.split(":")[-1]
-    digits = re.sub(r"\D", "", s)
-    return digits or None
+_sanitize_number = sanitize_number
 
 
 def send_presence_signal(number: str, presence: str) -> bool:
@@ -463,7 +235,6 @@ def send_presence_signal(number: str, presence: str) -> bool:
     """
     base = (settings.whatsapp_api_url or "").rstrip("/")
     try:
-        from urllib.parse import urlparse
         parsed = urlparse(base)
         # Usar apenas domínio para presença; caminho de mensagem (ex.: /send/text) não serve
         base_domain = f"{parsed.scheme}://{parsed.netloc}" if parsed.scheme and parsed.netloc else base
@@ -489,44 +260,42 @@ def send_presence_signal(number: str, presence: str) -> bool:
 
     method = getattr(settings, "whatsapp_method", "POST").upper()
 
-    # Log token parcialmente mascarado
-    try:
+    # Log token parcialmente mascarado (apenas em DEBUG)
+    if logger.isEnabledFor(logging.DEBUG):
         tok = (settings.whatsapp_token or "").strip()
         masked = (tok[:8] + "..." + tok[-4:]) if tok else "<vazio>"
-        logger.info(f"Auth UAZ token (masked): {masked} len={len(tok)}")
-    except Exception:
-        pass
+        logger.debug("Auth UAZ token (masked): %s len=%d", masked, len(tok))
 
     last_status = None
     last_body = ""
     for url in url_candidates:
         try:
             if method == "GET":
-                logger.info(f"Presença (GET): url={url} params={payload_main}")
-                response = requests.get(url, headers=headers, params=payload_main, timeout=10)
+                logger.info("Presença (GET): url=%s params=%s", url, payload_main)
+                response = upstream.get(url, headers=headers, params=payload_main, timeout=10)
             else:
-                logger.info(f"Presença (POST): url={url} payload={payload_main}")
-                response = requests.post(url, headers=headers, json=payload_main, timeout=10)
+                logger.info("Presença (POST): url=%s payload=%s", url, payload_main)
+                response = upstream.post(url, headers=headers, json=payload_main, timeout=10)
             last_status = response.status_code
-            last_body = (response.text or "")[:400]
-            logger.info(f"UAZ retorno presença: status={last_status} body={last_body}")
+            last_body = response.text or ""
+            logger.info("UAZ retorno presença: status=%s body=%s", last_status, payload_preview(last_body, 400))
             if response.status_code < 400:
                 return True
 
             # tenta payload alternativo
             if method == "GET":
-                response = requests.get(url, headers=headers, params=payload_alt, timeout=10)
+                response = upstream.get(url, headers=headers, params=payload_alt, timeout=10)
             else:
-                response = requests.post(url, headers=headers, json=payload_alt, timeout=10)
+                response = upstream.post(url, headers=headers, json=payload_alt, timeout=10)
             last_status = response.status_code
-            last_body = (response.text or "")[:400]
-            logger.info(f"UAZ retorno presença (alt): status={last_status} body={last_body}")
+            last_body = response.text or ""
+            logger.info("UAZ retorno presença (alt): status=%s body=%s", last_status, payload_preview(last_body, 400))
             if response.status_code < 400:
                 return True
         except requests.exceptions.RequestException as e:
             logger.warning(f"Falha ao enviar presença em {url}: {e}")
 
-    logger.error(f"Falha ao enviar presença: status={last_status} body={last_body}")
+    logger.error("Falha ao enviar presença: status=%s body=%s", last_status, payload_preview(last_body, 400))
     return False
 
 
@@ -596,6 +365,7 @@ def presence_loop(number: str, presence: str, delay_ms: Optional[int] = None):
     presence_sessions.pop(n, None)
 
 
+@timed_stage("process_message")
 def process_message_async(telefone: str, mensagem: str, message_id: Optional[str] = None):
     """
     Processa a mensagem com o agente e envia resposta (execução assíncrona).
@@ -612,8 +382,9 @@ def process_message_async(telefone: str, mensagem: str, message_id: Optional[str
         if not isinstance(final_text, str) or not final_text.strip():
             final_text = "Desculpe, não consegui processar sua mensagem. Por favor, tente novamente."
 
-        # Enviar resposta
-        success = send_whatsapp_message(telefone, final_text)
+        # Enviar resposta (mesmo parcial): o envio não fica sujeito ao prazo do agente
+        with deadline.unbounded():
+            success = send_whatsapp_message(telefone, final_text)
 
         if success:
             logger.info(f"✅ Resposta enviada com sucesso para {telefone}")
@@ -624,28 +395,37 @@ def process_message_async(telefone: str, mensagem: str, message_id: Optional[str
         logger.error(f"Erro no processamento assíncrono: {e}", exc_info=True)
         # Tentar enviar mensagem de erro
         try:
-            send_whatsapp_message(
-                telefone,
-                "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente."
-            )
+            with deadline.unbounded():
+                send_whatsapp_message(
+                    telefone,
+                    "Desculpe, ocorreu um erro ao processar sua mensagem. Por favor, tente novamente."
+                )
         except Exception:
             pass
     finally:
         # Cancelar presença em qualquer caso (com ou sem resposta)
         try:
-            cancel_presence(telefone)
+            with deadline.unbounded():
+                cancel_presence(telefone)
         except Exception:
             pass
 
 
 def buffer_loop(telefone: str):
-    """Agrega mensagens em janelas de 5s até 3 tentativas sem novas mensagens."""
+    """
+    Agrega mensagens em janelas de `buffer_window_seconds` (padrão 5s) até
+    `buffer_idle_checks` (padrão 3) janelas seguidas sem novas mensagens.
+    """
     try:
+        started = time.perf_counter()
         numero = _sanitize_number(telefone) or telefone
+        wait_span = tracing.start_span("buffer_wait", telefone=numero)
         prev_len = get_buffer_length(numero)
+        window = float(settings.buffer_window_seconds)
+        idle_checks = int(settings.buffer_idle_checks)
         consecutive_no_new = 0
-        while consecutive_no_new < 3:
-            time.sleep(5)
+        while consecutive_no_new < idle_checks:
+            time.sleep(window)
             cur_len = get_buffer_length(numero)
             if cur_len > prev_len:
                 prev_len = cur_len
@@ -654,11 +434,16 @@ def buffer_loop(telefone: str):
                 consecutive_no_new += 1
 
         msgs = pop_all_messages(numero)
+        STAGE_LATENCY.observe(time.perf_counter() - started, stage="buffer_wait")
+        wait_span.set_attribute("messages", len(msgs))
+        wait_span.end()
         combined = " ".join([m for m in msgs if isinstance(m, str) and m.strip()])
         if not combined.strip():
             combined = msgs[-1] if msgs else ""
         if combined:
-            process_message_async(numero, combined)
+            # O prazo da resposta começa a contar na liberação do buffer
+            with deadline.budget(float(settings.reply_deadline_seconds)):
+                process_message_async(numero, combined)
     except Exception as e:
         logger.error(f"Erro no buffer_loop: {e}", exc_info=True)
     finally:
@@ -692,6 +477,22 @@ async def health_check():
         "timestamp": datetime.now().isoformat()
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Prontidão: 503 até o aquecimento da inicialização terminar"""
+    body = {
+        "status": "ready" if _startup_state["ready"] else "starting",
+        "phases": _startup_state["phases"],
+    }
+    return JSONResponse(body, status_code=200 if _startup_state["ready"] else 503)
+
+
+@app.get("/metrics")
+async def metrics():
+    """Métricas no formato de exposição do Prometheus"""
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
 @app.post("/")
 async def root_post(request: Request, background_tasks: BackgroundTasks):
     """
@@ -702,6 +503,7 @@ async def root_post(request: Request, background_tasks: BackgroundTasks):
 
 
 @app.post("/webhook/whatsapp")
+@timed_stage("webhook")
 async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
     """
     Webhook para receber mensagens do WhatsApp
@@ -711,15 +513,19 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
     """
     try:
         # Receber payload e normalizar
-        payload = await request.json()
-        logger.info(f"Webhook recebido: {payload}")
+        payload = fast_json.loads(await request.body())
+        if sample_payload():
+            logger.info("Webhook recebido: %s", payload_preview(payload))
 
         normalized = _extract_incoming(payload)
-        telefone = normalized.get("telefone")
-        mensagem_texto = normalized.get("mensagem_texto")
-        message_type = normalized.get("message_type")
-        message_id = normalized.get("message_id")
-        from_me = bool(normalized.get("from_me") or False)
+        telefone = normalized.telefone
+        mensagem_texto = normalized.mensagem_texto
+        message_type = normalized.message_type
+        message_id = normalized.message_id
+        from_me = normalized.from_me
+        # Número sanitizado uma única vez para todo o fluxo do webhook
+        numero = _sanitize_number(telefone) or telefone
+        tracing.set_attributes(telefone=numero, message_type=message_type or "", from_me=bool(from_me))
 
         # Construir preview seguro para log
         if isinstance(mensagem_texto, str):
@@ -753,7 +559,6 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
                     logger.warning(f"Falha ao salvar fromMe no histórico: {e}")
                 # Ativar cooldown por 60s para o cliente
                 try:
-                    numero = _sanitize_number(telefone) or telefone
                     set_agent_cooldown(numero, ttl_seconds=60)
                     logger.info(f"Cooldown ativado para {numero} por 60s após envio do agente")
                 except Exception as e:
@@ -771,11 +576,11 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
 
         # Filtro: ignorar mensagens vindas do próprio número do agente
         try:
-            incoming_num = _sanitize_number(telefone) or telefone
+            incoming_num = numero
             agent_raw = getattr(settings, "whatsapp_agent_number", None)
             agent_num = _sanitize_number(agent_raw) if agent_raw else None
             try:
-                logger.info(f"Filtro auto-mensagem: incoming={incoming_num} agent={agent_num}")
+                logger.debug("Filtro auto-mensagem: incoming=%s agent=%s", incoming_num, agent_num)
             except Exception:
                 pass
             if agent_num and incoming_num == agent_num:
@@ -789,7 +594,6 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
                     logger.warning(f"Falha ao salvar auto-mensagem no histórico: {e}")
                 # Ativar cooldown por 60s
                 try:
-                    numero = _sanitize_number(telefone) or telefone
                     set_agent_cooldown(numero, ttl_seconds=60)
                     logger.info(f"Cooldown ativado para {numero} por 60s após auto-mensagem do agente")
                 except Exception as e:
@@ -808,7 +612,6 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
 
         # Checar cooldown antes de iniciar presença/agregação
         try:
-            numero = _sanitize_number(telefone) or telefone
             active, ttl = is_agent_in_cooldown(numero)
             if active:
                 logger.info(f"Cooldown ativo para {numero} (TTL restante ~{ttl}s). Pausando automação.")
@@ -831,13 +634,12 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
 
         # Iniciar indicação de digitando enquanto processa (evitar threads duplicadas)
         try:
-            numero = _sanitize_number(telefone) or telefone
             sess = presence_sessions.get(numero)
             if (not sess) or sess.get("cancel"):
                 # Marcar sessão antes de iniciar para evitar corrida e múltiplas threads
                 presence_sessions[numero] = {"cancel": False, "running": True}
                 threading.Thread(
-                    target=presence_loop,
+                    target=tracing.bind_context(presence_loop),
                     args=(numero, "composing", 30000),  # 30s de presença enquanto agregamos
                     daemon=True,
                 ).start()
@@ -847,9 +649,8 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
             # Se houver falha ao iniciar presença, não bloquear o restante do fluxo
             pass
 
-        # Empilhar no buffer e iniciar agregação 5s x 3
+        # Empilhar no buffer e iniciar agregação (janela x checagens ociosas)
         try:
-            numero = _sanitize_number(telefone) or telefone
             ok_push = push_message_to_buffer(numero, mensagem_texto)
             if not ok_push:
                 # fallback: processar imediatamente
@@ -863,7 +664,7 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
                 if not buffer_sessions.get(numero):
                     buffer_sessions[numero] = {"running": True}
                     # Usar o número sanitizado para consistência
-                    threading.Thread(target=buffer_loop, args=(numero,), daemon=True).start()
+                    threading.Thread(target=tracing.bind_context(buffer_loop), args=(numero,), daemon=True).start()
         except Exception as e:
             logger.error(f"Erro ao agendar agregação: {e}")
             background_tasks.add_task(
@@ -878,7 +679,7 @@ async def webhook_whatsapp(request: Request, background_tasks: BackgroundTasks):
             status_code=200,
             content={
                 "status": "buffering",
-                "message": "Aguardando até 15s para agrupar mensagens do cliente",
+                "message": f"Aguardando até {settings.buffer_window_seconds * settings.buffer_idle_checks:g}s para agrupar mensagens do cliente",
             }
         )
 
@@ -970,6 +771,17 @@ async def agent_dryrun_post(req: DryRunRequest) -> AgentResponse:
         )
 
 
+@app.get("/pedidos/{telefone}")
+async def pedidos_status(telefone: str):
+    """
+    Situação das operações de pedido do telefone na fila local
+    (pending, sending, delivered ou failed), mais recentes primeiro.
+    """
+    numero = sanitize_number(telefone) or telefone
+    entries = await asyncio.get_running_loop().run_in_executor(None, order_outbox.status_by_phone, numero)
+    return JSONResponse({"telefone": numero, "pedidos": entries})
+
+
 @app.post("/presence")
 async def presence(request: PresenceRequest, background_tasks: BackgroundTasks):
     """Envia atualização de presença de forma assíncrona.
@@ -993,7 +805,7 @@ async def presence(request: PresenceRequest, background_tasks: BackgroundTasks):
                 logger.info(f"Ignorando nova presença: sessão já existente/cancelada para {numero}")
             else:
                 threading.Thread(
-                    target=presence_loop,
+                    target=tracing.bind_context(presence_loop),
                     args=(numero, presence_type, request.delay),
                     daemon=True,
                 ).start()
@@ -1078,6 +890,80 @@ async def send_whatsapp(message: WhatsAppMessage):
 # Inicialização
 # ============================================
 
+# Estado do aquecimento exposto em /ready
+_startup_state: Dict[str, Any] = {"ready": False, "phases": {}}
+
+
+def _warmup_phase(name: str, fn) -> None:
+    """Executa uma fase do aquecimento registrando duração e resultado (falhas não interrompem as demais)."""
+    start = time.perf_counter()
+    try:
+        detail = fn()
+        status = "ok" if detail is not False else "indisponível"
+    except Exception as e:
+        status = "erro"
+        logger.warning(f"Aquecimento '{name}' falhou: {e}")
+    elapsed = time.perf_counter() - start
+    STARTUP_PHASE.set(elapsed, phase=name)
+    _startup_state["phases"][name] = {"status": status, "ms": round(elapsed * 1000, 1)}
+    logger.info(f"⏱️  Aquecimento {name}: {status} em {elapsed * 1000:.0f}ms")
+
+
+def _warmup_postgres() -> bool:
+    import psycopg2
+
+    with psycopg2.connect(settings.postgres_connection_string, connect_timeout=5) as conn:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1")
+    return True
+
+
+def _warmup_http() -> bool:
+    """Abre (e deixa no pool da sessão compartilhada) uma conexão por host externo."""
+    urls = (settings.whatsapp_api_url, settings.supermercado_base_url,
+            settings.estoque_ean_base_url, settings.smart_responder_url)
+    origins = {f"{u.scheme}://{u.netloc}" for u in (urlparse((url or "").strip()) for url in urls) if u.netloc}
+    session = upstream.get_session()
+    opened = 0
+    for origin in sorted(origins):
+        try:
+            session.head(f"{origin}/", timeout=settings.warmup_http_timeout)
+            opened += 1
+        except requests.RequestException as e:
+            logger.warning(f"Aquecimento HTTP: {origin} inacessível ({e})")
+    return opened == len(origins)
+
+
+def run_warmup() -> None:
+    """
+    Aquece o processo antes de atender: grafo do agente (prompt + cliente LLM),
+    Redis, Postgres, pool HTTP e, opcionalmente, uma chamada mínima ao LLM.
+    """
+    total = time.perf_counter()
+    try:
+        with tracing.span("startup.warmup"):
+            _warmup_phase("agent_graph", get_agent_graph)
+            if settings.llm_cascade_enabled:
+                _warmup_phase("agent_graph_fast", get_fast_agent_graph)
+            _warmup_phase("redis", lambda: get_redis_client() is not None)
+            if settings.postgres_connection_string:
+                _warmup_phase("postgres", _warmup_postgres)
+            if settings.warmup_http:
+                _warmup_phase("http", _warmup_http)
+            if settings.warmup_llm:
+                _warmup_phase("llm", warmup_llm)
+    finally:
+        # Aquecimento é otimização: mesmo com erro fora das fases o /ready não pode ficar preso em 503
+        _startup_state["ready"] = True
+        logger.info(f"✅ Pronto para atender (aquecimento em {(time.perf_counter() - total) * 1000:.0f}ms)")
+
+
+def _log_warmup_result(future: "asyncio.Future") -> None:
+    error = future.exception() if not future.cancelled() else None
+    if error is not None:
+        logger.error("Aquecimento interrompido", exc_info=(type(error), error, error.__traceback__))
+
+
 @app.on_event("startup")
 async def startup_event():
     """Executado ao iniciar o servidor"""
@@ -1088,12 +974,25 @@ async def startup_event():
     logger.info(f"Modelo LLM: {settings.llm_model}")
     logger.info(f"Host: {settings.server_host}:{settings.server_port}")
     logger.info("=" * 60)
+    if settings.order_outbox_enabled:
+        # Entrega pedidos que ficaram na fila de uma execução anterior
+        order_outbox.ensure_dispatcher()
+    if settings.erp_snapshot_enabled:
+        erp_snapshot.start_sync()
+    if settings.warmup_enabled:
+        # Em segundo plano: /health responde já, /ready só ao final do aquecimento
+        asyncio.get_running_loop().run_in_executor(None, run_warmup).add_done_callback(_log_warmup_result)
+    else:
+        _startup_state["ready"] = True
 
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Executado ao desligar o servidor"""
     logger.info("🛑 Desligando Servidor do Agente de Supermercado")
+    order_outbox.stop_dispatcher()
+    erp_snapshot.stop_sync()
+    tracing.flush()
 
 
 # ============================================
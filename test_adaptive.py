@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Teste dos timeouts adaptativos e do orçamento de retentativas (tools/adaptive.py).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import random
+
+from config.settings import settings
+from mocks import MockServices, ServiceProfile
+from tools import adaptive
+from tools.http_tools import estoque_preco
+
+
+def _ajustar(ajustes):
+    original = {k: getattr(settings, k) for k in ajustes}
+    for k, v in ajustes.items():
+        setattr(settings, k, v)
+    return original
+
+
+def test_esboco_de_percentis():
+    """O p99 do esboço fica dentro do erro relativo configurado"""
+    rng = random.Random(3)
+    valores = [rng.lognormvariate(-1.5, 0.8) for _ in range(5000)]
+    sketch = adaptive.LatencySketch(0.02)
+    for v in valores:
+        sketch.add(v)
+    exato = sorted(valores)[int(0.99 * (len(valores) - 1))]
+    assert abs(sketch.quantile(0.99) - exato) / exato < 0.03, (sketch.quantile(0.99), exato)
+    assert len(sketch.buckets) < 300
+    print(f"🧪 p99 exato {exato:.3f}s, esboço {sketch.quantile(0.99):.3f}s em {len(sketch.buckets)} baldes")
+
+
+def test_timeout_acompanha_o_p99():
+    """Sem amostras vale o timeout fixo; depois, múltiplo do p99 entre o mínimo e o máximo"""
+    original = _ajustar({"adaptive_timeout_enabled": True, "adaptive_min_samples": 20,
+                         "adaptive_timeout_multiplier": 3.0, "adaptive_timeout_min_seconds": 1.0,
+                         "adaptive_timeout_max_seconds": 30.0})
+    try:
+        assert adaptive.timeout_for("erp-teste", 10) == 10
+        for _ in range(50):
+            adaptive.observe("erp-teste", 0.2)
+        assert adaptive.timeout_for("erp-teste", 10) == 1.0  # 3 × 0.2s abaixo do mínimo
+        for _ in range(5):
+            adaptive.observe("funcao-fria", 4.0)
+        for _ in range(20):
+            adaptive.observe("funcao-fria", 0.5)
+        assert 11.0 < adaptive.timeout_for("funcao-fria", 15) <= 12.5  # cold starts no p99: 3 × 4s
+        assert adaptive.timeout_for("funcao-fria", (3, 15))[0] == 3
+        print("🧪 Timeout adaptativo por host")
+    finally:
+        adaptive.reset()
+        _ajustar(original)
+
+
+def _com_erp(profile, ajustes, fn):
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in keys}
+    original.update(_ajustar(ajustes))
+    with MockServices(profiles={"erp": profile}) as mocks:
+        mocks.apply_to_settings(settings)
+        try:
+            return fn(mocks)
+        finally:
+            adaptive.reset()
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+def test_retentativa_recupera_falha_transitoria():
+    """Um 503 isolado do ERP é repetido e o cliente recebe o preço"""
+    # Semente cuja primeira requisição falha e a segunda não
+    seed = next(s for s in range(1000) if (lambda r: r.random() < 0.5 <= r.random())(random.Random(s)))
+    profile = ServiceProfile.parse("0", error_rate=0.5, seed=seed)
+    resultado, chamadas = _com_erp(profile, {"breaker_enabled": False},
+                                   lambda mocks: (estoque_preco("7896100100000"), mocks.requests["erp"]))
+    assert "27.9" in resultado and chamadas == 2, (resultado, chamadas)
+    print("🧪 503 transitório recuperado com uma retentativa")
+
+
+def test_orcamento_de_retentativas():
+    """ERP fora do ar: as retentativas ficam limitadas ao orçamento, não dobram o tráfego"""
+    ajustes = {"breaker_enabled": False, "retry_budget_ratio": 0.1, "retry_budget_burst": 1.0}
+
+    def rodar(mocks):
+        for _ in range(10):
+            assert "503" in estoque_preco("7896100100000")
+        host = mocks.base_url.split("://", 1)[1]
+        return mocks.requests["erp"], adaptive.UPSTREAM_RETRIES.value(host=host, result="budget_exhausted")
+
+    chamadas, recusadas = _com_erp(ServiceProfile.parse("0", error_rate=1.0), ajustes, rodar)
+    # 1 ficha inicial; depois 0.1 por requisição não chega a outra ficha em 10 requisições
+    assert chamadas == 11 and recusadas == 9, (chamadas, recusadas)
+    print(f"🧪 {chamadas} requisições ao ERP para 10 consultas")
+
+
+if __name__ == "__main__":
+    test_esboco_de_percentis()
+    test_timeout_acompanha_o_p99()
+    test_retentativa_recupera_falha_transitoria()
+    test_orcamento_de_retentativas()
+    print("✅ Todos os testes de timeout adaptativo passaram")
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Teste do carrinho por cliente (tools/cart.py) e das ferramentas do agente.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import tempfile
+import threading
+
+from langchain_core.messages import AIMessage
+
+import agent_langgraph_simple as agente
+from config.settings import settings
+from mocks import MockServices
+from tools import cart, circuit_breaker, order_outbox
+from tools.tool_node import InstrumentedToolNode
+
+ARROZ = "7896100100000"
+
+
+def _com_mocks(fn, **ajustes):
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in (*keys, *ajustes)}
+    with MockServices() as mocks:
+        mocks.apply_to_settings(settings)
+        for k, v in ajustes.items():
+            setattr(settings, k, v)
+        try:
+            return fn(mocks)
+        finally:
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+def test_totais_calculados_localmente():
+    """Preço vem do ERP uma vez; quantidades, subtotais e total são calculados no carrinho"""
+    def rodar(mocks):
+        telefone = "5585000000049"
+        cart.clear(telefone)
+        cart.add(telefone, ARROZ, 2)
+        resumo = cart.add(telefone, ARROZ, 1)
+        assert "3x ARROZ CAMIL TIPO 1 5KG" in resumo and "Total: R$ 83,70" in resumo, resumo
+        assert mocks.requests["erp"] == 1
+        assert "Total: R$ 55,80" in cart.remove(telefone, ARROZ, 1)
+        assert "não foi adicionado" in cart.add(telefone, "123", 1)
+        assert cart.remove(telefone, ARROZ) == "Carrinho vazio."
+
+    _com_mocks(rodar)
+    print("🧪 Totais do carrinho")
+
+
+def test_adicoes_em_paralelo_nao_se_perdem():
+    """Chamadas de cart_add em paralelo (mesmo turno) somam todas as quantidades"""
+    def rodar(mocks):
+        telefone = "5585000000052"
+        cart.clear(telefone)
+        threads = [threading.Thread(target=cart.add, args=(telefone, ARROZ, 1)) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        cart_items = cart.items(telefone)
+        assert len(cart_items) == 1 and cart_items[0]["quantidade"] == 8, cart_items
+        assert "Total: R$ 223,20" in cart.render(cart_items)
+        cart.clear(telefone)
+
+    _com_mocks(rodar)
+    print("🧪 Adições em paralelo no carrinho")
+
+
+def test_erp_fora_usa_preco_guardado_como_provisorio():
+    """Com o ERP fora, o preço do circuit breaker entra no carrinho e o total sai como provisório"""
+    def rodar(mocks):
+        telefone = "5585000000053"
+        cart.clear(telefone)
+        cart.add(telefone, ARROZ, 1)  # guarda o último resultado bom
+        cart.clear(telefone)
+        mocks.profiles["erp"].error_rate = 1.0
+        try:
+            resumo = cart.add(telefone, ARROZ, 2)
+        finally:
+            circuit_breaker.reset()
+        assert "2x ARROZ CAMIL TIPO 1 5KG" in resumo and "(preço a confirmar)" in resumo, resumo
+        assert "Total: R$ 55,80 (provisório" in resumo
+        pedido = {}
+        assert cart.fill_order(telefone, pedido) and pedido["preco_a_confirmar"] is True
+        cart.clear(telefone)
+
+    _com_mocks(rodar, breaker_enabled=True, breaker_min_calls=3, breaker_error_rate=0.5)
+    print("🧪 Carrinho com preço guardado durante queda do ERP")
+
+
+def test_ferramentas_usam_o_telefone_da_conversa():
+    """As ferramentas pegam o telefone do thread_id e o resumo entra no contexto do prompt"""
+    def rodar(mocks):
+        telefone = "5585000000050"
+        cart.clear(telefone)
+        config = {"configurable": {"thread_id": telefone}}
+        chamada = AIMessage(content="", tool_calls=[
+            {"name": "cart_add", "args": {"ean": ARROZ, "quantidade": 2}, "id": "c1"},
+        ])
+        resultado = InstrumentedToolNode(agente.CART_TOOLS).invoke({"messages": [chamada]}, config)
+        assert "Total: R$ 55,80" in resultado["messages"][0].content
+        msgs = agente.make_cached_prompt("P")({"messages": []}, config)
+        assert "2x ARROZ CAMIL TIPO 1 5KG" in msgs[-1].content
+        vazio = agente.make_cached_prompt("P")({"messages": []}, {"configurable": {"thread_id": "5585000000099"}})
+        assert "Carrinho" not in vazio[-1].content
+        cart.clear(telefone)
+
+    _com_mocks(rodar)
+    print("🧪 Ferramentas do carrinho no grafo")
+
+
+def test_prompt_so_cita_ferramentas_ligadas():
+    """Com o carrinho desligado, o prompt não manda usar cart_* nem montar o pedido do carrinho"""
+    original = settings.cart_enabled
+    try:
+        settings.cart_enabled = True
+        ligado = agente.load_system_prompt()
+        assert "**cart_add**" in ligado and "saem do carrinho" in ligado
+        settings.cart_enabled = False
+        desligado = agente.load_system_prompt()
+        assert "cart_" not in desligado and "carrinho" not in desligado, desligado
+        assert "{" not in "".join(l for l in desligado.splitlines() if l.startswith(("4.", "8.")))
+        for texto in (ligado, desligado):
+            assert "alterar_tool" not in texto
+    finally:
+        settings.cart_enabled = original
+    print("🧪 Prompt lista só as ferramentas ligadas")
+
+
+def test_pedido_montado_do_carrinho():
+    """pedidos_tool sem itens envia o carrinho (itens + total) e o esvazia"""
+    def rodar(mocks):
+        telefone = "5585000000051"
+        cart.clear(telefone)
+        cart.add(telefone, ARROZ, 2)
+        resultado = agente.pedidos_tool.invoke({"json_body": json.dumps({"cliente": "Ana"})},
+                                               {"configurable": {"thread_id": telefone}})
+        assert resultado.startswith("✅"), resultado
+        with order_outbox._lock:
+            row = order_outbox._connection().execute("SELECT payload FROM outbox").fetchone()
+        pedido = json.loads(row["payload"])
+        assert pedido["total"] == 55.8 and pedido["itens"][0]["ean"] == ARROZ
+        assert pedido["telefone"] == telefone
+        assert cart.summary(telefone) == "Carrinho vazio."
+        order_outbox.stop_dispatcher()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        _com_mocks(rodar, order_outbox_path=os.path.join(tmp, "outbox.sqlite3"))
+    print("🧪 Pedido a partir do carrinho")
+
+
+if __name__ == "__main__":
+    test_totais_calculados_localmente()
+    test_adicoes_em_paralelo_nao_se_perdem()
+    test_erp_fora_usa_preco_guardado_como_provisorio()
+    test_ferramentas_usam_o_telefone_da_conversa()
+    test_prompt_so_cita_ferramentas_ligadas()
+    test_pedido_montado_do_carrinho()
+    print("✅ Todos os testes do carrinho passaram")
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Teste dos cassetes de gravação/reprodução (tools/cassette.py):
+HTTP via tools.upstream contra os serviços simulados e LLM com modelo falso.
+"""
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from config.settings import settings
+from mocks import MockServices
+from tools import cassette, upstream
+
+
+class _Cassete:
+    """Ativa um cassete temporário e restaura as configurações ao sair."""
+
+    def __init__(self, mode: str, directory: str):
+        self.mode, self.directory = mode, directory
+
+    def __enter__(self):
+        self._saved = (settings.cassette_mode, settings.cassette_dir, settings.cassette_name)
+        settings.cassette_mode, settings.cassette_dir, settings.cassette_name = self.mode, self.directory, "teste"
+        cassette.reset()
+        return self
+
+    def __exit__(self, *exc):
+        settings.cassette_mode, settings.cassette_dir, settings.cassette_name = self._saved
+        cassette.reset()
+
+
+def test_http_grava_e_reproduz():
+    """Resposta gravada do ERP é reproduzida com o serviço desligado"""
+    with tempfile.TemporaryDirectory() as tmp:
+        with MockServices() as mocks:
+            url = f"{mocks.base_url}/erp/ean/7896100100000"
+            with _Cassete("record", tmp):
+                gravada = upstream.get(url, params={"b": 2, "a": 1}, timeout=5).json()
+            assert mocks.requests["erp"] == 1
+
+        with _Cassete("replay", tmp):
+            # mesma requisição com parâmetros em outra ordem → mesmo hash
+            resp = upstream.get(url, params={"a": 1, "b": 2}, timeout=5)
+            assert resp.status_code == 200
+            assert resp.json() == gravada
+            try:
+                upstream.get(f"{url}9", timeout=5)
+                assert False, "requisição não gravada deveria falhar no replay"
+            except cassette.CassetteMiss:
+                pass
+        print(f"🧪 HTTP reproduzido: {len(gravada)} item(ns)")
+
+
+def test_llm_grava_e_reproduz():
+    """Respostas do LLM (com tool_calls) voltam idênticas, mesmo com horário diferente no prompt"""
+    chamada = AIMessage(content="", tool_calls=[{"name": "ean", "args": {"query": "arroz"}, "id": "call_1"}])
+    final = AIMessage(content="Temos arroz!")
+
+    def prompt(hora):
+        return [SystemMessage(content=f"Agora: 19/10/2026 às {hora}"), HumanMessage(content="quero arroz")]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        with _Cassete("record", tmp):
+            llm = cassette.wrap_llm(GenericFakeChatModel(messages=iter([chamada, final])))
+            r1 = llm.invoke(prompt("10:00:00"))
+            r2 = llm.invoke(prompt("10:00:00"))
+
+        class _SemRede(GenericFakeChatModel):
+            def _generate(self, *args, **kwargs):
+                raise AssertionError("replay não deve chamar o modelo real")
+
+        with _Cassete("replay", tmp):
+            llm = cassette.wrap_llm(_SemRede(messages=iter([])))
+            p1 = llm.invoke(prompt("18:30:59"))
+            p2 = llm.invoke(prompt("18:30:59"))
+
+    assert p1.tool_calls[0]["name"] == "ean" and p1.tool_calls[0]["args"] == r1.tool_calls[0]["args"]
+    assert p2.content == r2.content == "Temos arroz!"
+    print("🧪 LLM reproduzido na ordem gravada")
+
+
+def test_modo_off_nao_envolve():
+    """Com cassette_mode=off o LLM é devolvido sem alteração"""
+    llm = GenericFakeChatModel(messages=iter([]))
+    assert settings.cassette_mode == "off"
+    assert cassette.wrap_llm(llm) is llm
+
+
+if __name__ == "__main__":
+    test_http_grava_e_reproduz()
+    test_llm_grava_e_reproduz()
+    test_modo_off_nao_envolve()
+    print("✅ Todos os testes de cassete passaram")
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Teste dos circuit breakers por serviço externo e do último resultado bom
+(tools/circuit_breaker.py + tools/upstream.py).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from config.metrics import REGISTRY
+from config.settings import settings
+from mocks import MockServices
+from tools import circuit_breaker
+from tools.http_tools import estoque_preco
+
+_BREAKER_SETTINGS = {"breaker_enabled": True, "breaker_window_seconds": 30.0, "breaker_min_calls": 3,
+                     "breaker_error_rate": 0.5, "breaker_open_seconds": 0.5}
+
+
+def _ajustar(ajustes):
+    original = {k: getattr(settings, k) for k in ajustes}
+    for k, v in ajustes.items():
+        setattr(settings, k, v)
+    return original
+
+
+def test_estados_do_circuito():
+    """closed → open após erros na janela → half_open com uma chamada de teste → closed"""
+    original = _ajustar(_BREAKER_SETTINGS)
+    try:
+        breaker = circuit_breaker.for_host("teste-estados:1")
+        for _ in range(3):
+            assert breaker.allow()
+            breaker.record(False, 0.01)
+        assert breaker.state() == circuit_breaker.OPEN
+        assert not breaker.allow()
+        assert circuit_breaker.CIRCUIT_REJECTED.value(host="teste-estados:1") == 1
+
+        time.sleep(0.6)
+        assert breaker.state() == circuit_breaker.HALF_OPEN
+        assert breaker.allow()
+        # Só uma chamada de teste por vez: outra thread é recusada enquanto ela não volta
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            assert not pool.submit(breaker.allow).result()
+        breaker.record(True, 0.01)
+        assert breaker.state() == circuit_breaker.CLOSED
+        assert 'agente_circuit_state{host="teste-estados:1"} 0' in REGISTRY.render()
+        print("🧪 closed → open → half_open → closed")
+    finally:
+        circuit_breaker.reset()
+        _ajustar(original)
+
+
+def test_erp_fora_do_ar_usa_ultimo_resultado():
+    """Com o ERP devolvendo 503 o preço vem do último resultado bom e o circuito para de chamar o ERP"""
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in keys}
+    original.update(_ajustar(_BREAKER_SETTINGS))
+    original_idade = settings.breaker_price_fallback_max_age_seconds
+    with MockServices() as mocks:
+        mocks.apply_to_settings(settings)
+        try:
+            assert "27.9" in estoque_preco("7896100100000")
+            mocks.profiles["erp"].error_rate = 1.0
+
+            for _ in range(3):
+                antigo = estoque_preco("7896100100000")
+                assert "27.9" in antigo and antigo.startswith("⚠️") and "pode ter mudado" in antigo
+            host = mocks.base_url.split("://", 1)[1]
+            assert circuit_breaker.for_host(host).state() == circuit_breaker.OPEN
+            assert circuit_breaker.FALLBACK_SERVED.value(host=host, result="hit") == 3
+
+            # Circuito aberto: falha na hora, sem requisição ao ERP
+            chamadas = mocks.requests["erp"]
+            assert "27.9" in estoque_preco("7896100100000")
+            assert "Circuito aberto" in estoque_preco("7896100100017")
+            assert mocks.requests["erp"] == chamadas
+            assert f'agente_circuit_state{{host="{host}"}} 2' in REGISTRY.render()
+
+            # Preço guardado há mais que o limite não é servido
+            settings.breaker_price_fallback_max_age_seconds = 0.0
+            assert "Circuito aberto" in estoque_preco("7896100100000")
+            settings.breaker_price_fallback_max_age_seconds = original_idade
+
+            # ERP de volta: a chamada de teste fecha o circuito
+            mocks.profiles["erp"].error_rate = 0.0
+            time.sleep(0.6)
+            ao_vivo = estoque_preco("7896100100000")
+            assert "27.9" in ao_vivo and not ao_vivo.startswith("⚠️")
+            assert circuit_breaker.for_host(host).state() == circuit_breaker.CLOSED
+            assert mocks.requests["erp"] == chamadas + 1
+            print(f"🧪 Requisições ao ERP: {mocks.requests['erp']}")
+        finally:
+            circuit_breaker.reset()
+            settings.breaker_price_fallback_max_age_seconds = original_idade
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+if __name__ == "__main__":
+    test_estados_do_circuito()
+    test_erp_fora_do_ar_usa_ultimo_resultado()
+    print("✅ Todos os testes de circuit breaker passaram")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Teste do prazo de ponta a ponta da resposta (tools/deadline.py) e da resposta
+parcial do agente quando o prazo ou o limite de passos acaba.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import time
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+import agent_langgraph_simple as agente
+from config.settings import settings
+from mocks import MockServices, ServiceProfile
+from tools import deadline
+from tools.http_tools import estoque_preco
+
+_AGENT_SETTINGS = ("reply_deadline_seconds", "deadline_min_tool_seconds", "deadline_min_llm_seconds",
+                   "agent_recursion_limit", "prefetch_enabled")
+
+
+def test_prazo_encolhe_timeouts():
+    """Prazo mais curto prevalece, timeouts são limitados ao restante e o envio pode ignorar o prazo"""
+    assert deadline.remaining() is None and deadline.clamp_timeout(10) == 10
+    with deadline.budget(2.0):
+        with deadline.budget(30.0):
+            assert deadline.remaining() <= 2.0
+            assert deadline.clamp_timeout(10) <= 2.0
+            assert deadline.clamp_timeout((3, 10))[1] <= 2.0
+        with deadline.unbounded():
+            assert deadline.remaining() is None
+    with deadline.budget(0.0):
+        try:
+            deadline.clamp_timeout(10)
+            raise AssertionError("esperava DeadlineExceeded")
+        except deadline.DeadlineExceeded as e:
+            assert e.stage == "http"
+    print("🧪 Prazo aninhado e timeouts limitados")
+
+
+def test_ferramenta_respeita_o_prazo():
+    """Uma consulta lenta ao ERP é abandonada quando o prazo acaba, não no timeout fixo de 10s"""
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in keys}
+    with MockServices(profiles={"erp": ServiceProfile.parse("fixed:1.5")}) as mocks:
+        mocks.apply_to_settings(settings)
+        try:
+            start = time.perf_counter()
+            with deadline.budget(0.3):
+                resultado = estoque_preco("7896100100000")
+            elapsed = time.perf_counter() - start
+        finally:
+            for k, v in original.items():
+                setattr(settings, k, v)
+    assert resultado.startswith("Erro: Timeout"), resultado
+    assert elapsed < 1.0, elapsed
+    print(f"🧪 ERP lento abandonado em {elapsed:.2f}s")
+
+
+def _rodar_agente(profiles, ajustes, turnos):
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in (*keys, *_AGENT_SETTINGS)}
+    saved_graphs = (agente._agent_graph, agente._fast_agent_graph)
+    with MockServices(profiles=profiles) as mocks:
+        mocks.apply_to_settings(settings)
+        agente._agent_graph = agente._fast_agent_graph = None
+        try:
+            resultados = []
+            for telefone, mensagem, extra in turnos:
+                for k, v in {**ajustes, **extra}.items():
+                    setattr(settings, k, v)
+                resultados.append(agente.run_agent_langgraph(telefone, mensagem))
+            state = agente.get_agent_graph().get_state({"configurable": {"thread_id": turnos[0][0]}})
+            return resultados, state.values["messages"]
+        finally:
+            agente._agent_graph, agente._fast_agent_graph = saved_graphs
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+def test_resposta_parcial_no_prazo():
+    """Sem tempo para a última chamada ao LLM, o cliente recebe os preços já consultados"""
+    ajustes = {"reply_deadline_seconds": 1.0, "deadline_min_tool_seconds": 0.3,
+               "deadline_min_llm_seconds": 0.5, "prefetch_enabled": False}
+    antes = deadline.DEADLINE_EXCEEDED.value(stage="llm")
+    (parcial, seguinte), msgs = _rodar_agente(
+        {"erp": ServiceProfile.parse("fixed:0.6")},
+        ajustes,
+        [("5585000000044", "arroz 5kg", {}),
+         ("5585000000044", "e feijão?", {"reply_deadline_seconds": 30.0})],
+    )
+    assert parcial["error"] is None
+    assert "Desculpe a demora" in parcial["output"] and "ARROZ CAMIL TIPO 1 5KG: R$ 27,90" in parcial["output"]
+    assert deadline.DEADLINE_EXCEEDED.value(stage="llm") == antes + 1
+    # O turno seguinte continua normalmente sobre o histórico com a resposta parcial
+    assert seguinte["error"] is None and "27,90" in seguinte["output"]
+    assert any(isinstance(m, AIMessage) and "Desculpe a demora" in m.content for m in msgs)
+    print(f"🧪 Resposta parcial: {parcial['output']!r}")
+
+
+def test_limite_de_passos():
+    """Estourar o recursion_limit encerra o turno com resposta parcial e histórico consistente"""
+    (resultado,), msgs = _rodar_agente({}, {"agent_recursion_limit": 4, "prefetch_enabled": False},
+                                       [("5585000000045", "arroz 5kg", {})])
+    assert resultado["error"] is None and "Desculpe a demora" in resultado["output"]
+    chamadas = {c["id"] for m in msgs if isinstance(m, AIMessage) for c in m.tool_calls}
+    respostas = {m.tool_call_id for m in msgs if isinstance(m, ToolMessage)}
+    assert chamadas and chamadas == respostas
+    print(f"🧪 Limite de passos: {len(msgs)} mensagens no histórico")
+
+
+if __name__ == "__main__":
+    test_prazo_encolhe_timeouts()
+    test_ferramenta_respeita_o_prazo()
+    test_resposta_parcial_no_prazo()
+    test_limite_de_passos()
+    print("✅ Todos os testes de prazo passaram")
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Teste do snapshot local de preço/estoque do ERP (tools/erp_snapshot.py).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import sqlite3
+import tempfile
+import time
+
+from config.settings import settings
+from mocks import MockServices
+from tools import erp_snapshot
+from tools.http_tools import estoque_preco
+
+ARROZ = "7896100100000"
+
+
+def _com_snapshot(fn, **ajustes):
+    keys = [k.lower() for k in MockServices().env()]
+    ajustes = {"erp_snapshot_enabled": True, "erp_snapshot_max_age_seconds": 600.0,
+               "erp_snapshot_refresh_seconds": 0.0, **ajustes}
+    original = {k: getattr(settings, k) for k in (*keys, *ajustes, "erp_snapshot_path")}
+    with tempfile.TemporaryDirectory() as tmp, MockServices() as mocks:
+        mocks.apply_to_settings(settings)
+        for k, v in ajustes.items():
+            setattr(settings, k, v)
+        settings.erp_snapshot_path = os.path.join(tmp, "snapshot.sqlite3")
+        try:
+            return fn(mocks)
+        finally:
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+def test_snapshot_responde_sem_ir_ao_erp():
+    """EAN desconhecido vai ao ERP uma vez; a seguir a resposta idêntica vem do snapshot"""
+    def rodar(mocks):
+        ao_vivo = estoque_preco(ARROZ)
+        assert "27.9" in ao_vivo and mocks.requests["erp"] == 1
+        assert estoque_preco(ARROZ) == ao_vivo
+        assert mocks.requests["erp"] == 1
+        settings.erp_snapshot_max_age_seconds = 0.0
+        estoque_preco(ARROZ)  # vencido: consulta ao vivo
+        assert mocks.requests["erp"] == 2
+
+    _com_snapshot(rodar)
+    print("🧪 Snapshot usado enquanto válido")
+
+
+def test_sincronizacao_condicional():
+    """Sem mudança o ERP responde 304; preço alterado no ERP chega ao snapshot no ciclo seguinte"""
+    def rodar(mocks):
+        estoque_preco(ARROZ)
+        assert erp_snapshot.sync_once()["not_modified"] == 1
+        mocks._catalog[ARROZ][0]["vl_produto"] = "25,90"
+        stats = erp_snapshot.sync_once()
+        assert stats["changed"] == 1, stats
+        chamadas = mocks.requests["erp"]
+        assert "25.9" in estoque_preco(ARROZ) and mocks.requests["erp"] == chamadas
+
+    _com_snapshot(rodar)
+    print("🧪 GET condicional e atualização de preço")
+
+
+def test_diff_do_catalogo():
+    """O catálogo completo é gravado por EAN e só baixado de novo quando muda"""
+    def rodar(mocks):
+        settings.erp_snapshot_catalog_url = f"{mocks.base_url}/erp/api/produtos/consulta"
+        primeira = erp_snapshot.full_diff()
+        assert primeira["changed"] >= 1 and primeira["unchanged"] == 0
+        assert erp_snapshot.full_diff() == {"changed": 0, "unchanged": 0}  # 304
+        chamadas = mocks.requests["erp"]
+        assert "27.9" in estoque_preco(ARROZ) and mocks.requests["erp"] == chamadas
+
+    _com_snapshot(rodar, erp_snapshot_catalog_url=None)
+    print("🧪 Diff do catálogo completo")
+
+
+def test_so_reconfere_eans_procurados():
+    """EANs sem procura recente não geram GET; o catálogo renova os seus; sem procura por muito tempo, sai do snapshot"""
+    def rodar(mocks):
+        estoque_preco(ARROZ)
+        with erp_snapshot._lock:
+            erp_snapshot._connection().execute("UPDATE erp_snapshot SET requested_at = ?", (time.time() - 3600,))
+        chamadas = mocks.requests["erp"]
+        stats = erp_snapshot.sync_once()
+        assert stats["not_modified"] == 0 and stats["evicted"] == 0 and mocks.requests["erp"] == chamadas, stats
+
+        # Uma procura reativa a conferência
+        settings.erp_snapshot_max_age_seconds = 0.0
+        estoque_preco(ARROZ)
+        assert erp_snapshot.sync_once()["not_modified"] == 1
+
+        # Catálogo: 304 renova a conferência dos EANs dele sem GET por EAN
+        settings.erp_snapshot_catalog_url = f"{mocks.base_url}/erp/api/produtos/consulta"
+        erp_snapshot.full_diff()
+        with erp_snapshot._lock:
+            erp_snapshot._connection().execute("UPDATE erp_snapshot SET checked_at = 0")
+        assert erp_snapshot.full_diff() == {"changed": 0, "unchanged": 0}  # 304
+        with erp_snapshot._lock:
+            velhos = erp_snapshot._connection().execute(
+                "SELECT COUNT(*) FROM erp_snapshot WHERE checked_at = 0").fetchone()[0]
+        assert velhos == 0
+
+        # Fora do catálogo e sem procura dentro de erp_snapshot_evict_seconds: removido
+        erp_snapshot.store("7890000000001", "[]")
+        settings.erp_snapshot_evict_seconds = -1.0
+        assert erp_snapshot.evict() == 1
+        with erp_snapshot._lock:
+            restantes = [r["ean"] for r in erp_snapshot._connection().execute("SELECT ean FROM erp_snapshot")]
+        assert ARROZ in restantes and "7890000000001" not in restantes  # o do catálogo fica
+
+    _com_snapshot(rodar, erp_snapshot_catalog_url=None, erp_snapshot_active_seconds=1800.0,
+                  erp_snapshot_evict_seconds=86400.0, erp_snapshot_full_sync_seconds=3600.0)
+    print("🧪 Conferência só dos EANs procurados e remoção dos esquecidos")
+
+
+def test_catalogo_renovado_antes_de_vencer():
+    """Com FULL_SYNC maior que MAX_AGE, o catálogo é baixado antes das entradas só dele vencerem"""
+    def rodar(mocks):
+        settings.erp_snapshot_catalog_url = f"{mocks.base_url}/erp/api/produtos/consulta"
+        assert erp_snapshot.full_sync_interval() == 570.0
+        so_catalogo = next(ean for ean in mocks._catalog if ean != ARROZ)
+        erp_snapshot.sync_once()
+
+        # 580s depois do download: ainda válidas (< 600s), mas o intervalo efetivo já passou
+        antes = time.time() - 580
+        with erp_snapshot._lock:
+            erp_snapshot._connection().execute("UPDATE erp_snapshot SET checked_at = ?", (antes,))
+        erp_snapshot._set_meta("catalog_synced_at", repr(antes))
+        stats = erp_snapshot.sync_once()
+        assert stats["not_modified"] == 0 and stats["changed"] == 0, stats  # 304 do catálogo, sem GET por EAN
+
+        # A entrada só do catálogo foi renovada e segue valendo além dos 600s do primeiro download
+        with erp_snapshot._lock:
+            checked_at = erp_snapshot._connection().execute(
+                "SELECT checked_at FROM erp_snapshot WHERE ean = ?", (so_catalogo,)).fetchone()[0]
+        assert time.time() - checked_at < 5 and checked_at + 600 > antes + 600 + 20
+        chamadas = mocks.requests["erp"]
+        assert erp_snapshot.lookup(so_catalogo) is not None
+        estoque_preco(so_catalogo)
+        assert mocks.requests["erp"] == chamadas
+
+    _com_snapshot(rodar, erp_snapshot_catalog_url=None, erp_snapshot_full_sync_seconds=3600.0,
+                  erp_snapshot_interval_seconds=30.0, erp_snapshot_active_seconds=1800.0)
+    print("🧪 Entradas do catálogo renovadas antes de vencer")
+
+
+def test_migra_snapshot_antigo():
+    """Snapshot criado antes de requested_at/in_catalog ganha as colunas ao abrir"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "antigo.sqlite3")
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE erp_snapshot (ean TEXT PRIMARY KEY, body TEXT NOT NULL, digest TEXT NOT NULL,"
+                     " etag TEXT, last_modified TEXT, checked_at REAL NOT NULL, changed_at REAL NOT NULL)")
+        conn.execute("INSERT INTO erp_snapshot VALUES (?, '[]', 'x', NULL, NULL, ?, ?)", (ARROZ, time.time(), time.time()))
+        conn.commit()
+        conn.close()
+        original = (settings.erp_snapshot_path, settings.erp_snapshot_max_age_seconds)
+        settings.erp_snapshot_path, settings.erp_snapshot_max_age_seconds = path, 600.0
+        try:
+            assert erp_snapshot.lookup(ARROZ) == "[]"
+            assert erp_snapshot.evict() == 0  # requested_at herdou checked_at
+        finally:
+            settings.erp_snapshot_path, settings.erp_snapshot_max_age_seconds = original
+    print("🧪 Migração do snapshot antigo")
+
+
+if __name__ == "__main__":
+    test_snapshot_responde_sem_ir_ao_erp()
+    test_sincronizacao_condicional()
+    test_diff_do_catalogo()
+    test_so_reconfere_eans_procurados()
+    test_catalogo_renovado_antes_de_vencer()
+    test_migra_snapshot_antigo()
+    print("✅ Todos os testes do snapshot do ERP passaram")
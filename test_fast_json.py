@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""
+Teste da camada de JSON rápida (config/fast_json.py).
+Garante que a saída das ferramentas continua idêntica à do json da stdlib.
+"""
+import json
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import fast_json
+
+UPSTREAM_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "upstream")
+
+
+def test_saida_identica_stdlib():
+    """dumps(indent=True) reproduz json.dumps(indent=2, ensure_ascii=False)"""
+    print(f"🧪 Backend: {fast_json.BACKEND}")
+    for name in ("erp_estoque_preco.json", "smart_responder.json"):
+        with open(os.path.join(UPSTREAM_DIR, name), "rb") as f:
+            raw = f.read()
+        data = fast_json.loads(raw)
+        assert data == json.loads(raw)
+        assert fast_json.dumps(data, indent=True) == json.dumps(data, indent=2, ensure_ascii=False)
+        assert json.loads(fast_json.dumps_bytes(data)) == data
+
+
+def test_erro_de_decodificacao():
+    """Erros de decodificação continuam sendo json.JSONDecodeError"""
+    try:
+        fast_json.loads(b"<html>502</html>")
+    except json.JSONDecodeError:
+        pass
+    else:
+        raise AssertionError("esperava JSONDecodeError")
+
+
+def test_fallback_para_tipos_nao_suportados():
+    """Inteiros fora do intervalo de 64 bits caem para a stdlib"""
+    assert fast_json.dumps({"n": 2 ** 70}) == json.dumps({"n": 2 ** 70})
+
+
+if __name__ == "__main__":
+    test_saida_identica_stdlib()
+    test_erro_de_decodificacao()
+    test_fallback_para_tipos_nao_suportados()
+    print("✅ Todos os testes de JSON passaram")
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Teste do atalho determinístico para intenções triviais.
+Não requer LLM, Redis ou banco de dados.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.fast_path import answer_fast_path, classify_intent
+
+
+def test_intencoes_triviais():
+    """Saudações e perguntas de informação da loja são respondidas localmente"""
+    print("🧪 Testando intenções triviais...")
+
+    casos = [
+        ("Bom dia!", "saudacao"),
+        ("oi, tudo bem?", "saudacao"),
+        ("Que horas abre?", "horario"),
+        ("boa tarde, qual o horário de funcionamento?", "horario"),
+        ("Qual o endereço?", "endereco"),
+        ("onde fica o mercado", "endereco"),
+        ("quais setores vocês tem?", "setores"),
+    ]
+    for texto, esperado in casos:
+        intent, conf = classify_intent(texto)
+        print(f"   '{texto}' -> {intent} ({conf:.2f})")
+        assert intent == esperado
+        assert answer_fast_path(texto)
+
+
+def test_respostas_usam_prompt():
+    """Respostas trazem os dados da loja do prompt do sistema"""
+    assert "Caucaia" in answer_fast_path("qual o endereço?")
+    assert "07:00" in answer_fast_path("que horas abre?")
+    assert answer_fast_path("Bom dia").startswith("Bom dia!")
+
+
+def test_mensagens_de_pedido_seguem_para_agente():
+    """Qualquer menção a produto ou pedido não pode ser respondida pelo atalho"""
+    print("🧪 Testando mensagens que devem ir para o agente...")
+
+    for texto in [
+        "quero arroz, feijão e 2 coca 2l",
+        "bom dia, quero arroz",
+        "tem leite condensado?",
+        "quero cancelar meu pedido",
+        "sim",
+        "beleza",
+        "tudo bem",
+        "blz",
+        "",
+    ]:
+        print(f"   '{texto}' -> {classify_intent(texto)}")
+        assert answer_fast_path(texto) is None
+
+
+def test_resposta_a_pergunta_segue_para_agente():
+    """Se o agente acabou de perguntar algo, a mensagem do cliente é a resposta"""
+    pergunta = "Total: R$ 27,90\nPosso confirmar o pedido?"
+    assert answer_fast_path("bom dia", last_reply=pergunta) is None
+    assert answer_fast_path("que horas abre?", last_reply=pergunta) is None
+    assert answer_fast_path("bom dia", last_reply="Pedido confirmado! ✅") == "Bom dia! 😊 O que você quer comprar hoje?"
+    print("🧪 Mensagens após pergunta do agente não usam o atalho")
+
+
+if __name__ == "__main__":
+    test_intencoes_triviais()
+    test_respostas_usam_prompt()
+    test_mensagens_de_pedido_seguem_para_agente()
+    test_resposta_a_pergunta_segue_para_agente()
+    print("✅ Todos os testes do atalho passaram")
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Teste das requisições hedged (tools/hedging.py) usadas pelo ean_lookup.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import itertools
+import threading
+import time
+
+from config.settings import settings
+from mocks import MockServices
+from tools import adaptive, hedging
+from tools.http_tools import ean_lookup
+
+_HEDGE_SETTINGS = {"hedge_enabled": True, "hedge_min_samples": 5, "hedge_percentile": 0.9,
+                   "hedge_min_delay_seconds": 0.01, "hedge_budget_ratio": 0.1, "hedge_budget_burst": 1.0}
+
+
+def _ajustar(ajustes):
+    original = {k: getattr(settings, k) for k in ajustes}
+    for k, v in ajustes.items():
+        setattr(settings, k, v)
+    return original
+
+
+def _aquecer(nome, n=5):
+    for _ in range(n):
+        adaptive.observe(nome, 0.01)
+
+
+def test_copia_vence_a_chamada_lenta():
+    """A original trava; a cópia sai após o percentil recente e responde antes"""
+    original = _ajustar(_HEDGE_SETTINGS)
+    try:
+        _aquecer("teste-hedge")
+        contador = itertools.count()
+        liberar = threading.Event()
+
+        def chamada():
+            if next(contador) == 0:
+                liberar.wait(2.0)  # cold start
+                return "original"
+            return "copia"
+
+        antes = hedging.HEDGE_EVENTS.value(name="teste-hedge", event="won")
+        start = time.perf_counter()
+        assert hedging.call("teste-hedge", chamada) == "copia"
+        elapsed = time.perf_counter() - start
+        liberar.set()
+        assert elapsed < 0.5, elapsed
+        assert hedging.HEDGE_EVENTS.value(name="teste-hedge", event="won") == antes + 1
+        print(f"🧪 Cópia respondeu em {elapsed * 1000:.0f}ms")
+    finally:
+        hedging.reset()
+        adaptive.reset()
+        _ajustar(original)
+
+
+def test_orcamento_limita_as_copias():
+    """Sem fichas no balde a chamada lenta só é aguardada, sem cópia"""
+    original = _ajustar({**_HEDGE_SETTINGS, "hedge_percentile": 0.8})
+    try:
+        # Amostras rápidas suficientes para as lentas não moverem o percentil
+        _aquecer("teste-orcamento", n=20)
+        chamadas = itertools.count()
+
+        def lenta():
+            next(chamadas)
+            time.sleep(0.1)
+            return "ok"
+
+        for _ in range(3):
+            assert hedging.call("teste-orcamento", lenta) == "ok"
+        # 1 ficha inicial + 0.1 por chamada: só a primeira chamada lenta ganha cópia
+        assert hedging.HEDGE_EVENTS.value(name="teste-orcamento", event="issued") == 1
+        assert hedging.HEDGE_EVENTS.value(name="teste-orcamento", event="budget_exhausted") == 2
+        assert next(chamadas) == 4
+        print("🧪 Orçamento de cópias respeitado")
+    finally:
+        hedging.reset()
+        adaptive.reset()
+        _ajustar(original)
+
+
+def test_originais_nao_passam_pelo_pool():
+    """Com o pool de cópias ocupado, as originais rodam em paralelo e sem disparar cópias"""
+    original = _ajustar({**_HEDGE_SETTINGS, "hedge_min_delay_seconds": 0.2})
+    try:
+        # Sem amostras: roda na própria thread de quem chamou
+        assert hedging.call("teste-pool", lambda: threading.current_thread()) is threading.current_thread()
+
+        _aquecer("teste-pool")
+        bloqueio = threading.Event()
+        ocupadas = [hedging._submit(lambda: bloqueio.wait(2.0)) for _ in range(settings.hedge_workers)]
+        resultados = []
+
+        def chamada():
+            time.sleep(0.05)
+            return "ok"
+
+        threads = [threading.Thread(target=lambda: resultados.append(hedging.call("teste-pool", chamada)))
+                   for _ in range(settings.hedge_workers + 4)]
+        start = time.perf_counter()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        elapsed = time.perf_counter() - start
+        bloqueio.set()
+        for f in ocupadas:
+            f.result()
+        assert resultados == ["ok"] * len(threads)
+        assert elapsed < 0.5, elapsed
+        assert hedging.HEDGE_EVENTS.value(name="teste-pool", event="issued") == 0
+        print(f"🧪 {len(threads)} chamadas originais em {elapsed * 1000:.0f}ms com o pool ocupado")
+    finally:
+        hedging.reset()
+        adaptive.reset()
+        _ajustar(original)
+
+
+def test_ean_lookup_com_hedge():
+    """O ean_lookup continua respondendo normalmente com o hedge ligado"""
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in keys}
+    original.update(_ajustar(_HEDGE_SETTINGS))
+    with MockServices() as mocks:
+        mocks.apply_to_settings(settings)
+        try:
+            for _ in range(6):
+                assert "7896100100000" in ean_lookup("arroz 5kg")
+            assert mocks.requests["smart_responder"] >= 6
+        finally:
+            hedging.reset()
+            adaptive.reset()
+            for k, v in original.items():
+                setattr(settings, k, v)
+    print("🧪 ean_lookup com hedge")
+
+
+if __name__ == "__main__":
+    test_copia_vence_a_chamada_lenta()
+    test_orcamento_limita_as_copias()
+    test_originais_nao_passam_pelo_pool()
+    test_ean_lookup_com_hedge()
+    print("✅ Todos os testes de hedge passaram")
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Teste dos caminhos quentes cobertos por benchmarks/bench_hot_paths.py:
+helpers extraídos de send_whatsapp_message, ean_lookup e estoque_preco,
+e consistência do baseline gravado.
+"""
+import json
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from benchmarks import bench_hot_paths
+from tools import http_tools
+
+
+def test_split_message():
+    """Partes respeitam o limite e preservam os parágrafos"""
+    import server
+
+    assert server._split_message("oi") == ["oi"]
+    paragrafos = [f"linha {i} " + "x" * 300 for i in range(40)]
+    partes = server._split_message("\n\n".join(paragrafos))
+    assert len(partes) > 1
+    assert all(len(p) <= 4000 for p in partes)
+    assert "\n\n".join(partes).split("\n\n") == paragrafos
+    print(f"🧪 {len(paragrafos)} parágrafos → {len(partes)} partes")
+
+
+def test_ranqueamento_de_eans():
+    """Pares do smart-responder: relevantes primeiro, medida conta mais"""
+    smart = json.loads((bench_hot_paths.HERE / "upstream" / "smart_responder.json").read_text(encoding="utf-8"))
+    pairs = http_tools._extract_pairs(smart)
+    assert pairs and all(e for e, _ in pairs[:5])
+    ranked = http_tools._rank_pairs("arroz camil 5kg", pairs)
+    assert "CAMIL" in ranked[0][1] and "5KG" in ranked[0][1]
+    assert http_tools._score("feijão", "FEIJAO CARIOCA") == 1.0
+    assert http_tools._rank_pairs("xyz", pairs) == pairs[:10]
+
+
+def test_normalizacao_estoque():
+    """Somente itens com estoque; preço e quantidade unificados"""
+    itens = [
+        {"produto": "A", "vl_produto": "27,90", "qtd_estoque": "3"},
+        {"produto": "B", "preco": "9,90", "estoque": "0"},
+        "lixo",
+    ]
+    saida = http_tools._normalize_estoque_items(itens)
+    assert saida == [{"produto": "A", "vl_produto": "27,90", "disponibilidade": True, "preco": 27.9, "quantidade": 3.0}]
+
+
+def test_casos_do_benchmark():
+    """Todos os casos executam e o baseline cobre todos eles"""
+    cases = bench_hot_paths.build_cases()
+    for name, fn in cases.items():
+        fn()
+    baseline = json.loads(bench_hot_paths.BASELINE.read_text(encoding="utf-8"))
+    assert set(cases) == set(baseline["cases"]), "rode benchmarks/bench_hot_paths.py --save"
+    print(f"🧪 {len(cases)} casos de benchmark")
+
+
+if __name__ == "__main__":
+    test_split_message()
+    test_ranqueamento_de_eans()
+    test_normalizacao_estoque()
+    test_casos_do_benchmark()
+    print("✅ Todos os testes de caminhos quentes passaram")
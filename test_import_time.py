@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Teste do orçamento de import a frio de `server` (perfil em scripts/import_profile.py).
+
+Provedores opcionais e módulos pesados usados só na criação do agente
+(langchain_openai/openai, langchain_anthropic, cohere, langchain_community)
+não podem ser importados junto com o servidor.
+"""
+import os
+import subprocess
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from scripts import import_profile
+
+# Melhor de 3 imports a frio; ajustável em máquinas lentas
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "2.0"))
+LAZY_MODULES = ("langchain_openai", "openai", "langchain_anthropic", "anthropic", "cohere", "langchain_community")
+
+
+def test_modulos_preguicosos():
+    """import server não carrega provedores de LLM nem langchain_community"""
+    code = f"import sys, server; print(','.join(m for m in {LAZY_MODULES!r} if m in sys.modules))"
+    proc = subprocess.run([sys.executable, "-c", code], cwd=import_profile.ROOT, capture_output=True, text=True)
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    carregados = proc.stdout.strip().splitlines()[-1] if proc.stdout.strip() else ""
+    assert carregados == "", f"importados a frio: {carregados}"
+
+
+def test_orcamento_de_import():
+    """import server a frio fica dentro do orçamento"""
+    best = min(import_profile.total_seconds(import_profile.profile("server"), "server") for _ in range(3))
+    print(f"🧪 import server: {best * 1000:.0f}ms (orçamento {IMPORT_BUDGET_SECONDS * 1000:.0f}ms)")
+    assert best <= IMPORT_BUDGET_SECONDS, (
+        f"import server levou {best:.2f}s (> {IMPORT_BUDGET_SECONDS}s); veja python scripts/import_profile.py"
+    )
+
+
+if __name__ == "__main__":
+    test_modulos_preguicosos()
+    test_orcamento_de_import()
+    print("✅ Import a frio dentro do orçamento")
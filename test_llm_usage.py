@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Teste do callback de uso do LLM/ferramentas (memory/llm_usage.py).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from config.settings import settings
+from memory.llm_usage import UsageCallbackHandler, UsageStore
+
+
+@tool
+def eco(texto: str) -> str:
+    """Devolve o texto recebido."""
+    return texto * 2
+
+
+def test_registra_llm_e_ferramenta_por_thread():
+    """Tokens, chamadas e tamanhos ficam agregados por thread_id"""
+    settings.llm_usage_persist = False
+    store = UsageStore()
+    handler = UsageCallbackHandler(store)
+    config = {"callbacks": [handler], "metadata": {"thread_id": "5511999998888"}}
+
+    resposta = AIMessage(
+        content="Temos arroz sim!",
+        usage_metadata={
+            "input_tokens": 120, "output_tokens": 8, "total_tokens": 128,
+            "input_token_details": {"cache_read": 100},
+        },
+    )
+    model = GenericFakeChatModel(messages=iter([resposta]))
+    model.invoke("tem arroz?", config=config)
+    eco.invoke({"texto": "abc"}, config=config)
+
+    totals = store.summary("5511999998888")
+    print(f"🧪 Totais: {totals}")
+    assert totals.llm_calls == 1
+    assert totals.prompt_tokens == 120
+    assert totals.completion_tokens == 8
+    assert totals.cached_tokens == 100
+    assert abs(totals.cached_ratio - 100 / 120) < 1e-9
+    assert totals.tool_calls == 1
+    assert store.pending() == 0  # persistência desligada
+
+
+def test_fila_limitada_sem_postgres():
+    """Com o Postgres fora, os registros voltam para a fila sem passar do limite"""
+    settings.llm_usage_persist = True
+    original_max, original_batch = settings.llm_usage_max_pending, settings.llm_usage_batch_size
+    settings.llm_usage_max_pending = 3
+    settings.llm_usage_batch_size = 1000
+    try:
+        store = UsageStore()
+        store._thread = object()  # sem thread de flush em segundo plano
+        from memory.llm_usage import UsageRecord
+        for i in range(5):
+            store.add(UsageRecord(thread_id="t", kind="tool", name="eco", latency_ms=1.0))
+        assert store.pending() == 3
+    finally:
+        settings.llm_usage_max_pending = original_max
+        settings.llm_usage_batch_size = original_batch
+        settings.llm_usage_persist = True
+
+
+def test_totais_limitados_por_conversa():
+    """Só as conversas mais recentes mantêm totais em memória (LRU)"""
+    from memory.llm_usage import UsageRecord
+    original = (settings.llm_usage_persist, settings.llm_usage_max_threads)
+    settings.llm_usage_persist, settings.llm_usage_max_threads = False, 2
+    try:
+        store = UsageStore()
+        for tel in ("a", "b", "a", "c"):
+            store.add(UsageRecord(thread_id=tel, kind="tool", name="eco", latency_ms=1.0))
+        assert store.summary("b") is None  # menos recente
+        assert store.summary("a").tool_calls == 2
+        assert store.summary("c").tool_calls == 1
+    finally:
+        settings.llm_usage_persist, settings.llm_usage_max_threads = original
+    print("🧪 Totais por conversa limitados")
+
+
+if __name__ == "__main__":
+    test_registra_llm_e_ferramenta_por_thread()
+    test_fila_limitada_sem_postgres()
+    test_totais_limitados_por_conversa()
+    print("✅ Todos os testes de uso do LLM passaram")
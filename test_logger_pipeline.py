@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""
+Teste do pipeline de logging (fila + listener, rotação comprimida, truncamento).
+"""
+import gzip
+import logging
+import os
+import sys
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import logger as log_module
+from config.logger import payload_preview, setup_logger
+
+
+def test_handlers_compartilhados_via_fila():
+    """Vários loggers compartilham um único QueueHandler por arquivo"""
+    a = setup_logger("teste.pipeline.a")
+    b = setup_logger("teste.pipeline.b")
+    assert len(a.handlers) == 1
+    assert a.handlers[0] is b.handlers[0]
+    assert isinstance(a.handlers[0], logging.handlers.QueueHandler)
+
+
+def test_rotacao_comprimida():
+    """Arquivos rotacionados são comprimidos em .gz"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "agente.log")
+        handler = log_module._rotating_handler(log_module.Path(path))
+        handler.maxBytes = 200
+        handler.setFormatter(logging.Formatter("%(message)s"))
+        for i in range(20):
+            handler.emit(logging.LogRecord("x", logging.INFO, __file__, 0, "linha %d " + "x" * 40, (i,), None))
+        handler.close()
+        rotated = path + ".1.gz"
+        print(f"📁 Arquivos: {sorted(os.listdir(tmp))}")
+        assert os.path.exists(rotated)
+        with gzip.open(rotated, "rt", encoding="utf-8") as f:
+            assert "linha" in f.read()
+
+
+def test_payload_truncado():
+    """Payloads grandes são truncados apenas quando formatados"""
+    preview = payload_preview({"texto": "a" * 5000}, limit=100)
+    text = str(preview)
+    assert len(text) < 130
+    assert text.endswith("chars)")
+    assert str(payload_preview("curto", limit=100)) == "curto"
+
+
+if __name__ == "__main__":
+    test_handlers_compartilhados_via_fila()
+    test_rotacao_comprimida()
+    test_payload_truncado()
+    print("✅ Todos os testes de logging passaram")
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Teste do registro de métricas (config/metrics.py) e do endpoint /metrics.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+from config.metrics import Registry, track_tool, TOOL_LATENCY
+
+
+def test_formato_prometheus():
+    """Contador, gauge calculado e histograma no formato de exposição"""
+    reg = Registry()
+    c = reg.counter("t_requests_total", "Requisições", ["rota"])
+    c.inc(rota="/a")
+    c.inc(2, rota="/a")
+    g = reg.gauge("t_sessions", "Sessões", ["kind"])
+    sessions = {"1": {}, "2": {}}
+    g.set_function(lambda: len(sessions), kind="buffer")
+    h = reg.histogram("t_latency_seconds", "Latência", ["stage"], buckets=(0.1, 1.0))
+    h.observe(0.05, stage="agent")
+    h.observe(0.5, stage="agent")
+    h.observe(3.0, stage="agent")
+
+    text = reg.render()
+    print(text)
+    assert "# TYPE t_requests_total counter" in text
+    assert 't_requests_total{rota="/a"} 3' in text
+    assert 't_sessions{kind="buffer"} 2' in text
+    assert 't_latency_seconds_bucket{stage="agent",le="0.1"} 1' in text
+    assert 't_latency_seconds_bucket{stage="agent",le="1"} 2' in text
+    assert 't_latency_seconds_bucket{stage="agent",le="+Inf"} 3' in text
+    assert 't_latency_seconds_count{stage="agent"} 3' in text
+
+
+def test_labels_invalidos():
+    """Labels diferentes dos declarados geram ValueError"""
+    reg = Registry()
+    c = reg.counter("t_x_total", "X", ["a"])
+    try:
+        c.inc(b="1")
+    except (ValueError, KeyError):
+        pass
+    else:
+        raise AssertionError("esperava erro de label")
+
+
+def test_track_tool_status():
+    """Saídas 'Erro...' das ferramentas contam como status=error"""
+    @track_tool("teste_tool")
+    def ferramenta(ok: bool) -> str:
+        return "[]" if ok else "Erro: Timeout"
+
+    ferramenta(True)
+    ferramenta(False)
+    assert TOOL_LATENCY.count(tool="teste_tool", status="ok") == 1
+    assert TOOL_LATENCY.count(tool="teste_tool", status="error") == 1
+
+
+def test_endpoint_metrics():
+    """GET /metrics expõe as métricas de etapas e sessões"""
+    import server
+
+    client = TestClient(server.app)
+    client.get("/health")
+    resp = client.get("/metrics")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/plain")
+    assert 'agente_active_sessions{kind="presence"}' in resp.text
+    assert "agente_threads" in resp.text
+
+
+if __name__ == "__main__":
+    test_formato_prometheus()
+    test_labels_invalidos()
+    test_track_tool_status()
+    test_endpoint_metrics()
+    print("✅ Todos os testes de métricas passaram")
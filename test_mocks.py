@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Teste dos serviços simulados (mocks/): ERP, smart-responder, UAZ, LLM
+compatível com OpenAI e injeção de erros.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+
+from mocks import DEFAULT_SCRIPT, LatencyModel, MockServices, ServiceProfile, chat_completion
+
+
+def test_distribuicoes_de_latencia():
+    """Especificações de latência são reprodutíveis com semente"""
+    a = [LatencyModel("lognormal:0.2", seed=7).sample() for _ in range(3)]
+    b = [LatencyModel("lognormal:0.2", seed=7).sample() for _ in range(3)]
+    assert a == b
+    assert LatencyModel("fixed:0.05").sample() == 0.05
+    assert 0.1 <= LatencyModel("uniform:0.1-0.2").sample() <= 0.2
+
+
+def test_roteiro_do_llm():
+    """Usuário → ean; saída do ean → estoque com o EAN; depois texto final"""
+    msgs = [{"role": "user", "content": "quero arroz"}]
+    r1 = chat_completion({"messages": msgs}, script=DEFAULT_SCRIPT)
+    call = r1["choices"][0]["message"]["tool_calls"][0]
+    assert call["function"]["name"] == "ean"
+
+    msgs += [r1["choices"][0]["message"], {"role": "tool", "tool_call_id": call["id"], "content": "1) 7896100100000 - ARROZ"}]
+    r2 = chat_completion({"messages": msgs}, script=DEFAULT_SCRIPT)
+    call2 = r2["choices"][0]["message"]["tool_calls"][0]
+    assert call2["function"]["name"] == "estoque"
+    assert "7896100100000" in call2["function"]["arguments"]
+
+    msgs += [r2["choices"][0]["message"], {"role": "tool", "tool_call_id": call2["id"], "content": "[]"}]
+    r3 = chat_completion({"messages": msgs}, script=DEFAULT_SCRIPT)
+    assert r3["choices"][0]["finish_reason"] == "stop"
+    assert r3["choices"][0]["message"]["content"]
+
+
+def test_servicos_http():
+    """ERP por EAN, entrega na UAZ e erro injetado"""
+    profiles = {"smart_responder": ServiceProfile.parse("0", error_rate=1.0)}
+    with MockServices(profiles=profiles) as mocks:
+        base = mocks.base_url
+        itens = requests.get(f"{base}/erp/ean/7896100100000", timeout=5).json()
+        assert itens and itens[0]["codigo_ean"] == "7896100100000"
+        assert requests.get(f"{base}/erp/ean/123", timeout=5).json() == []
+
+        requests.post(f"{base}/message/send", json={"number": "5585999990000", "text": "oi"}, timeout=5)
+        assert mocks.deliveries.wait("5585999990000", timeout=1) is not None
+
+        resp = requests.post(f"{base}/smart-responder", json={"query": "arroz"}, timeout=5)
+        assert resp.status_code == 503
+        print(f"🧪 Requisições: {mocks.requests}")
+
+
+def test_ferramentas_contra_mocks():
+    """estoque_preco e ean_lookup funcionam apontando o settings para os mocks"""
+    from config.settings import settings
+    from tools.http_tools import ean_lookup, estoque_preco
+
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in keys}
+    with MockServices() as mocks:
+        mocks.apply_to_settings(settings)
+        try:
+            assert '"preco": 27.9' in estoque_preco("7896100100000")
+            assert ean_lookup("arroz 5kg").startswith("EANS_ENCONTRADOS:")
+        finally:
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+if __name__ == "__main__":
+    test_distribuicoes_de_latencia()
+    test_roteiro_do_llm()
+    test_servicos_http()
+    test_ferramentas_contra_mocks()
+    print("✅ Todos os testes dos serviços simulados passaram")
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Teste da cascata de modelos (tools/model_router.py): escolha da rota,
+validação da resposta do modelo rápido e escalonamento a partir do
+checkpoint anterior ao turno.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from typing import Any, List
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import agent_langgraph_simple as agente
+from config.settings import settings
+from tools.model_router import FAST, QUALITY, ROUTE_TURNS, choose_route, count_items, side_effect_calls, validate_turn
+
+
+class _Roteiro(BaseChatModel):
+    """Modelo de chat que devolve respostas fixas em sequência (texto ou AIMessage com tool_calls)."""
+
+    respostas: List[Any]
+    chamadas: int = 0
+
+    @property
+    def _llm_type(self) -> str:
+        return "roteiro"
+
+    def bind_tools(self, tools, **kwargs):
+        return self
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        texto = self.respostas[min(self.chamadas, len(self.respostas) - 1)]
+        self.chamadas += 1
+        message = texto if isinstance(texto, AIMessage) else AIMessage(content=texto)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def test_escolha_da_rota():
+    """Reclamação, mensagem longa e vários itens vão direto para o modelo de qualidade"""
+    assert choose_route("tem arroz tio joão?") == (FAST, "simples")
+    assert choose_route("meu pedido veio errado, quero falar com o gerente") == (QUALITY, "reclamacao")
+    assert choose_route("quero arroz, feijão, óleo e açúcar") == (QUALITY, "varios_itens")
+    assert choose_route("arroz " * 80) == (QUALITY, "mensagem_longa")
+    assert count_items("2 leites e 1 pão") == 2
+    print("🧪 Rotas escolhidas conforme a complexidade")
+
+
+def test_validacao_da_resposta():
+    """Respostas vazias, com erro de ferramenta, vazamento interno ou desistência são reprovadas"""
+    pergunta = HumanMessage(content="tem café?")
+    assert validate_turn([pergunta, AIMessage(content="Temos sim! Café Pilão 500g por R$ 18,90.")]) is None
+    assert validate_turn([pergunta]) == "sem_resposta"
+    assert validate_turn([pergunta, AIMessage(content="  ")]) == "sem_resposta"
+    erro = ToolMessage(content="Erro ao consultar estoque", tool_call_id="1")
+    assert validate_turn([pergunta, erro, AIMessage(content="Temos sim")]) == "erro_ferramenta"
+    assert validate_turn([pergunta, AIMessage(content="EANS_ENCONTRADOS: 789...")]) == "vazamento_interno"
+    assert validate_turn([pergunta, AIMessage(content="Não consegui encontrar, tente novamente")]) == "desistiu"
+    print("🧪 Validação da resposta do modelo rápido")
+
+
+def test_escalonamento_bifurca_do_checkpoint():
+    """Resposta reprovada do modelo rápido é refeita no de qualidade sem deixar rastro no histórico"""
+    rapido = _Roteiro(respostas=["Oi! Temos arroz.", "Não consegui verificar, tente novamente."])
+    qualidade = _Roteiro(respostas=["Temos feijão carioca por R$ 8,50."])
+    modelos = {settings.llm_cascade_fast_model: rapido, None: qualidade}
+
+    saved_build, saved_prompt = agente._build_llm, agente.load_system_prompt
+    saved = {k: getattr(settings, k) for k in ("llm_cascade_enabled", "cassette_mode")}
+    saved_graphs = (agente._agent_graph, agente._fast_agent_graph)
+    agente._build_llm = lambda model=None: modelos[model]
+    agente.load_system_prompt = lambda: "PROMPT"
+    agente._agent_graph = agente._fast_agent_graph = None
+    settings.llm_cascade_enabled, settings.cassette_mode = True, "off"
+    try:
+        config = {"configurable": {"thread_id": "5585000000040"}}
+        escalados = ROUTE_TURNS.value(route=FAST, outcome="escalated", reason="desistiu")
+
+        r1 = agente._invoke_agent("5585000000040", "tem arroz?", {"messages": [HumanMessage(content="tem arroz?")]}, config)
+        assert r1["messages"][-1].content == "Oi! Temos arroz."
+
+        r2 = agente._invoke_agent("5585000000040", "e feijão?", {"messages": [HumanMessage(content="e feijão?")]}, config)
+        conteudos = [m.content for m in r2["messages"]]
+        assert conteudos == ["tem arroz?", "Oi! Temos arroz.", "e feijão?", "Temos feijão carioca por R$ 8,50."]
+        assert ROUTE_TURNS.value(route=FAST, outcome="escalated", reason="desistiu") == escalados + 1
+
+        estado = agente.get_agent_graph().get_state(config)
+        assert [m.content for m in estado.values["messages"]] == conteudos
+
+        # Primeiro turno de outra conversa: bifurca do checkpoint de entrada, sem apagar a conversa
+        checkpointer = agente.get_agent_graph().checkpointer
+
+        def proibido(thread_id):
+            raise AssertionError(f"delete_thread({thread_id}) no escalonamento")
+
+        checkpointer.delete_thread = proibido
+        try:
+            outro = {"configurable": {"thread_id": "5585000000041"}}
+            agente._invoke_agent("5585000000041", "tem feijão?", {"messages": [HumanMessage(content="tem feijão?")]}, outro)
+        finally:
+            del checkpointer.delete_thread
+        estado = agente.get_agent_graph().get_state(outro)
+        assert [m.content for m in estado.values["messages"]] == ["tem feijão?", "Temos feijão carioca por R$ 8,50."]
+        print(f"🧪 Histórico após escalonamento: {conteudos}")
+    finally:
+        agente._build_llm, agente.load_system_prompt = saved_build, saved_prompt
+        agente._agent_graph, agente._fast_agent_graph = saved_graphs
+        for key, value in saved.items():
+            setattr(settings, key, value)
+
+
+def test_sem_escalonamento_apos_efeito_colateral():
+    """Tentativa que já mexeu no carrinho/pedido não é refeita no modelo de qualidade"""
+    remover = AIMessage(content="", tool_calls=[{"name": "cart_remove", "args": {"ean": "7896100100000"}, "id": "c1"}])
+    assert side_effect_calls([remover]) == ["cart_remove"]
+    assert side_effect_calls([AIMessage(content="", tool_calls=[{"name": "ean_tool", "args": {}, "id": "c2"}])]) == []
+
+    rapido = _Roteiro(respostas=[remover, "Não consegui remover, tente novamente."])
+    qualidade = _Roteiro(respostas=["Removi o arroz do carrinho."])
+    modelos = {settings.llm_cascade_fast_model: rapido, None: qualidade}
+
+    saved_build, saved_prompt = agente._build_llm, agente.load_system_prompt
+    saved = {k: getattr(settings, k) for k in ("llm_cascade_enabled", "cassette_mode")}
+    saved_graphs = (agente._agent_graph, agente._fast_agent_graph)
+    agente._build_llm = lambda model=None: modelos[model]
+    agente.load_system_prompt = lambda: "PROMPT"
+    agente._agent_graph = agente._fast_agent_graph = None
+    settings.llm_cascade_enabled, settings.cassette_mode = True, "off"
+    try:
+        config = {"configurable": {"thread_id": "5585000000042"}}
+        mantidos = ROUTE_TURNS.value(route=FAST, outcome="not_escalated", reason="desistiu")
+        r = agente._invoke_agent("5585000000042", "tira o arroz", {"messages": [HumanMessage(content="tira o arroz")]}, config)
+        assert r["messages"][-1].content == "Não consegui remover, tente novamente."
+        assert qualidade.chamadas == 0
+        assert ROUTE_TURNS.value(route=FAST, outcome="not_escalated", reason="desistiu") == mantidos + 1
+        print("🧪 Turno com efeito colateral não escalado")
+    finally:
+        agente._build_llm, agente.load_system_prompt = saved_build, saved_prompt
+        agente._agent_graph, agente._fast_agent_graph = saved_graphs
+        for key, value in saved.items():
+            setattr(settings, key, value)
+
+
+if __name__ == "__main__":
+    test_escolha_da_rota()
+    test_validacao_da_resposta()
+    test_escalonamento_bifurca_do_checkpoint()
+    test_sem_escalonamento_apos_efeito_colateral()
+    print("✅ Todos os testes da cascata de modelos passaram")
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Teste da fila local de pedidos (tools/order_outbox.py) usada por pedidos/alterar.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import json
+import tempfile
+import time
+
+from config.settings import settings
+from mocks import MockServices, ServiceProfile
+from tools import order_outbox
+from tools.http_tools import alterar, pedidos
+
+PEDIDO = json.dumps({"cliente": "Ana", "telefone": "5585000000048", "itens": [{"produto": "Arroz", "quantidade": 1}]})
+
+
+def _com_fila(profile, fn):
+    keys = [k.lower() for k in MockServices().env()]
+    ajustes = {"order_outbox_enabled": True, "order_outbox_retry_base_seconds": 0.05,
+               "order_outbox_poll_seconds": 0.05, "breaker_enabled": False}
+    original = {k: getattr(settings, k) for k in (*keys, *ajustes, "order_outbox_path")}
+    with tempfile.TemporaryDirectory() as tmp, MockServices(profiles={"erp": profile}) as mocks:
+        mocks.apply_to_settings(settings)
+        for k, v in ajustes.items():
+            setattr(settings, k, v)
+        settings.order_outbox_path = os.path.join(tmp, "outbox.sqlite3")
+        try:
+            return fn(mocks)
+        finally:
+            order_outbox.stop_dispatcher()
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+def _aguardar(telefone, status, timeout=5.0):
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        entries = order_outbox.status_by_phone(telefone)
+        if entries and all(e["status"] == status for e in entries):
+            return entries
+        time.sleep(0.02)
+    raise AssertionError(f"esperava {status}: {order_outbox.status_by_phone(telefone)}")
+
+
+def test_pedido_repetido_nao_duplica():
+    """Entregue na hora; a repetição do LLM no mesmo turno não gera outro pedido, um novo turno sim"""
+    def rodar(mocks):
+        primeiro = pedidos(PEDIDO, turn_id="turno-1")
+        repetido = pedidos(PEDIDO, turn_id="turno-1")
+        assert primeiro.startswith("✅") and "entregue ao painel" in primeiro and "#1" in primeiro, primeiro
+        assert "já registrado" in repetido and "#1" in repetido, repetido
+        entries = order_outbox.status_by_phone("5585000000048")
+        assert len(entries) == 1 and entries[0]["status"] == order_outbox.DELIVERED and entries[0]["tentativas"] == 1
+        # Cliente pedindo o mesmo de novo (ex.: após cancelar) em outro turno
+        assert "entregue ao painel" in pedidos(PEDIDO, turn_id="turno-2")
+        assert len(order_outbox.status_by_phone("5585000000048")) == 2
+        return mocks.requests["erp"]
+
+    assert _com_fila(ServiceProfile(), rodar) == 2
+    print("🧪 Pedido entregue uma vez por turno")
+
+
+def test_retentativa_e_ordem_por_telefone():
+    """Com o painel falhando o pedido fica na fila com backoff; a alteração espera (sem tentativa) e só sai depois dele"""
+    def rodar(mocks):
+        mocks.profiles["erp"].error_rate = 1.0
+        resposta = pedidos(PEDIDO, turn_id="turno-1")
+        assert resposta.startswith("✅") and "será repetido" in resposta, resposta
+        na_fila = alterar("5585000000048", json.dumps({"status": "cancelado"}), turn_id="turno-2")
+        assert "logo depois" in na_fila and "não respondeu" not in na_fila, na_fila
+        time.sleep(0.3)
+        pedido, = [e for e in order_outbox.status_by_phone("5585000000048") if e["tipo"] == order_outbox.PEDIDO]
+        alteracao, = [e for e in order_outbox.status_by_phone("5585000000048") if e["tipo"] == order_outbox.ALTERACAO]
+        assert pedido["tentativas"] >= 2 and "503" in pedido["erro"]
+        assert alteracao["tentativas"] == 0 and alteracao["status"] == order_outbox.PENDING
+        mocks.profiles["erp"].error_rate = 0.0
+        entries = _aguardar("5585000000048", order_outbox.DELIVERED)
+        assert entries[0]["tipo"] == order_outbox.ALTERACAO and entries[0]["atualizado_em"] >= entries[1]["atualizado_em"]
+
+    _com_fila(ServiceProfile(), rodar)
+    print("🧪 Retentativas com backoff e ordem por telefone")
+
+
+def test_erro_definitivo_volta_para_o_agente():
+    """Um 400 do painel volta na resposta da ferramenta, sem novas tentativas"""
+    def rodar(mocks):
+        resposta = pedidos(PEDIDO, turn_id="turno-1")
+        assert resposta.startswith("Erro") and "HTTP 400" in resposta, resposta
+        entries = order_outbox.status_by_phone("5585000000048")
+        assert entries[0]["status"] == order_outbox.FAILED and entries[0]["tentativas"] == 1
+        # O LLM corrige e reenvia no mesmo turno: a recusa anterior não bloqueia
+        mocks.profiles["erp"].error_rate = 0.0
+        assert "entregue ao painel" in pedidos(PEDIDO, turn_id="turno-1")
+
+    _com_fila(ServiceProfile(error_rate=1.0, error_status=400), rodar)
+    print("🧪 Erro definitivo devolvido ao agente")
+
+
+if __name__ == "__main__":
+    test_pedido_repetido_nao_duplica()
+    test_retentativa_e_ordem_por_telefone()
+    test_erro_definitivo_volta_para_o_agente()
+    print("✅ Todos os testes da fila de pedidos passaram")
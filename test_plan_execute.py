@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Teste do modo plan_execute do agente (tools/plan_execute.py).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import AIMessage, ToolMessage
+
+import agent_langgraph_simple as agente
+from config.settings import settings
+from mocks import MULTI_ITEM_SCRIPT, MockServices
+from tools.plan_execute import _chained_estoque_calls
+
+
+def test_estoque_encadeado_do_plano():
+    """Os primeiros EANs de cada resultado de ean viram consultas de estoque, sem repetir as do plano"""
+    plano = AIMessage(content="", tool_calls=[
+        {"name": "ean", "args": {"query": "arroz"}, "id": "a"},
+        {"name": "estoque", "args": {"ean": "7896100100000"}, "id": "b"},
+    ])
+    resultados = [
+        ToolMessage(content="EANS_ENCONTRADOS:\n1) 7896100100000 - Arroz\n2) 7896100100017 - Arroz 1kg\n3) 7896100100024 - X", tool_call_id="a"),
+        ToolMessage(content="[]", tool_call_id="b"),
+    ]
+    calls = _chained_estoque_calls(plano, resultados, "estoque")
+    assert [c["args"]["ean"] for c in calls] == ["7896100100017"]
+    print("🧪 Estoque encadeado a partir dos EANs do plano")
+
+
+def test_turno_com_varios_itens_em_duas_chamadas():
+    """Três itens: uma chamada de plano, consultas em paralelo e uma chamada de resposta"""
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in keys}
+    saved = {k: getattr(settings, k) for k in ("agent_mode", "prefetch_enabled")}
+    saved_graphs = (agente._agent_graph, agente._fast_agent_graph)
+    with MockServices(llm_script=MULTI_ITEM_SCRIPT) as mocks:
+        mocks.apply_to_settings(settings)
+        settings.agent_mode, settings.prefetch_enabled = "plan_execute", False
+        agente._agent_graph = agente._fast_agent_graph = None
+        try:
+            result = agente.run_agent_langgraph("5585000000043", "quero arroz, feijão e óleo")
+            assert result["error"] is None and result["output"].startswith("Separei tudo")
+            assert mocks.requests["llm"] == 2
+            assert mocks.requests["smart_responder"] == 3
+
+            state = agente.get_agent_graph().get_state({"configurable": {"thread_id": "5585000000043"}})
+            msgs = state.values["messages"]
+            plano, encadeado = [m for m in msgs if isinstance(m, AIMessage) and m.tool_calls]
+            assert [c["args"]["query"] for c in plano.tool_calls] == ["quero arroz", "feijão", "óleo"]
+            assert all(c["name"] == "estoque" for c in encadeado.tool_calls)
+            respondidas = {m.tool_call_id for m in msgs if isinstance(m, ToolMessage)}
+            assert {c["id"] for c in plano.tool_calls + encadeado.tool_calls} == respondidas
+            print(f"🧪 Requisições: {mocks.requests}")
+        finally:
+            agente._agent_graph, agente._fast_agent_graph = saved_graphs
+            for k, v in {**original, **saved}.items():
+                setattr(settings, k, v)
+
+
+if __name__ == "__main__":
+    test_estoque_encadeado_do_plano()
+    test_turno_com_varios_itens_em_duas_chamadas()
+    print("✅ Todos os testes do modo plan_execute passaram")
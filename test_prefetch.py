@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Teste da pré-busca especulativa de produtos (tools/prefetch.py).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import threading
+import time
+
+import agent_langgraph_simple as agente
+from config.metrics import CACHE_REQUESTS
+from config.settings import settings
+from mocks import MockServices
+from tools import prefetch
+
+
+def test_extracao_de_produtos():
+    """Itens da lista sem intenção, quantidade e acentos"""
+    assert prefetch.extract_mentions("quero arroz, feijão e 2 coca 2l") == ["arroz", "feijao", "coca 2l"]
+    assert prefetch.extract_mentions("Oi, vocês tem leite integral?") == ["leite integral"]
+    assert prefetch.extract_mentions("me vê 2 kg de tomate") == ["tomate"]
+    assert prefetch.extract_mentions("bom dia") == []
+    # Mensagens sem produto não disparam consultas
+    for texto in ("sim pode confirmar", "obrigado", "pode ser pix", "meu endereço é rua das flores 123, bairro centro"):
+        assert prefetch.extract_mentions(texto) == [], texto
+    assert prefetch.query_key("Feijão  Carioca") == prefetch.query_key("carioca feijao")
+    print("🧪 Produtos extraídos da mensagem")
+
+
+def test_cache_do_turno():
+    """Ferramentas recebem o resultado pré-buscado (aguardando o que está em andamento) só dentro do turno"""
+    chamadas = []
+    liberar = threading.Event()
+
+    def ean_fn(query):
+        chamadas.append(("ean", query))
+        liberar.wait(2)
+        return f"EANS_ENCONTRADOS:\n1) 7896100100000 - {query}\n2) 7896100100017 - {query} 1kg\n\n[]"
+
+    def estoque_fn(ean):
+        chamadas.append(("estoque", ean))
+        return '[{"produto": "Arroz", "preco": 27.9}]'
+
+    with prefetch.scope("tem arroz?", ean_fn, estoque_fn):
+        threading.Timer(0.05, liberar.set).start()
+        resultado = prefetch.cached_ean_lookup("Arroz")
+        assert resultado and resultado.startswith("EANS_ENCONTRADOS")
+        deadline = time.time() + 2
+        while len(chamadas) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        assert prefetch.cached_estoque_preco("7896100100000") == '[{"produto": "Arroz", "preco": 27.9}]'
+        assert prefetch.cached_ean_lookup("feijão") is None
+    assert sorted(chamadas) == [("ean", "arroz"), ("estoque", "7896100100000"), ("estoque", "7896100100017")]
+    assert prefetch.cached_ean_lookup("arroz") is None
+    assert prefetch.PREFETCH_REQUESTS.value(kind="estoque", result="unused") >= 1
+    print(f"🧪 Chamadas da pré-busca: {chamadas}")
+
+
+def test_agente_usa_pre_busca():
+    """Turno completo contra os mocks: as ferramentas do agente não repetem as consultas pré-buscadas"""
+    keys = [k.lower() for k in MockServices().env()]
+    original = {k: getattr(settings, k) for k in keys}
+    saved_graphs = (agente._agent_graph, agente._fast_agent_graph)
+    hits = CACHE_REQUESTS.value(cache="prefetch_estoque", result="hit")
+    with MockServices() as mocks:
+        mocks.apply_to_settings(settings)
+        agente._agent_graph = agente._fast_agent_graph = None
+        try:
+            result = agente.run_agent_langgraph("5585000000041", "arroz 5kg")
+            assert result["error"] is None and "27,90" in result["output"]
+            assert mocks.requests["smart_responder"] == 1
+            assert mocks.requests["erp"] == 2  # dois primeiros EANs pré-buscados, nenhum repetido
+            assert CACHE_REQUESTS.value(cache="prefetch_estoque", result="hit") == hits + 1
+            print(f"🧪 Requisições: {mocks.requests}")
+        finally:
+            agente._agent_graph, agente._fast_agent_graph = saved_graphs
+            for k, v in original.items():
+                setattr(settings, k, v)
+
+
+if __name__ == "__main__":
+    test_extracao_de_produtos()
+    test_cache_do_turno()
+    test_agente_usa_pre_busca()
+    print("✅ Todos os testes da pré-busca passaram")
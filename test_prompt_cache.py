@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Teste do prompt com prefixo estável (make_cached_prompt) e do cache de
+prefixo simulado em mocks/llm.py.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_core.messages import HumanMessage, SystemMessage
+
+import agent_langgraph_simple as agente
+from config.settings import settings
+from mocks import DEFAULT_SCRIPT, PrefixCache, chat_completion
+
+
+def test_prefixo_identico_e_contexto_no_fim():
+    """O SystemMessage do prefixo é o mesmo objeto a cada chamada; o contexto variável vem por último"""
+    prompt = agente.make_cached_prompt("PROMPT FIXO")
+    conversa = [HumanMessage(content="quero arroz")]
+    a = prompt({"messages": conversa}, {})
+    b = prompt({"messages": conversa + [HumanMessage(content="e feijão")]}, {})
+    assert a[0] is b[0] and a[0].content == "PROMPT FIXO"
+    assert a[1:-1] == conversa
+    assert isinstance(a[-1], SystemMessage) and "Data/hora atual" in a[-1].content
+
+
+def test_contexto_registrado_e_falha_isolada():
+    """Provedores de contexto entram no rabo; um provedor com erro não derruba o prompt"""
+    @agente.register_prompt_tail
+    def _carrinho(state, config):
+        return f"Carrinho de {config['configurable']['thread_id']}: vazio"
+
+    @agente.register_prompt_tail
+    def _quebrado(state, config):
+        raise RuntimeError("falhou")
+
+    try:
+        msgs = agente.make_cached_prompt("P")({"messages": []}, {"configurable": {"thread_id": "5585"}})
+        assert "Carrinho de 5585: vazio" in msgs[-1].content
+    finally:
+        agente._prompt_tail_providers.remove(_carrinho)
+        agente._prompt_tail_providers.remove(_quebrado)
+
+
+def test_formato_anthropic_com_cache_control():
+    """moonshot (API Anthropic): bloco com cache_control e contexto como mensagem do usuário"""
+    original = settings.llm_provider
+    settings.llm_provider = "moonshot"
+    try:
+        msgs = agente.make_cached_prompt("P")({"messages": [HumanMessage(content="oi")]}, {})
+    finally:
+        settings.llm_provider = original
+    assert msgs[0].content[0]["cache_control"] == {"type": "ephemeral"}
+    assert isinstance(msgs[-1], HumanMessage)
+
+
+def test_cache_de_prefixo_simulado():
+    """Segunda chamada com o mesmo prefixo longo reporta tokens em cache"""
+    cache = PrefixCache()
+    prefixo = {"role": "system", "content": "regras " * 1500}
+    r1 = chat_completion({"messages": [prefixo, {"role": "user", "content": "oi"}]}, DEFAULT_SCRIPT, cache)
+    r2 = chat_completion({"messages": [prefixo, {"role": "user", "content": "tem arroz?"}]}, DEFAULT_SCRIPT, cache)
+    assert r1["usage"]["prompt_tokens_details"]["cached_tokens"] == 0
+    cached = r2["usage"]["prompt_tokens_details"]["cached_tokens"]
+    assert cached >= 1024 and cached % 128 == 0
+    print(f"🧪 {cached}/{r2['usage']['prompt_tokens']} tokens em cache")
+
+
+if __name__ == "__main__":
+    test_prefixo_identico_e_contexto_no_fim()
+    test_contexto_registrado_e_falha_isolada()
+    test_formato_anthropic_com_cache_control()
+    test_cache_de_prefixo_simulado()
+    print("✅ Todos os testes de prompt em cache passaram")
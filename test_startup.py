@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+Teste do aquecimento na inicialização e do endpoint /ready.
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+
+import server
+from config.settings import settings
+from mocks import MockServices
+
+
+def test_ready_so_apos_aquecimento():
+    """/ready responde 503 até run_warmup terminar e lista as fases com duração"""
+    client = TestClient(server.app)
+    saved_state = dict(server._startup_state)
+    saved = {k: getattr(settings, k) for k in ("whatsapp_api_url", "supermercado_base_url",
+                                               "estoque_ean_base_url", "smart_responder_url", "warmup_llm")}
+    server._startup_state.update({"ready": False, "phases": {}})
+    try:
+        resp = client.get("/ready")
+        assert resp.status_code == 503
+        assert resp.json()["status"] == "starting"
+
+        with MockServices() as mocks:
+            for key in ("whatsapp_api_url", "supermercado_base_url", "estoque_ean_base_url", "smart_responder_url"):
+                setattr(settings, key, mocks.base_url)
+            settings.warmup_llm = False
+            server.run_warmup()
+
+        resp = client.get("/ready")
+        assert resp.status_code == 200
+        phases = resp.json()["phases"]
+        assert {"agent_graph", "redis", "http"} <= set(phases)
+        assert phases["agent_graph"]["status"] == "ok"
+        assert phases["http"]["status"] == "ok"
+        assert "llm" not in phases
+        assert 'agente_startup_phase_seconds{phase="agent_graph"}' in client.get("/metrics").text
+        print(f"🧪 Fases: {phases}")
+    finally:
+        server._startup_state.clear()
+        server._startup_state.update(saved_state)
+        for key, value in saved.items():
+            setattr(settings, key, value)
+
+
+def test_ready_mesmo_com_erro_fora_das_fases():
+    """Erro fora das fases (ex.: no span de tracing) não deixa o /ready preso em 503"""
+    client = TestClient(server.app)
+    saved_state = dict(server._startup_state)
+    original_span = server.tracing.span
+
+    def span_quebrado(*args, **kwargs):
+        raise RuntimeError("exportador de traces fora")
+
+    server._startup_state.update({"ready": False, "phases": {}})
+    server.tracing.span = span_quebrado
+    try:
+        try:
+            server.run_warmup()
+            raise AssertionError("o erro deveria chegar ao chamador (e ao log do future)")
+        except RuntimeError:
+            pass
+        assert client.get("/ready").status_code == 200
+        print("🧪 /ready liberado após falha no aquecimento")
+    finally:
+        server.tracing.span = original_span
+        server._startup_state.clear()
+        server._startup_state.update(saved_state)
+
+
+if __name__ == "__main__":
+    test_ready_so_apos_aquecimento()
+    test_ready_mesmo_com_erro_fora_das_fases()
+    print("✅ Testes de aquecimento passaram")
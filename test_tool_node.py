@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Teste da execução concorrente das chamadas de ferramenta (tools/tool_node.py).
+"""
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import time
+from contextvars import ContextVar
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import tool
+
+from config.settings import settings
+from tools import tool_node
+from tools.tool_node import TOOL_BATCH_SAVED, TOOL_TIMEOUTS, InstrumentedToolNode
+
+_turno: ContextVar[str] = ContextVar("turno", default="-")
+
+
+@tool
+def lento(item: str) -> str:
+    """Ferramenta de teste que demora 0.3s."""
+    time.sleep(0.3)
+    return f"{item}@{_turno.get()}"
+
+
+@tool
+def travada(item: str) -> str:
+    """Ferramenta de teste que passa do tempo limite."""
+    time.sleep(1.5)
+    return item
+
+
+def _chamadas(*pares):
+    return AIMessage(content="", tool_calls=[
+        {"name": nome, "args": {"item": item}, "id": f"c{i}"} for i, (nome, item) in enumerate(pares)
+    ])
+
+
+def test_chamadas_em_paralelo_e_em_ordem():
+    """Três chamadas de 0.3s terminam juntas, na ordem pedida e com o contexto do turno"""
+    node = InstrumentedToolNode([lento])
+    token = _turno.set("t1")
+    try:
+        start = time.perf_counter()
+        out = node.invoke({"messages": [_chamadas(("lento", "arroz"), ("lento", "feijao"), ("lento", "oleo"))]})
+        wall = time.perf_counter() - start
+    finally:
+        _turno.reset(token)
+    assert [m.content for m in out["messages"]] == ["arroz@t1", "feijao@t1", "oleo@t1"]
+    assert [m.tool_call_id for m in out["messages"]] == ["c0", "c1", "c2"]
+    assert wall < 0.8, wall
+    assert TOOL_BATCH_SAVED.count() >= 1
+    print(f"🧪 3 chamadas em {wall:.2f}s")
+
+
+def test_tempo_limite_por_ferramenta():
+    """A chamada que estoura o tempo vira erro sem atrasar as demais"""
+    saved = dict(settings.tool_timeouts)
+    settings.tool_timeouts = {**saved, "travada": 0.5}
+    try:
+        node = InstrumentedToolNode([lento, travada])
+        antes = TOOL_TIMEOUTS.value(tool="travada")
+        start = time.perf_counter()
+        out = node.invoke({"messages": [_chamadas(("travada", "x"), ("lento", "arroz"))]})
+        wall = time.perf_counter() - start
+    finally:
+        settings.tool_timeouts = saved
+    erro, ok = out["messages"]
+    assert erro.status == "error" and erro.content.startswith("Erro: tempo limite")
+    assert ok.content == "arroz@-"
+    assert wall < 1.0, wall
+    assert TOOL_TIMEOUTS.value(tool="travada") == antes + 1
+    print(f"🧪 Tempo limite aplicado em {wall:.2f}s")
+
+
+def test_fila_do_pool_nao_conta_no_tempo_limite():
+    """Com o pool ocupado, a espera na fila não consome o tempo limite da ferramenta"""
+    saved_timeouts, saved_workers, saved_pool = dict(settings.tool_timeouts), settings.tool_pool_workers, tool_node._pool
+    settings.tool_timeouts = {**saved_timeouts, "lento": 0.5}
+    settings.tool_pool_workers, tool_node._pool = 1, None
+    try:
+        assert tool_node.pool_size() == 1
+        node = InstrumentedToolNode([lento])
+        # Segunda chamada espera 0.3s na fila e roda 0.3s: 0.6s do início do passo, 0.3s de execução
+        out = node.invoke({"messages": [_chamadas(("lento", "arroz"), ("lento", "feijao"))]})
+    finally:
+        tool_node._pool.shutdown(wait=True)
+        settings.tool_timeouts, settings.tool_pool_workers, tool_node._pool = saved_timeouts, saved_workers, saved_pool
+    assert [m.content for m in out["messages"]] == ["arroz@-", "feijao@-"]
+    print("🧪 Espera na fila fora do tempo limite")
+
+
+if __name__ == "__main__":
+    test_chamadas_em_paralelo_e_em_ordem()
+    test_tempo_limite_por_ferramenta()
+    test_fila_do_pool_nao_conta_no_tempo_limite()
+    print("✅ Todos os testes de ferramentas concorrentes passaram")
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Teste do tracing (config/tracing.py): hierarquia de spans, propagação entre
+threads, exportação OTLP/JSON e trace_id nos registros de log.
+"""
+import json
+import logging
+import os
+import sys
+import tempfile
+import threading
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from config import tracing
+from config.settings import settings
+
+
+_ORIGINAL = {k: getattr(settings, k) for k in ("trace_export_file", "tracing_enabled", "trace_max_bytes")}
+
+
+def _export_to_tmp():
+    fd, path = tempfile.mkstemp(suffix=".jsonl")
+    os.close(fd)
+    settings.trace_export_file = path
+    settings.tracing_enabled = True
+    return path
+
+
+def _restore(path):
+    tracing.flush()
+    for k, v in _ORIGINAL.items():
+        setattr(settings, k, v)
+    for name in os.listdir(os.path.dirname(path)):
+        if name.startswith(os.path.basename(path)):
+            os.remove(os.path.join(os.path.dirname(path), name))
+
+
+def _read_spans(path):
+    spans = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            for rs in json.loads(line)["resourceSpans"]:
+                for ss in rs["scopeSpans"]:
+                    spans.extend(ss["spans"])
+    return spans
+
+
+def test_hierarquia_e_threads():
+    """Spans filhos herdam o trace, inclusive em thread iniciada com bind_context"""
+    path = _export_to_tmp()
+    tracing.flush()
+    with tracing.span("webhook", telefone="5511999998888") as root:
+        def worker():
+            with tracing.span("buffer_wait"):
+                with tracing.span("tool.ean_lookup"):
+                    pass
+        t = threading.Thread(target=tracing.bind_context(worker))
+        t.start()
+        t.join()
+    tracing.flush()
+
+    spans = {s["name"]: s for s in _read_spans(path)}
+    print(f"🧪 Spans exportados: {sorted(spans)}")
+    assert spans["webhook"]["traceId"] == root.trace_id
+    assert spans["buffer_wait"]["traceId"] == root.trace_id
+    assert spans["buffer_wait"]["parentSpanId"] == spans["webhook"]["spanId"]
+    assert spans["tool.ean_lookup"]["parentSpanId"] == spans["buffer_wait"]["spanId"]
+    assert "parentSpanId" not in spans["webhook"]
+    _restore(path)
+
+
+def test_erro_marcado_no_span():
+    """Exceções dentro do span marcam status de erro (code=2)"""
+    path = _export_to_tmp()
+    try:
+        with tracing.span("agent"):
+            raise RuntimeError("falhou")
+    except RuntimeError:
+        pass
+    tracing.flush()
+    spans = _read_spans(path)
+    assert spans[-1]["status"]["code"] == 2
+    assert "falhou" in spans[-1]["status"]["message"]
+    _restore(path)
+
+
+def test_trace_id_no_log():
+    """O filtro do QueueHandler anexa o trace_id ativo ao registro"""
+    from config.logger import _TraceContextFilter
+    path = _export_to_tmp()
+    record = logging.LogRecord("t", logging.INFO, __file__, 1, "msg", (), None)
+    with tracing.span("webhook") as sp:
+        _TraceContextFilter().filter(record)
+    assert record.trace_id == sp.trace_id
+    _restore(path)
+
+
+def test_arquivo_de_spans_rotaciona():
+    """O arquivo de spans não cresce sem limite: rotaciona por tamanho e comprime"""
+    path = _export_to_tmp()
+    settings.trace_max_bytes = 2000
+    for i in range(40):
+        with tracing.span("webhook", telefone=f"55119999{i:05d}"):
+            pass
+        tracing.flush()
+    rotacionados = [n for n in os.listdir(os.path.dirname(path))
+                    if n.startswith(os.path.basename(path)) and n.endswith(".gz")]
+    assert rotacionados and len(rotacionados) <= settings.trace_backup_count, rotacionados
+    assert os.path.getsize(path) <= 2000
+    _restore(path)
+    print(f"🧪 Spans rotacionados: {sorted(rotacionados)}")
+
+
+def test_desligado_por_padrao():
+    """Sem TRACING_ENABLED nenhum span é criado nem exportado"""
+    from config.settings import Settings
+    assert Settings.model_fields["tracing_enabled"].default is False
+    settings.tracing_enabled = False
+    try:
+        with tracing.span("webhook") as sp:
+            assert sp is None
+    finally:
+        settings.tracing_enabled = _ORIGINAL["tracing_enabled"]
+
+
+if __name__ == "__main__":
+    test_hierarquia_e_threads()
+    test_erro_marcado_no_span()
+    test_trace_id_no_log()
+    test_arquivo_de_spans_rotaciona()
+    test_desligado_por_padrao()
+    print("✅ Todos os testes de tracing passaram")
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Teste do normalizador de webhooks com payloads gravados (benchmarks/payloads).
+Não requer servidor, Redis ou banco de dados.
+"""
+import json
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tools.webhook_normalizer import IncomingMessage, detect_layout, normalize_incoming, sanitize_number
+
+PAYLOAD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmarks", "payloads")
+
+
+def _load(name: str) -> dict:
+    with open(os.path.join(PAYLOAD_DIR, f"{name}.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_layouts_gravados():
+    """Cada payload gravado é detectado e normalizado corretamente"""
+    print("🧪 Testando layouts gravados...")
+
+    esperado = {
+        "uaz_message_text": ("uaz_top_level", "558598752006", "quero arroz, feijão e 2 coca 2l", False),
+        "uaz_message_from_me": ("uaz_top_level", "558598752006", "Tem sim! Arroz Camil 5kg R$ 27,90. Quer quantos?", True),
+        "uaz_messages_list": ("uaz_messages", "558598752006", "e uma dúzia de ovos", False),
+        "uaz_body_image": ("uaz_body", "558598752006", "tem esse aqui?", False),
+        "cloud_api_text": ("cloud_api", "558598752006", "que horas vocês fecham?", False),
+    }
+    for name, (layout, telefone, texto, from_me) in esperado.items():
+        payload = _load(name)
+        msg = normalize_incoming(payload)
+        print(f"   {name}: {msg}")
+        assert isinstance(msg, IncomingMessage)
+        assert detect_layout(payload) == layout
+        assert msg.telefone == telefone
+        assert msg.mensagem_texto == texto
+        assert msg.from_me is from_me
+
+
+def test_fallback_sem_telefone():
+    """Layout detectado sem telefone cai no formato UAZ de topo"""
+    payload = {"messages": [{"content": {"text": "oi"}}], "sender": "5585999990000@s.whatsapp.net"}
+    msg = normalize_incoming(payload)
+    assert msg.telefone == "5585999990000"
+
+
+def test_sanitize_number():
+    """Sufixos de domínio e prefixo owner: são removidos"""
+    assert sanitize_number("558598752006@s.whatsapp.net") == "558598752006"
+    assert sanitize_number("558597520000:558598752006") == "558598752006"
+    assert sanitize_number("+55 85 9875-2006") == "558598752006"
+    assert sanitize_number("") is None
+    assert sanitize_number(None) is None
+
+
+if __name__ == "__main__":
+    test_layouts_gravados()
+    test_fallback_sem_telefone()
+    test_sanitize_number()
+    print("✅ Todos os testes do normalizador passaram")
@@ -4,6 +4,7 @@ Módulo de ferramentas do Agente de Supermercado
 from .http_tools import estoque, pedidos, alterar, ean_lookup, estoque_preco
 from .redis_tools import push_message_to_buffer, get_buffer_length, pop_all_messages, set_agent_cooldown, is_agent_in_cooldown
 from .time_tool import get_current_time
+from .fast_path import answer_fast_path, classify_intent
 
 __all__ = [
     'estoque',
@@ -16,5 +17,7 @@ __all__ = [
     'is_agent_in_cooldown',
     'get_current_time',
     'ean_lookup',
-    'estoque_preco'
+    'estoque_preco',
+    'answer_fast_path',
+    'classify_intent',
 ]
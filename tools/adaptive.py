@@ -0,0 +1,157 @@
+"""
+Timeouts adaptativos e orçamento de retentativas por serviço externo (host)
+
+Cada resposta alimenta um esboço de percentis do host (histograma logarítmico,
+erro relativo ~settings.adaptive_sketch_accuracy), em duas janelas de
+adaptive_window_seconds que se revezam para refletir só a latência recente.
+O timeout de cada requisição passa a ser adaptive_timeout_multiplier × p99,
+entre adaptive_timeout_min_seconds e adaptive_timeout_max_seconds; com poucas
+amostras vale o timeout fixo passado pelo chamador.
+
+Retentativas gastam fichas de um balde por host que só recebe
+retry_budget_ratio ficha por requisição original: num incidente as retentativas
+ficam limitadas a essa fração do tráfego em vez de multiplicá-lo.
+"""
+import math
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from config.metrics import REGISTRY
+from config.settings import settings
+
+UPSTREAM_TIMEOUT = REGISTRY.gauge(
+    "agente_upstream_timeout_seconds",
+    "Timeout adaptativo atual por serviço externo (múltiplo do p99 recente)",
+    ["host"],
+)
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "agente_upstream_retries_total",
+    "Retentativas por serviço externo: issued (feita) ou budget_exhausted (recusada pelo orçamento)",
+    ["host", "result"],
+)
+
+
+class LatencySketch:
+    """Histograma com baldes logarítmicos: percentis com erro relativo limitado e memória pequena."""
+
+    def __init__(self, accuracy: float = 0.02):
+        self.gamma = (1 + accuracy) / (1 - accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+
+    def add(self, seconds: float) -> None:
+        index = math.ceil(math.log(max(seconds, 1e-4)) / self._log_gamma)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+
+    def quantile(self, q: float, other: Optional["LatencySketch"] = None) -> Optional[float]:
+        """Percentil q (0..1), opcionalmente somando os baldes de outro esboço."""
+        buckets = dict(self.buckets)
+        if other is not None:
+            for index, n in other.buckets.items():
+                buckets[index] = buckets.get(index, 0) + n
+        total = sum(buckets.values())
+        if not total:
+            return None
+        rank = q * (total - 1)
+        seen = 0
+        for index in sorted(buckets):
+            seen += buckets[index]
+            if seen > rank:
+                return 2 * self.gamma ** index / (self.gamma + 1)
+        return 2 * self.gamma ** max(buckets) / (self.gamma + 1)
+
+
+class _HostStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = LatencySketch(settings.adaptive_sketch_accuracy)
+        self.previous = LatencySketch(settings.adaptive_sketch_accuracy)
+        self.rotated_at = time.monotonic()
+        self.tokens = float(settings.retry_budget_burst)
+
+    def _rotate(self) -> None:
+        elapsed = time.monotonic() - self.rotated_at
+        window = float(settings.adaptive_window_seconds)
+        if elapsed < window:
+            return
+        # Sem tráfego por mais de duas janelas, a janela anterior também já não vale
+        self.previous = self.current if elapsed < 2 * window else LatencySketch(settings.adaptive_sketch_accuracy)
+        self.current = LatencySketch(settings.adaptive_sketch_accuracy)
+        self.rotated_at = time.monotonic()
+
+    def observe(self, seconds: float) -> None:
+        with self.lock:
+            self._rotate()
+            self.current.add(seconds)
+
+    def quantile(self, q: float, min_samples: int) -> Optional[float]:
+        with self.lock:
+            self._rotate()
+            if self.current.count + self.previous.count < min_samples:
+                return None
+            return self.current.quantile(q, self.previous)
+
+
+_hosts: Dict[str, _HostStats] = {}
+_hosts_lock = threading.Lock()
+
+
+def _stats(host: str) -> _HostStats:
+    stats = _hosts.get(host)
+    if stats is None:
+        with _hosts_lock:
+            stats = _hosts.setdefault(host, _HostStats())
+    return stats
+
+
+def observe(host: str, seconds: float) -> None:
+    """Registra a duração de uma requisição ao host (respostas e timeouts do próprio serviço)."""
+    _stats(host).observe(seconds)
+
+
+def quantile(host: str, q: float, min_samples: int = 1) -> Optional[float]:
+    """Percentil recente das latências do host, ou None com menos de min_samples amostras."""
+    return _stats(host).quantile(q, min_samples)
+
+
+def timeout_for(host: str, timeout: Any) -> Any:
+    """Timeout da requisição: múltiplo do p99 recente do host, ou o fixo sem amostras suficientes."""
+    if not settings.adaptive_timeout_enabled or timeout is None:
+        return timeout
+    p99 = quantile(host, 0.99, settings.adaptive_min_samples)
+    if p99 is None:
+        return timeout
+    adaptive = min(max(p99 * settings.adaptive_timeout_multiplier, settings.adaptive_timeout_min_seconds),
+                   settings.adaptive_timeout_max_seconds)
+    UPSTREAM_TIMEOUT.set(adaptive, host=host)
+    # Em (connect, read) só o read acompanha a latência observada
+    if isinstance(timeout, tuple):
+        return (timeout[0], adaptive)
+    return adaptive
+
+
+def earn_retry(host: str) -> None:
+    """Cada requisição original rende retry_budget_ratio ficha ao balde do host."""
+    stats = _stats(host)
+    with stats.lock:
+        stats.tokens = min(float(settings.retry_budget_burst), stats.tokens + settings.retry_budget_ratio)
+
+
+def allow_retry(host: str) -> bool:
+    """Gasta uma ficha do balde do host; False quando o orçamento de retentativas acabou."""
+    stats = _stats(host)
+    with stats.lock:
+        allowed = stats.tokens >= 1.0
+        if allowed:
+            stats.tokens -= 1.0
+    UPSTREAM_RETRIES.inc(host=host, result="issued" if allowed else "budget_exhausted")
+    return allowed
+
+
+def reset() -> None:
+    """Descarta latências e orçamentos observados (testes)."""
+    with _hosts_lock:
+        _hosts.clear()
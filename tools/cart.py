@@ -0,0 +1,231 @@
+"""
+Carrinho do cliente mantido pelas ferramentas do agente
+
+Um hash no Redis por telefone (cart:<telefone>), com um campo por EAN contendo
+nome e preço unitário e um campo q:<EAN> com a quantidade; expira em
+settings.cart_ttl_seconds sem alterações. A quantidade muda só com
+HINCRBYFLOAT, então chamadas de ferramenta em paralelo no mesmo turno não
+perdem itens. Sem Redis, o carrinho fica em memória no processo.
+
+Nome e preço vêm do ERP (estoque_preco, aproveitando a pré-busca do turno) no
+momento em que o item entra no carrinho, e os totais são calculados aqui, não
+pelo LLM. Com o ERP fora, o preço guardado pelo circuit breaker ainda entra no
+carrinho, marcado como "a confirmar", e o total sai como provisório. O resumo compacto entra no contexto variável do prompt e o
+pedidos_tool monta os itens/total do pedido a partir do carrinho.
+"""
+import json
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+import redis
+
+from config import fast_json
+from config.logger import setup_logger
+from config.settings import settings
+from tools.redis_tools import get_redis_client
+
+logger = setup_logger(__name__)
+
+_NAME_KEYS = ("produto", "descricao", "nome", "name")
+_QTY_PREFIX = "q:"
+
+# Carrinhos em memória (fallback quando Redis não está disponível)
+_local_carts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+_local_lock = threading.Lock()
+
+
+def cart_key(telefone: str) -> str:
+    """Chave do hash do carrinho no Redis."""
+    return f"cart:{telefone}"
+
+
+def _load(telefone: str) -> Dict[str, Dict[str, Any]]:
+    client = get_redis_client()
+    if client is not None:
+        try:
+            raw = client.hgetall(cart_key(telefone))
+            cart = {}
+            for ean, value in raw.items():
+                if ean.startswith(_QTY_PREFIX):
+                    continue
+                item = fast_json.loads(value)
+                item["quantidade"] = float(raw.get(_QTY_PREFIX + ean, item.get("quantidade", 0)))
+                if item["quantidade"] > 0:
+                    cart[ean] = item
+            return cart
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Erro ao ler carrinho no Redis: {e}")
+    with _local_lock:
+        return {ean: dict(item) for ean, item in _local_carts.get(telefone, {}).items()}
+
+
+def _change_quantity(telefone: str, ean: str, delta: Optional[float],
+                     info: Optional[Dict[str, Any]] = None) -> Optional[float]:
+    """
+    Soma delta à quantidade do item de forma atômica e renova a validade do
+    carrinho. info (nome/preço) só é gravado se o item ainda não existir;
+    delta=None ou quantidade final <= 0 removem o item. Retorna a quantidade
+    final (None se o item não estava no carrinho e não veio info).
+    """
+    client = get_redis_client()
+    if client is not None:
+        key = cart_key(telefone)
+        try:
+            if delta is None:
+                pipe = client.pipeline()
+                pipe.hdel(key, ean, _QTY_PREFIX + ean)
+                pipe.expire(key, int(settings.cart_ttl_seconds))
+                removed, _ = pipe.execute()
+                return 0.0 if removed else None
+            if info is None and not client.hexists(key, ean):
+                return None
+            pipe = client.pipeline()
+            if info is not None:
+                pipe.hsetnx(key, ean, fast_json.dumps({**info, "adicionado": time.time()}))
+            pipe.hincrbyfloat(key, _QTY_PREFIX + ean, float(delta))
+            pipe.expire(key, int(settings.cart_ttl_seconds))
+            quantidade = float(pipe.execute()[-2])
+            if quantidade <= 0:
+                client.hdel(key, ean, _QTY_PREFIX + ean)
+                return 0.0
+            return quantidade
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Erro ao gravar carrinho no Redis: {e}")
+    with _local_lock:
+        cart = _local_carts.setdefault(telefone, {})
+        current = cart.get(ean)
+        if current is None and info is None:
+            return None
+        if current is None:
+            current = cart[ean] = {**info, "quantidade": 0.0, "adicionado": time.time()}
+        quantidade = 0.0 if delta is None else float(current["quantidade"]) + float(delta)
+        if quantidade <= 0:
+            cart.pop(ean, None)
+            return 0.0
+        current["quantidade"] = quantidade
+        return quantidade
+
+
+def clear(telefone: str) -> None:
+    client = get_redis_client()
+    if client is not None:
+        try:
+            client.delete(cart_key(telefone))
+        except redis.exceptions.RedisError as e:
+            logger.error(f"Erro ao limpar carrinho no Redis: {e}")
+    with _local_lock:
+        _local_carts.pop(telefone, None)
+
+
+def phone_from(config: Optional[Dict[str, Any]]) -> str:
+    """Telefone da conversa (thread_id do grafo)."""
+    return str(((config or {}).get("configurable") or {}).get("thread_id") or "")
+
+
+def _lookup(ean: str) -> Optional[Dict[str, Any]]:
+    """
+    Nome e preço atuais do EAN no ERP (None se não encontrado/sem preço).
+    provisorio=True quando o preço é o último guardado (ERP indisponível).
+    """
+    from tools import prefetch
+    from tools.http_tools import estoque_preco, split_stale_notice
+
+    raw = prefetch.cached_estoque_preco(ean) or estoque_preco(ean)
+    notice, body = split_stale_notice(raw)
+    try:
+        items = json.loads(body)
+    except (TypeError, ValueError):
+        logger.warning(f"Carrinho: consulta do EAN {ean} falhou: {str(raw)[:200]}")
+        return None
+    items = [i for i in items if isinstance(i, dict) and isinstance(i.get("preco"), (int, float))] if isinstance(items, list) else []
+    if not items:
+        return None
+    item = next((i for i in items if str(i.get("codigo_ean", "")) == ean), items[0])
+    nome = next((str(item[k]) for k in _NAME_KEYS if item.get(k)), ean)
+    info = {"nome": nome, "preco": float(item["preco"])}
+    if notice:
+        info["provisorio"] = True
+    return info
+
+
+def _money(value: float) -> str:
+    return "R$ " + f"{value:.2f}".replace(".", ",")
+
+
+def _qty(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else f"{value:g}".replace(".", ",")
+
+
+def items(telefone: str) -> List[Dict[str, Any]]:
+    """Itens do carrinho com subtotal, na ordem em que entraram."""
+    cart = _load(telefone)
+    out = []
+    for ean, item in sorted(cart.items(), key=lambda kv: kv[1].get("adicionado", 0)):
+        subtotal = round(float(item["quantidade"]) * float(item["preco"]), 2)
+        out.append({"ean": ean, "nome": item["nome"], "quantidade": item["quantidade"],
+                    "preco": item["preco"], "subtotal": subtotal,
+                    "provisorio": bool(item.get("provisorio"))})
+    return out
+
+
+def total(cart_items: List[Dict[str, Any]]) -> float:
+    return round(sum(i["subtotal"] for i in cart_items), 2)
+
+
+def summary(telefone: str) -> str:
+    """Resumo compacto: uma linha por item e o total."""
+    return render(items(telefone))
+
+
+def render(cart_items: List[Dict[str, Any]]) -> str:
+    """Resumo de itens já carregados (sem nova leitura do carrinho)."""
+    if not cart_items:
+        return "Carrinho vazio."
+    lines = [f"- {_qty(i['quantidade'])}x {i['nome']} ({i['ean']}) {_money(i['preco'])} = {_money(i['subtotal'])}"
+             + (" (preço a confirmar)" if i.get("provisorio") else "")
+             for i in cart_items]
+    footer = f"\nTotal: {_money(total(cart_items))}"
+    if any(i.get("provisorio") for i in cart_items):
+        footer += " (provisório: sistema do mercado indisponível, valores confirmados na separação)"
+    return f"Carrinho ({len(cart_items)} itens):\n" + "\n".join(lines) + footer
+
+
+def add(telefone: str, ean: str, quantidade: float = 1) -> str:
+    ean = "".join(filter(str.isdigit, ean or ""))
+    if not telefone or not ean:
+        return "Erro: telefone ou EAN ausente."
+    if quantidade <= 0:
+        return "Erro: a quantidade deve ser maior que zero."
+    if _change_quantity(telefone, ean, quantidade) is None:
+        info = _lookup(ean)
+        if info is None:
+            return f"Não encontrei preço/estoque para o EAN {ean}; o item não foi adicionado."
+        _change_quantity(telefone, ean, quantidade, info)
+    logger.info(f"Carrinho {telefone}: +{_qty(quantidade)} {ean}")
+    return summary(telefone)
+
+
+def remove(telefone: str, ean: str, quantidade: Optional[float] = None) -> str:
+    ean = "".join(filter(str.isdigit, ean or ""))
+    if _change_quantity(telefone, ean, None if quantidade is None else -float(quantidade)) is None:
+        return f"O EAN {ean} não está no carrinho.\n" + summary(telefone)
+    logger.info(f"Carrinho {telefone}: -{'tudo' if quantidade is None else _qty(quantidade)} {ean}")
+    return summary(telefone)
+
+
+def fill_order(telefone: str, data: Dict[str, Any]) -> bool:
+    """
+    Completa o corpo do pedido com os itens e o total do carrinho (quando o LLM
+    não mandou itens). Retorna True se o carrinho foi usado.
+    """
+    cart_items = items(telefone)
+    if not cart_items or data.get("itens"):
+        return False
+    data["itens"] = [{"ean": i["ean"], "produto": i["nome"], "quantidade": i["quantidade"],
+                      "preco": i["preco"], "subtotal": i["subtotal"]} for i in cart_items]
+    data["total"] = total(cart_items)
+    if any(i["provisorio"] for i in cart_items):
+        data["preco_a_confirmar"] = True
+    data.setdefault("telefone", telefone)
+    return True
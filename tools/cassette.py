@@ -0,0 +1,274 @@
+"""
+Gravação/reprodução (cassetes) de chamadas ao LLM e aos serviços HTTP
+
+Modos (settings.cassette_mode):
+  off     comportamento normal
+  record  executa a chamada real e grava requisição → resposta
+  replay  responde apenas do cassete; requisição não gravada gera CassetteMiss
+  auto    reproduz se houver gravação, senão executa e grava
+
+Cada cassete é um arquivo JSONL em settings.cassette_dir, uma linha por
+interação, indexada pelo hash da requisição normalizada (sem headers de
+autenticação, JSON com chaves ordenadas, datas/horas voláteis mascaradas).
+Requisições repetidas com o mesmo hash são reproduzidas na ordem gravada.
+"""
+import hashlib
+import re
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from config import fast_json
+from config.logger import setup_logger
+from config.settings import settings
+
+logger = setup_logger(__name__)
+
+MODES = ("off", "record", "replay", "auto")
+
+# Trechos que mudam a cada execução e não devem alterar o hash
+_VOLATILE = (
+    (re.compile(r"\d{2}/\d{2}/\d{4} às \d{2}:\d{2}:\d{2}"), "<data_hora>"),
+    (re.compile(r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d+)?(?:Z|[+-]\d{2}:?\d{2})?"), "<timestamp>"),
+)
+
+
+class CassetteMiss(KeyError):
+    """Requisição sem gravação correspondente no modo replay."""
+
+
+def _scrub(text: str) -> str:
+    for pattern, placeholder in _VOLATILE:
+        text = pattern.sub(placeholder, text)
+    return text
+
+
+def request_hash(kind: str, normalized: Any) -> str:
+    raw = fast_json.dumps({"kind": kind, "request": normalized})
+    return hashlib.sha256(_scrub(raw).encode("utf-8")).hexdigest()[:24]
+
+
+def _canonical(value: Any) -> Any:
+    """Ordena chaves recursivamente para que JSONs equivalentes tenham o mesmo hash."""
+    if isinstance(value, dict):
+        return {k: _canonical(value[k]) for k in sorted(value)}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    return value
+
+
+class Cassette:
+    """Arquivo de gravações carregado em memória; gravações novas são anexadas ao arquivo."""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self._lock = threading.Lock()
+        self._entries: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        if path.exists():
+            with path.open("rb") as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entry = fast_json.loads(line)
+                        self._entries.setdefault(entry["key"], []).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(v) for v in self._entries.values())
+
+    def has(self, key: str) -> bool:
+        return key in self._entries
+
+    def play(self, key: str) -> Dict[str, Any]:
+        """Próxima resposta gravada para o hash (a última se repete quando acabam)."""
+        with self._lock:
+            entries = self._entries.get(key)
+            if not entries:
+                raise CassetteMiss(key)
+            idx = self._cursor.get(key, 0)
+            self._cursor[key] = idx + 1
+            return entries[min(idx, len(entries) - 1)]["response"]
+
+    def record(self, key: str, kind: str, label: str, response: Dict[str, Any]) -> None:
+        entry = {"key": key, "kind": kind, "label": label, "response": response}
+        with self._lock:
+            self._entries.setdefault(key, []).append(entry)
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with self.path.open("ab") as f:
+                f.write(fast_json.dumps_bytes(entry) + b"\n")
+
+
+_cassettes: Dict[str, Cassette] = {}
+_cassettes_lock = threading.Lock()
+
+
+def mode() -> str:
+    value = (getattr(settings, "cassette_mode", "off") or "off").lower()
+    return value if value in MODES else "off"
+
+
+def active() -> bool:
+    return mode() != "off"
+
+
+def current_cassette() -> Cassette:
+    path = Path(settings.cassette_dir) / f"{settings.cassette_name}.jsonl"
+    key = str(path.resolve())
+    with _cassettes_lock:
+        cassette = _cassettes.get(key)
+        if cassette is None:
+            cassette = _cassettes[key] = Cassette(path)
+        return cassette
+
+
+def reset() -> None:
+    """Descarta os cassetes carregados (recarrega do disco na próxima chamada)."""
+    with _cassettes_lock:
+        _cassettes.clear()
+
+
+def _label(kind: str, normalized: Dict[str, Any]) -> str:
+    """Resumo legível da requisição gravado junto da resposta (o hash é a chave)."""
+    if kind == "http":
+        return f"{normalized['method']} {normalized['url']}"
+    last = normalized["messages"][-1] if normalized["messages"] else {}
+    return f"{normalized['model']} {last.get('type', '')}: {str(last.get('content', ''))[:80]}"
+
+
+def _through(kind: str, normalized: Dict[str, Any], call: Callable[[], Dict[str, Any]]) -> Dict[str, Any]:
+    """Aplica o modo atual: reproduz, grava ou executa."""
+    current = mode()
+    cassette = current_cassette()
+    key = request_hash(kind, normalized)
+    if current in ("replay", "auto") and cassette.has(key):
+        return cassette.play(key)
+    if current == "replay":
+        raise CassetteMiss(f"{kind} sem gravação ({key}) no cassete {cassette.path}")
+    response = call()
+    cassette.record(key, kind, _label(kind, normalized), response)
+    return response
+
+
+# ============================================
+# HTTP (tools/upstream.py)
+# ============================================
+
+def _normalize_http(method: str, url: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+    parts = urlsplit(url)
+    params = dict(parse_qsl(parts.query))
+    params.update({k: str(v) for k, v in (kwargs.get("params") or {}).items()})
+    normalized_url = urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(sorted(params.items())), ""))
+
+    body: Any = None
+    if kwargs.get("json") is not None:
+        body = _canonical(kwargs["json"])
+    elif kwargs.get("data") is not None:
+        data = kwargs["data"]
+        try:
+            body = _canonical(fast_json.loads(data))
+        except (ValueError, TypeError):
+            body = data.decode("utf-8", errors="replace") if isinstance(data, bytes) else str(data)
+    return {"method": method.upper(), "url": normalized_url, "body": body}
+
+
+def _response_from(recorded: Dict[str, Any], url: str) -> requests.Response:
+    response = requests.Response()
+    response.status_code = int(recorded["status"])
+    response._content = recorded["body"].encode("utf-8")
+    response.headers.update(recorded.get("headers") or {})
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+def http_request(method: str, url: str, kwargs: Dict[str, Any], send: Callable[[], requests.Response]) -> requests.Response:
+    """Ponto de entrada usado por tools.upstream.request quando o modo não é 'off'."""
+    def call() -> Dict[str, Any]:
+        resp = send()
+        return {
+            "status": resp.status_code,
+            "headers": {"Content-Type": resp.headers.get("Content-Type", "application/json")},
+            "body": resp.content.decode("utf-8", errors="replace"),
+        }
+
+    return _response_from(_through("http", _normalize_http(method, url, kwargs), call), url)
+
+
+# ============================================
+# LLM
+# ============================================
+
+def _normalize_messages(messages: List[BaseMessage]) -> List[Dict[str, Any]]:
+    out = []
+    for m in messages:
+        item: Dict[str, Any] = {"type": m.type, "content": m.content}
+        tool_calls = getattr(m, "tool_calls", None)
+        if tool_calls:
+            item["tool_calls"] = [{"name": c.get("name"), "args": _canonical(c.get("args"))} for c in tool_calls]
+        if getattr(m, "name", None):
+            item["name"] = m.name
+        out.append(item)
+    return out
+
+
+def _tool_names(tools: Any) -> List[str]:
+    names = []
+    for t in tools or []:
+        if isinstance(t, dict):
+            names.append(t.get("name") or (t.get("function") or {}).get("name") or "")
+    return sorted(names)
+
+
+class CassetteChatModel(BaseChatModel):
+    """
+    Envolve o modelo de chat real com gravação/reprodução.
+    bind_tools delega ao modelo interno para obter o formato de ferramentas do provedor.
+    """
+
+    inner: Any
+
+    @property
+    def _llm_type(self) -> str:
+        return "cassette"
+
+    @property
+    def model_name(self) -> str:
+        return str(getattr(self.inner, "model_name", None) or getattr(self.inner, "model", None) or "desconhecido")
+
+    def bind_tools(self, tools, **kwargs):
+        bound = self.inner.bind_tools(tools, **kwargs)
+        return self.bind(**getattr(bound, "kwargs", {}))
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        normalized = {
+            "model": self.model_name,
+            "messages": _normalize_messages(messages),
+            "tools": _tool_names(kwargs.get("tools")),
+            "tool_choice": kwargs.get("tool_choice"),
+            "stop": stop,
+        }
+
+        def call() -> Dict[str, Any]:
+            result = self.inner._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+            return {
+                "generations": [message_to_dict(g.message) for g in result.generations],
+                "llm_output": result.llm_output or {},
+            }
+
+        recorded = _through("llm", normalized, call)
+        generations = [ChatGeneration(message=m) for m in messages_from_dict(recorded["generations"])]
+        return ChatResult(generations=generations, llm_output=recorded.get("llm_output") or None)
+
+
+def wrap_llm(llm: Any) -> Any:
+    """Envolve o LLM com o cassete quando o modo não é 'off'."""
+    if not active():
+        return llm
+    logger.info("Cassete de LLM ativo: modo=%s arquivo=%s", mode(), current_cassette().path)
+    return CassetteChatModel(inner=llm)
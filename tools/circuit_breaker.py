@@ -0,0 +1,332 @@
+"""
+Circuit breakers por serviço externo (host) e cache do último resultado bom
+
+Estados:
+  closed     chamadas normais; erros (5xx/429, timeout, falha de conexão) e
+             chamadas lentas (> breaker_slow_call_seconds) contam numa janela
+             fixa de breaker_window_seconds
+  open       a janela passou de breaker_min_calls com taxa de erro ou de
+             lentidão acima do limite: chamadas falham na hora (CircuitOpenError)
+             por breaker_open_seconds
+  half_open  passado o tempo aberto, uma única chamada de teste por vez; sucesso
+             fecha o circuito, falha reabre
+
+Com Redis disponível o estado (aberto até, contagens da janela, chamada de
+teste) é compartilhado entre os workers; sem Redis cada processo mantém o seu.
+
+Requisições de consulta marcadas com fallback=True em tools.upstream guardam a
+última resposta boa (Redis ou memória, breaker_fallback_ttl_seconds) e a
+reutilizam quando o circuito está aberto ou a chamada falha.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+
+from config import fast_json
+from config.logger import setup_logger
+from config.metrics import REGISTRY
+from config.settings import settings
+
+logger = setup_logger(__name__)
+
+CLOSED = "closed"
+HALF_OPEN = "half_open"
+OPEN = "open"
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = REGISTRY.gauge(
+    "agente_circuit_state",
+    "Estado do circuit breaker por serviço externo (0=closed, 1=half_open, 2=open)",
+    ["host"],
+)
+CIRCUIT_TRANSITIONS = REGISTRY.counter(
+    "agente_circuit_transitions_total",
+    "Mudanças de estado do circuit breaker por serviço externo",
+    ["host", "state"],
+)
+CIRCUIT_REJECTED = REGISTRY.counter(
+    "agente_circuit_rejected_total",
+    "Chamadas recusadas na hora com o circuito aberto",
+    ["host"],
+)
+FALLBACK_SERVED = REGISTRY.counter(
+    "agente_upstream_fallback_total",
+    "Falhas de serviço externo atendidas (hit) ou não (miss) pelo último resultado bom",
+    ["host", "result"],
+)
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Circuito aberto: a chamada nem foi feita (as ferramentas tratam como falha de conexão)."""
+
+
+# ============================================
+# Armazenamento do estado (Redis compartilhado ou memória local)
+# ============================================
+
+_REDIS_RETRY_SECONDS = 30.0
+_redis_retry_at = 0.0
+
+
+def _redis():
+    """Cliente Redis ou None; após uma falha só tenta de novo depois de _REDIS_RETRY_SECONDS."""
+    global _redis_retry_at
+    if time.monotonic() < _redis_retry_at:
+        return None
+    from tools.redis_tools import get_redis_client
+
+    client = get_redis_client()
+    if client is None:
+        _redis_retry_at = time.monotonic() + _REDIS_RETRY_SECONDS
+    return client
+
+
+class _LocalStore:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._open_until: Dict[str, float] = {}
+        self._probe_until: Dict[str, float] = {}
+        self._windows: Dict[Tuple[str, int], list] = {}
+
+    def open_until(self, host: str) -> float:
+        return self._open_until.get(host, 0.0)
+
+    def set_open_until(self, host: str, until: float) -> None:
+        with self._lock:
+            self._open_until[host] = until
+            if not until:
+                self._windows = {k: v for k, v in self._windows.items() if k[0] != host}
+
+    def acquire_probe(self, host: str, ttl: float) -> bool:
+        now = time.time()
+        with self._lock:
+            if self._probe_until.get(host, 0.0) > now:
+                return False
+            self._probe_until[host] = now + ttl
+            return True
+
+    def release_probe(self, host: str) -> None:
+        with self._lock:
+            self._probe_until.pop(host, None)
+
+    def add(self, host: str, bucket: int, error: bool, slow: bool) -> Tuple[int, int, int]:
+        with self._lock:
+            counts = self._windows.setdefault((host, bucket), [0, 0, 0])
+            counts[0] += 1
+            counts[1] += int(error)
+            counts[2] += int(slow)
+            # Mantém só a janela atual de cada host
+            for key in [k for k in self._windows if k[0] == host and k[1] != bucket]:
+                del self._windows[key]
+            return tuple(counts)
+
+
+class _RedisStore:
+    def __init__(self, client):
+        self.client = client
+
+    def open_until(self, host: str) -> float:
+        return float(self.client.get(f"cb:{host}:open_until") or 0.0)
+
+    def set_open_until(self, host: str, until: float) -> None:
+        if until:
+            # Expira bem depois do tempo aberto: o estado half_open precisa continuar visível
+            self.client.set(f"cb:{host}:open_until", repr(until), ex=int(settings.breaker_open_seconds * 10) + 60)
+        else:
+            self.client.delete(f"cb:{host}:open_until")
+
+    def acquire_probe(self, host: str, ttl: float) -> bool:
+        return bool(self.client.set(f"cb:{host}:probe", "1", nx=True, ex=max(1, int(ttl))))
+
+    def release_probe(self, host: str) -> None:
+        self.client.delete(f"cb:{host}:probe")
+
+    def add(self, host: str, bucket: int, error: bool, slow: bool) -> Tuple[int, int, int]:
+        key = f"cb:{host}:w:{bucket}"
+        pipe = self.client.pipeline()
+        pipe.hincrby(key, "calls", 1)
+        pipe.hincrby(key, "errors", int(error))
+        pipe.hincrby(key, "slow", int(slow))
+        pipe.expire(key, int(settings.breaker_window_seconds) * 2)
+        calls, errors, slow_calls, _ = pipe.execute()
+        return int(calls), int(errors), int(slow_calls)
+
+
+_local = _LocalStore()
+
+
+def _call_store(method: str, *args):
+    """Executa no Redis quando disponível; em erro do Redis usa o estado local."""
+    client = _redis()
+    if client is not None:
+        try:
+            return getattr(_RedisStore(client), method)(*args)
+        except Exception as e:
+            logger.warning(f"[BREAKER] Redis indisponível para o estado do circuito ({e}); usando memória local")
+    return getattr(_local, method)(*args)
+
+
+# ============================================
+# Circuit breaker
+# ============================================
+
+class CircuitBreaker:
+    """Breaker de um serviço externo (identificado pelo host)."""
+
+    def __init__(self, host: str):
+        self.host = host
+        self._probing = threading.local()
+
+    def state(self) -> str:
+        until = _call_store("open_until", self.host)
+        if not until:
+            return CLOSED
+        return OPEN if time.time() < until else HALF_OPEN
+
+    def allow(self) -> bool:
+        """True se a chamada pode ser feita agora (em half_open, só a chamada de teste)."""
+        self._probing.active = False
+        state = self.state()
+        if state == CLOSED:
+            return True
+        if state == HALF_OPEN and _call_store("acquire_probe", self.host, float(settings.breaker_probe_timeout_seconds)):
+            self._probing.active = True
+            CIRCUIT_TRANSITIONS.inc(host=self.host, state=HALF_OPEN)
+            logger.info(f"[BREAKER] {self.host}: chamada de teste (half_open)")
+            return True
+        CIRCUIT_REJECTED.inc(host=self.host)
+        return False
+
+    def record(self, ok: bool, latency: float) -> None:
+        slow = latency > float(settings.breaker_slow_call_seconds)
+        if getattr(self._probing, "active", False):
+            self._probing.active = False
+            _call_store("release_probe", self.host)
+            if ok and not slow:
+                self._transition(CLOSED)
+            else:
+                self._transition(OPEN)
+            return
+
+        bucket = int(time.time() // float(settings.breaker_window_seconds))
+        calls, errors, slow_calls = _call_store("add", self.host, bucket, not ok, slow)
+        if calls < int(settings.breaker_min_calls) or self.state() != CLOSED:
+            return
+        if errors / calls >= float(settings.breaker_error_rate) or slow_calls / calls >= float(settings.breaker_slow_rate):
+            logger.warning(f"[BREAKER] {self.host}: {errors}/{calls} erros e {slow_calls}/{calls} lentas na janela")
+            self._transition(OPEN)
+
+    def discard(self) -> None:
+        """Chamada interrompida por motivo alheio ao serviço: não conta e libera a chamada de teste."""
+        if getattr(self._probing, "active", False):
+            self._probing.active = False
+            _call_store("release_probe", self.host)
+
+    def _transition(self, state: str) -> None:
+        until = time.time() + float(settings.breaker_open_seconds) if state == OPEN else 0.0
+        _call_store("set_open_until", self.host, until)
+        CIRCUIT_TRANSITIONS.inc(host=self.host, state=state)
+        logger.warning(f"[BREAKER] {self.host}: circuito {state}")
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def for_host(host: str) -> CircuitBreaker:
+    breaker = _breakers.get(host)
+    if breaker is None:
+        with _breakers_lock:
+            breaker = _breakers.get(host)
+            if breaker is None:
+                breaker = _breakers[host] = CircuitBreaker(host)
+                CIRCUIT_STATE.set_function(lambda b=breaker: _STATE_VALUE[b.state()], host=host)
+    return breaker
+
+
+# ============================================
+# Último resultado bom (fallback)
+# ============================================
+
+_lkg: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+_lkg_lock = threading.Lock()
+
+
+def fallback_key(method: str, url: str, kwargs: Dict[str, Any]) -> str:
+    params = sorted((str(k), str(v)) for k, v in (kwargs.get("params") or {}).items())
+    body = kwargs.get("json")
+    if body is None:
+        data = kwargs.get("data")
+        body = data.decode("utf-8", errors="replace") if isinstance(data, bytes) else data
+    raw = fast_json.dumps({"m": method.upper(), "u": url, "p": params, "b": body})
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:32]
+
+
+def remember(key: str, response: requests.Response) -> None:
+    entry = {
+        "status": response.status_code,
+        "content_type": response.headers.get("Content-Type", "application/json"),
+        "body": response.content.decode("utf-8", errors="replace"),
+        "saved_at": time.time(),
+    }
+    ttl = float(settings.breaker_fallback_ttl_seconds)
+    client = _redis()
+    if client is not None:
+        try:
+            client.set(f"lkg:{key}", fast_json.dumps(entry), ex=int(ttl))
+            return
+        except Exception as e:
+            logger.debug(f"[BREAKER] Falha ao gravar último resultado no Redis: {e}")
+    with _lkg_lock:
+        _lkg[key] = (time.time() + ttl, entry)
+        _lkg.move_to_end(key)
+        while len(_lkg) > int(settings.breaker_fallback_max_entries):
+            _lkg.popitem(last=False)
+
+
+def last_known_good(key: str, host: str, url: str, max_age: Optional[float] = None) -> Optional[requests.Response]:
+    """
+    Resposta guardada para a requisição ou None. Vem marcada com os headers
+    X-Fallback-Cache e X-Fallback-Saved-At (epoch de quando foi obtida ao vivo);
+    com max_age, respostas mais antigas que isso não são servidas.
+    """
+    entry = None
+    client = _redis()
+    if client is not None:
+        try:
+            raw = client.get(f"lkg:{key}")
+            entry = fast_json.loads(raw) if raw else None
+        except Exception as e:
+            logger.debug(f"[BREAKER] Falha ao ler último resultado do Redis: {e}")
+    if entry is None:
+        with _lkg_lock:
+            expires, local = _lkg.get(key, (0.0, None))
+        entry = local if expires > time.time() else None
+    if entry is not None and max_age is not None and time.time() - float(entry.get("saved_at") or 0.0) > max_age:
+        entry = None
+    FALLBACK_SERVED.inc(host=host, result="hit" if entry else "miss")
+    if entry is None:
+        return None
+    response = requests.Response()
+    response.status_code = int(entry["status"])
+    response._content = entry["body"].encode("utf-8")
+    response.headers["Content-Type"] = entry["content_type"]
+    response.headers["X-Fallback-Cache"] = "stale"
+    response.headers["X-Fallback-Saved-At"] = repr(float(entry.get("saved_at") or 0.0))
+    response.encoding = "utf-8"
+    response.url = url
+    logger.warning(f"[BREAKER] {host}: servindo último resultado bom para {url}")
+    return response
+
+
+def reset() -> None:
+    """Fecha todos os circuitos e limpa o estado local (testes/operação manual)."""
+    for host in list(_breakers):
+        _call_store("set_open_until", host, 0.0)
+        _call_store("release_probe", host)
+    with _lkg_lock:
+        _lkg.clear()
@@ -0,0 +1,128 @@
+"""
+Prazo de ponta a ponta para responder ao cliente
+
+O prazo nasce quando o buffer libera as mensagens (settings.reply_deadline_seconds)
+e segue por contextvar até as ferramentas e o cliente do LLM:
+
+  - tools.upstream encolhe o timeout de cada requisição ao tempo restante
+  - o cliente HTTP do LLM (httpx) recebe o mesmo ajuste a cada requisição
+  - o grafo não inicia passo de ferramenta com menos de deadline_min_tool_seconds
+    nem chamada ao LLM com menos de deadline_min_llm_seconds restantes
+
+Quando o prazo acaba, o agente envia uma resposta parcial com o que já apurou.
+Threads de pools (ferramentas em paralelo, pré-busca) levam o prazo junto com
+a cópia do contexto.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+import requests
+
+from config.metrics import REGISTRY
+
+DEADLINE_EXCEEDED = REGISTRY.counter(
+    "agente_deadline_exceeded_total",
+    "Turnos interrompidos pelo prazo de resposta, por etapa que deixou de ser executada",
+    ["stage"],
+)
+DEADLINE_REMAINING = REGISTRY.histogram(
+    "agente_deadline_remaining_seconds",
+    "Folga do prazo ao final de cada turno do agente (negativa = estourou)",
+    buckets=(-5.0, -1.0, 0.0, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("reply_deadline", default=None)
+
+
+class DeadlineExceeded(requests.exceptions.Timeout):
+    """O prazo da conversa acabou (subclasse de Timeout: as ferramentas já tratam)."""
+
+    def __init__(self, stage: str, message: str = ""):
+        super().__init__(message or f"Prazo de resposta esgotado antes de: {stage}")
+        self.stage = stage
+
+
+@contextmanager
+def budget(seconds: float) -> Iterator[float]:
+    """Abre um prazo de `seconds`; um prazo já ativo e mais curto prevalece."""
+    target = time.monotonic() + float(seconds)
+    current = _deadline.get()
+    if current is not None and current < target:
+        target = current
+    token = _deadline.set(target)
+    try:
+        yield target
+    finally:
+        _deadline.reset(token)
+
+
+@contextmanager
+def unbounded() -> Iterator[None]:
+    """Suspende o prazo (ex.: envio da resposta, que precisa acontecer mesmo após o prazo)."""
+    token = _deadline.set(None)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """Segundos até o prazo (negativo se já passou) ou None sem prazo ativo."""
+    target = _deadline.get()
+    return None if target is None else target - time.monotonic()
+
+
+def expired() -> bool:
+    left = remaining()
+    return left is not None and left <= 0
+
+
+def require(stage: str, min_seconds: float) -> None:
+    """Impede iniciar uma etapa que não cabe no tempo restante."""
+    left = remaining()
+    if left is not None and left < min_seconds:
+        DEADLINE_EXCEEDED.inc(stage=stage)
+        raise DeadlineExceeded(stage, f"Prazo de resposta: {max(left, 0):.1f}s restantes, {stage} precisa de {min_seconds:.1f}s")
+
+
+def clamp_timeout(timeout: Any) -> Any:
+    """Timeout de requests limitado ao tempo restante (aceita número ou tupla connect/read)."""
+    left = remaining()
+    if left is None:
+        return timeout
+    if left <= 0:
+        DEADLINE_EXCEEDED.inc(stage="http")
+        raise DeadlineExceeded("http")
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return tuple(left if t is None else min(float(t), left) for t in timeout)
+    return min(float(timeout), left)
+
+
+def _httpx_request_hook(request: Any) -> None:
+    """Ajusta o timeout de cada requisição do cliente do LLM ao tempo restante."""
+    left = remaining()
+    if left is None:
+        return
+    left = max(left, 0.001)
+    timeouts = request.extensions.get("timeout") or {}
+    request.extensions["timeout"] = {
+        key: left if timeouts.get(key) is None else min(timeouts[key], left)
+        for key in ("connect", "read", "write", "pool")
+    }
+
+
+_llm_http_client = None
+
+
+def llm_http_client():
+    """Cliente httpx do LLM (compartilhado) com o prazo aplicado por requisição."""
+    global _llm_http_client
+    if _llm_http_client is None:
+        from openai import DefaultHttpxClient
+
+        _llm_http_client = DefaultHttpxClient(event_hooks={"request": [_httpx_request_hook]})
+    return _llm_http_client
@@ -0,0 +1,359 @@
+"""
+Cópia local (SQLite) de preço/estoque do ERP por EAN
+
+estoque_preco responde do snapshot quando a entrada do EAN foi conferida há
+menos de settings.erp_snapshot_max_age_seconds; EANs desconhecidos ou vencidos
+vão ao ERP ao vivo e a resposta passa a fazer parte do snapshot.
+
+Uma thread de sincronização mantém as entradas conferidas:
+  - a cada ciclo, os EANs conferidos há mais de erp_snapshot_refresh_seconds
+    e pedidos nos últimos erp_snapshot_active_seconds são consultados com GET
+    condicional (If-None-Match / If-Modified-Since); 304 só renova a
+    conferência, 200 regrava a entrada se o conteúdo mudou
+  - com erp_snapshot_catalog_url configurada, a lista completa do catálogo é
+    baixada a cada erp_snapshot_full_sync_seconds (também condicional; limitado
+    para caber em erp_snapshot_max_age_seconds, senão as entradas só do
+    catálogo venceriam entre um download e outro) e
+    comparada item a item com o snapshot (diff por EAN); o diff e o 304 do
+    catálogo renovam a conferência dos EANs do catálogo, que assim não
+    precisam de GET próprio
+  - entradas fora do catálogo e não pedidas há erp_snapshot_evict_seconds
+    são removidas, então o snapshot não cresce com EANs que ninguém procura
+
+O conteúdo guardado é exatamente a saída de estoque_preco (itens disponíveis,
+preço normalizado), então a resposta do snapshot e a ao vivo são idênticas.
+"""
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional
+
+import requests
+
+from config import fast_json
+from config.logger import setup_logger
+from config.metrics import REGISTRY, record_cache
+from config.settings import settings
+from tools import upstream
+
+logger = setup_logger(__name__)
+
+SNAPSHOT_SYNC = REGISTRY.counter(
+    "agente_erp_snapshot_sync_total",
+    "Conferências do snapshot do ERP: changed, unchanged, not_modified (304) ou error",
+    ["source", "result"],
+)
+SNAPSHOT_ENTRIES = REGISTRY.gauge(
+    "agente_erp_snapshot_entries",
+    "EANs no snapshot local do ERP",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS erp_snapshot (
+    ean TEXT PRIMARY KEY,
+    body TEXT NOT NULL,
+    digest TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    checked_at REAL NOT NULL,
+    changed_at REAL NOT NULL,
+    requested_at REAL NOT NULL DEFAULT 0,
+    in_catalog INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS erp_snapshot_checked ON erp_snapshot (checked_at);
+CREATE TABLE IF NOT EXISTS erp_snapshot_meta (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# lookup só regrava requested_at quando a marca anterior é mais velha que isso
+_REQUESTED_GRANULARITY = 60.0
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+_lock = threading.RLock()
+_wake = threading.Event()
+_stop = threading.Event()
+_syncer: Optional[threading.Thread] = None
+
+
+def _connection() -> sqlite3.Connection:
+    global _conn, _conn_path
+    path = settings.erp_snapshot_path
+    if _conn is None or _conn_path != path:
+        if _conn is not None:
+            _conn.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _migrate(conn)
+        _conn, _conn_path = conn, path
+        SNAPSHOT_ENTRIES.set_function(_count_entries)
+    return _conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Acrescenta as colunas novas em snapshots criados por versões anteriores."""
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(erp_snapshot)")}
+    if "requested_at" not in columns:
+        conn.execute("ALTER TABLE erp_snapshot ADD COLUMN requested_at REAL NOT NULL DEFAULT 0")
+        conn.execute("UPDATE erp_snapshot SET requested_at = checked_at")
+    if "in_catalog" not in columns:
+        conn.execute("ALTER TABLE erp_snapshot ADD COLUMN in_catalog INTEGER NOT NULL DEFAULT 0")
+    conn.execute("CREATE INDEX IF NOT EXISTS erp_snapshot_requested ON erp_snapshot (requested_at)")
+
+
+def _count_entries() -> float:
+    with _lock:
+        return float(_connection().execute("SELECT COUNT(*) FROM erp_snapshot").fetchone()[0])
+
+
+def _digest(body: str) -> str:
+    return hashlib.sha1(body.encode("utf-8")).hexdigest()
+
+
+def _meta(name: str) -> Optional[str]:
+    with _lock:
+        row = _connection().execute("SELECT value FROM erp_snapshot_meta WHERE name = ?", (name,)).fetchone()
+    return row["value"] if row else None
+
+
+def _set_meta(name: str, value: Optional[str]) -> None:
+    with _lock:
+        _connection().execute(
+            "INSERT INTO erp_snapshot_meta (name, value) VALUES (?, ?)"
+            " ON CONFLICT(name) DO UPDATE SET value = excluded.value",
+            (name, value),
+        )
+
+
+def lookup(ean: str) -> Optional[str]:
+    """Saída de estoque_preco guardada para o EAN, se conferida dentro do prazo de validade."""
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connection()
+            row = conn.execute("SELECT body, checked_at, requested_at FROM erp_snapshot WHERE ean = ?", (ean,)).fetchone()
+            if row is not None and now - row["requested_at"] >= _REQUESTED_GRANULARITY:
+                conn.execute("UPDATE erp_snapshot SET requested_at = ? WHERE ean = ?", (now, ean))
+    except sqlite3.Error as e:
+        logger.error(f"Snapshot do ERP indisponível: {e}")
+        return None
+    fresh = row is not None and now - row["checked_at"] <= settings.erp_snapshot_max_age_seconds
+    record_cache("erp_snapshot", fresh)
+    return row["body"] if fresh else None
+
+
+def store(ean: str, body: str, headers: Optional[Mapping[str, str]] = None,
+          requested: bool = True, in_catalog: bool = False) -> bool:
+    """
+    Grava a saída de estoque_preco do EAN; retorna True se o conteúdo mudou.
+    requested=False (diff do catálogo) não conta como procura pelo EAN.
+    """
+    headers = headers or {}
+    digest = _digest(body)
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connection()
+            row = conn.execute("SELECT digest FROM erp_snapshot WHERE ean = ?", (ean,)).fetchone()
+            changed = row is None or row["digest"] != digest
+            conn.execute(
+                "INSERT INTO erp_snapshot (ean, body, digest, etag, last_modified, checked_at, changed_at,"
+                " requested_at, in_catalog) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(ean) DO UPDATE SET body = excluded.body, digest = excluded.digest,"
+                " etag = excluded.etag, last_modified = excluded.last_modified, checked_at = excluded.checked_at,"
+                " changed_at = CASE WHEN erp_snapshot.digest = excluded.digest THEN erp_snapshot.changed_at"
+                " ELSE excluded.changed_at END,"
+                " requested_at = MAX(erp_snapshot.requested_at, excluded.requested_at),"
+                " in_catalog = MAX(erp_snapshot.in_catalog, excluded.in_catalog)",
+                (ean, body, digest, headers.get("ETag"), headers.get("Last-Modified"), now, now,
+                 now if requested else 0.0, int(in_catalog)),
+            )
+    except sqlite3.Error as e:
+        logger.error(f"Falha ao gravar snapshot do ERP ({ean}): {e}")
+        return False
+    return changed
+
+
+def _touch(ean: str) -> None:
+    with _lock:
+        _connection().execute("UPDATE erp_snapshot SET checked_at = ? WHERE ean = ?", (time.time(), ean))
+
+
+# ============================================
+# Sincronização
+# ============================================
+
+def _render(items: List[Any]) -> str:
+    """Mesmo formato da saída de estoque_preco."""
+    from tools.http_tools import _normalize_estoque_items
+
+    return fast_json.dumps(_normalize_estoque_items(items), indent=True)
+
+
+def _conditional_headers(etag: Optional[str], last_modified: Optional[str]) -> Dict[str, str]:
+    headers = {"Accept": "application/json"}
+    if etag:
+        headers["If-None-Match"] = etag
+    if last_modified:
+        headers["If-Modified-Since"] = last_modified
+    return headers
+
+
+def refresh(row: sqlite3.Row) -> str:
+    """Confere um EAN no ERP com GET condicional; retorna o resultado da conferência."""
+    ean = row["ean"]
+    url = f"{(settings.estoque_ean_base_url or '').strip().rstrip('/')}/{ean}"
+    try:
+        resp = upstream.get(url, headers=_conditional_headers(row["etag"], row["last_modified"]), timeout=10)
+        if resp.status_code == 304:
+            _touch(ean)
+            result = "not_modified"
+        else:
+            resp.raise_for_status()
+            data = fast_json.loads(resp.content)
+            items = data if isinstance(data, list) else ([data] if isinstance(data, dict) else [])
+            result = "changed" if store(ean, _render(items), resp.headers) else "unchanged"
+    except (requests.exceptions.RequestException, ValueError, sqlite3.Error) as e:
+        logger.warning(f"[SNAPSHOT] Falha ao conferir EAN {ean}: {e}")
+        result = "error"
+    SNAPSHOT_SYNC.inc(source="ean", result=result)
+    return result
+
+
+def full_diff() -> Dict[str, int]:
+    """Baixa o catálogo completo (condicional) e regrava só os EANs cujo conteúdo mudou."""
+    stats = {"changed": 0, "unchanged": 0}
+    url = (settings.erp_snapshot_catalog_url or "").strip()
+    if not url:
+        return stats
+    from tools.http_tools import get_auth_headers
+
+    headers = {**get_auth_headers(), **_conditional_headers(_meta("catalog_etag"), _meta("catalog_last_modified"))}
+    try:
+        resp = upstream.get(url, headers=headers, timeout=60)
+        if resp.status_code == 304:
+            with _lock:
+                _connection().execute("UPDATE erp_snapshot SET checked_at = ? WHERE in_catalog = 1", (time.time(),))
+            _set_meta("catalog_synced_at", repr(time.time()))
+            SNAPSHOT_SYNC.inc(source="catalog", result="not_modified")
+            return stats
+        resp.raise_for_status()
+        data = fast_json.loads(resp.content)
+    except (requests.exceptions.RequestException, ValueError) as e:
+        logger.warning(f"[SNAPSHOT] Falha ao baixar o catálogo: {e}")
+        SNAPSHOT_SYNC.inc(source="catalog", result="error")
+        return stats
+
+    groups: Dict[str, List[Any]] = {}
+    for item in data if isinstance(data, list) else []:
+        ean = "".join(ch for ch in str(item.get("codigo_ean") or "") if ch.isdigit()) if isinstance(item, dict) else ""
+        if ean:
+            groups.setdefault(ean, []).append(item)
+    with _lock:
+        _connection().execute("UPDATE erp_snapshot SET in_catalog = 0")
+    for ean, items in groups.items():
+        changed = store(ean, _render(items), requested=False, in_catalog=True)
+        stats["changed" if changed else "unchanged"] += 1
+        SNAPSHOT_SYNC.inc(source="catalog", result="changed" if changed else "unchanged")
+    _set_meta("catalog_etag", resp.headers.get("ETag"))
+    _set_meta("catalog_last_modified", resp.headers.get("Last-Modified"))
+    _set_meta("catalog_synced_at", repr(time.time()))
+    logger.info(f"[SNAPSHOT] Catálogo: {len(groups)} EANs, {stats['changed']} alterados")
+    return stats
+
+
+def evict() -> int:
+    """Remove as entradas fora do catálogo que ninguém pediu dentro de erp_snapshot_evict_seconds."""
+    with _lock:
+        cursor = _connection().execute(
+            "DELETE FROM erp_snapshot WHERE in_catalog = 0 AND requested_at < ?",
+            (time.time() - settings.erp_snapshot_evict_seconds,),
+        )
+    if cursor.rowcount:
+        logger.info(f"[SNAPSHOT] {cursor.rowcount} EANs sem procura removidos")
+    return cursor.rowcount
+
+
+def full_sync_interval() -> float:
+    """
+    Intervalo efetivo entre downloads do catálogo: erp_snapshot_full_sync_seconds,
+    limitado a max_age menos um ciclo, para as entradas do catálogo serem
+    renovadas antes de vencer.
+    """
+    limit = settings.erp_snapshot_max_age_seconds - settings.erp_snapshot_interval_seconds
+    return max(settings.erp_snapshot_interval_seconds, min(settings.erp_snapshot_full_sync_seconds, limit))
+
+
+def sync_once() -> Dict[str, int]:
+    """Um ciclo: diff do catálogo (quando vencido), remoção das entradas sem
+    procura e conferência dos EANs pedidos recentemente."""
+    stats = {"changed": 0, "unchanged": 0, "not_modified": 0, "error": 0, "evicted": 0}
+    synced_at = float(_meta("catalog_synced_at") or 0.0)
+    if settings.erp_snapshot_catalog_url and time.time() - synced_at >= full_sync_interval():
+        for key, n in full_diff().items():
+            stats[key] += n
+
+    stats["evicted"] = evict()
+
+    now = time.time()
+    with _lock:
+        rows = _connection().execute(
+            "SELECT ean, etag, last_modified FROM erp_snapshot WHERE checked_at < ? AND requested_at >= ?"
+            " ORDER BY checked_at LIMIT ?",
+            (now - settings.erp_snapshot_refresh_seconds, now - settings.erp_snapshot_active_seconds,
+             settings.erp_snapshot_batch_size),
+        ).fetchall()
+    if rows:
+        with ThreadPoolExecutor(max_workers=min(len(rows), settings.erp_snapshot_workers)) as pool:
+            for result in pool.map(refresh, rows):
+                stats[result] += 1
+    return stats
+
+
+def _loop() -> None:
+    logger.info("[SNAPSHOT] Sincronização do ERP iniciada")
+    if settings.erp_snapshot_catalog_url and full_sync_interval() < settings.erp_snapshot_full_sync_seconds:
+        logger.warning(
+            f"[SNAPSHOT] ERP_SNAPSHOT_FULL_SYNC_SECONDS={settings.erp_snapshot_full_sync_seconds:.0f} maior que "
+            f"ERP_SNAPSHOT_MAX_AGE_SECONDS={settings.erp_snapshot_max_age_seconds:.0f}; "
+            f"catálogo baixado a cada {full_sync_interval():.0f}s"
+        )
+    while not _stop.is_set():
+        try:
+            stats = sync_once()
+            if stats["changed"] or stats["error"]:
+                logger.info(f"[SNAPSHOT] Ciclo: {stats}")
+        except Exception as e:
+            logger.error(f"[SNAPSHOT] Erro na sincronização: {e}", exc_info=True)
+        _wake.wait(settings.erp_snapshot_interval_seconds)
+        _wake.clear()
+
+
+def start_sync() -> None:
+    """Inicia a sincronização em segundo plano (uma vez por processo)."""
+    global _syncer
+    with _lock:
+        if _syncer is not None and _syncer.is_alive():
+            return
+        _stop.clear()
+        _syncer = threading.Thread(target=_loop, name="erp-snapshot", daemon=True)
+        _syncer.start()
+
+
+def stop_sync(timeout: float = 5.0) -> None:
+    global _syncer
+    _stop.set()
+    _wake.set()
+    if _syncer is not None:
+        _syncer.join(timeout)
+    _syncer = None
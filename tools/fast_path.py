@@ -0,0 +1,301 @@
+"""
+Atalho determinístico para intenções triviais (saudação, horário, endereço, setores)
+Responde localmente em milissegundos sem acionar o LLM
+"""
+import json
+import math
+import re
+import unicodedata
+from collections import Counter
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from config.settings import settings
+from config.logger import setup_logger
+
+logger = setup_logger(__name__)
+
+PROMPT_PATH = Path(__file__).resolve().parent.parent / "prompts" / "agent_system.md"
+
+# Limite de tokens para considerar uma mensagem "trivial"
+MAX_TOKENS = 10
+
+# Intenção de descarte: qualquer coisa que deve seguir para o agente
+OTHER = "outro"
+
+
+# ============================================
+# Normalização
+# ============================================
+
+_PUNCT_RE = re.compile(r"[^\w\s]")
+_SPACES_RE = re.compile(r"\s+")
+
+
+def _normalize(text: str) -> str:
+    """Minúsculas, sem acentos e sem pontuação (emojis incluídos)."""
+    s = unicodedata.normalize("NFD", (text or "").lower())
+    s = "".join(c for c in s if unicodedata.category(c) != "Mn")
+    s = _PUNCT_RE.sub(" ", s)
+    return _SPACES_RE.sub(" ", s).strip()
+
+
+def _tokenize(text: str) -> List[str]:
+    return _normalize(text).split()
+
+
+# ============================================
+# Informações da loja (fonte: prompt do agente)
+# ============================================
+
+@lru_cache(maxsize=1)
+def _store_info() -> Dict[str, str]:
+    """
+    Extrai endereço/horário/setores do prompt do sistema, para que as respostas
+    do atalho fiquem sempre alinhadas com o que o agente diria.
+    """
+    info: Dict[str, str] = {}
+    try:
+        text = PROMPT_PATH.read_text(encoding="utf-8")
+    except Exception as e:
+        logger.error(f"Falha ao ler prompt para o atalho: {e}")
+        return info
+    for key, label in (("endereco", "Endereço"), ("horario", "Horário"), ("setores", "Setores")):
+        m = re.search(rf"\*\*{label}:\*\*\s*(.+)", text)
+        if m:
+            info[key] = m.group(1).strip()
+    return info
+
+
+# ============================================
+# Regras (regex sobre texto normalizado)
+# ============================================
+
+_GREETING = r"(?:oi+|ola|opa|eai|e ai|bom dia|boa tarde|boa noite)"
+_GREETING_PREFIX = rf"(?:{_GREETING}\s*)*"
+# Sozinhas, servem de confirmação no meio do pedido ("beleza", "tudo bem");
+# só contam como saudação depois de um cumprimento ("oi, tudo bem?")
+_ACKNOWLEDGEMENT = r"(?:tudo bem|tudo bom|tudo certo|blz|beleza|ok|certo)"
+_ACKNOWLEDGEMENT_ONLY = re.compile(rf"{_ACKNOWLEDGEMENT}(?:\s+{_ACKNOWLEDGEMENT})*")
+
+_RULES: Dict[str, List[re.Pattern]] = {
+    "saudacao": [
+        re.compile(rf"{_GREETING}(?:\s+{_GREETING})*(?:\s+{_ACKNOWLEDGEMENT})?(?:\s+(?:ana|moca|amiga|querida))?"),
+    ],
+    "horario": [
+        re.compile(rf"{_GREETING_PREFIX}(?:que|qual|q) (?:horas?|horario) (?:voces? |vcs? )?(?:abre|abrem|fecha|fecham|funciona|funcionam)(?: hoje| amanha| domingo| no domingo| sabado| no sabado)?"),
+        re.compile(rf"{_GREETING_PREFIX}(?:qual )?(?:o )?horario(?: de funcionamento| de atendimento)?(?: de voces| do mercado| do supermercado)?"),
+        re.compile(rf"{_GREETING_PREFIX}(?:ta|esta|estao|voces estao) abert[oa]s?(?: hoje| agora| amanha| domingo)?"),
+        re.compile(rf"{_GREETING_PREFIX}(?:abre|abrem|funciona|funcionam) (?:hoje|amanha|domingo|no domingo|sabado|no sabado|feriado)"),
+    ],
+    "endereco": [
+        re.compile(rf"{_GREETING_PREFIX}(?:qual )?(?:e )?(?:o )?endereco(?: de voces| do mercado| do supermercado| da loja)?"),
+        re.compile(rf"{_GREETING_PREFIX}(?:onde|aonde) (?:fica|ficam|e|voces ficam|fica a loja|fica o mercado|fica o supermercado)(?: a loja| o mercado| o supermercado)?"),
+        re.compile(rf"{_GREETING_PREFIX}(?:qual a )?localizacao(?: de voces| da loja)?"),
+    ],
+    "setores": [
+        re.compile(rf"{_GREETING_PREFIX}(?:quais|que) (?:sao )?(?:os )?setores(?: de voces| que voces tem| voces tem| tem)?"),
+        re.compile(rf"{_GREETING_PREFIX}(?:o )?que (?:voces|vcs) vendem"),
+    ],
+}
+
+
+def _match_rules(norm: str) -> Optional[str]:
+    for intent, patterns in _RULES.items():
+        for pat in patterns:
+            if pat.fullmatch(norm):
+                return intent
+    return None
+
+
+# ============================================
+# Modelo treinado (Naive Bayes multinomial)
+# ============================================
+
+# Exemplos-semente; complementados por settings.fast_path_training_file
+# (JSONL com {"text": ..., "intent": ...} exportado dos logs de atendimento).
+_SEED_EXAMPLES: List[Tuple[str, str]] = [
+    ("bom dia", "saudacao"),
+    ("boa tarde", "saudacao"),
+    ("boa noite", "saudacao"),
+    ("oi tudo bem", "saudacao"),
+    ("ola boa tarde", "saudacao"),
+    ("oii bom dia", "saudacao"),
+    ("opa tudo certo", "saudacao"),
+    ("bom diaa", "saudacao"),
+    ("que horas abre", "horario"),
+    ("que horas voces fecham", "horario"),
+    ("horario de funcionamento", "horario"),
+    ("ate que horas fica aberto", "horario"),
+    ("abre domingo", "horario"),
+    ("voces abrem que horas", "horario"),
+    ("fecha que horas hoje", "horario"),
+    ("ta aberto agora", "horario"),
+    ("qual o endereco", "endereco"),
+    ("onde fica o mercado", "endereco"),
+    ("endereco da loja", "endereco"),
+    ("me passa a localizacao", "endereco"),
+    ("onde voces ficam", "endereco"),
+    ("qual a rua do supermercado", "endereco"),
+    ("quais setores voces tem", "setores"),
+    ("o que voces vendem", "setores"),
+    ("tem acougue", "setores"),
+    ("tem hortifruti", "setores"),
+    ("quero arroz", OTHER),
+    ("me ve 2 coca 2l", OTHER),
+    ("tem feijao carioca", OTHER),
+    ("quanto ta o leite", OTHER),
+    ("quero cancelar meu pedido", OTHER),
+    ("pode entregar em casa", OTHER),
+    ("sim pode confirmar", OTHER),
+    ("so isso", OTHER),
+    ("o pedido ta demorando", OTHER),
+    ("quero trocar o arroz", OTHER),
+    ("qual o preco da cerveja", OTHER),
+    ("manda 1 kg de carne moida", OTHER),
+    ("bom dia quero arroz e feijao", OTHER),
+    ("boa tarde tem coca", OTHER),
+]
+
+
+class _NaiveBayes:
+    """Classificador Naive Bayes multinomial com suavização de Laplace."""
+
+    def __init__(self, examples: List[Tuple[str, str]]):
+        self.class_counts: Counter = Counter()
+        self.token_counts: Dict[str, Counter] = {}
+        self.vocab: set = set()
+        for text, label in examples:
+            tokens = _tokenize(text)
+            self.class_counts[label] += 1
+            self.token_counts.setdefault(label, Counter()).update(tokens)
+            self.vocab.update(tokens)
+        self.total_examples = sum(self.class_counts.values())
+        self.class_totals = {c: sum(cnt.values()) for c, cnt in self.token_counts.items()}
+
+    def predict(self, tokens: List[str]) -> Tuple[str, float]:
+        """Retorna (intenção, probabilidade posterior)."""
+        vocab_size = len(self.vocab) + 1
+        log_scores: Dict[str, float] = {}
+        for label, n in self.class_counts.items():
+            score = math.log(n / self.total_examples)
+            counts = self.token_counts[label]
+            denom = self.class_totals[label] + vocab_size
+            for tok in tokens:
+                score += math.log((counts.get(tok, 0) + 1) / denom)
+            log_scores[label] = score
+        best = max(log_scores, key=log_scores.get)
+        top = log_scores[best]
+        norm = sum(math.exp(s - top) for s in log_scores.values())
+        return best, 1.0 / norm
+
+
+def _load_training_examples(path: Optional[str]) -> List[Tuple[str, str]]:
+    if not path:
+        return []
+    examples: List[Tuple[str, str]] = []
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                row = json.loads(line)
+                text, intent = row.get("text"), row.get("intent")
+                if isinstance(text, str) and isinstance(intent, str):
+                    examples.append((text, intent))
+        logger.info(f"Atalho: {len(examples)} exemplos de treino carregados de {path}")
+    except Exception as e:
+        logger.warning(f"Falha ao carregar exemplos de treino do atalho ({path}): {e}")
+    return examples
+
+
+@lru_cache(maxsize=1)
+def _model() -> _NaiveBayes:
+    extra = _load_training_examples(getattr(settings, "fast_path_training_file", None))
+    return _NaiveBayes(_SEED_EXAMPLES + extra)
+
+
+# ============================================
+# API pública
+# ============================================
+
+def classify_intent(text: str) -> Tuple[str, float]:
+    """
+    Classifica a mensagem em uma intenção trivial.
+
+    Regras (regex) têm prioridade e confiança 1.0; o modelo só é consultado
+    para mensagens curtas. Qualquer coisa fora do escopo retorna `outro`.
+    """
+    norm = _normalize(text)
+    if not norm:
+        return OTHER, 1.0
+    tokens = norm.split()
+    if len(tokens) > MAX_TOKENS or any(t.isdigit() for t in tokens):
+        return OTHER, 1.0
+    if _ACKNOWLEDGEMENT_ONLY.fullmatch(norm):
+        return OTHER, 1.0
+
+    intent = _match_rules(norm)
+    if intent:
+        return intent, 1.0
+
+    # Vocabulário desconhecido indica produto/assunto novo: deixar para o agente
+    model = _model()
+    if any(t not in model.vocab for t in tokens):
+        return OTHER, 1.0
+    return model.predict(tokens)
+
+
+def _greeting_reply(norm: str) -> str:
+    if "bom dia" in norm:
+        return "Bom dia! 😊"
+    if "boa tarde" in norm:
+        return "Boa tarde! 😊"
+    if "boa noite" in norm:
+        return "Boa noite! 😊"
+    return "Oi! 😊"
+
+
+def _asks_question(reply: Optional[str]) -> bool:
+    """A última linha da resposta anterior termina em pergunta (ex.: confirmação de pedido)."""
+    lines = (reply or "").strip().splitlines()
+    return bool(lines) and "?" in lines[-1]
+
+
+def answer_fast_path(text: str, last_reply: Optional[str] = None) -> Optional[str]:
+    """
+    Retorna a resposta pronta para intenções triviais ou None quando a
+    mensagem deve seguir para o agente.
+
+    last_reply é a última mensagem do agente na conversa (None se vazia): se
+    ela fez uma pergunta, a mensagem do cliente é resposta a ela e vai para o agente.
+    """
+    if not getattr(settings, "fast_path_enabled", True):
+        return None
+    if _asks_question(last_reply):
+        return None
+
+    intent, confidence = classify_intent(text)
+    min_conf = float(getattr(settings, "fast_path_min_confidence", 0.85))
+    if intent == OTHER or confidence < min_conf:
+        return None
+
+    info = _store_info()
+    norm = _normalize(text)
+    greeting = _greeting_reply(norm) if re.match(_GREETING, norm) else ""
+
+    if intent == "saudacao":
+        reply = f"{_greeting_reply(norm)} O que você quer comprar hoje?"
+    elif intent == "horario" and info.get("horario"):
+        reply = f"{greeting} Nosso horário: {info['horario']}".strip()
+    elif intent == "endereco" and info.get("endereco"):
+        reply = f"{greeting} Estamos na {info['endereco']}".strip()
+    elif intent == "setores" and info.get("setores"):
+        reply = f"{greeting} Temos: {info['setores']}. O que você procura?".strip()
+    else:
+        return None
+
+    logger.info(f"Atalho respondeu intenção '{intent}' (confiança={confidence:.2f})")
+    return reply
@@ -0,0 +1,143 @@
+"""
+Requisições "hedged" para cortar a cauda de latência (ex.: cold start do smart-responder)
+
+A chamada original roda numa thread própria, sem fila (sem amostras de
+latência ainda, roda direto na thread de quem chamou); se não responder dentro
+do limiar adaptativo (percentil settings.hedge_percentile das latências
+recentes do host, medidas por tools/adaptive.py), uma segunda chamada idêntica
+é disparada no pool de settings.hedge_workers e vale a primeira que responder.
+Só as cópias passam pelo pool, então ele não limita as chamadas originais e a
+espera na fila não conta como lentidão do destino.
+
+O orçamento é um balde de fichas: cada chamada original rende
+settings.hedge_budget_ratio ficha (até hedge_budget_burst) e cada cópia gasta
+uma, então a carga extra fica limitada a essa fração do tráfego. A chamada que
+perde continua em segundo plano e só alimenta as latências observadas.
+"""
+import contextvars
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Optional, TypeVar
+
+from config.logger import setup_logger
+from config.metrics import REGISTRY
+from config.settings import settings
+from tools import adaptive
+
+logger = setup_logger(__name__)
+
+T = TypeVar("T")
+
+HEDGE_EVENTS = REGISTRY.counter(
+    "agente_hedge_requests_total",
+    "Requisições hedged por destino: issued (cópia disparada), won (cópia respondeu antes), "
+    "budget_exhausted (limiar atingido sem orçamento)",
+    ["name", "event"],
+)
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=settings.hedge_workers, thread_name_prefix="hedge")
+    return _executor
+
+
+class _Target:
+    """Orçamento de cópias de um destino."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.tokens = float(settings.hedge_budget_burst)
+
+    def earn(self) -> None:
+        with self.lock:
+            self.tokens = min(float(settings.hedge_budget_burst), self.tokens + settings.hedge_budget_ratio)
+
+    def spend(self) -> bool:
+        with self.lock:
+            if self.tokens < 1.0:
+                return False
+            self.tokens -= 1.0
+            return True
+
+
+_targets: Dict[str, _Target] = {}
+_targets_lock = threading.Lock()
+
+
+def _target(name: str) -> _Target:
+    target = _targets.get(name)
+    if target is None:
+        with _targets_lock:
+            target = _targets.setdefault(name, _Target())
+    return target
+
+
+def _submit(fn: Callable[[], T]) -> Future:
+    return _get_executor().submit(contextvars.copy_context().run, fn)
+
+
+def _start(fn: Callable[[], T]) -> Future:
+    """Roda fn numa thread própria, que começa na hora (o limiar conta só a execução)."""
+    future: Future = Future()
+    context = contextvars.copy_context()
+
+    def run() -> None:
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(context.run(fn))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="hedge-primary", daemon=True).start()
+    return future
+
+
+def call(name: str, fn: Callable[[], T]) -> T:
+    """Executa fn() com hedge para o host `name` (sem hedge se desligado)."""
+    if not settings.hedge_enabled:
+        return fn()
+
+    target = _target(name)
+    target.earn()
+    delay = adaptive.quantile(name, settings.hedge_percentile, settings.hedge_min_samples)
+    if delay is None:
+        return fn()
+    delay = max(delay, settings.hedge_min_delay_seconds)
+    primary = _start(fn)
+
+    done, _ = wait([primary], timeout=delay)
+    if done:
+        return primary.result()
+    if not target.spend():
+        HEDGE_EVENTS.inc(name=name, event="budget_exhausted")
+        return primary.result()
+
+    HEDGE_EVENTS.inc(name=name, event="issued")
+    logger.info(f"[HEDGE] {name}: sem resposta em {delay * 1000:.0f}ms, disparando cópia")
+    hedge = _submit(fn)
+    pending = {primary, hedge}
+    first_error: Optional[BaseException] = None
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            error = future.exception()
+            if error is None:
+                if future is hedge:
+                    HEDGE_EVENTS.inc(name=name, event="won")
+                return future.result()
+            first_error = first_error or error
+    raise first_error
+
+
+def reset() -> None:
+    """Descarta os orçamentos de cópias (testes)."""
+    with _targets_lock:
+        _targets.clear()
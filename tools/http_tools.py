@@ -1,11 +1,19 @@
 """
 Ferramentas HTTP para interação com a API do Supermercado
 """
+import datetime
+import re
+import sqlite3
+import unicodedata
+import pytz
 import requests
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Tuple
 from config.settings import settings
-from config.logger import setup_logger
+from config.logger import setup_logger, payload_preview
+from config.metrics import track_tool
+from config import fast_json
+from tools import erp_snapshot, order_outbox, upstream
 
 logger = setup_logger(__name__)
 
@@ -19,6 +27,31 @@ def get_auth_headers() -> Dict[str, str]:
     }
 
 
+STALE_NOTICE_PREFIX = "⚠️ Sistema do mercado indisponível"
+
+
+def _stale_notice(response: requests.Response) -> str:
+    """
+    Aviso para o LLM quando a resposta é o último resultado bom guardado pelo
+    circuit breaker (ERP fora), e não a consulta ao vivo.
+    """
+    if "X-Fallback-Cache" not in response.headers:
+        return ""
+    saved_at = float(response.headers.get("X-Fallback-Saved-At") or 0.0)
+    hora = datetime.datetime.fromtimestamp(saved_at, pytz.timezone("America/Sao_Paulo")).strftime("%H:%M")
+    return (f"{STALE_NOTICE_PREFIX}: preço/estoque de {hora}, pode ter mudado. "
+            "Avise o cliente que o valor será confirmado na separação.\n")
+
+
+def split_stale_notice(text: str) -> Tuple[str, str]:
+    """Separa o aviso de _stale_notice (se houver) do JSON da resposta: (aviso, corpo)."""
+    if text and text.startswith(STALE_NOTICE_PREFIX):
+        notice, _, body = text.partition("\n")
+        return notice, body
+    return "", text
+
+
+@track_tool("estoque")
 def estoque(url: str) -> str:
     """
     Consulta o estoque e preço de produtos no sistema do supermercado.
@@ -32,17 +65,20 @@ def estoque(url: str) -> str:
     logger.info(f"Consultando estoque: {url}")
     
     try:
-        response = requests.get(
+        response = upstream.get(
             url,
             headers=get_auth_headers(),
-            timeout=10
+            timeout=10,
+            fallback=True,
+            fallback_max_age=settings.breaker_price_fallback_max_age_seconds,
+            retry=True,
         )
         response.raise_for_status()
         
-        data = response.json()
+        data = fast_json.loads(response.content)
         logger.info(f"Estoque consultado com sucesso: {len(data) if isinstance(data, list) else 1} produto(s)")
         
-        return json.dumps(data, indent=2, ensure_ascii=False)
+        return _stale_notice(response) + fast_json.dumps(data, indent=True)
     
     except requests.exceptions.Timeout:
         error_msg = "Erro: Timeout ao consultar estoque. Tente novamente."
@@ -65,13 +101,42 @@ def estoque(url: str) -> str:
         return error_msg
 
 
-def pedidos(json_body: str) -> str:
+def _submit_order(kind: str, telefone: str, data: Any, turn_id: Optional[str]) -> Optional[Dict[str, Any]]:
+    """Grava na fila de pedidos e tenta entregar; None se a fila estiver indisponível (envio direto)."""
+    try:
+        return order_outbox.submit(kind, telefone, data, turn_id)
+    except sqlite3.Error as e:
+        logger.error(f"Fila de pedidos indisponível ({e}); enviando direto ao painel")
+        return None
+
+
+def _outbox_message(entry: Dict[str, Any], what: str) -> str:
+    """Resposta da ferramenta para uma operação da fila de pedidos, conforme o desfecho da entrega."""
+    if entry["duplicado"]:
+        return (f"✅ {what} já registrado anteriormente (protocolo #{entry['id']}, status: {entry['status']}). "
+                "Não é necessário enviar de novo.")
+    if entry["status"] == order_outbox.FAILED:
+        # Recusa do painel (dados inválidos): o LLM precisa ver o erro para corrigir
+        return f"Erro: o painel recusou {what.lower()} ({entry['erro']}). Corrija os dados e tente novamente."
+    if entry["status"] == order_outbox.DELIVERED:
+        return (f"✅ {what} entregue ao painel dos funcionários (protocolo #{entry['id']}).\n\n"
+                f"Resposta do servidor:\n{entry['resposta']}")
+    if entry["status"] == order_outbox.QUEUED:
+        return (f"✅ {what} registrado (protocolo #{entry['id']}). Ainda há uma operação anterior deste cliente "
+                "sendo enviada ao painel; esta será enviada logo depois dela, automaticamente.")
+    return (f"✅ {what} registrado (protocolo #{entry['id']}). O painel não respondeu agora; "
+            "o envio será repetido automaticamente em instantes.")
+
+
+@track_tool("pedidos")
+def pedidos(json_body: str, turn_id: Optional[str] = None) -> str:
     """
     Envia um pedido finalizado para o painel dos funcionários (dashboard).
     
     Args:
         json_body: JSON string com os detalhes do pedido
                    Exemplo: '{"cliente": "João", "itens": [{"produto": "Arroz", "quantidade": 1}]}'
+        turn_id: Turno da conversa; o mesmo pedido repetido no turno não duplica (fila de pedidos)
     
     Returns:
         Mensagem de sucesso com resposta do servidor ou mensagem de erro
@@ -81,19 +146,25 @@ def pedidos(json_body: str) -> str:
     
     try:
         # Validar JSON
-        data = json.loads(json_body)
-        logger.debug(f"Dados do pedido: {data}")
+        data = fast_json.loads(json_body)
+        logger.debug("Dados do pedido: %s", payload_preview(data))
+
+        if settings.order_outbox_enabled:
+            telefone = str(data.get("telefone") or data.get("phone") or "") if isinstance(data, dict) else ""
+            entry = _submit_order(order_outbox.PEDIDO, telefone, data, turn_id)
+            if entry is not None:
+                return _outbox_message(entry, "Pedido")
         
-        response = requests.post(
+        response = upstream.post(
             url,
             headers=get_auth_headers(),
-            json=data,
+            data=fast_json.dumps_bytes(data),
             timeout=10
         )
         response.raise_for_status()
         
-        result = response.json()
-        success_msg = f"✅ Pedido enviado com sucesso!\n\nResposta do servidor:\n{json.dumps(result, indent=2, ensure_ascii=False)}"
+        result = fast_json.loads(response.content)
+        success_msg = f"✅ Pedido enviado com sucesso!\n\nResposta do servidor:\n{fast_json.dumps(result, indent=True)}"
         logger.info("Pedido enviado com sucesso")
         
         return success_msg
@@ -119,13 +190,15 @@ def pedidos(json_body: str) -> str:
         return error_msg
 
 
-def alterar(telefone: str, json_body: str) -> str:
+@track_tool("alterar")
+def alterar(telefone: str, json_body: str, turn_id: Optional[str] = None) -> str:
     """
     Atualiza um pedido existente no painel dos funcionários (dashboard).
     
     Args:
         telefone: Telefone do cliente para identificar o pedido
         json_body: JSON string com os dados a serem atualizados
+        turn_id: Turno da conversa; a mesma alteração repetida no turno não duplica (fila de pedidos)
     
     Returns:
         Mensagem de sucesso com resposta do servidor ou mensagem de erro
@@ -138,19 +211,24 @@ def alterar(telefone: str, json_body: str) -> str:
     
     try:
         # Validar JSON
-        data = json.loads(json_body)
-        logger.debug(f"Dados de atualização: {data}")
+        data = fast_json.loads(json_body)
+        logger.debug("Dados de atualização: %s", payload_preview(data))
+
+        if settings.order_outbox_enabled:
+            entry = _submit_order(order_outbox.ALTERACAO, telefone_limpo, data, turn_id)
+            if entry is not None:
+                return _outbox_message(entry, "Alteração do pedido")
         
-        response = requests.put(
+        response = upstream.put(
             url,
             headers=get_auth_headers(),
-            json=data,
+            data=fast_json.dumps_bytes(data),
             timeout=10
         )
         response.raise_for_status()
         
-        result = response.json()
-        success_msg = f"✅ Pedido atualizado com sucesso!\n\nResposta do servidor:\n{json.dumps(result, indent=2, ensure_ascii=False)}"
+        result = fast_json.loads(response.content)
+        success_msg = f"✅ Pedido atualizado com sucesso!\n\nResposta do servidor:\n{fast_json.dumps(result, indent=True)}"
         logger.info("Pedido atualizado com sucesso")
         
         return success_msg
@@ -161,6 +239,123 @@ def alterar(telefone: str, json_body: str) -> str:
         return error_msg
 
 
+# ============================================
+# ean_lookup: extração e ranqueamento de pares (EAN, nome)
+# ============================================
+
+_EAN_TEXT_RE = re.compile(r'"codigo_ean"\s*:\s*([0-9]+)')
+_PRODUTO_TEXT_RE = re.compile(r'"produto"\s*:\s*"([^"]+)"')
+_TOKEN_RE = re.compile(r"[\wáéíóúâêîôûãõç]+")
+_MEDIDA_RE = re.compile(r"(\d+\s*(g|kg|ml|l|litro|un))")
+_EAN_KEYS = ("ean", "ean_code", "codigo_ean", "barcode", "gtin")
+_NOME_KEYS = ("produto", "product", "name", "nome", "title", "descricao", "description")
+
+
+def _extract_pairs_from_text(text: str) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Pares (EAN, nome) em texto com JSON embutido (ex.: campo "content" do Supabase)."""
+    eans = _EAN_TEXT_RE.findall(text)
+    names = _PRODUTO_TEXT_RE.findall(text)
+    # Emparelhar por ordem de aparição; não limitar aqui
+    pairs = []
+    limit = min(len(eans), len(names)) or max(len(eans), len(names))
+    for i in range(min(limit, 50)):
+        e = eans[i] if i < len(eans) else None
+        n = names[i] if i < len(names) else None
+        if e or n:
+            pairs.append((e, n))
+    return pairs
+
+
+def _extract_pairs(data: Any) -> List[Tuple[Optional[str], Optional[str]]]:
+    """Percorre a resposta JSON inteira coletando pares de campos estruturados e de strings."""
+    pairs: List[Tuple[Optional[str], Optional[str]]] = []
+
+    def try_obj(d: Dict[str, Any]):
+        # EAN pode ser string ou número
+        e = None
+        for k in _EAN_KEYS:
+            v = d.get(k)
+            if isinstance(v, (str, int)) and str(v).strip():
+                e = str(v).strip()
+                break
+        n = None
+        for k in _NOME_KEYS:
+            v = d.get(k)
+            if isinstance(v, str) and v.strip():
+                n = v.strip()
+                break
+        if e or n:
+            pairs.append((e, n))
+
+    def walk(payload: Any):
+        if isinstance(payload, dict):
+            # Primeiro tenta extrair diretamente do objeto
+            try_obj(payload)
+            # Percorre TODOS os campos do dict, não apenas nomes comuns
+            for val in payload.values():
+                if isinstance(val, dict):
+                    walk(val)
+                elif isinstance(val, list):
+                    for it in val:
+                        walk(it)
+                elif isinstance(val, str):
+                    # Conteúdos string (ex.: campo "content" vindo do Supabase)
+                    pairs.extend(_extract_pairs_from_text(val))
+        elif isinstance(payload, list):
+            for it in payload:
+                walk(it)
+        elif isinstance(payload, str):
+            pairs.extend(_extract_pairs_from_text(payload))
+
+    walk(data)
+    return pairs
+
+
+def _strip_accents(s: str) -> str:
+    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
+
+
+def _score(q: str, nome: Optional[str]) -> float:
+    """Relevância do nome para a consulta: +1 por palavra, +1.5 por medida (5kg, 2l...)."""
+    if not nome:
+        return 0.0
+    qn = _strip_accents((q or '').lower())
+    nn = _strip_accents((nome or '').lower())
+    score = 0.0
+    for tok in _TOKEN_RE.findall(qn):
+        if tok and tok in nn:
+            score += 1.0
+    for m in _MEDIDA_RE.findall(qn):
+        if m[0] in nn:
+            score += 1.5
+    return score
+
+
+def _rank_pairs(query: str, pairs: List[Tuple[Optional[str], Optional[str]]]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """
+    Até 10 pares com pelo menos uma palavra da consulta, do mais relevante ao menos;
+    sem nenhum relevante, os 10 primeiros na ordem retornada.
+    """
+    scored = [(pn, _score(query, pn[1])) for pn in pairs]
+    top_relevant = [pn for pn, sc in sorted(scored, key=lambda x: x[1], reverse=True) if sc >= 1.0][:10]
+    return top_relevant if top_relevant else pairs[:10]
+
+
+def _format_summary(pairs) -> Optional[str]:
+    if not pairs:
+        return None
+    lines = ["EANS_ENCONTRADOS:"]
+    for idx, (e, n) in enumerate(pairs, 1):
+        if e and n:
+            lines.append(f"{idx}) {e} - {n}")
+        elif e:
+            lines.append(f"{idx}) {e}")
+        elif n:
+            lines.append(f"{idx}) {n}")
+    return "\n".join(lines)
+
+
+@track_tool("ean_lookup")
 def ean_lookup(query: str) -> str:
     """
     Busca informações/EAN do produto mencionado via Supabase Functions (smart-responder).
@@ -200,154 +395,31 @@ def ean_lookup(query: str) -> str:
     payload = {"query": query}
     logger.info(f"Consultando smart-responder: {url} query='{query[:80]}'")
 
-    def _extract_pairs_from_text(text: str):
-        import re
-        eans = re.findall(r'"codigo_ean"\s*:\s*([0-9]+)', text)
-        names = re.findall(r'"produto"\s*:\s*"([^"]+)"', text)
-        # Emparelhar por ordem de aparição; não limitar aqui
-        pairs = []
-        limit = min(len(eans), len(names)) or max(len(eans), len(names))
-        for i in range(min(limit, 50)):
-            e = eans[i] if i < len(eans) else None
-            n = names[i] if i < len(names) else None
-            if e or n:
-                pairs.append((e, n))
-        return pairs
-
-    def _format_summary(pairs):
-        if not pairs:
-            return None
-        lines = ["EANS_ENCONTRADOS:"]
-        for idx, (e, n) in enumerate(pairs, 1):
-            if e and n:
-                lines.append(f"{idx}) {e} - {n}")
-            elif e:
-                lines.append(f"{idx}) {e}")
-            elif n:
-                lines.append(f"{idx}) {n}")
-        return "\n".join(lines)
-
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=15)
+        resp = upstream.post(url, headers=headers, data=fast_json.dumps_bytes(payload), timeout=15, fallback=True, hedge=True, retry=True)
         status = resp.status_code
         text = resp.text
         logger.info(f"smart-responder retorno: status={status}")
 
         # Tentar interpretar como JSON e extrair EAN/nome quando possível
         try:
-            data = resp.json()
-
-            # Caminho 1: procurar pares diretamente em campos estruturados
-            pairs = []
-            def try_obj(d: Dict[str, Any]):
-                # EAN pode ser string ou número
-                e = None
-                for k in ["ean", "ean_code", "codigo_ean", "barcode", "gtin"]:
-                    v = d.get(k)
-                    if isinstance(v, (str, int)) and str(v).strip():
-                        e = str(v).strip()
-                        break
-                n = None
-                for k in ["produto", "product", "name", "nome", "title", "descricao", "description"]:
-                    v = d.get(k)
-                    if isinstance(v, str) and v.strip():
-                        n = v.strip()
-                        break
-                if e or n:
-                    pairs.append((e, n))
-
-            def walk(payload: Any):
-                if isinstance(payload, dict):
-                    # Primeiro tenta extrair diretamente do objeto
-                    try_obj(payload)
-                    # Percorre TODOS os campos do dict, não apenas nomes comuns
-                    for _, val in payload.items():
-                        if isinstance(val, dict):
-                            walk(val)
-                        elif isinstance(val, list):
-                            for it in val:
-                                walk(it)
-                        elif isinstance(val, str):
-                            # Conteúdos string (ex.: campo "content" vindo do Supabase)
-                            pairs.extend(_extract_pairs_from_text(val))
-                elif isinstance(payload, list):
-                    for it in payload:
-                        walk(it)
-                elif isinstance(payload, str):
-                    pairs.extend(_extract_pairs_from_text(payload))
-
-            walk(data)
-
-            # Ordenar pares por relevância em relação ao 'query' e limitar na sumarização
-            def _strip_accents(s: str) -> str:
-                try:
-                    import unicodedata
-                    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
-                except Exception:
-                    return s
-
-            def _score(q: str, nome: str | None) -> float:
-                if not nome:
-                    return 0.0
-                import re as _re
-                qn = _strip_accents((q or '').lower())
-                nn = _strip_accents((nome or '').lower())
-                score = 0.0
-                for tok in _re.findall(r"[\wáéíóúâêîôûãõç]+", qn):
-                    if tok and tok in nn:
-                        score += 1.0
-                for m in _re.findall(r"(\d+\s*(g|kg|ml|l|litro|un))", qn):
-                    if m[0] in nn:
-                        score += 1.5
-                return score
-
-            # Pontuar por relevância e filtrar apenas itens que casam com a consulta
-            scored = [(pn, _score(query, pn[1])) for pn in pairs]
-            # Ordena por score desc
-            ordered = [pn for pn, sc in sorted(scored, key=lambda x: x[1], reverse=True)]
-            # Mantém apenas os com score >= 1.0 (pelo menos um token da consulta)
-            top_relevant = [pn for pn, sc in sorted(scored, key=lambda x: x[1], reverse=True) if sc >= 1.0][:10]
-            # Fallback: se não houver relevantes, use os primeiros pares retornados
-            used_pairs = top_relevant if top_relevant else ordered[:10]
-            summary = _format_summary(used_pairs)
-            if summary:
-                sanitized = summary.replace("\n", "; ")
-                logger.info(f"smart-responder resumo extraído: {sanitized}")
-                return f"{summary}\n\n{json.dumps(data, indent=2, ensure_ascii=False)}"
-            else:
-                return json.dumps(data, indent=2, ensure_ascii=False)
+            data = fast_json.loads(resp.content)
         except Exception:
             # Se não for JSON, tentar extrair com regex do texto bruto
-            pairs = _extract_pairs_from_text(text)
-            # Aplicar o mesmo filtro de relevância no texto bruto
-            def _strip_accents(s: str) -> str:
-                try:
-                    import unicodedata
-                    return ''.join(c for c in unicodedata.normalize('NFD', s) if unicodedata.category(c) != 'Mn')
-                except Exception:
-                    return s
-            def _score(q: str, nome: str | None) -> float:
-                if not nome:
-                    return 0.0
-                import re as _re
-                qn = _strip_accents((q or '').lower())
-                nn = _strip_accents((nome or '').lower())
-                score = 0.0
-                for tok in _re.findall(r"[\wáéíóúâêîôûãõç]+", qn):
-                    if tok and tok in nn:
-                        score += 1.0
-                for m in _re.findall(r"(\d+\s*(g|kg|ml|l|litro|un))", qn):
-                    if m[0] in nn:
-                        score += 1.5
-                return score
-            scored = [(pn, _score(query, pn[1])) for pn in pairs]
-            top_relevant = [pn for pn, sc in sorted(scored, key=lambda x: x[1], reverse=True) if sc >= 1.0][:10]
-            used_pairs = top_relevant if top_relevant else [pn for pn, _ in scored][:10]
-            summary = _format_summary(used_pairs)
+            # e aplicar o mesmo filtro de relevância
+            summary = _format_summary(_rank_pairs(query, _extract_pairs_from_text(text)))
             if summary:
                 return f"{summary}\n\n{text}"
             return text
 
+        # Ordenar pares por relevância em relação ao 'query' e limitar na sumarização
+        summary = _format_summary(_rank_pairs(query, _extract_pairs(data)))
+        if summary:
+            sanitized = summary.replace("\n", "; ")
+            logger.info(f"smart-responder resumo extraído: {sanitized}")
+            return f"{summary}\n\n{fast_json.dumps(data, indent=True)}"
+        return fast_json.dumps(data, indent=True)
+
     except requests.exceptions.Timeout:
         msg = "Erro: Timeout ao consultar smart-responder. Tente novamente."
         logger.error(msg)
@@ -362,6 +434,126 @@ def ean_lookup(query: str) -> str:
         return msg
 
 
+# ============================================
+# estoque_preco: normalização de disponibilidade e preço
+# ============================================
+
+# Heurística de extração de preço
+PRICE_KEYS = (
+    "vl_produto",
+    "vl_produto_normal",
+    "preco",
+    "preco_venda",
+    "valor",
+    "valor_unitario",
+    "preco_unitario",
+    "atacadoPreco",
+)
+
+# Possíveis chaves de quantidade de estoque (remover da saída)
+STOCK_QTY_KEYS = {
+    "estoque", "qtd", "qtde", "qtd_estoque", "quantidade", "quantidade_disponivel",
+    "quantidadeDisponivel", "qtdDisponivel", "qtdEstoque", "estoqueAtual", "saldo",
+    "qty", "quantity", "stock", "amount", "qtd_produto", "qtd_movimentacao"
+}
+
+# Possíveis indicadores de disponibilidade
+BOOL_AVAIL_KEYS = ("disponibilidade", "disponivel", "available", "in_stock", "em_estoque", "ativo")
+STATUS_KEYS = ("situacao", "situacaoEstoque", "status", "statusEstoque")
+
+
+def _parse_float(val) -> Optional[float]:
+    try:
+        s = str(val).strip()
+        if not s:
+            return None
+        # aceita formato brasileiro
+        s = s.replace(".", "").replace(",", ".") if s.count(",") == 1 and s.count(".") > 1 else s.replace(",", ".")
+        return float(s)
+    except Exception:
+        return None
+
+
+def _has_positive_qty(d: Dict[str, Any]) -> bool:
+    for k in STOCK_QTY_KEYS:
+        if k in d:
+            v = d.get(k)
+            try:
+                n = float(str(v).replace(",", "."))
+                if n > 0:
+                    return True
+            except Exception:
+                # ignore não numérico
+                pass
+    return False
+
+
+def _status_available(d: Dict[str, Any]) -> bool:
+    for k in STATUS_KEYS:
+        v = d.get(k)
+        if isinstance(v, str):
+            s = v.strip().lower()
+            if any(x in s for x in ["dispon", "em estoque", "in stock", "ativo"]):
+                return True
+    return False
+
+
+def _is_available(d: Dict[str, Any]) -> bool:
+    # APENAS produtos com estoque real positivo (> 0)
+    return _has_positive_qty(d)
+
+
+def _extract_qty(d: Dict[str, Any]) -> Optional[float]:
+    for k in STOCK_QTY_KEYS:
+        if k in d:
+            try:
+                return float(str(d.get(k)).replace(',', '.'))
+            except Exception:
+                pass
+    return None
+
+
+def _extract_price(d: Dict[str, Any]) -> Optional[float]:
+    for k in PRICE_KEYS:
+        if k in d:
+            val = _parse_float(d.get(k))
+            if val is not None:
+                return val
+    return None
+
+
+def _normalize_estoque_items(items: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Mantém apenas itens com estoque positivo, remove as quantidades brutas e
+    acrescenta os campos unificados 'disponibilidade', 'preco' e 'quantidade'.
+    """
+    sanitized: List[Dict[str, Any]] = []
+    for it in items:
+        if not isinstance(it, dict):
+            continue
+        if not _is_available(it):
+            continue  # manter apenas itens com estoque/disponibilidade
+
+        clean = {k: v for k, v in it.items() if k not in STOCK_QTY_KEYS}
+
+        # Normalizar disponibilidade
+        if "disponibilidade" not in clean:
+            clean["disponibilidade"] = True
+
+        # Normalizar preço em campo unificado
+        price = _extract_price(it)
+        if price is not None:
+            clean["preco"] = price
+
+        qty = _extract_qty(it)
+        if qty is not None:
+            clean["quantidade"] = qty
+
+        sanitized.append(clean)
+    return sanitized
+
+
+@track_tool("estoque_preco")
 def estoque_preco(ean: str) -> str:
     """
     Consulta preço e disponibilidade pelo EAN.
@@ -388,6 +580,12 @@ def estoque_preco(ean: str) -> str:
         logger.error(msg)
         return msg
 
+    if settings.erp_snapshot_enabled:
+        cached = erp_snapshot.lookup(ean_digits)
+        if cached is not None:
+            logger.info(f"EAN {ean_digits}: respondido pelo snapshot local do ERP")
+            return cached
+
     url = f"{base}/{ean_digits}"
     logger.info(f"Consultando estoque_preco por EAN: {url}")
 
@@ -396,12 +594,13 @@ def estoque_preco(ean: str) -> str:
     }
 
     try:
-        resp = requests.get(url, headers=headers, timeout=10)
+        resp = upstream.get(url, headers=headers, timeout=10, fallback=True,
+                            fallback_max_age=settings.breaker_price_fallback_max_age_seconds, retry=True)
         resp.raise_for_status()
 
         # resposta esperada: lista de objetos
         try:
-            data = resp.json()
+            data = fast_json.loads(resp.content)
         except json.JSONDecodeError:
             txt = resp.text
             logger.warning("Resposta não é JSON válido; retornando texto bruto")
@@ -410,113 +609,18 @@ def estoque_preco(ean: str) -> str:
         # Se vier um único objeto, normalizar para lista
         items = data if isinstance(data, list) else ([data] if isinstance(data, dict) else [])
 
-        # Heurística de extração de preço
-        PRICE_KEYS = (
-            "vl_produto",
-            "vl_produto_normal",
-            "preco",
-            "preco_venda",
-            "valor",
-            "valor_unitario",
-            "preco_unitario",
-            "atacadoPreco",
-        )
-
-        # Possíveis chaves de quantidade de estoque (remover da saída)
-        STOCK_QTY_KEYS = {
-            "estoque", "qtd", "qtde", "qtd_estoque", "quantidade", "quantidade_disponivel",
-            "quantidadeDisponivel", "qtdDisponivel", "qtdEstoque", "estoqueAtual", "saldo",
-            "qty", "quantity", "stock", "amount", "qtd_produto", "qtd_movimentacao"
-        }
-
-        # Possíveis indicadores de disponibilidade
-        BOOL_AVAIL_KEYS = ("disponibilidade", "disponivel", "available", "in_stock", "em_estoque", "ativo")
-        STATUS_KEYS = ("situacao", "situacaoEstoque", "status", "statusEstoque")
-
-        def _parse_float(val) -> float | None:
-            try:
-                s = str(val).strip()
-                if not s:
-                    return None
-                # aceita formato brasileiro
-                s = s.replace(".", "").replace(",", ".") if s.count(",") == 1 and s.count(".") > 1 else s.replace(",", ".")
-                return float(s)
-            except Exception:
-                return None
-
-        def _has_positive_qty(d: Dict[str, Any]) -> bool:
-            for k in STOCK_QTY_KEYS:
-                if k in d:
-                    v = d.get(k)
-                    try:
-                        n = float(str(v).replace(",", "."))
-                        if n > 0:
-                            return True
-                    except Exception:
-                        # ignore não numérico
-                        pass
-            return False
-
-        def _status_available(d: Dict[str, Any]) -> bool:
-            for k in STATUS_KEYS:
-                v = d.get(k)
-                if isinstance(v, str):
-                    s = v.strip().lower()
-                    if any(x in s for x in ["dispon", "em estoque", "in stock", "ativo"]):
-                        return True
-            return False
-
-        def _is_available(d: Dict[str, Any]) -> bool:
-            # APENAS produtos com estoque real positivo (> 0)
-            if _has_positive_qty(d):
-                return True
-            
-            return False
-
-        def _extract_qty(d: Dict[str, Any]) -> float | None:
-            for k in STOCK_QTY_KEYS:
-                if k in d:
-                    try:
-                        return float(str(d.get(k)).replace(',', '.'))
-                    except Exception:
-                        pass
-            return None
-
-        def _extract_price(d: Dict[str, Any]) -> float | None:
-            for k in PRICE_KEYS:
-                if k in d:
-                    val = _parse_float(d.get(k))
-                    if val is not None:
-                        return val
-            return None
-
-        sanitized: list[Dict[str, Any]] = []
-        for it in items:
-            if not isinstance(it, dict):
-                continue
-            if not _is_available(it):
-                continue  # manter apenas itens com estoque/disponibilidade
-
-            clean = {k: v for k, v in it.items() if k not in STOCK_QTY_KEYS}
-
-            # Normalizar disponibilidade
-            if "disponibilidade" not in clean:
-                clean["disponibilidade"] = True
-
-            # Normalizar preço em campo unificado
-            price = _extract_price(it)
-            if price is not None:
-                clean["preco"] = price
-
-            qty = _extract_qty(it)
-            if qty is not None:
-                clean["quantidade"] = qty
-
-            sanitized.append(clean)
+        sanitized = _normalize_estoque_items(items)
 
         logger.info(f"EAN {ean_digits}: {len(sanitized)} item(s) disponíveis após filtragem")
 
-        return json.dumps(sanitized, indent=2, ensure_ascii=False)
+        result = fast_json.dumps(sanitized, indent=True)
+        notice = _stale_notice(resp)
+        if notice:
+            return notice + result
+        # Resposta ao vivo (não a última boa do circuit breaker) passa a valer no snapshot
+        if settings.erp_snapshot_enabled:
+            erp_snapshot.store(ean_digits, result, resp.headers)
+        return result
 
     except requests.exceptions.Timeout:
         msg = "Erro: Timeout ao consultar preço/estoque por EAN. Tente novamente."
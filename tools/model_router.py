@@ -0,0 +1,120 @@
+"""
+Cascata de modelos: turnos simples vão para o modelo rápido/barato e só
+escalam para o modelo de qualidade quando a resposta não passa na validação
+ou a conversa é complexa (vários itens, reclamação, mensagem longa). Turnos em
+que o modelo rápido já chamou uma ferramenta com efeito colateral (pedido,
+carrinho) nunca são refeitos.
+
+Estatísticas por rota (latência, escalonamentos e motivo) no /metrics;
+o custo por rota sai de agente_llm_tokens_total{model=...}.
+"""
+import re
+import unicodedata
+from typing import List, Optional, Sequence, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+
+from config.logger import setup_logger
+from config.metrics import REGISTRY
+from config.settings import settings
+
+logger = setup_logger(__name__)
+
+FAST = "fast"
+QUALITY = "quality"
+
+ROUTE_TURNS = REGISTRY.counter(
+    "agente_llm_route_turns_total",
+    "Turnos atendidos por rota da cascata e motivo (escalados contam na rota fast)",
+    ["route", "outcome", "reason"],
+)
+ROUTE_LATENCY = REGISTRY.histogram(
+    "agente_llm_route_duration_seconds",
+    "Duração do turno do agente por rota da cascata (escalated = fast falhou + quality)",
+    ["route"],
+)
+
+
+# ============================================
+# Classificação do turno
+# ============================================
+
+_COMPLAINT_RE = re.compile(
+    r"\b(reclama\w*|absurd\w*|pessim\w*|horrivel|errad\w*|faltando|faltou|veio sem|estragad\w*|vencid\w*|"
+    r"demor\w*|atrasad\w*|cancel\w*|devolu\w*|reembols\w*|estorno|procon|gerente|nao chegou)\b"
+)
+# Separadores de itens em listas de compras: vírgula, ";", quebra de linha, " e ", "+"
+_ITEM_SPLIT_RE = re.compile(r"\s*(?:,|;|\n|\+|\be\b|\btambem\b)\s*")
+_WORD_RE = re.compile(r"[a-z]{3,}")
+
+
+def _normalize(text: str) -> str:
+    s = unicodedata.normalize("NFD", (text or "").lower())
+    return "".join(c for c in s if unicodedata.category(c) != "Mn")
+
+
+def count_items(mensagem: str) -> int:
+    """Estimativa de itens pedidos na mensagem (partes com pelo menos uma palavra)."""
+    parts = _ITEM_SPLIT_RE.split(_normalize(mensagem))
+    return sum(1 for p in parts if _WORD_RE.search(p))
+
+
+def choose_route(mensagem: str) -> Tuple[str, str]:
+    """Rota inicial do turno e o motivo (rótulo curto para métricas/logs)."""
+    text = _normalize(mensagem)
+    if _COMPLAINT_RE.search(text):
+        return QUALITY, "reclamacao"
+    if len(text) > settings.llm_cascade_max_chars:
+        return QUALITY, "mensagem_longa"
+    if count_items(mensagem) > settings.llm_cascade_max_items:
+        return QUALITY, "varios_itens"
+    return FAST, "simples"
+
+
+# ============================================
+# Validação da resposta do modelo rápido
+# ============================================
+
+# Marcadores internos que nunca devem chegar ao cliente
+_LEAK_MARKERS = ("EANS_ENCONTRADOS", "codigo_ean", "tool_call", "```")
+_GIVE_UP_RE = re.compile(r"nao (consegui|sei|tenho como)|desculpe.{0,40}(erro|problema)|tente novamente")
+
+
+def validate_turn(new_messages: Sequence[BaseMessage]) -> Optional[str]:
+    """
+    Valida as mensagens produzidas no turno pelo modelo rápido.
+    Retorna None se a resposta pode ir ao cliente ou o motivo da reprovação.
+    """
+    if not new_messages or not isinstance(new_messages[-1], AIMessage):
+        return "sem_resposta"
+    final = new_messages[-1]
+    content = final.content if isinstance(final.content, str) else str(final.content)
+    if not content.strip() or final.tool_calls:
+        return "sem_resposta"
+    for m in new_messages:
+        if isinstance(m, ToolMessage) and str(m.content).startswith(("Erro", "❌")):
+            return "erro_ferramenta"
+    if any(marker in content for marker in _LEAK_MARKERS):
+        return "vazamento_interno"
+    if _GIVE_UP_RE.search(_normalize(content)):
+        return "desistiu"
+    return None
+
+
+# Ferramentas com efeito fora do histórico: refazer o turno repetiria o efeito
+# (pedido duplicado, quantidade dobrada no carrinho)
+SIDE_EFFECT_TOOLS = frozenset({"pedidos_tool", "alterar_tool", "cart_add", "cart_remove"})
+
+
+def side_effect_calls(new_messages: Sequence[BaseMessage]) -> List[str]:
+    """Ferramentas com efeito colateral chamadas no turno (pedidas pelo modelo, executadas ou não)."""
+    return [
+        call["name"]
+        for m in new_messages if isinstance(m, AIMessage)
+        for call in m.tool_calls if call.get("name") in SIDE_EFFECT_TOOLS
+    ]
+
+
+def new_turn_messages(before: List[BaseMessage], after: List[BaseMessage]) -> List[BaseMessage]:
+    """Mensagens acrescentadas ao estado durante o turno."""
+    return list(after[len(before):])
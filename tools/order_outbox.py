@@ -0,0 +1,357 @@
+"""
+Fila local (outbox) de pedidos e alterações para o painel dos funcionários
+
+As ferramentas pedidos/alterar gravam a operação num SQLite local
+(settings.order_outbox_path) e tentam entregá-la ao painel (/pedidos/ e
+/pedidos/telefone/<telefone>) na hora (submit):
+  - 2xx: entregue; a ferramenta devolve a resposta do painel
+  - 4xx (exceto 408/429): recusada; o erro volta para o LLM corrigir o pedido
+  - 5xx, timeout ou conexão: fica na fila e um despachante em segundo plano
+    repete com backoff exponencial; a ferramenta responde com o protocolo
+
+Idempotência:
+  - a mesma operação (tipo + telefone + corpo) repetida no mesmo turno da
+    conversa devolve o registro já existente, então o LLM refazer a chamada
+    após um timeout não duplica o pedido; em outro turno (cliente pedindo de
+    novo, ex.: após cancelar) é uma operação nova
+  - cada registro tem uma chave enviada no header Idempotency-Key, estável
+    entre as retentativas da entrega
+
+As operações de um mesmo telefone são entregues em ordem (uma alteração não
+passa na frente do pedido). Os registros são reservados por um prazo antes do
+envio, o que permite vários workers compartilhando o mesmo arquivo.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+import requests
+
+from config import fast_json
+from config.logger import setup_logger
+from config.metrics import REGISTRY
+from config.settings import settings
+from tools import upstream
+
+logger = setup_logger(__name__)
+
+PEDIDO = "pedido"
+ALTERACAO = "alteracao"
+
+PENDING = "pending"
+SENDING = "sending"
+DELIVERED = "delivered"
+FAILED = "failed"
+# Só no retorno de submit: ficou pending atrás de outra operação do telefone, sem tentativa
+QUEUED = "queued"
+
+OUTBOX_EVENTS = REGISTRY.counter(
+    "agente_order_outbox_total",
+    "Operações da fila de pedidos: enqueued, duplicate, delivered, retry, failed",
+    ["kind", "result"],
+)
+OUTBOX_PENDING = REGISTRY.gauge(
+    "agente_order_outbox_pending",
+    "Operações aguardando entrega ao painel",
+)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    idempotency_key TEXT NOT NULL UNIQUE,
+    content_hash TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    telefone TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    lease_until REAL,
+    last_error TEXT,
+    response TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS outbox_telefone ON outbox (telefone, id);
+CREATE INDEX IF NOT EXISTS outbox_content ON outbox (content_hash, created_at);
+"""
+
+_conn: Optional[sqlite3.Connection] = None
+_conn_path: Optional[str] = None
+_lock = threading.RLock()
+_wake = threading.Event()
+_stop = threading.Event()
+_dispatcher: Optional[threading.Thread] = None
+
+
+def _connection() -> sqlite3.Connection:
+    global _conn, _conn_path
+    path = settings.order_outbox_path
+    if _conn is None or _conn_path != path:
+        if _conn is not None:
+            _conn.close()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript(_SCHEMA)
+        _conn, _conn_path = conn, path
+        OUTBOX_PENDING.set_function(_count_pending)
+    return _conn
+
+
+def _count_pending() -> float:
+    with _lock:
+        row = _connection().execute(
+            "SELECT COUNT(*) FROM outbox WHERE status IN (?, ?)", (PENDING, SENDING)
+        ).fetchone()
+    return float(row[0])
+
+
+def _digits(telefone: str) -> str:
+    return "".join(filter(str.isdigit, telefone or ""))
+
+
+def _entry(row: sqlite3.Row) -> Dict[str, Any]:
+    return {
+        "id": row["id"],
+        "tipo": row["kind"],
+        "telefone": row["telefone"],
+        "status": row["status"],
+        "tentativas": row["attempts"],
+        "idempotency_key": row["idempotency_key"],
+        "criado_em": row["created_at"],
+        "atualizado_em": row["updated_at"],
+        "erro": row["last_error"],
+        "resposta": row["response"],
+    }
+
+
+def _operation_hash(kind: str, telefone: str, data: Any, turn_id: Optional[str]) -> str:
+    """Identidade da operação no turno; sem turno (chamada direta) cada operação é nova."""
+    canonical = json.dumps([turn_id or uuid.uuid4().hex, kind, telefone, data], sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def enqueue(kind: str, telefone: str, data: Any, turn_id: Optional[str] = None,
+            send_now: bool = False) -> Dict[str, Any]:
+    """
+    Grava a operação na fila. A mesma operação já gravada no turno (e não
+    recusada) devolve o registro existente (campo "duplicado": True).
+
+    Com send_now=True o registro já nasce reservado (sending) para o chamador
+    entregar, a não ser que outra operação do telefone ainda esteja na fila.
+    """
+    telefone = _digits(telefone)
+    payload = fast_json.dumps(data)
+    content_hash = _operation_hash(kind, telefone, data, turn_id)
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT * FROM outbox WHERE content_hash = ? AND status != ? ORDER BY id DESC LIMIT 1",
+                (content_hash, FAILED),
+            ).fetchone()
+            if row is None:
+                behind = conn.execute(
+                    "SELECT 1 FROM outbox WHERE telefone = ? AND status IN (?, ?) LIMIT 1", (telefone, PENDING, SENDING)
+                ).fetchone()
+                status = SENDING if send_now and behind is None else PENDING
+                lease = now + settings.order_outbox_lease_seconds if status == SENDING else None
+                cur = conn.execute(
+                    "INSERT INTO outbox (idempotency_key, content_hash, kind, telefone, payload, status,"
+                    " next_attempt_at, lease_until, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (uuid.uuid4().hex, content_hash, kind, telefone, payload, status, now, lease, now, now),
+                )
+                row = conn.execute("SELECT * FROM outbox WHERE id = ?", (cur.lastrowid,)).fetchone()
+                duplicate = False
+            else:
+                duplicate = True
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    OUTBOX_EVENTS.inc(kind=kind, result="duplicate" if duplicate else "enqueued")
+    if duplicate:
+        logger.info(f"[OUTBOX] {kind} repetido para {telefone}: mantendo #{row['id']} ({row['status']})")
+    else:
+        logger.info(f"[OUTBOX] {kind} #{row['id']} registrado para {telefone}")
+        if row["status"] == PENDING:
+            _wake_dispatcher()
+    return {**_entry(row), "duplicado": duplicate}
+
+
+def submit(kind: str, telefone: str, data: Any, turn_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Grava a operação e tenta entregá-la na hora. O registro devolvido diz o
+    desfecho: delivered, failed (recusada pelo painel, com "erro"), pending
+    (falha transitória: o despachante repete) ou queued (outra operação do
+    telefone ainda está na fila; esta sai depois dela, sem tentativa agora).
+    """
+    entry = enqueue(kind, telefone, data, turn_id, send_now=True)
+    if entry["duplicado"]:
+        return entry
+    if entry["status"] == PENDING:
+        return {**entry, "status": QUEUED}
+    with _lock:
+        row = _connection().execute("SELECT * FROM outbox WHERE id = ?", (entry["id"],)).fetchone()
+    _deliver(row)
+    with _lock:
+        row = _connection().execute("SELECT * FROM outbox WHERE id = ?", (entry["id"],)).fetchone()
+    if row["status"] == PENDING:
+        _wake_dispatcher()
+    return {**_entry(row), "duplicado": False}
+
+
+def status_by_phone(telefone: str, limit: int = 20) -> List[Dict[str, Any]]:
+    """Operações mais recentes do telefone (mais nova primeiro)."""
+    with _lock:
+        rows = _connection().execute(
+            "SELECT * FROM outbox WHERE telefone = ? ORDER BY id DESC LIMIT ?", (_digits(telefone), limit)
+        ).fetchall()
+    return [_entry(r) for r in rows]
+
+
+# ============================================
+# Despachante
+# ============================================
+
+def _claim(limit: int) -> List[sqlite3.Row]:
+    """Reserva operações vencidas, no máximo uma por telefone e sem passar na frente de outra do mesmo telefone."""
+    now = time.time()
+    with _lock:
+        conn = _connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            rows = conn.execute(
+                """
+                SELECT * FROM outbox o
+                WHERE ((o.status = ? AND o.next_attempt_at <= ?) OR (o.status = ? AND o.lease_until < ?))
+                  AND NOT EXISTS (
+                      SELECT 1 FROM outbox p
+                      WHERE p.telefone = o.telefone AND p.id < o.id AND p.status IN (?, ?)
+                  )
+                ORDER BY o.id LIMIT ?
+                """,
+                (PENDING, now, SENDING, now, PENDING, SENDING, limit),
+            ).fetchall()
+            lease = now + settings.order_outbox_lease_seconds
+            for row in rows:
+                conn.execute(
+                    "UPDATE outbox SET status = ?, lease_until = ?, updated_at = ? WHERE id = ?",
+                    (SENDING, lease, now, row["id"]),
+                )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+    return rows
+
+
+def _finish(row: sqlite3.Row, status: str, *, error: Optional[str] = None, response: Optional[str] = None,
+            retry_in: float = 0.0) -> None:
+    now = time.time()
+    with _lock:
+        _connection().execute(
+            "UPDATE outbox SET status = ?, attempts = attempts + 1, next_attempt_at = ?, lease_until = NULL,"
+            " last_error = ?, response = COALESCE(?, response), updated_at = ? WHERE id = ?",
+            (status, now + retry_in, error, response, now, row["id"]),
+        )
+
+
+def _send(row: sqlite3.Row) -> requests.Response:
+    from tools.http_tools import get_auth_headers
+
+    headers = {**get_auth_headers(), "Idempotency-Key": row["idempotency_key"]}
+    data = row["payload"].encode("utf-8")
+    if row["kind"] == PEDIDO:
+        return upstream.post(f"{settings.supermercado_base_url}/pedidos/", headers=headers, data=data, timeout=10)
+    return upstream.put(
+        f"{settings.supermercado_base_url}/pedidos/telefone/{row['telefone']}", headers=headers, data=data, timeout=10
+    )
+
+
+def _deliver(row: sqlite3.Row) -> None:
+    kind, attempt = row["kind"], row["attempts"] + 1
+    try:
+        response = _send(row)
+        error = None if response.status_code < 400 else f"HTTP {response.status_code}: {response.text[:300]}"
+        retryable = response.status_code >= 500 or response.status_code in (408, 429)
+    except requests.exceptions.RequestException as e:
+        response, error, retryable = None, str(e), True
+
+    if error is None:
+        _finish(row, DELIVERED, response=response.text[:2000])
+        OUTBOX_EVENTS.inc(kind=kind, result="delivered")
+        logger.info(f"[OUTBOX] {kind} #{row['id']} entregue ao painel (tentativa {attempt})")
+    elif retryable and attempt < settings.order_outbox_max_attempts:
+        delay = min(settings.order_outbox_retry_base_seconds * 2 ** (attempt - 1), settings.order_outbox_retry_max_seconds)
+        _finish(row, PENDING, error=error, retry_in=delay)
+        OUTBOX_EVENTS.inc(kind=kind, result="retry")
+        logger.warning(f"[OUTBOX] {kind} #{row['id']} falhou ({error}); nova tentativa em {delay:.0f}s")
+    else:
+        _finish(row, FAILED, error=error)
+        OUTBOX_EVENTS.inc(kind=kind, result="failed")
+        logger.error(f"[OUTBOX] {kind} #{row['id']} não entregue após {attempt} tentativa(s): {error}")
+
+
+def dispatch_once() -> int:
+    """Entrega um lote de operações vencidas; retorna quantas foram processadas."""
+    rows = _claim(settings.order_outbox_batch_size)
+    if len(rows) == 1:
+        _deliver(rows[0])
+    elif rows:
+        with ThreadPoolExecutor(max_workers=min(len(rows), settings.order_outbox_workers)) as pool:
+            list(pool.map(_deliver, rows))
+    return len(rows)
+
+
+def _loop() -> None:
+    logger.info("[OUTBOX] Despachante iniciado")
+    while not _stop.is_set():
+        try:
+            processed = dispatch_once()
+        except Exception as e:
+            logger.error(f"[OUTBOX] Erro no despachante: {e}", exc_info=True)
+            processed = 0
+        if processed:
+            continue
+        _wake.wait(settings.order_outbox_poll_seconds)
+        _wake.clear()
+
+
+def _wake_dispatcher() -> None:
+    ensure_dispatcher()
+    _wake.set()
+
+
+def ensure_dispatcher() -> None:
+    """Inicia o despachante do processo (uma vez)."""
+    global _dispatcher
+    with _lock:
+        if _dispatcher is not None and _dispatcher.is_alive():
+            return
+        _stop.clear()
+        _dispatcher = threading.Thread(target=_loop, name="order-outbox", daemon=True)
+        _dispatcher.start()
+
+
+def stop_dispatcher(timeout: float = 5.0) -> None:
+    global _dispatcher
+    _stop.set()
+    _wake.set()
+    if _dispatcher is not None:
+        _dispatcher.join(timeout)
+    _dispatcher = None
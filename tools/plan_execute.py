@@ -0,0 +1,100 @@
+"""
+Modo plan_execute do agente (settings.agent_mode = "plan_execute")
+
+No ReAct o modelo pede ean → estoque → ean → estoque... e cada volta reenvia o
+prompt inteiro. Aqui o turno tem duas chamadas ao LLM:
+
+  plan     o modelo pede de uma vez todas as consultas necessárias
+           (uma chamada `ean` por produto); sem ferramentas, a resposta já é final
+  execute  executor determinístico: roda as consultas do plano em paralelo e, para
+           cada resultado de `ean`, consulta `estoque` dos primeiros EANs
+  respond  o modelo escreve a resposta com todos os resultados na conversa
+
+Se a resposta ainda pedir ferramentas (faltou algo no plano), volta ao execute,
+como no ReAct. O histórico fica no mesmo formato do ReAct (AIMessage com
+tool_calls + ToolMessages), então os dois modos compartilham checkpoints.
+"""
+import uuid
+from typing import Any, Callable, Dict, List, Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.graph import END, START, MessagesState, StateGraph
+
+from config.logger import setup_logger
+from config.settings import settings
+from tools.prefetch import top_eans
+from tools.tool_node import InstrumentedToolNode
+
+logger = setup_logger(__name__)
+
+PLAN_INSTRUCTION = (
+    "Etapa de planejamento: se precisar consultar produtos, peça TODAS as consultas nesta mesma "
+    "resposta (uma chamada `ean` por produto citado). Preço e estoque dos EANs encontrados são "
+    "consultados automaticamente em seguida."
+)
+RESPOND_INSTRUCTION = (
+    "As consultas planejadas já foram executadas (resultados acima). Responda ao cliente com base "
+    "nelas; só chame ferramentas de novo se faltar algo essencial."
+)
+
+EAN_TOOLS = ("ean", "ean_tool")
+ESTOQUE_TOOLS = ("estoque", "estoque_preco_tool")
+
+PromptFn = Callable[[Dict[str, Any], RunnableConfig], List[BaseMessage]]
+
+
+def _chained_estoque_calls(plan: AIMessage, results: Sequence[BaseMessage], estoque_name: str) -> List[Dict[str, Any]]:
+    """Chamadas de estoque para os primeiros EANs de cada resultado de ean ainda não consultados."""
+    ean_call_ids = {c["id"] for c in plan.tool_calls if c["name"] in EAN_TOOLS}
+    seen = {str(c["args"].get("ean", "")) for c in plan.tool_calls if c["name"] in ESTOQUE_TOOLS}
+    calls = []
+    for msg in results:
+        if not isinstance(msg, ToolMessage) or msg.tool_call_id not in ean_call_ids:
+            continue
+        for ean in top_eans(str(msg.content), int(settings.plan_eans_per_item)):
+            if ean not in seen:
+                seen.add(ean)
+                calls.append({"name": estoque_name, "args": {"ean": ean}, "id": f"plan_{uuid.uuid4().hex[:16]}", "type": "tool_call"})
+    return calls
+
+
+def create_plan_execute_agent(llm: Any, tools: Sequence[Any], plan_prompt: PromptFn,
+                              respond_prompt: PromptFn, checkpointer: Any = None):
+    """Grafo plan → execute → respond com o mesmo estado (messages) do create_react_agent."""
+    model = llm.bind_tools(list(tools))
+    tool_node = InstrumentedToolNode(list(tools))
+    names = {t.name for t in tools}
+    estoque_name = next((n for n in ESTOQUE_TOOLS if n in names), None)
+
+    def plan(state: MessagesState, config: RunnableConfig) -> Dict[str, Any]:
+        return {"messages": [model.invoke(plan_prompt(state, config), config)]}
+
+    def execute(state: MessagesState, config: RunnableConfig) -> Dict[str, Any]:
+        request = state["messages"][-1]
+        results = tool_node.invoke({"messages": [request]}, config)["messages"]
+        new_messages: List[BaseMessage] = list(results)
+        chained = _chained_estoque_calls(request, results, estoque_name) if estoque_name else []
+        if chained:
+            logger.info(f"[PLAN] Consultando estoque de {len(chained)} EAN(s) do plano")
+            lookup = AIMessage(content="", tool_calls=chained)
+            new_messages.append(lookup)
+            new_messages.extend(tool_node.invoke({"messages": [lookup]}, config)["messages"])
+        return {"messages": new_messages}
+
+    def respond(state: MessagesState, config: RunnableConfig) -> Dict[str, Any]:
+        return {"messages": [model.invoke(respond_prompt(state, config), config)]}
+
+    def needs_tools(state: MessagesState) -> str:
+        last = state["messages"][-1]
+        return "execute" if isinstance(last, AIMessage) and last.tool_calls else END
+
+    graph = StateGraph(MessagesState)
+    graph.add_node("plan", plan)
+    graph.add_node("execute", execute)
+    graph.add_node("respond", respond)
+    graph.add_edge(START, "plan")
+    graph.add_conditional_edges("plan", needs_tools, ["execute", END])
+    graph.add_edge("execute", "respond")
+    graph.add_conditional_edges("respond", needs_tools, ["execute", END])
+    return graph.compile(checkpointer=checkpointer)
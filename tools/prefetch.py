@@ -0,0 +1,256 @@
+"""
+Pré-busca especulativa de produtos enquanto o LLM decide o que fazer
+
+Assim que a mensagem (já agregada pelo buffer) chega ao agente, os produtos
+citados são extraídos localmente e ean_lookup + estoque_preco são disparados
+em paralelo. Só contam como produto as partes da mensagem com alguma palavra
+do vocabulário de produtos (lista abaixo + settings.prefetch_vocabulary_file),
+para que "sim pode confirmar" ou um endereço não gerem consultas. Os resultados ficam num cache do próprio turno (contextvar) que
+as ferramentas do agente consultam antes de ir ao serviço externo; uma consulta
+ainda em andamento é aguardada em vez de repetida.
+
+O cache vale só para o turno: ao sair de prefetch.scope() as tarefas que ainda
+não começaram são canceladas e as que não foram usadas contam como desperdício.
+"""
+import contextvars
+import re
+import threading
+import unicodedata
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Callable, Dict, FrozenSet, Iterator, List, Optional
+
+from config.logger import setup_logger
+from config.metrics import REGISTRY, record_cache
+from config.settings import settings
+from tools import deadline
+from tools.http_tools import ean_lookup, estoque_preco
+
+logger = setup_logger(__name__)
+
+EAN = "ean"
+ESTOQUE = "estoque"
+
+PREFETCH_REQUESTS = REGISTRY.counter(
+    "agente_prefetch_requests_total",
+    "Consultas disparadas pela pré-busca por destino (used = aproveitada por uma ferramenta)",
+    ["kind", "result"],
+)
+
+# Separadores de itens, palavras de intenção no início e quantidades
+_ITEM_SPLIT_RE = re.compile(r"\s*(?:,|;|\n|\+|\be\b|\btambem\b|\bmais\b)\s*")
+_LEADING_RE = re.compile(
+    r"^(?:(?:oi|ola|bom dia|boa tarde|boa noite|por favor|quero|queria|gostaria de|preciso de|"
+    r"me ve|me manda|manda|traz|tem|voces tem|vcs tem|ainda tem|qual o preco d[aoe]s?|quanto custa|"
+    r"quanto ta|quanto e|o|a|os|as|um|uma|uns|umas|de|do|da)\b\s*)+"
+)
+_QTY_RE = re.compile(r"^\d+\s*(?:x|un|unidades?|pacotes?|caixas?|fardos?|kg|kilos?|quilos?|g|gramas|litros?|l)?\s+")
+_WORD_RE = re.compile(r"[a-z]{3,}")
+_EAN_RE = re.compile(r"^\d+\)\s*(\d{8,14})\b", re.MULTILINE)
+_KEY_TOKEN_RE = re.compile(r"[a-z0-9]+")
+_STOPWORDS = frozenset({"de", "do", "da", "dos", "das", "o", "a", "os", "as", "um", "uma", "com", "sem"})
+
+# Palavras (sem acento) que indicam produto de supermercado; marcas e itens
+# locais entram por settings.prefetch_vocabulary_file (uma palavra por linha)
+_PRODUCT_WORDS = frozenset("""
+    arroz feijao macarrao massa oleo azeite acucar sal cafe leite manteiga margarina pao paes queijo presunto
+    mortadela iogurte requeijao creme ovo farinha fuba tapioca aveia biscoito bolacha bolo chocolate
+    achocolatado nescau toddy condensado granola cereal mel geleia goiabada
+    carne frango peixe linguica salsicha bacon picanha alcatra acem patinho costela file figado hamburguer
+    calabresa charque sardinha atum camarao
+    tomate cebola alho batata cenoura alface banana maca laranja limao limoes mamao abacaxi melancia melao uva
+    manga abacate pimentao pepino repolho couve beterraba mandioca macaxeira aipim abobora chuchu inhame
+    coentro cebolinha
+    coca refrigerante refri guarana fanta pepsi sprite suco agua cerveja skol brahma heineken vinho cachaca
+    energetico
+    detergente sabao amaciante desinfetante sanitaria cloro alvejante esponja vassoura rodo papel guardanapo
+    lixo shampoo xampu condicionador sabonete dental desodorante fralda absorvente
+    molho extrato ketchup catchup maionese mostarda vinagre tempero caldo colorau pimenta milho ervilha
+    carvao gelo fosforo vela pilha racao pizza lasanha nuggets sorvete polpa
+""".split())
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+_current: ContextVar[Optional["PrefetchCache"]] = ContextVar("prefetch_cache", default=None)
+
+
+def _normalize(text: str) -> str:
+    s = unicodedata.normalize("NFD", (text or "").lower())
+    return "".join(c for c in s if unicodedata.category(c) != "Mn")
+
+
+@lru_cache(maxsize=1)
+def _vocabulary() -> FrozenSet[str]:
+    path = settings.prefetch_vocabulary_file
+    if not path:
+        return _PRODUCT_WORDS
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            extra = {_normalize(line).strip() for line in f if line.strip()}
+    except OSError as e:
+        logger.warning(f"[PREFETCH] Falha ao ler vocabulário de produtos ({path}): {e}")
+        return _PRODUCT_WORDS
+    return _PRODUCT_WORDS | frozenset(extra)
+
+
+def _is_product(part: str) -> bool:
+    """Alguma palavra da parte (ou seu singular) está no vocabulário de produtos."""
+    vocabulary = _vocabulary()
+    for word in _WORD_RE.findall(part):
+        if word in vocabulary or (word.endswith("s") and word[:-1] in vocabulary):
+            return True
+    return False
+
+
+def extract_mentions(mensagem: str) -> List[str]:
+    """Produtos citados na mensagem, sem intenção/quantidade ("quero 2 coca 2l" → "coca 2l")."""
+    mentions: List[str] = []
+    for part in _ITEM_SPLIT_RE.split(_normalize(mensagem)):
+        part = re.sub(r"[?!.]+", " ", part).strip()
+        part = _LEADING_RE.sub("", _QTY_RE.sub("", _LEADING_RE.sub("", part))).strip()
+        if _is_product(part) and part not in mentions:
+            mentions.append(part)
+    return mentions[: max(0, int(settings.prefetch_max_items))]
+
+
+def query_key(query: str) -> str:
+    """Chave do ean_lookup: tokens sem acento/ordem/artigos ("Arroz 5kg" == "arroz  5kg")."""
+    tokens = {t for t in _KEY_TOKEN_RE.findall(_normalize(query)) if t not in _STOPWORDS}
+    return " ".join(sorted(tokens))
+
+
+def ean_key(ean: str) -> str:
+    return "".join(ch for ch in str(ean) if ch.isdigit())
+
+
+def top_eans(ean_result: str, limit: int) -> List[str]:
+    """Primeiros EANs do resumo EANS_ENCONTRADOS devolvido por ean_lookup."""
+    if not ean_result.startswith("EANS_ENCONTRADOS:"):
+        return []
+    return _EAN_RE.findall(ean_result.split("\n\n", 1)[0])[:limit]
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=max(1, int(settings.prefetch_workers)), thread_name_prefix="prefetch"
+                )
+    return _executor
+
+
+class PrefetchCache:
+    """Consultas disparadas num turno, indexadas por (tipo, chave)."""
+
+    def __init__(self, ean_fn: Callable[[str], str], estoque_fn: Callable[[str], str]):
+        self._ean_fn = ean_fn
+        self._estoque_fn = estoque_fn
+        self._lock = threading.Lock()
+        self._futures: Dict[tuple, Future] = {}
+        self._used: set = set()
+        self._closed = False
+        # Contexto do turno (prazo da conversa), copiado para cada consulta do pool
+        self._context = contextvars.copy_context()
+
+    def _submit(self, kind: str, key: str, fn: Callable[[], str]) -> Optional[Future]:
+        with self._lock:
+            if self._closed or not key or (kind, key) in self._futures:
+                return None
+            future = _get_executor().submit(self._context.copy().run, fn)
+            self._futures[(kind, key)] = future
+            return future
+
+    def start(self, mentions: List[str]) -> None:
+        for mention in mentions:
+            future = self._submit(EAN, query_key(mention), lambda m=mention: self._ean_fn(m))
+            if future is not None:
+                future.add_done_callback(self._chain_estoque)
+
+    def _chain_estoque(self, future: Future) -> None:
+        """Ao chegar o resultado do ean_lookup, dispara estoque_preco dos primeiros EANs."""
+        if future.cancelled() or future.exception() is not None:
+            return
+        for ean in top_eans(future.result(), int(settings.prefetch_eans_per_item)):
+            self._submit(ESTOQUE, ean, lambda e=ean: self._estoque_fn(e))
+
+    def get(self, kind: str, key: str, timeout: float) -> Optional[str]:
+        """Resultado da pré-busca (aguarda até timeout se ainda estiver em andamento) ou None."""
+        with self._lock:
+            future = self._futures.get((kind, key))
+        if future is None:
+            return None
+        try:
+            result = future.result(timeout=timeout)
+        except (FutureTimeout, CancelledError):
+            return None
+        except Exception as e:
+            logger.debug(f"[PREFETCH] {kind} '{key}' falhou: {e}")
+            return None
+        # Erros transitórios não são reaproveitados: a ferramenta tenta de novo
+        if not isinstance(result, str) or result.startswith(("Erro", "❌")):
+            return None
+        with self._lock:
+            self._used.add((kind, key))
+        return result
+
+    def close(self) -> None:
+        """Cancela o que não começou e contabiliza consultas usadas/desperdiçadas."""
+        with self._lock:
+            self._closed = True
+            futures = dict(self._futures)
+        for (kind, key), future in futures.items():
+            if future.cancel():
+                result = "cancelled"
+            elif (kind, key) in self._used:
+                result = "used"
+            else:
+                result = "unused"
+            PREFETCH_REQUESTS.inc(kind=kind, result=result)
+
+
+@contextmanager
+def scope(mensagem: str, ean_fn: Optional[Callable[[str], str]] = None,
+          estoque_fn: Optional[Callable[[str], str]] = None) -> Iterator[Optional[PrefetchCache]]:
+    """Abre o cache do turno e dispara a pré-busca dos produtos citados em `mensagem`."""
+    if not settings.prefetch_enabled:
+        yield None
+        return
+    cache = PrefetchCache(ean_fn or ean_lookup, estoque_fn or estoque_preco)
+    token = _current.set(cache)
+    try:
+        mentions = extract_mentions(mensagem)
+        if mentions:
+            logger.info(f"[PREFETCH] Pré-buscando {len(mentions)} produto(s): {mentions}")
+            cache.start(mentions)
+        yield cache
+    finally:
+        _current.reset(token)
+        cache.close()
+
+
+def _lookup(kind: str, key: str, cache_name: str) -> Optional[str]:
+    cache = _current.get()
+    if cache is None:
+        return None
+    wait = float(settings.prefetch_wait_seconds)
+    left = deadline.remaining()
+    if left is not None:
+        wait = min(wait, max(left, 0.0))
+    result = cache.get(kind, key, wait)
+    record_cache(cache_name, result is not None)
+    return result
+
+
+def cached_ean_lookup(query: str) -> Optional[str]:
+    """Resultado pré-buscado de ean_lookup(query) no turno atual, se houver."""
+    return _lookup(EAN, query_key(query), "prefetch_ean")
+
+
+def cached_estoque_preco(ean: str) -> Optional[str]:
+    """Resultado pré-buscado de estoque_preco(ean) no turno atual, se houver."""
+    return _lookup(ESTOQUE, ean_key(ean), "prefetch_estoque")
@@ -4,10 +4,12 @@ Ferramenta para obter data e hora atual
 import datetime
 import pytz
 from config.logger import setup_logger
+from config.metrics import track_tool
 
 logger = setup_logger(__name__)
 
 
+@track_tool("time")
 def get_current_time(timezone: str = "America/Sao_Paulo") -> str:
     """
     Retorna a data e hora atual no fuso horário especificado.
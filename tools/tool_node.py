@@ -0,0 +1,149 @@
+"""
+Execução concorrente das chamadas de ferramenta de um mesmo passo do agente
+
+O modelo costuma pedir várias ferramentas numa única resposta (um `ean` por
+item da lista). InstrumentedToolNode executa essas chamadas num pool
+compartilhado, devolve os ToolMessages na ordem das chamadas e aplica tempo
+limite por ferramenta (settings.tool_timeouts, com settings.tool_timeout_seconds
+como padrão), contado a partir do início da execução da chamada: a espera na
+fila do pool não consome o tempo da ferramenta. Uma chamada que estoura o tempo
+vira um ToolMessage de erro; a thread segue até o timeout HTTP da própria
+ferramenta, mas o turno não espera por ela.
+
+O pool é dimensionado pela concorrência esperada (settings.tool_pool_workers,
+ou tool_expected_conversations × tool_calls_per_conversation), com folga para
+as chamadas abandonadas que ainda ocupam threads. Perto do prazo da conversa
+(tools/deadline.py) o passo nem começa: DeadlineExceeded interrompe o grafo
+e o tempo limite de cada chamada nunca passa do prazo.
+
+O tempo de parede economizado por passo (soma das durações − duração do
+passo) sai em agente_tool_batch_saved_seconds no /metrics.
+"""
+import contextvars
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Any, List, Optional, Tuple
+
+from langchain_core.messages import ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_config_list
+from langgraph.prebuilt import ToolNode
+from langgraph.store.base import BaseStore
+
+from config.logger import setup_logger
+from config.metrics import REGISTRY
+from config.settings import settings
+from tools import deadline
+
+logger = setup_logger(__name__)
+
+TOOL_BATCH_SIZE = REGISTRY.histogram(
+    "agente_tool_batch_size",
+    "Chamadas de ferramenta pedidas pelo modelo num mesmo passo",
+    buckets=(1, 2, 3, 4, 6, 8, 12),
+)
+TOOL_BATCH_SAVED = REGISTRY.histogram(
+    "agente_tool_batch_saved_seconds",
+    "Tempo de parede economizado por passo com execução concorrente (soma das durações - duração do passo)",
+)
+TOOL_TIMEOUTS = REGISTRY.counter(
+    "agente_tool_timeouts_total",
+    "Chamadas de ferramenta abandonadas por tempo limite",
+    ["tool"],
+)
+
+_pool: Optional[ThreadPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=pool_size(), thread_name_prefix="tool")
+    return _pool
+
+
+def pool_size() -> int:
+    """Threads do pool: o valor fixo configurado ou conversas simultâneas × chamadas por passo."""
+    if settings.tool_pool_workers:
+        return max(1, int(settings.tool_pool_workers))
+    return max(1, int(settings.tool_expected_conversations) * int(settings.tool_calls_per_conversation))
+
+
+def tool_timeout(name: str) -> float:
+    """Tempo limite da ferramenta: settings.tool_timeouts[name] ou o padrão."""
+    return float((settings.tool_timeouts or {}).get(name, settings.tool_timeout_seconds))
+
+
+class _Started:
+    """Instante em que a chamada saiu da fila do pool e começou a executar."""
+
+    __slots__ = ("event", "at")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.at = 0.0
+
+    def mark(self) -> None:
+        self.at = time.perf_counter()
+        self.event.set()
+
+
+class InstrumentedToolNode(ToolNode):
+    """ToolNode que roda as chamadas de um passo em paralelo, em ordem e com tempo limite."""
+
+    def _func(self, input: Any, config: RunnableConfig, *, store: Optional[BaseStore]) -> Any:
+        tool_calls, input_type = self._parse_input(input, store)
+        deadline.require("tools", float(settings.deadline_min_tool_seconds))
+        TOOL_BATCH_SIZE.observe(len(tool_calls))
+        config_list = get_config_list(config, len(tool_calls))
+        started = time.perf_counter()
+        pool = _get_pool()
+        futures: List[Tuple[Future, _Started]] = []
+        for call, call_config in zip(tool_calls, config_list):
+            # Cada chamada leva uma cópia do contexto (cache da pré-busca, spans de tracing)
+            ctx = contextvars.copy_context()
+            began = _Started()
+            futures.append((pool.submit(ctx.run, self._timed_run_one, call, input_type, call_config, began), began))
+
+        outputs = []
+        busy = 0.0
+        for call, (future, began) in zip(tool_calls, futures):
+            timeout = tool_timeout(call["name"])
+            try:
+                # Na fila só o prazo da conversa vale; o tempo da ferramenta conta do início da execução
+                if not began.event.wait(deadline.remaining()):
+                    raise FutureTimeout()
+                remaining = began.at + timeout - time.perf_counter()
+                left = deadline.remaining()
+                if left is not None:
+                    remaining = min(remaining, left)
+                output, elapsed = future.result(timeout=max(0.0, remaining))
+                busy += elapsed
+            except FutureTimeout:
+                future.cancel()
+                TOOL_TIMEOUTS.inc(tool=call["name"])
+                logger.warning(f"[TOOLS] {call['name']} excedeu {timeout:.1f}s; seguindo sem o resultado")
+                busy += time.perf_counter() - (began.at or started)
+                output = ToolMessage(
+                    content=f"Erro: tempo limite ({timeout:.0f}s) excedido na ferramenta {call['name']}. Tente novamente.",
+                    name=call["name"],
+                    tool_call_id=call["id"],
+                    status="error",
+                )
+            outputs.append(output)
+
+        wall = time.perf_counter() - started
+        if len(tool_calls) > 1:
+            TOOL_BATCH_SAVED.observe(max(0.0, busy - wall))
+        logger.debug(f"[TOOLS] {len(tool_calls)} chamadas em {wall:.3f}s (sequencial: {busy:.3f}s)")
+        return self._combine_tool_outputs(outputs, input_type)
+
+    def _timed_run_one(self, call: Any, input_type: Any, config: RunnableConfig, began: _Started) -> Tuple[Any, float]:
+        began.mark()
+        output = self._run_one(call, input_type, config)
+        return output, time.perf_counter() - began.at
@@ -0,0 +1,163 @@
+"""
+Cliente HTTP compartilhado para os serviços externos (ERP, smart-responder, UAZ)
+
+Centraliza as chamadas para reaproveitar conexões (requests.Session com pool)
+e registrar a latência por host no /metrics. Com settings.cassette_mode
+ativo, as respostas são gravadas/reproduzidas por tools/cassette.py. O
+timeout de cada chamada é limitado ao prazo da conversa (tools/deadline.py)
+e acompanha a latência recente do host (tools/adaptive.py); cada host passa por
+um circuit breaker (tools/circuit_breaker.py). Chamadas com hedge=True podem
+ganhar uma cópia quando demoram (tools/hedging.py).
+"""
+import time
+from typing import Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from config import tracing
+from config.metrics import UPSTREAM_LATENCY
+from config.settings import settings
+from tools import adaptive, cassette, circuit_breaker, deadline, hedging
+
+_session: Optional[requests.Session] = None
+
+
+def get_session() -> requests.Session:
+    """Sessão HTTP do processo (criada na primeira chamada)."""
+    global _session
+    if _session is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _session = session
+    return _session
+
+
+def _failed(response: requests.Response) -> bool:
+    """Respostas que contam como falha do serviço para o circuit breaker."""
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def _retryable(error: requests.exceptions.RequestException) -> bool:
+    """Falhas transitórias do serviço (não do prazo da conversa nem do circuito aberto)."""
+    if isinstance(error, (deadline.DeadlineExceeded, circuit_breaker.CircuitOpenError)):
+        return False
+    return isinstance(error, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+
+
+def _send(method: str, url: str, host: str, breaker: Optional[circuit_breaker.CircuitBreaker],
+          kwargs: dict) -> requests.Response:
+    """Uma tentativa: timeout adaptativo limitado ao prazo, métricas, span e registro no breaker."""
+    status = "error"
+    start = time.perf_counter()
+    try:
+        with tracing.span(f"http {method}", host=host) as sp:
+            try:
+                adaptive_timeout = adaptive.timeout_for(host, kwargs.get("timeout"))
+                kwargs["timeout"] = deadline.clamp_timeout(adaptive_timeout)
+                if cassette.active():
+                    response = cassette.http_request(
+                        method, url, kwargs, lambda: get_session().request(method, url, **kwargs)
+                    )
+                else:
+                    response = get_session().request(method, url, **kwargs)
+                status = str(response.status_code)
+            except requests.exceptions.Timeout as e:
+                status = "timeout"
+                # Timeout encurtado pelo prazo da conversa não é culpa do serviço
+                if isinstance(e, deadline.DeadlineExceeded) or kwargs.get("timeout") != adaptive_timeout:
+                    if breaker is not None:
+                        breaker.discard()
+                    raise
+                adaptive.observe(host, time.perf_counter() - start)
+                if breaker is not None:
+                    breaker.record(False, time.perf_counter() - start)
+                raise
+            except requests.exceptions.RequestException:
+                if breaker is not None:
+                    breaker.record(False, time.perf_counter() - start)
+                raise
+            finally:
+                if sp is not None:
+                    sp.set_attribute("status", status)
+    finally:
+        UPSTREAM_LATENCY.observe(time.perf_counter() - start, host=host, method=method, status=status)
+
+    elapsed = time.perf_counter() - start
+    adaptive.observe(host, elapsed)
+    if breaker is not None:
+        breaker.record(not _failed(response), elapsed)
+    return response
+
+
+def request(method: str, url: str, fallback: bool = False, hedge: bool = False, retry: bool = False,
+            fallback_max_age: Optional[float] = None, **kwargs) -> requests.Response:
+    """
+    Executa a requisição e observa a duração por host/método/status
+    (métrica + span "http <MÉTODO>"). Exceções do requests são repassadas sem alteração.
+
+    O timeout passado é o inicial: com latências suficientes do host vale o
+    timeout adaptativo (tools/adaptive.py).
+    Com o circuito do host aberto a chamada falha na hora (CircuitOpenError).
+    Com fallback=True (consultas), a última resposta boa da mesma requisição é
+    guardada e devolvida no lugar de uma falha ou do circuito aberto (só se
+    obtida há menos de fallback_max_age segundos, quando informado).
+    Com hedge=True (consultas idempotentes) uma chamada lenta ganha uma cópia.
+    Com retry=True (idempotentes) falhas transitórias são repetidas até
+    settings.upstream_max_retries vezes, dentro do orçamento de retentativas do host.
+    """
+    host = urlparse(url).netloc or "desconhecido"
+    if hedge:
+        return hedging.call(host, lambda: request(method, url, fallback=fallback, retry=retry,
+                                                  fallback_max_age=fallback_max_age, **kwargs))
+    breaker = circuit_breaker.for_host(host) if settings.breaker_enabled else None
+    key = circuit_breaker.fallback_key(method, url, kwargs) if breaker is not None and fallback else None
+    attempts = 1 + (settings.upstream_max_retries if retry else 0)
+    adaptive.earn_retry(host)
+
+    response: Optional[requests.Response] = None
+    for attempt in range(attempts):
+        if breaker is not None and not breaker.allow():
+            if response is not None:
+                break
+            cached = circuit_breaker.last_known_good(key, host, url, fallback_max_age) if key else None
+            if cached is not None:
+                return cached
+            raise circuit_breaker.CircuitOpenError(f"Circuito aberto para {host}")
+
+        last_attempt = attempt + 1 >= attempts
+        try:
+            response = _send(method, url, host, breaker, dict(kwargs))
+        except requests.exceptions.RequestException as e:
+            if not last_attempt and _retryable(e) and adaptive.allow_retry(host):
+                continue
+            cached = circuit_breaker.last_known_good(key, host, url, fallback_max_age) if key else None
+            if cached is not None:
+                return cached
+            raise
+        if not _failed(response) or last_attempt or not adaptive.allow_retry(host):
+            break
+
+    if key:
+        if 200 <= response.status_code < 300:
+            circuit_breaker.remember(key, response)
+        elif _failed(response):
+            cached = circuit_breaker.last_known_good(key, host, url, fallback_max_age)
+            if cached is not None:
+                return cached
+    return response
+
+
+def get(url: str, **kwargs) -> requests.Response:
+    return request("GET", url, **kwargs)
+
+
+def post(url: str, **kwargs) -> requests.Response:
+    return request("POST", url, **kwargs)
+
+
+def put(url: str, **kwargs) -> requests.Response:
+    return request("PUT", url, **kwargs)
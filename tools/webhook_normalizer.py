@@ -0,0 +1,237 @@
+"""
+Normalização de payloads de webhook do WhatsApp (UAZ / Cloud API)
+Detecta o layout do provedor pelas chaves de topo e extrai os campos em uma única passada
+"""
+import re
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+_NON_DIGITS = re.compile(r"\D")
+
+AUDIO_PLACEHOLDER = "[Mensagem de áudio recebida - transcrição não implementada]"
+IMAGE_PLACEHOLDER = "[Imagem recebida]"
+
+
+@dataclass(slots=True)
+class IncomingMessage:
+    """Mensagem recebida normalizada, independente do provedor."""
+    telefone: Optional[str]
+    mensagem_texto: Optional[str]
+    message_type: Optional[str]
+    message_id: Optional[str]
+    from_me: bool = False
+
+
+def sanitize_number(raw: Any) -> Optional[str]:
+    """
+    Extrai apenas os dígitos de um identificador do WhatsApp.
+    Remove sufixos de domínio ("@s.whatsapp.net") e o prefixo "owner:" do wa_fastid.
+    """
+    if not raw:
+        return None
+    s = str(raw)
+    if "@" in s:
+        s = s.split("@", 1)[0]
+    if ":" in s:
+        s = s.rsplit(":", 1)[-1]
+    if not s.isdigit():
+        s = _NON_DIGITS.sub("", s)
+    return s or None
+
+
+# ============================================
+# Parsers por layout
+# ============================================
+
+def _parse_uaz_messages_list(payload: Dict[str, Any]) -> IncomingMessage:
+    """UAZ Webhook com lista 'messages' e campo 'content'."""
+    m0 = payload["messages"][0] or {}
+    content = m0.get("content") or {}
+    if not isinstance(content, dict):
+        content = {"text": content}
+
+    # telefone pode vir em 'sender' ou 'chatid' (ex.: "5585987520060@s.whatsapp.net")
+    telefone = m0.get("sender") or m0.get("chatid") or m0.get("from")
+    if isinstance(telefone, str):
+        telefone = _NON_DIGITS.sub("", telefone.split("@", 1)[0])
+
+    return IncomingMessage(
+        telefone=telefone or None,
+        mensagem_texto=content.get("text") or m0.get("text"),
+        message_type=content.get("type") or m0.get("type") or "text",
+        message_id=m0.get("messageid") or m0.get("id"),
+        from_me=bool(m0.get("fromMe") or m0.get("wasSentByApi")),
+    )
+
+
+def _parse_uaz_body(payload: Dict[str, Any]) -> IncomingMessage:
+    """UAZ presumida com envelope 'body' (message/chat/data)."""
+    body = payload["body"]
+    message = body.get("message") or {}
+    chat = body.get("chat") or {}
+    data = body.get("data") or {}
+
+    message_type = data.get("messageType") or message.get("type") or "textMessage"
+    mensagem_texto = None
+    if message_type in ("textMessage", "text", "txt"):
+        mensagem_texto = (message.get("text") or {}).get("body") or message.get("body")
+    elif message_type in ("imageMessage", "image"):
+        mensagem_texto = (message.get("image") or {}).get("caption", IMAGE_PLACEHOLDER)
+    elif message_type in ("audioMessage", "audio"):
+        mensagem_texto = AUDIO_PLACEHOLDER
+
+    return IncomingMessage(
+        telefone=chat.get("wa_id") or message.get("from"),
+        mensagem_texto=mensagem_texto,
+        message_type=message_type,
+        message_id=message.get("messageid") or message.get("id"),
+        from_me=bool(message.get("fromMe") or message.get("wasSentByApi")),
+    )
+
+
+def _parse_cloud_api(payload: Dict[str, Any]) -> IncomingMessage:
+    """WhatsApp Cloud API oficial (entry -> changes -> value)."""
+    changes = (payload["entry"][0] or {}).get("changes") or []
+    value = (changes[0] or {}).get("value", {}) if changes else {}
+    messages = value.get("messages") or []
+    contacts = value.get("contacts") or []
+    msg = messages[0] if messages else {}
+
+    message_type = msg.get("type") or "text"
+    mensagem_texto = None
+    if message_type == "text":
+        mensagem_texto = (msg.get("text") or {}).get("body")
+    elif message_type == "image":
+        mensagem_texto = (msg.get("image") or {}).get("caption", IMAGE_PLACEHOLDER)
+    elif message_type == "audio":
+        mensagem_texto = AUDIO_PLACEHOLDER
+
+    return IncomingMessage(
+        telefone=(contacts[0].get("wa_id") if contacts else None) or msg.get("from"),
+        mensagem_texto=mensagem_texto,
+        message_type=message_type,
+        message_id=msg.get("id"),
+        from_me=False,
+    )
+
+
+# Ordem de candidatos a telefone (ver _parse_uaz_top_level)
+_FROM_ME_PAYLOAD_KEYS = ("wa_id", "sender", "chatid", "from")
+_FROM_ME_CHAT_KEYS = ("wa_id", "phone", "wa_chatid", "wa_fastid")
+_INCOMING_PAYLOAD_KEYS = ("from", "wa_id", "sender", "chatid")
+_INCOMING_CHAT_KEYS = ("phone", "wa_chatid", "wa_fastid")
+_MESSAGE_KEYS = ("sender", "sender_pn", "chatid", "from")
+
+
+def _parse_uaz_top_level(payload: Dict[str, Any]) -> IncomingMessage:
+    """Formato UAZ com campos de topo (message/chat); também serve de fallback."""
+    chat = payload.get("chat") or {}
+    message_any = payload.get("message")
+    message_dict = message_any if isinstance(message_any, dict) else None
+    from_me = False
+
+    mensagem_texto = payload.get("text")
+    message_type = payload.get("messageType") or "text"
+    message_id = payload.get("id") or payload.get("messageid")
+
+    if message_dict is not None:
+        message_type = message_dict.get("type") or message_type
+
+        # content pode ser string ou dict
+        content = message_dict.get("content")
+        if isinstance(content, str) and not mensagem_texto:
+            mensagem_texto = content
+        elif isinstance(content, dict):
+            mensagem_texto = content.get("text") or mensagem_texto
+            message_type = content.get("type") or message_type
+
+        # Campo text pode ser string ou dict { body: "..." }
+        if mensagem_texto is None:
+            txt = message_dict.get("text")
+            if isinstance(txt, dict):
+                mensagem_texto = txt.get("body")
+            else:
+                mensagem_texto = txt or message_dict.get("body")
+
+        message_id = message_dict.get("messageid") or message_dict.get("id") or message_id
+        from_me = bool(message_dict.get("fromMe") or message_dict.get("wasSentByApi"))
+
+    # Se a mensagem foi enviada pelo agente (from_me), priorizamos o número do CLIENTE
+    # (chat.wa_id) para que a memória use sempre o mesmo session_id do cliente.
+    if from_me:
+        sources = ((chat, _FROM_ME_CHAT_KEYS), (payload, _FROM_ME_PAYLOAD_KEYS))
+    else:
+        sources = ((payload, _INCOMING_PAYLOAD_KEYS), (chat, _INCOMING_CHAT_KEYS))
+    if message_dict is not None:
+        sources += ((message_dict, _MESSAGE_KEYS),)
+
+    telefone: Optional[str] = None
+    for source, keys in sources:
+        for key in keys:
+            telefone = sanitize_number(source.get(key))
+            if telefone:
+                break
+        if telefone:
+            break
+
+    if message_type in (None, "", "textMessage"):
+        message_type = "text"
+
+    if message_dict is not None and not mensagem_texto:
+        if message_type in ("imageMessage", "image"):
+            img = message_dict.get("image")
+            mensagem_texto = (img.get("caption") if isinstance(img, dict) else None) or IMAGE_PLACEHOLDER
+        elif message_type in ("audioMessage", "audio"):
+            mensagem_texto = AUDIO_PLACEHOLDER
+
+    return IncomingMessage(
+        telefone=telefone,
+        mensagem_texto=mensagem_texto,
+        message_type=message_type,
+        message_id=message_id,
+        from_me=from_me,
+    )
+
+
+def detect_layout(payload: Dict[str, Any]) -> str:
+    """Identifica o layout do provedor a partir das chaves de topo."""
+    messages = payload.get("messages")
+    if isinstance(messages, list) and messages:
+        return "uaz_messages"
+    if isinstance(payload.get("body"), dict):
+        return "uaz_body"
+    entry = payload.get("entry")
+    if isinstance(entry, list) and entry:
+        return "cloud_api"
+    return "uaz_top_level"
+
+
+_PARSERS = {
+    "uaz_messages": _parse_uaz_messages_list,
+    "uaz_body": _parse_uaz_body,
+    "cloud_api": _parse_cloud_api,
+    "uaz_top_level": _parse_uaz_top_level,
+}
+
+
+def normalize_incoming(payload: Dict[str, Any]) -> IncomingMessage:
+    """
+    Normaliza payloads de diferentes provedores (UAZ/Cloud API) para IncomingMessage.
+
+    O layout é detectado uma única vez; se o parser específico não encontrar
+    telefone (payload parcial), o formato UAZ de topo é usado como fallback.
+    """
+    if not isinstance(payload, dict):
+        return IncomingMessage(None, None, "text", None, False)
+
+    layout = detect_layout(payload)
+    try:
+        result = _PARSERS[layout](payload)
+    except (AttributeError, IndexError, KeyError, TypeError):
+        result = None
+
+    if layout == "cloud_api" and result is not None:
+        return result
+    if result is None or not result.telefone:
+        return _parse_uaz_top_level(payload)
+    return result